@@ -3,8 +3,6 @@
 from __future__ import print_function, division, unicode_literals, \
     absolute_import
 
-import argparse
-
 from .logging import get_logger
 
 
@@ -13,6 +11,8 @@ __author__ = "Dan Obermiller"
 
 
 if __name__ == '__main__':
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="Predict an organic chemistry reaction using the CAOS tool"
                     ", powered by Python"
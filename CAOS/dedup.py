@@ -0,0 +1,475 @@
+"""Deduplication of product streams.
+
+Batch runs produce the same products (water, salts, ...) over and over.
+`deduplicate` passes on the first occurrence of every product of a
+stream and counts the others, in memory bounded independently of the
+length of the stream:
+
+1. Every product is keyed by its `canonical.canonical_hash`, a 64 bit
+   id-independent hash, computed for a batch of products at once.
+2. A `BloomFilter` tells which keys may have been seen before.  Most
+   new keys are rejected by it, so they're stored without a lookup.
+3. A `KeyStore` keeps the exact count of every key.  It holds up to a
+   set number of keys in memory, then spills them to disk as a sorted
+   run; runs are searched with `numpy.searchsorted`, for a batch of
+   keys at once, and merged as they pile up so there are only a
+   logarithmic number of them.
+
+Products are compared by hash, not by `Molecule.__eq__`.  The hash is
+canonical, so two products are only wrongly merged if their 64 bit
+digests collide (see `CAOS.structures.canonical`).  The implicit and
+explicit forms of a molecule (see `Molecule.to_implicit`) are different
+products.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .structures.canonical import canonical_hashes, mix
+
+_DEFAULT_BATCH = 10000
+_DEFAULT_MEMORY = 1 << 20
+# Rows of spilled runs read at once while merging.
+_MERGE_BLOCK = 1 << 18
+
+_SALT = np.uint64(0x9e3779b97f4a7c15)
+
+
+def molecule_keys(molecules):
+    """The canonical keys of molecules, as 64 bit integers.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+
+    Returns
+    -------
+    keys : numpy.ndarray
+        Array of ``uint64``, one key per molecule.
+    """
+
+    return np.array(
+        [int(key, 16) for key in canonical_hashes(molecules)],
+        dtype=np.uint64
+    )
+
+
+class BloomFilter(object):
+    """A set of 64 bit keys that may report keys it doesn't contain.
+
+    Parameters
+    ----------
+    capacity : int
+        The number of keys the filter is sized for.
+    error_rate : Optional[float]
+        The rate of false positives once `capacity` keys were added.
+        It grows quickly past the capacity.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        bits = -capacity * math.log(error_rate) / math.log(2) ** 2
+        self.size = max(int(math.ceil(bits / 8)) * 8, 64)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = np.zeros(self.size // 8, dtype=np.uint8)
+
+    def _positions(self, keys):
+        # Double hashing: position i is h1 + i * h2.
+        keys = np.asarray(keys, dtype=np.uint64)
+        first = mix(keys)
+        second = mix(keys ^ _SALT) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        positions = first[:, None] + steps[None, :] * second[:, None]
+        return (positions % np.uint64(self.size)).astype(np.intp)
+
+    def contains(self, keys):
+        """Whether each key may have been added.
+
+        Parameters
+        ----------
+        keys : numpy.ndarray
+            Array of ``uint64`` keys.
+
+        Returns
+        -------
+        maybe : numpy.ndarray
+            Array of booleans, false only for keys that were never added.
+        """
+
+        positions = self._positions(keys)
+        bits = self._bits[positions >> 3] >> (positions & 7).astype(np.uint8)
+        return (bits & 1).astype(bool).all(axis=1)
+
+    def add(self, keys):
+        """Add keys to the filter.
+
+        Parameters
+        ----------
+        keys : numpy.ndarray
+            Array of ``uint64`` keys.
+        """
+
+        positions = self._positions(keys).ravel()
+        np.bitwise_or.at(
+            self._bits, positions >> 3,
+            np.left_shift(1, positions & 7).astype(np.uint8)
+        )
+
+    def __contains__(self, key):
+        return bool(self.contains(np.array([key], dtype=np.uint64))[0])
+
+
+class _Run(object):
+    """Sorted keys and their counts, memory mapped from disk."""
+
+    def __init__(self, path, keys, counts):
+        self.path = path
+        self.keys = keys
+        self.counts = counts
+
+    @classmethod
+    def create(cls, path, length):
+        keys = np.memmap(
+            path + '.keys', dtype=np.uint64, mode='w+', shape=(length,)
+        )
+        counts = np.memmap(
+            path + '.counts', dtype=np.int64, mode='w+', shape=(length,)
+        )
+        return cls(path, keys, counts)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, keys):
+        """The position of each key in the run, or -1."""
+
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return np.where(found, positions, -1)
+
+    def delete(self):
+        # The memory maps must be closed before the files are removed.
+        self.keys = self.counts = None
+        for suffix in ('.keys', '.counts'):
+            os.remove(self.path + suffix)
+
+
+class KeyStore(object):
+    """Exact counts of 64 bit keys, spilled to disk past a size.
+
+    Parameters
+    ----------
+    memory_limit : Optional[int]
+        The number of keys kept in memory.  When more are added, the
+        keys in memory are written to disk as a sorted run.
+    directory : Optional[str]
+        Where runs are written.  A temporary directory is made on the
+        first spill if not given, and removed by `close`.
+    """
+
+    def __init__(self, memory_limit=_DEFAULT_MEMORY, directory=None):
+        self.memory_limit = memory_limit
+        self.directory = directory
+        self._temporary = False
+        self._memory = {}
+        self._runs = []
+        self._serial = 0
+        self.total = 0
+
+    def __len__(self):
+        return len(self._memory) + sum(len(run) for run in self._runs)
+
+    def add(self, keys, counts=None, maybe=None):
+        """Count distinct keys.
+
+        Parameters
+        ----------
+        keys : numpy.ndarray
+            Array of distinct ``uint64`` keys.
+        counts : Optional[numpy.ndarray]
+            How many times each key occurred, 1 by default.
+        maybe : Optional[numpy.ndarray]
+            Booleans telling which keys may already be stored (from a
+            `BloomFilter`).  The other keys are stored without looking
+            them up.
+
+        Returns
+        -------
+        new : numpy.ndarray
+            Booleans telling which keys weren't stored before.
+        """
+
+        keys = np.asarray(keys, dtype=np.uint64)
+        counts = np.ones(len(keys), dtype=np.int64) if counts is None \
+            else np.asarray(counts, dtype=np.int64)
+        self.total += int(counts.sum())
+        new = np.ones(len(keys), dtype=bool)
+        lookup = np.arange(len(keys)) if maybe is None \
+            else np.flatnonzero(maybe)
+
+        memory = self._memory
+        remaining = []
+        for position in lookup.tolist():
+            key = int(keys[position])
+            if key in memory:
+                memory[key] += int(counts[position])
+                new[position] = False
+            else:
+                remaining.append(position)
+        remaining = np.array(remaining, dtype=np.intp)
+        for run in self._runs:
+            if not len(remaining):
+                break
+            found = run.find(keys[remaining])
+            hit = found >= 0
+            run.counts[found[hit]] += counts[remaining[hit]]
+            new[remaining[hit]] = False
+            remaining = remaining[~hit]
+
+        for key, count in zip(keys[new].tolist(), counts[new].tolist()):
+            memory[key] = count
+        if len(memory) > self.memory_limit:
+            self._spill()
+        return new
+
+    def count(self, key):
+        """The number of times a key was added (0 if never)."""
+
+        key = int(key)
+        if key in self._memory:
+            return self._memory[key]
+        keys = np.array([key], dtype=np.uint64)
+        for run in self._runs:
+            position = run.find(keys)[0]
+            if position >= 0:
+                return int(run.counts[position])
+        return 0
+
+    def items(self):
+        """Iterate over ``(key, count)`` pairs, in no particular order."""
+
+        for item in self._memory.items():
+            yield item
+        for run in self._runs:
+            for start in range(0, len(run), _MERGE_BLOCK):
+                end = start + _MERGE_BLOCK
+                for item in zip(run.keys[start:end].tolist(),
+                                run.counts[start:end].tolist()):
+                    yield item
+
+    def _new_run(self, length):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='caos-dedup-')
+            self._temporary = True
+        elif not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._serial += 1
+        return _Run.create(
+            os.path.join(self.directory, 'run{}'.format(self._serial)),
+            length
+        )
+
+    def _spill(self):
+        keys = np.fromiter(self._memory, dtype=np.uint64,
+                           count=len(self._memory))
+        counts = np.fromiter(
+            (self._memory[key] for key in keys.tolist()), dtype=np.int64,
+            count=len(keys)
+        )
+        order = np.argsort(keys)
+        run = self._new_run(len(keys))
+        run.keys[:] = keys[order]
+        run.counts[:] = counts[order]
+        self._memory = {}
+        self._runs.append(run)
+        # Like a binary counter: runs are merged while the newest is at
+        # least half the size of the one before it, so sizes at least
+        # double down the list.
+        while len(self._runs) > 1 and \
+                2 * len(self._runs[-1]) >= len(self._runs[-2]):
+            second = self._runs.pop()
+            first = self._runs.pop()
+            self._runs.append(self._merge(first, second))
+
+    def _merge(self, first, second):
+        merged = self._new_run(len(first) + len(second))
+        i = j = written = 0
+        while i < len(first) or j < len(second):
+            a = first.keys[i:i + _MERGE_BLOCK]
+            b = second.keys[j:j + _MERGE_BLOCK]
+            # Everything up to the smaller of the two last keys can be
+            # written; the rest waits for the next blocks.
+            if len(a) and len(b):
+                limit = min(a[-1], b[-1])
+                take_a = int(np.searchsorted(a, limit, side='right'))
+                take_b = int(np.searchsorted(b, limit, side='right'))
+            else:
+                take_a, take_b = len(a), len(b)
+            keys = np.concatenate([a[:take_a], b[:take_b]])
+            counts = np.concatenate([
+                first.counts[i:i + take_a], second.counts[j:j + take_b]
+            ])
+            order = np.argsort(keys, kind='mergesort')
+            end = written + len(keys)
+            merged.keys[written:end] = keys[order]
+            merged.counts[written:end] = counts[order]
+            written = end
+            i += take_a
+            j += take_b
+        first.delete()
+        second.delete()
+        return merged
+
+    def close(self):
+        """Delete the spilled runs (and the temporary directory)."""
+
+        for run in self._runs:
+            run.delete()
+        self._runs = []
+        if self._temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+            self._temporary = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class Deduplicator(object):
+    """Passes on the first occurrence of each product of streams.
+
+    Parameters
+    ----------
+    capacity : Optional[int]
+        The number of distinct products the Bloom filter is sized for.
+        More can be added, at the cost of more lookups.
+    error_rate : Optional[float]
+        The false positive rate of the Bloom filter at capacity.
+    memory_limit : Optional[int]
+        The number of distinct keys kept in memory, see `KeyStore`.
+    directory : Optional[str]
+        Where keys are spilled, see `KeyStore`.
+    batch_size : Optional[int]
+        The number of products keyed at once.  A product is only passed
+        on once its batch is complete.
+
+    Attributes
+    ----------
+    store : KeyStore
+        The count of every product seen, by key.
+    """
+
+    def __init__(self, capacity=10 ** 7, error_rate=0.01,
+                 memory_limit=_DEFAULT_MEMORY, directory=None,
+                 batch_size=_DEFAULT_BATCH):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.store = KeyStore(memory_limit, directory)
+        self.batch_size = batch_size
+
+    @property
+    def unique(self):
+        """The number of distinct products seen."""
+
+        return len(self.store)
+
+    @property
+    def seen(self):
+        """The number of products seen, duplicates included."""
+
+        return self.store.total
+
+    def count(self, molecule):
+        """The number of times a product was seen."""
+
+        return self.store.count(molecule_keys([molecule])[0])
+
+    def _firsts(self, molecules):
+        """Count a batch, and list the molecules that are the first of
+        their kind."""
+
+        if not molecules:
+            return []
+        keys = molecule_keys(molecules)
+        unique, first, counts = np.unique(
+            keys, return_index=True, return_counts=True
+        )
+        maybe = self.bloom.contains(unique)
+        self.bloom.add(unique[~maybe])
+        new = self.store.add(unique, counts, maybe)
+        return [molecules[position] for position in np.sort(first[new])]
+
+    def filter(self, products):
+        """Drop the products seen before.
+
+        Parameters
+        ----------
+        products : iterable[Optional[Molecule]]
+            The products; ``None`` entries are skipped.
+
+        Yields
+        ------
+        product : Molecule
+            Each product whose structure wasn't seen before (in this
+            stream or earlier ones), in the order of the stream.
+        """
+
+        batch = []
+        for product in products:
+            if product is not None:
+                batch.append(product)
+            if len(batch) >= self.batch_size:
+                for first in self._firsts(batch):
+                    yield first
+                batch = []
+        for first in self._firsts(batch):
+            yield first
+
+    def counts(self):
+        """Iterate over ``(canonical hash, count)`` for every product."""
+
+        for key, count in self.store.items():
+            yield '{:016x}'.format(key), count
+
+    def close(self):
+        """Delete the keys spilled to disk."""
+
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def deduplicate(products, **kwargs):
+    """Drop the products of a stream that were seen before.
+
+    Parameters
+    ----------
+    products : iterable[Optional[Molecule]]
+        The products, for instance
+        ``itertools.chain.from_iterable(react_many(...))``.
+    kwargs
+        Passed on to `Deduplicator`.
+
+    Yields
+    ------
+    product : Molecule
+        The first occurrence of each product.
+    """
+
+    with Deduplicator(**kwargs) as deduplicator:
+        for product in deduplicator.filter(products):
+            yield product
@@ -0,0 +1,446 @@
+"""Reaction outcomes stored as changes to the reactants.
+
+Most mechanisms change a handful of atoms and bonds, so storing whole
+product molecules wastes memory (and disk, once outcomes are saved).  A
+`ReactionDelta` keeps a reference to the reactants and, for every
+product, the reactant it was made from and the atoms and bonds that
+were removed, added or changed.  The product molecules are only built
+when they are asked for.
+
+Deltas are recorded by `react_delta`, which uses the transactions of
+`Molecule` (see `Molecule.changes`): the mechanism edits the reactants
+in place as usual, the changes are read from the undo log, and the
+reactants are rolled back, so no molecule is copied at all.
+
+Attributes
+----------
+react_delta: function
+    Function that reacts molecules and returns a `ReactionDelta`.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import json
+
+import six
+
+from .descriptors import Descriptors
+from .dispatch import ReactionDispatcher
+from .exceptions.reaction_errors import FailedReactionError
+from .structures.molecule import Molecule
+from .validation import validated_call
+from . import logger
+
+# Short keys, since serialized deltas are meant to be stored in bulk.
+_KEYS = (
+    ('removed_atoms', '-a'),
+    ('added_atoms', '+a'),
+    ('removed_bonds', '-b'),
+    ('added_bonds', '+b'),
+    ('changed_bonds', '~b'),
+    ('moved_atoms', 'm'),
+    ('changed_hydrogens', 'h'),
+)
+
+
+class MoleculeEdit(object):
+    """The changes turning one reactant (or nothing) into a product.
+
+    Parameters
+    ----------
+    source : Optional[int]
+        The position of the reactant the product is made from, or
+        ``None`` if it is built from scratch (out of `added_atoms` and
+        `added_bonds` alone).
+    removed_atoms : collection[str]
+        Ids of the reactant's atoms missing from the product.  Their
+        bonds are removed as well.
+    added_atoms : mapping[str -> str]
+        Symbols of the atoms the product has in addition, by id.
+    removed_bonds : collection[str]
+        Ids of the reactant's bonds missing from the product.
+    added_bonds : mapping[str -> tuple[str, str, int]]
+        The atoms and order of the bonds the product has in addition,
+        by id.
+    changed_bonds : mapping[str -> int]
+        The new order of the reactant's bonds whose order changed.
+    moved_atoms : mapping[str -> tuple[int, str]]
+        For added atoms that were moved from a reactant, the position
+        of that reactant and the atom's id in it.
+    changed_hydrogens : mapping[str -> int]
+        The new number of implicit hydrogens of the atoms where it
+        changed, including added atoms that have any.
+    """
+
+    def __init__(self, source, removed_atoms=(), added_atoms=None,
+                 removed_bonds=(), added_bonds=None, changed_bonds=None,
+                 moved_atoms=None, changed_hydrogens=None):
+        self.source = source
+        self.removed_atoms = list(removed_atoms)
+        self.added_atoms = dict(added_atoms or {})
+        self.removed_bonds = list(removed_bonds)
+        self.added_bonds = dict(
+            (id_, tuple(bond))
+            for id_, bond in six.iteritems(added_bonds or {})
+        )
+        self.changed_bonds = dict(changed_bonds or {})
+        self.moved_atoms = dict(
+            (id_, tuple(origin))
+            for id_, origin in six.iteritems(moved_atoms or {})
+        )
+        self.changed_hydrogens = dict(changed_hydrogens or {})
+
+    @classmethod
+    def from_changes(cls, source, changes, reactants):
+        """Build an edit from `Molecule.changes`.
+
+        Origins in other molecules than `reactants` are left out.
+        """
+
+        changes = dict(changes)
+        moved_atoms = {}
+        for id_, (molecule, atom) in six.iteritems(changes['moved_atoms']):
+            for number, reactant in enumerate(reactants):
+                if molecule is reactant:
+                    moved_atoms[id_] = (number, atom)
+                    break
+        changes['moved_atoms'] = moved_atoms
+        return cls(source, **changes)
+
+    @classmethod
+    def from_molecule(cls, molecule):
+        """Build an edit creating a copy of `molecule` from scratch."""
+
+        return cls(
+            None,
+            added_atoms=dict(
+                (atom, data['symbol'])
+                for atom, data in molecule.nodes(data=True)
+            ),
+            added_bonds=dict(
+                (data['id'], (first, second, data.get('order', 1)))
+                for first, second, data in molecule.edges(data=True)
+            ),
+            changed_hydrogens=dict(
+                (atom, data['hydrogens'])
+                for atom, data in molecule.nodes(data=True)
+                if data.get('hydrogens')
+            )
+        )
+
+    def __len__(self):
+        """The number of atoms and bonds the edit touches."""
+
+        return sum(
+            len(getattr(self, name)) for name, _ in _KEYS
+            if name != 'moved_atoms'
+        )
+
+    def origins(self, reactants):
+        """Where the product's atoms come from.
+
+        Returns
+        -------
+        origins : dict[str, tuple[int, str]]
+            Mapping from product atom id to the position of a reactant
+            and an atom id in it.  Atoms kept from the source reactant
+            map to themselves; added atoms only appear if they were
+            moved from a reactant.
+        """
+
+        origins = {}
+        if self.source is not None:
+            removed = set(self.removed_atoms)
+            for atom in reactants[self.source]:
+                if atom not in removed:
+                    origins[atom] = (self.source, atom)
+        origins.update(self.moved_atoms)
+        return origins
+
+    def apply(self, reactants):
+        """Build the product.
+
+        Parameters
+        ----------
+        reactants : sequence[Molecule]
+            The reactants the edit refers to.
+
+        Returns
+        -------
+        product : Molecule
+            A new molecule; the reactants are left unchanged.
+        """
+
+        atoms = {}
+        bonds = {}
+        hydrogens = {}
+        implicit = False
+        if self.source is not None:
+            reactant = reactants[self.source]
+            implicit = reactant.implicit_hydrogens
+            removed_atoms = set(self.removed_atoms)
+            removed_bonds = set(self.removed_bonds)
+            for atom, data in reactant.nodes(data=True):
+                if atom not in removed_atoms:
+                    atoms[atom] = data['symbol']
+                    if data.get('hydrogens'):
+                        hydrogens[atom] = data['hydrogens']
+            for first, second, data in reactant.edges(data=True):
+                id_ = data['id']
+                if (id_ in removed_bonds or first in removed_atoms or
+                        second in removed_atoms):
+                    continue
+                bonds[id_] = {
+                    'nodes': (first, second),
+                    'order': self.changed_bonds.get(
+                        id_, data.get('order', 1)
+                    )
+                }
+        atoms.update(self.added_atoms)
+        for id_, (first, second, order) in six.iteritems(self.added_bonds):
+            bonds[id_] = {'nodes': (first, second), 'order': order}
+        hydrogens.update(self.changed_hydrogens)
+        product = Molecule(atoms, bonds)
+        for atom, count in six.iteritems(hydrogens):
+            if count:
+                product.node[atom]['hydrogens'] = count
+        # Products built from scratch are implicit if they have counts.
+        product._implicit = implicit or any(six.itervalues(hydrogens))
+        return product
+
+    def to_dict(self):
+        """A JSON serializable representation, leaving out empty parts."""
+
+        data = {'r': self.source}
+        for name, key in _KEYS:
+            value = getattr(self, name)
+            if value:
+                if name in ('added_bonds', 'moved_atoms'):
+                    value = dict(
+                        (id_, list(item)) for id_, item in six.iteritems(value)
+                    )
+                data[key] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an edit from `to_dict`."""
+
+        return cls(data['r'], **dict(
+            (name, data[key]) for name, key in _KEYS if key in data
+        ))
+
+
+class ReactionDelta(object):
+    """The products of a reaction, as edits of its reactants.
+
+    A delta can be used like the list of products `react` returns:
+    iterating over it, indexing it or taking its length build the
+    products on first use (see `products`).
+
+    Parameters
+    ----------
+    reactants : sequence[Molecule]
+        The reactants, which the edits refer to.  They must not be
+        changed while the delta is in use.
+    edits : sequence[Optional[MoleculeEdit]]
+        One edit per product, or ``None`` where the mechanism gave
+        ``None`` (a missing salt, for instance).
+    """
+
+    def __init__(self, reactants, edits):
+        self.reactants = list(reactants)
+        self.edits = list(edits)
+        self._products = None
+
+    @classmethod
+    def from_products(cls, reactants, products):
+        """Describe products made by editing the reactants in place.
+
+        Must be called inside the transactions opened on the reactants
+        before the mechanism ran.  Products that are reactants are
+        recorded as the reactant's changes; any other product is
+        recorded whole.
+        """
+
+        reactants = list(reactants)
+        edits = []
+        for product in products:
+            if product is None:
+                edits.append(None)
+                continue
+            for number, reactant in enumerate(reactants):
+                if product is reactant:
+                    edits.append(MoleculeEdit.from_changes(
+                        number, reactant.changes(), reactants
+                    ))
+                    break
+            else:
+                edits.append(MoleculeEdit.from_molecule(product))
+        return cls(reactants, edits)
+
+    @property
+    def products(self):
+        """The product molecules, built the first time they are needed.
+
+        Returns
+        -------
+        products : list[Optional[Molecule]]
+        """
+
+        if self._products is None:
+            self._products = [
+                None if edit is None else edit.apply(self.reactants)
+                for edit in self.edits
+            ]
+        return self._products
+
+    def product(self, index):
+        """Build a single product, without building the others."""
+
+        if self._products is not None:
+            return self._products[index]
+        edit = self.edits[index]
+        return None if edit is None else edit.apply(self.reactants)
+
+    def atom_map(self):
+        """Map the atoms of the products to those of the reactants.
+
+        The map recorded by the mechanism is used where there is one.
+        Products recorded whole, and atoms added without an origin, are
+        mapped with `CAOS.structures.mapping.map_atoms`.
+
+        Returns
+        -------
+        atom_map : AtomMap
+        """
+
+        from .structures.mapping import AtomMap, map_atoms
+
+        recorded = [
+            {} if edit is None else edit.origins(self.reactants)
+            for edit in self.edits
+        ]
+        complete = all(
+            edit is None or (edit.source is not None and not any(
+                atom not in edit.moved_atoms for atom in edit.added_atoms
+            )) for edit in self.edits
+        )
+        if complete:
+            return AtomMap(recorded)
+        return map_atoms(self.reactants, self.products, AtomMap(recorded))
+
+    def __len__(self):
+        return len(self.edits)
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __getitem__(self, index):
+        return self.products[index]
+
+    def to_dict(self):
+        """A JSON serializable representation of the edits.
+
+        The reactants aren't included; they must be given again to
+        `from_dict`.
+        """
+
+        return {
+            'edits': [
+                None if edit is None else edit.to_dict()
+                for edit in self.edits
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data, reactants):
+        """Rebuild a delta from `to_dict` and the same reactants."""
+
+        return cls(reactants, [
+            None if edit is None else MoleculeEdit.from_dict(edit)
+            for edit in data['edits']
+        ])
+
+    def dumps(self):
+        """Serialize the edits to a compact JSON string."""
+
+        return json.dumps(self.to_dict(), separators=(',', ':'),
+                          sort_keys=True)
+
+    @classmethod
+    def loads(cls, text, reactants):
+        """Rebuild a delta from `dumps` and the same reactants."""
+
+        return cls.from_dict(json.loads(text), reactants)
+
+    def __repr__(self):
+        return "ReactionDelta({})".format(self.dumps())
+
+
+def _attempt_delta(mechanism, reactants, conditions, descriptors):
+    """Call a mechanism and record its products as a delta, leaving the
+    reactants as they were."""
+
+    molecules = [
+        reactant for reactant in reactants if hasattr(reactant, 'begin')
+    ]
+    for molecule in molecules:
+        molecule.begin()
+    try:
+        products = validated_call(
+            mechanism, reactants, conditions, descriptors
+        )
+        if not products:
+            return None
+        return ReactionDelta.from_products(reactants, products)
+    finally:
+        for molecule in reversed(molecules):
+            molecule.rollback()
+
+
+def react_delta(reactants, conditions, __test=False):
+    """React molecules, returning the outcome as a `ReactionDelta`.
+
+    Mechanisms are tried as by `react`, but the reactants are left
+    unchanged: the delta refers to them instead.
+
+    Parameters
+    ----------
+    reactants : collection[Molecule]
+        The molecules to react.
+    conditions : mapping[str -> object]
+        The conditions of the reaction.
+    __test : bool
+        Whether or not to use the testing namespace.
+
+    Returns
+    -------
+    delta : ReactionDelta
+        The products of the first mechanism that gave any.
+
+    Raises
+    ------
+    FailedReactionError
+        If no mechanism gave products.
+    """
+
+    reactants = list(reactants)
+    namespace = ReactionDispatcher._dispatch_namespace(__test)
+    descriptors = Descriptors(reactants, conditions)
+
+    for mechanism in ReactionDispatcher._generate_likely_reactions(
+            reactants, conditions, namespace, descriptors):
+        logger.log(ReactionDispatcher._REACTION_ATTEMPT_MESSAGE.format(
+            reactants, conditions, mechanism
+        ))
+        delta = _attempt_delta(mechanism, reactants, conditions, descriptors)
+        if delta:
+            return delta
+
+    message = ReactionDispatcher._REACTION_FAILURE_MESSAGE.format(
+        reactants, conditions
+    )
+    logger.log(message)
+    raise FailedReactionError(message)
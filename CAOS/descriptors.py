@@ -0,0 +1,241 @@
+"""Named values derived from the reactants, shared during a dispatch.
+
+Requirements and mechanisms often need the same information about the
+reactants (their pKa sites, their atom classes, ...).  Rather than each
+computing it, the computation is registered once as a descriptor with
+`register_descriptor`, naming the descriptors it is computed from.
+
+A requirement or mechanism that wants descriptors is marked with
+`uses_descriptors`, and is then called with a third argument: a
+`Descriptors` mapping for the current dispatch.  A descriptor is
+computed the first time it is asked for, after the descriptors it
+depends on (so always in topological order), and kept for the rest of
+the dispatch, so every requirement and mechanism shares the same value.
+
+Descriptor functions take ``(reactants, conditions, descriptors)`` and
+return the value.
+
+Attributes
+----------
+register_descriptor: function
+    Registers a descriptor.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import six
+
+from .exceptions.dispatch_errors import ExistingDescriptorError, \
+    InvalidDescriptorError
+from . import logger
+
+_registry = {}
+
+
+def register_descriptor(name, requires=()):
+    """Register a function computing a descriptor.
+
+    Parameters
+    ----------
+    name : str
+        The name of the descriptor.
+    requires : Optional[collection[str]]
+        The descriptors it is computed from.  They don't need to be
+        registered yet.
+
+    Returns
+    -------
+    decorator : callable
+        Decorator registering the function, and returning it unchanged.
+
+    Raises
+    ------
+    ExistingDescriptorError
+        If a descriptor with this name is already registered.
+    """
+
+    def decorator(function):
+        if name in _registry:
+            message = "A descriptor named {} already exists.".format(name)
+            logger.error(message)
+            raise ExistingDescriptorError(message)
+        _registry[name] = {
+            'function': function,
+            'requires': tuple(requires)
+        }
+        return function
+    return decorator
+
+
+def uses_descriptors(*names):
+    """Mark a requirement or mechanism as using descriptors.
+
+    The function will be called with a `Descriptors` instance as its
+    third argument by the dispatcher.
+
+    Parameters
+    ----------
+    *names : str
+        The names of the descriptors it uses.
+
+    Returns
+    -------
+    decorator : callable
+    """
+
+    def decorator(function):
+        function.descriptors = names
+        return function
+    return decorator
+
+
+def descriptor_order(names):
+    """Sort descriptors and everything they depend on topologically.
+
+    Parameters
+    ----------
+    names : collection[str]
+        The descriptors wanted.
+
+    Returns
+    -------
+    order : list[str]
+        Every descriptor needed, each after all the ones it requires.
+
+    Raises
+    ------
+    InvalidDescriptorError
+        If a descriptor isn't registered, or depends on itself.
+    """
+
+    order = []
+    visiting = set()
+    done = set()
+
+    def visit(name, path):
+        if name in done:
+            return
+        if name not in _registry:
+            raise InvalidDescriptorError(
+                "Unknown descriptor {} (needed by {}).".format(
+                    name, " -> ".join(path) or "the caller"
+                )
+            )
+        if name in visiting:
+            raise InvalidDescriptorError(
+                "Descriptor {} depends on itself: {}.".format(
+                    name, " -> ".join(path + [name])
+                )
+            )
+        visiting.add(name)
+        for requirement in _registry[name]['requires']:
+            visit(requirement, path + [name])
+        visiting.remove(name)
+        done.add(name)
+        order.append(name)
+
+    for name in names:
+        visit(name, [])
+    return order
+
+
+class Descriptors(object):
+    """The descriptors of one set of reactants in one set of conditions.
+
+    Parameters
+    ----------
+    reactants : collection[Molecule]
+        The reactants of the dispatch.
+    conditions : mapping[str -> object]
+        The conditions of the dispatch.
+    """
+
+    def __init__(self, reactants, conditions):
+        self.reactants = reactants
+        self.conditions = conditions
+        self._values = {}
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            self.compute([name])
+        return self._values[name]
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def compute(self, names):
+        """Compute descriptors (and what they require) not yet known.
+
+        Parameters
+        ----------
+        names : collection[str]
+            The descriptors wanted.
+        """
+
+        for name in descriptor_order(names):
+            if name not in self._values:
+                function = _registry[name]['function']
+                self._values[name] = function(
+                    self.reactants, self.conditions, self
+                )
+
+    def known(self):
+        """The descriptors computed so far, by name."""
+
+        return dict(six.iteritems(self._values))
+
+
+def call(function, reactants, conditions, descriptors):
+    """Call a requirement or mechanism, with descriptors if it uses them.
+
+    Parameters
+    ----------
+    function : callable
+        The requirement or mechanism.
+    reactants : collection[Molecule]
+    conditions : mapping[str -> object]
+    descriptors : Descriptors
+
+    Returns
+    -------
+    result : object
+        Whatever `function` returns.
+    """
+
+    if getattr(function, 'descriptors', None):
+        return function(reactants, conditions, descriptors)
+    return function(reactants, conditions)
+
+
+# Built in descriptors.  The structure modules are only imported once a
+# descriptor is needed, since they load NumPy.
+
+@register_descriptor('atom_classes')
+def _atom_classes(reactants, conditions, descriptors):
+    from .structures.canonical import atom_classes_many
+    return atom_classes_many(reactants)
+
+
+@register_descriptor('canonical_hashes', requires=('atom_classes',))
+def _canonical_hashes(reactants, conditions, descriptors):
+    from .structures.canonical import canonical_hashes
+    return canonical_hashes(reactants, descriptors['atom_classes'])
+
+
+@register_descriptor('pka_estimates')
+def _pka_estimates(reactants, conditions, descriptors):
+    from .structures.store import pka_estimates
+    return pka_estimates(reactants, conditions)
+
+
+@register_descriptor('ring_info')
+def _ring_info(reactants, conditions, descriptors):
+    from .structures.rings import ring_info_many
+    return ring_info_many(reactants)
+
+
+@register_descriptor('functional_groups')
+def _functional_groups(reactants, conditions, descriptors):
+    from .structures.substructure import functional_groups
+    return [functional_groups(reactant) for reactant in reactants]
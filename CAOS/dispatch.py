@@ -11,6 +11,20 @@ react: function
     Function that attempts to react molecules under given conditions
 register_reaction_mechanism: function
     Registers a reaction mechanism with the dispatch system.
+register_lazy_reaction_mechanism: function
+    Registers a reaction mechanism that is only imported once it is
+    first considered for a reaction.
+register_batch_requirement: function
+    Registers a vectorized implementation of a requirement, used by
+    `react_many`.
+register_species_requirement: function
+    Registers a per-species implementation of a requirement, used to
+    prune the reactions of a mixture (see `CAOS.enumeration`).
+register_retro_mechanism: function
+    Registers a reverse implementation of a mechanism, used for
+    retrosynthesis (see `CAOS.retrosynthesis`).
+react_many: function
+    Function that reacts many sets of reactants at once.
 reaction_is_registered: function
     Checks whether or not a reaction has been registered.
 """
@@ -18,11 +32,16 @@ reaction_is_registered: function
 from __future__ import print_function, division, unicode_literals, \
     absolute_import
 
+from copy import deepcopy
+from importlib import import_module
+
 import six
 
+from .descriptors import Descriptors, call
 from .exceptions.dispatch_errors import ExistingReactionError, \
     InvalidReactionError
 from .exceptions.reaction_errors import FailedReactionError
+from .validation import validated_call
 from . import logger
 
 
@@ -38,12 +57,14 @@ class ReactionDispatcher(object):
                                     " by reactants {} in conditions {}")
     _REQUIREMENT_PASSED_MESSAGE = "Passed requirement {} for mechanism {}"
     _ADDED_POSSIBLE_MECHANISM = "Added potential mechanism {}"
+    _LOADED_MECHANISM_MESSAGE = "Loaded lazily registered mechanism {}."
     _EXISTING_MECHANISM_ERROR = "A mechanism named {} already exists."
 
     _mechanism_namespace = {}
     _test_namespace = {}
+    _discovery_hooks = []
 
-    def __init__(self, requirements, __test=False):
+    def __init__(self, requirements, __test=False, arity=None):
         """Register a new reaction mechanism.
 
         Parameters
@@ -54,10 +75,15 @@ class ReactionDispatcher(object):
         __test: bool
             Whether or not the reaction being registered is a test
             reaction and shouldn't be in the real namespace.
+        arity: int or collection[int], optional
+            The numbers of reactants the mechanism reacts, used when
+            enumerating the reactions of a mixture.  Any number if not
+            given.
         """
 
         self.requirements = requirements
         self.__test = __test
+        self.arity = arity
 
     def __call__(self, mechanism_function):
         """Register the function.
@@ -86,13 +112,13 @@ class ReactionDispatcher(object):
         mechanism_function.logger = logger
         ReactionDispatcher._register(
             mechanism_function, self.requirements,
-            self._ReactionDispatcher__test
+            self._ReactionDispatcher__test, self.arity
         )
 
         return mechanism_function
 
     @classmethod
-    def _register(cls, function, requirements, __test):
+    def _register(cls, function, requirements, __test, arity=None):
         """Register a function with the dispatch system.
 
         Parameters
@@ -103,6 +129,8 @@ class ReactionDispatcher(object):
             List of requirement functions.
         __test : bool
             Whether or not to use the testing namespace.
+        arity : Optional[int or collection[int]]
+            The numbers of reactants the mechanism reacts.
         """
 
         namespace = cls._get_namespace(__test)
@@ -113,7 +141,53 @@ class ReactionDispatcher(object):
 
         namespace[name] = {
             "requirements": requirements,
-            "function": function
+            "function": function,
+            "arity": cls._normalize_arity(arity)
+        }
+
+        if not __test:
+            logger.log(
+                cls._REGISTERED_MECHANISM_MESSAGE.format(
+                    name, requirements
+                )
+            )
+
+    @classmethod
+    def _register_lazy(cls, name, requirements, module, attribute=None,
+                       __test=False, arity=None):
+        """Register a mechanism without importing it.
+
+        The module implementing the mechanism is only imported the
+        first time all of the mechanism's requirements pass.
+
+        Parameters
+        ----------
+        name : str
+            The name of the mechanism.  This must be the name of the
+            function that implements it.
+        requirements : collection
+            List of requirement functions.
+        module : str
+            The absolute name of the module implementing the mechanism.
+        attribute : Optional[str]
+            The name of the mechanism function in `module`.  Defaults to
+            `name`.
+        __test : bool
+            Whether or not to use the testing namespace.
+        arity : Optional[int or collection[int]]
+            The numbers of reactants the mechanism reacts.
+        """
+
+        namespace = cls._get_namespace(__test)
+        cls._validate_name(name, namespace)
+        cls._validate_requirements(requirements)
+
+        namespace[name] = {
+            "requirements": requirements,
+            "function": None,
+            "module": module,
+            "attribute": attribute or name,
+            "arity": cls._normalize_arity(arity)
         }
 
         if not __test:
@@ -123,6 +197,43 @@ class ReactionDispatcher(object):
                 )
             )
 
+    @classmethod
+    def _load_mechanism(cls, name, mechanism_info):
+        """Get the function of a mechanism, importing it if necessary.
+
+        Parameters
+        ----------
+        name : str
+            The name of the mechanism.
+        mechanism_info : dict
+            The mechanism's entry in its namespace.
+
+        Returns
+        -------
+        function : callable
+            The mechanism function.
+        """
+
+        function = mechanism_info['function']
+        if function is None:
+            module = import_module(mechanism_info['module'])
+            function = getattr(module, mechanism_info['attribute'])
+            function.logger = logger
+            mechanism_info['function'] = function
+            logger.log(cls._LOADED_MECHANISM_MESSAGE.format(name))
+        return function
+
+    @staticmethod
+    def _normalize_arity(arity):
+        """Turn an arity given at registration into a frozenset, or
+        ``None`` for any number of reactants."""
+
+        if arity is None:
+            return None
+        if isinstance(arity, six.integer_types):
+            return frozenset([arity])
+        return frozenset(arity)
+
     @classmethod
     def _get_namespace(cls, __test):
         """Get the namespace depending on if it is a test or not.
@@ -140,6 +251,44 @@ class ReactionDispatcher(object):
 
         return cls._test_namespace if __test else cls._mechanism_namespace
 
+    @classmethod
+    def _add_discovery_hook(cls, hook):
+        """Defer registering some mechanisms until the first dispatch.
+
+        Parameters
+        ----------
+        hook : callable
+            Called without arguments before mechanisms are first looked
+            up in the real namespace, and again before later lookups
+            until it returns without raising.  Used to discover plugins
+            (see `CAOS.mechanisms.plugins`) without slowing down
+            ``import CAOS``.
+        """
+
+        cls._discovery_hooks.append(hook)
+
+    @classmethod
+    def _dispatch_namespace(cls, __test):
+        """Get the namespace to dispatch on, running the pending
+        discovery hooks first.
+
+        Parameters
+        ----------
+        __test : bool
+            Whether or not to use the testing namespace.
+
+        Returns
+        -------
+        dict
+            The namespace to be used.
+        """
+
+        if not __test:
+            while cls._discovery_hooks:
+                cls._discovery_hooks[0]()
+                cls._discovery_hooks.pop(0)
+        return cls._get_namespace(__test)
+
     @classmethod
     def _validate_function(cls, function, namespace):
         """Check that a function is valid.
@@ -159,7 +308,24 @@ class ReactionDispatcher(object):
             mechanism shares this name it will cause an error.
         """
 
-        mechanism_name = function.__name__
+        cls._validate_name(function.__name__, namespace)
+
+    @classmethod
+    def _validate_name(cls, mechanism_name, namespace):
+        """Check that a mechanism name is not already in use.
+
+        Parameters
+        ----------
+        mechanism_name : str
+            The name of the mechanism being registered.
+        namespace : dict
+            The namespace being used.
+
+        Raises
+        ------
+        ExistingReactionError
+            If an existing mechanism already has this name.
+        """
 
         if mechanism_name in namespace:
             message = cls._EXISTING_MECHANISM_ERROR.format(
@@ -206,7 +372,8 @@ class ReactionDispatcher(object):
                 raise InvalidReactionError(message)
 
     @classmethod
-    def _generate_likely_reactions(cls, reactants, conditions, namespace):
+    def _generate_likely_reactions(cls, reactants, conditions, namespace,
+                                   descriptors=None):
         """Generate a list of potential reactions.
 
         Parameters
@@ -215,6 +382,9 @@ class ReactionDispatcher(object):
             A list of molecules to be reacted
         conditions: mapping[String -> Object]
             Dictionary of the conditions in this molecule.
+        descriptors: Descriptors, optional
+            The descriptors of this dispatch, passed to the requirements
+            that use them.
 
         Returns
         =======
@@ -228,14 +398,16 @@ class ReactionDispatcher(object):
         """
 
         mechanisms = []
+        if descriptors is None:
+            descriptors = Descriptors(reactants, conditions)
 
         for mech_name, mech_info in six.iteritems(namespace):
-            mechanism = mech_info['function']
             requirements = mech_info['requirements']
 
             for req_function in requirements:
                 req_name = req_function.__name__
-                if not req_function(reactants, conditions):
+                if not call(req_function, reactants, conditions,
+                            descriptors):
                     logger.log(cls._REQUIREMENT_NOT_MET_MESSAGE.format(
                         req_name, mech_name, reactants, conditions
                     ))
@@ -246,7 +418,7 @@ class ReactionDispatcher(object):
                     ))
             else:
                 logger.log(cls._ADDED_POSSIBLE_MECHANISM.format(mech_name))
-                mechanisms.append(mechanism)
+                mechanisms.append(cls._load_mechanism(mech_name, mech_info))
 
         return mechanisms
 
@@ -265,16 +437,27 @@ class ReactionDispatcher(object):
         =======
         products: list[Molecule]
             Returns a list of the products.
+
+        Notes
+        =====
+        Descriptors (see `CAOS.descriptors`) are computed at most once
+        per call, and shared by every requirement and mechanism.
+
+        The reactants are left unchanged, even by mechanisms that edit
+        them in place (see `_attempt`).
         """
 
-        namespace = cls._get_namespace(__test)
+        namespace = cls._dispatch_namespace(__test)
+        descriptors = Descriptors(reactants, conditions)
 
         potential_reactions = cls._generate_likely_reactions(
-            reactants, conditions, namespace
+            reactants, conditions, namespace, descriptors
         )
 
         for potential_reaction in potential_reactions:
-            products = potential_reaction(reactants, conditions)
+            products = cls._attempt(
+                potential_reaction, reactants, conditions, descriptors
+            )
             logger.log(
                 cls._REACTION_ATTEMPT_MESSAGE.format(
                     reactants, conditions, potential_reaction
@@ -287,6 +470,211 @@ class ReactionDispatcher(object):
         logger.log(message)
         raise FailedReactionError(message)
 
+    @classmethod
+    def _attempt(cls, mechanism, reactants, conditions, descriptors):
+        """Call a mechanism inside a transaction on each reactant.
+
+        Mechanisms may change the reactants in place: the changes are
+        always rolled back once the mechanism returns or raises, so the
+        next mechanism, and the caller, see the reactants as they were.
+        Products that are reactants changed in place are copied before
+        the rollback, so mechanisms don't need to copy the reactants
+        themselves.  With the ``'validate'`` condition, the products are
+        checked while the changes are still in place (see
+        `CAOS.validation`).
+
+        This is a tradeoff: keeping the changes instead would hand the
+        caller's own reactants back as products, so a successful
+        reaction still pays for a full copy of each reactant it returns
+        (and the rollback).  What it saves over copying the reactants
+        before dispatch is the copies for the mechanisms that fail and
+        for the reactants that aren't returned.
+
+        Parameters
+        ----------
+        mechanism : callable
+        reactants : collection[Molecule]
+        conditions : mapping[str -> object]
+        descriptors : Descriptors
+
+        Returns
+        -------
+        products : object
+            Whatever the mechanism returns, with its reactants replaced
+            by copies.
+
+        Raises
+        ------
+        InvalidProductError
+            If the products fail a check.
+        """
+
+        molecules = [
+            reactant for reactant in reactants or ()
+            if hasattr(reactant, 'begin')
+        ]
+        for molecule in molecules:
+            molecule.begin()
+        try:
+            products = validated_call(
+                mechanism, reactants, conditions, descriptors
+            )
+            if products and isinstance(products, (list, tuple)):
+                products = [
+                    deepcopy(product)
+                    if any(product is molecule for molecule in molecules)
+                    else product for product in products
+                ]
+        finally:
+            for molecule in reversed(molecules):
+                molecule.rollback()
+        return products
+
+    @classmethod
+    def _evaluate_requirement(cls, requirement, rows, reactant_sets,
+                              conditions, descriptors):
+        """Evaluate a requirement for some rows of a batch.
+
+        Parameters
+        ----------
+        requirement : callable
+            The requirement, possibly with a ``batch`` implementation.
+        rows : list[int]
+            The rows of the batch to evaluate it for.
+        reactant_sets : list[list[Molecule]]
+            The reactants of every row.
+        conditions : list[dict]
+            The conditions of every row.
+        descriptors : list[Descriptors]
+            The descriptors of every row.
+
+        Returns
+        -------
+        passed : list[bool]
+            Whether the requirement passed, for each of `rows`.
+        """
+
+        batch = getattr(requirement, 'batch', None)
+        if batch is not None:
+            mask = batch(
+                [reactant_sets[row] for row in rows],
+                [conditions[row] for row in rows]
+            )
+            return [bool(passed) for passed in mask]
+        return [
+            bool(call(requirement, reactant_sets[row], conditions[row],
+                      descriptors[row]))
+            for row in rows
+        ]
+
+    @classmethod
+    def _passing_rows(cls, requirements, rows, known, reactant_sets,
+                      conditions, descriptors):
+        """Find the rows of a batch that pass every requirement.
+
+        Each requirement is only evaluated for the rows that passed the
+        previous ones, and not for rows it was already evaluated for.
+
+        Parameters
+        ----------
+        requirements : collection[callable]
+            The requirements of a mechanism.
+        rows : list[int]
+            The rows to check.
+        known : dict
+            Results of requirements already evaluated, mapping each
+            requirement to a dict from row to whether it passed.
+            Updated with the new results.
+        reactant_sets, conditions, descriptors : list
+            As for `_evaluate_requirement`.
+
+        Returns
+        -------
+        rows : list[int]
+            The rows that passed.
+        """
+
+        for requirement in requirements:
+            results = known.setdefault(requirement, {})
+            pending = [row for row in rows if row not in results]
+            if pending:
+                results.update(zip(pending, cls._evaluate_requirement(
+                    requirement, pending, reactant_sets, conditions,
+                    descriptors
+                )))
+            rows = [row for row in rows if results[row]]
+            if not rows:
+                break
+        return rows
+
+    @classmethod
+    def _react_many(cls, reactant_sets, conditions, __test=False):
+        """React many sets of reactants.
+
+        Each requirement is evaluated once for all the rows that still
+        need it, with its batch implementation if it has one (see
+        `register_batch_requirement`), and mechanisms are only called
+        for the rows where all of their requirements passed.  As with
+        `react`, the reactants are left unchanged.
+
+        Parameters
+        ==========
+        reactant_sets: collection[collection[Molecule]]
+            The reactants of each reaction.
+        conditions: mapping[String -> Object] or list[mapping]
+            The conditions of every reaction, or a list with the
+            conditions of each.
+
+        Returns
+        =======
+        products: list[list[Molecule]]
+            The products of each reaction, as `react` would give them,
+            or ``None`` for those where no mechanism could react.
+        """
+
+        namespace = cls._dispatch_namespace(__test)
+        reactant_sets = [list(reactants) for reactants in reactant_sets]
+        count = len(reactant_sets)
+        if isinstance(conditions, (list, tuple)):
+            conditions = list(conditions)
+        else:
+            conditions = [conditions] * count
+        descriptors = [
+            Descriptors(reactants, row_conditions)
+            for reactants, row_conditions in zip(reactant_sets, conditions)
+        ]
+
+        # Requirements shared by several mechanisms are only evaluated
+        # once per row.
+        known = {}
+        candidates = [[] for _ in range(count)]
+        for mech_name, mech_info in six.iteritems(namespace):
+            rows = cls._passing_rows(
+                mech_info['requirements'], list(range(count)), known,
+                reactant_sets, conditions, descriptors
+            )
+            if rows:
+                logger.log(cls._ADDED_POSSIBLE_MECHANISM.format(mech_name))
+                mechanism = cls._load_mechanism(mech_name, mech_info)
+                for row in rows:
+                    candidates[row].append(mechanism)
+
+        products = [None] * count
+        for row, mechanisms in enumerate(candidates):
+            for mechanism in mechanisms:
+                result = cls._attempt(
+                    mechanism, reactant_sets[row], conditions[row],
+                    descriptors[row]
+                )
+                if result:
+                    products[row] = result
+                    break
+            else:
+                logger.log(cls._REACTION_FAILURE_MESSAGE.format(
+                    reactant_sets[row], conditions[row]
+                ))
+        return products
+
     @classmethod
     def _is_registered_reaction(cls, reaction, __test=False):
         """Check if a reaction has been registered.
@@ -302,19 +690,126 @@ class ReactionDispatcher(object):
             Whether or not the reaction has been registered.
         """
 
-        namespace = cls._get_namespace(__test)
+        namespace = cls._dispatch_namespace(__test)
 
         if callable(reaction):
             for name, info in six.iteritems(namespace):
                 if reaction is info['function']:
                     return True
+                elif (info['function'] is None and
+                        getattr(reaction, '__module__', None) ==
+                        info['module'] and
+                        getattr(reaction, '__name__', None) ==
+                        info['attribute']):
+                    return True
             else:
                 return False
         else:
             return reaction in namespace
 
 
+def register_batch_requirement(requirement):
+    """Register a batch implementation of a requirement.
+
+    The batch implementation is called by `react_many` with a list of
+    reactant sets and a list of conditions (one per set), and returns a
+    boolean for each set: a list, or a NumPy mask.  It must have the
+    same effects as calling the requirement on each set (setting the
+    same attributes on the reactants, say).
+
+    Parameters
+    ----------
+    requirement : callable
+        The requirement being vectorized.
+
+    Returns
+    -------
+    decorator : callable
+        Decorator that registers the batch function, and returns it
+        unchanged.
+    """
+
+    def decorator(batch_function):
+        requirement.batch = batch_function
+        return batch_function
+    return decorator
+
+
+def register_species_requirement(requirement, mode='all', exact=False):
+    """Register a per-species implementation of a requirement.
+
+    The species implementation is called with every molecule of a
+    mixture and the conditions, and returns a boolean for each: a
+    list, or a NumPy mask.  Combinations of the mixture are then only
+    considered if they pass it (see `CAOS.enumeration`).
+
+    Parameters
+    ----------
+    requirement : callable
+        The requirement being indexed.
+    mode : Optional[str]
+        ``'all'`` if the requirement can only pass when every reactant
+        passes the species test, ``'any'`` if it can only pass when at
+        least one of them does.
+    exact : Optional[bool]
+        Whether the requirement passes for exactly those combinations,
+        with the same effects (setting the same attributes on the
+        reactants, say), so it doesn't need to be called again for
+        each combination.
+
+    Returns
+    -------
+    decorator : callable
+        Decorator that registers the species function, and returns it
+        unchanged.
+
+    Raises
+    ------
+    ValueError
+        If `mode` is neither ``'all'`` nor ``'any'``.
+    """
+
+    if mode not in ('all', 'any'):
+        raise ValueError("Unknown species requirement mode {}.".format(mode))
+
+    def decorator(species_function):
+        requirement.species = species_function
+        requirement.species_mode = mode
+        requirement.species_exact = exact
+        return species_function
+    return decorator
+
+
+def register_retro_mechanism(mechanism):
+    """Register a reverse implementation of a mechanism.
+
+    The reverse implementation is called with a target molecule, the
+    conditions and a list of stock molecules, and generates lists of
+    precursors the mechanism might turn into the target.  It may propose
+    precursors that don't work: `CAOS.retrosynthesis` runs the mechanism
+    forward on each proposal and keeps those that give the target.
+
+    Parameters
+    ----------
+    mechanism : callable
+        The mechanism being reversed.
+
+    Returns
+    -------
+    decorator : callable
+        Decorator that registers the reverse function, and returns it
+        unchanged.
+    """
+
+    def decorator(retro_function):
+        mechanism.retro = retro_function
+        return retro_function
+    return decorator
+
+
 # Provide friendlier way to call things
 react = ReactionDispatcher._react
+react_many = ReactionDispatcher._react_many
 register_reaction_mechanism = ReactionDispatcher
+register_lazy_reaction_mechanism = ReactionDispatcher._register_lazy
 reaction_is_registered = ReactionDispatcher._is_registered_reaction
@@ -0,0 +1,395 @@
+"""Enumeration of the reactions possible in a mixture.
+
+`react` is given the reactants of one reaction.  For a flask of N
+species, trying every pair (or triple) with `react` means N^2 (or N^3)
+dispatches, most of which fail a requirement.  `feasible_reactions`
+finds the combinations worth trying without building most of them:
+
+1. Only the numbers of reactants mechanisms declared when they were
+   registered (their arity) are enumerated.
+2. Requirements with a per-species implementation (see
+   `register_species_requirement`) are evaluated once per species of
+   the mixture.  An ``'all'`` requirement restricts the species the
+   combinations are drawn from; an ``'any'`` requirement is an index
+   of the species at least one reactant must come from, and
+   combinations without one of them are never generated.
+3. Requirements that aren't exact at the species level are evaluated
+   for the remaining combinations, a chunk at a time, with their batch
+   implementation if they have one (as in `react_many`).
+
+Combinations are streamed in lexicographic order of the positions of
+their reactants in the mixture, so large mixtures can be processed
+without holding all of their combinations.  `react_mixture` then reacts
+each of them, recording the outcome as a `CAOS.delta.ReactionDelta`
+so the structures of the species are left unchanged (requirements do
+annotate them, with their pKa for instance).
+
+Attributes
+----------
+feasible_reactions: function
+    Generates the combinations of a mixture that may react.
+react_mixture: function
+    Reacts every feasible combination of a mixture.
+reactants_of: function
+    Gives the reactants of a combination.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+import heapq
+from itertools import groupby
+
+import six
+
+from .delta import _attempt_delta
+from .descriptors import Descriptors
+from .dispatch import ReactionDispatcher
+from . import logger
+
+_DEFAULT_CHUNK = 1024
+_PRUNED_MESSAGE = ("Species requirement {} of mechanism {} leaves {} of {}"
+                   " species.")
+
+
+def _combinations(pool, size, required=None, repeats=False):
+    """Generate the combinations of `size` positions from `pool` that
+    contain at least one position of `required`, in lexicographic order.
+
+    Prefixes that can no longer include a required position are pruned,
+    so the cost is proportional to the number of combinations generated.
+    With `repeats`, a position can be used more than once.
+    """
+
+    pool = sorted(pool)
+    if size <= 0 or (size > len(pool) and not repeats):
+        return iter(())
+    if required is None:
+        last_required = len(pool)
+    else:
+        indices = [index for index, position in enumerate(pool)
+                   if position in required]
+        if not indices:
+            return iter(())
+        last_required = indices[-1]
+    return _Combinations(pool, size, required, last_required, repeats).extend(
+        0, required is None
+    )
+
+
+class _Combinations(object):
+    """The recursion of `_combinations`, extending a shared prefix."""
+
+    def __init__(self, pool, size, required, last_required, repeats):
+        self.pool = pool
+        self.size = size
+        self.required = required
+        self.last_required = last_required
+        self.repeats = repeats
+        self.prefix = []
+
+    def _is_required(self, index):
+        return self.required is None or self.pool[index] in self.required
+
+    def extend(self, start, found):
+        """Yield the combinations extending the prefix with positions
+        from `start` on; `found` tells whether the prefix already has a
+        required position."""
+
+        slots = self.size - len(self.prefix)
+        if not slots:
+            yield tuple(self.prefix)
+            return
+        stop = len(self.pool)
+        if not self.repeats:
+            stop -= slots - 1
+        if not found:
+            # Past the last required position, none can be added.
+            stop = min(stop, self.last_required + 1)
+        for index in range(start, stop):
+            is_required = self._is_required(index)
+            if not found and slots == 1 and not is_required:
+                continue
+            self.prefix.append(self.pool[index])
+            following = index if self.repeats else index + 1
+            for combination in self.extend(following, found or is_required):
+                yield combination
+            self.prefix.pop()
+
+
+class _Plan(object):
+    """How the combinations of a mixture are found for one mechanism."""
+
+    def __init__(self, name, info, pool, required, remaining):
+        self.name = name
+        self.info = info
+        self.pool = pool
+        self.required = required
+        self.remaining = remaining
+
+    def combinations(self, size, repeats=False):
+        # The smallest index generates the combinations, and the others
+        # filter them.
+        required = sorted(self.required, key=len)
+        generate = required[0] if required else None
+        for combination in _combinations(self.pool, size, generate,
+                                         repeats):
+            if all(any(position in index for position in combination)
+                   for index in required[1:]):
+                yield combination
+
+
+def _plan(name, info, mixture, conditions, masks):
+    """Evaluate the species requirements of a mechanism, reusing the
+    masks already computed for the mixture."""
+
+    pool = set(range(len(mixture)))
+    required = []
+    remaining = []
+    for requirement in info['requirements']:
+        species = getattr(requirement, 'species', None)
+        if species is None:
+            remaining.append(requirement)
+            continue
+        if requirement not in masks:
+            masks[requirement] = [
+                bool(passed) for passed in species(mixture, conditions)
+            ]
+        passing = set(
+            position for position, passed in enumerate(masks[requirement])
+            if passed
+        )
+        if requirement.species_mode == 'all':
+            pool &= passing
+        else:
+            required.append(passing)
+        logger.log(_PRUNED_MESSAGE.format(
+            requirement.__name__, name, len(passing), len(mixture)
+        ))
+        if not requirement.species_exact:
+            remaining.append(requirement)
+    return _Plan(name, info, pool, required, remaining)
+
+
+def _arities(namespace, arity):
+    if arity is not None:
+        return sorted(ReactionDispatcher._normalize_arity(arity))
+    arities = set()
+    for info in six.itervalues(namespace):
+        arities.update(info.get('arity') or ())
+    return sorted(arities)
+
+
+def _accepts(info, size, arity):
+    # Mechanisms without a declared arity are only considered for the
+    # sizes asked for explicitly.
+    accepted = info.get('arity')
+    if accepted is None:
+        return arity is not None
+    return size in accepted
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _check_chunk(chunk, mixture, conditions):
+    """Evaluate the remaining requirements for a chunk of combinations.
+
+    Parameters
+    ----------
+    chunk : list[tuple[tuple[int], list[_Plan]]]
+        Combinations with the plans of the mechanisms they may react by.
+
+    Returns
+    -------
+    feasible : list[tuple[tuple[int], list[_Plan]]]
+        The combinations for which some mechanism passed, with those
+        mechanisms.
+    """
+
+    reactant_sets = [
+        [mixture[position] for position in combination]
+        for combination, _ in chunk
+    ]
+    row_conditions = [conditions] * len(chunk)
+    descriptors = [
+        Descriptors(reactants, conditions) for reactants in reactant_sets
+    ]
+
+    # Requirements shared by several mechanisms are only evaluated once
+    # per row.
+    known = {}
+    passed = [[] for _ in chunk]
+    plans = []
+    for _, row_plans in chunk:
+        for plan in row_plans:
+            if plan not in plans:
+                plans.append(plan)
+    for plan in plans:
+        rows = [row for row, (_, row_plans) in enumerate(chunk)
+                if plan in row_plans]
+        rows = ReactionDispatcher._passing_rows(
+            plan.remaining, rows, known, reactant_sets, row_conditions,
+            descriptors
+        )
+        for row in rows:
+            passed[row].append(plan)
+
+    return [
+        (combination, [plan for plan in row_plans if plan in passed[row]])
+        for row, (combination, row_plans) in enumerate(chunk)
+        if passed[row]
+    ]
+
+
+def feasible_reactions(mixture, conditions, arity=None,
+                       chunk_size=_DEFAULT_CHUNK, required=None,
+                       repeats=False, __test=False):
+    """Generate the combinations of a mixture that may react.
+
+    Requirements are evaluated on the species themselves, as `react`
+    evaluates them on its reactants, so they may annotate the species:
+    the ``pka`` requirement sets ``pka``, ``pka_point`` and
+    ``acceptor_point`` on every species of the mixture.  Exact species
+    requirements (see `register_species_requirement`) are not evaluated
+    again per combination, and mechanisms rely on those annotations.
+
+    Parameters
+    ----------
+    mixture : collection[Molecule]
+        The species in the mixture.
+    conditions : mapping[str -> object]
+        The conditions of the reactions.
+    arity : Optional[int or collection[int]]
+        The numbers of reactants to combine.  Defaults to the arities
+        the registered mechanisms declared; mechanisms that declared
+        none are only considered when this is given.
+    chunk_size : Optional[int]
+        The number of combinations whose remaining requirements are
+        evaluated together.
+    required : Optional[collection[int]]
+        Positions in `mixture` at least one reactant of every
+        combination must come from, such as the species new to a
+        mixture whose other combinations were already tried.
+    repeats : Optional[bool]
+        Whether or not a species can be combined with itself.  The
+        reactants of such combinations are the same molecule, so see
+        `reactants_of` before reacting them.
+    __test : bool
+        Whether or not to use the testing namespace.
+
+    Yields
+    ------
+    reaction : tuple[tuple[int], list[callable]]
+        The positions in `mixture` of the reactants of a combination,
+        ordered by number of reactants then lexicographically, and the
+        mechanisms whose requirements all passed for it, in the order
+        `react` would try them.
+    """
+
+    mixture = list(mixture)
+    namespace = ReactionDispatcher._dispatch_namespace(__test)
+    masks = {}
+    if required is not None:
+        required = set(required)
+
+    for size in _arities(namespace, arity):
+        plans = [
+            _plan(name, info, mixture, conditions, masks)
+            for name, info in six.iteritems(namespace)
+            if _accepts(info, size, arity)
+        ]
+        if required is not None:
+            for plan in plans:
+                plan.required.append(required)
+        streams = [
+            ((combination, number)
+             for combination in plan.combinations(size, repeats))
+            for number, plan in enumerate(plans)
+        ]
+        merged = groupby(heapq.merge(*streams), key=lambda item: item[0])
+        candidates = (
+            (combination, [plans[number] for _, number in group])
+            for combination, group in merged
+        )
+        for chunk in _chunks(candidates, chunk_size):
+            for combination, passed in _check_chunk(
+                    chunk, mixture, conditions):
+                yield combination, [
+                    ReactionDispatcher._load_mechanism(plan.name, plan.info)
+                    for plan in passed
+                ]
+
+
+def reactants_of(mixture, combination):
+    """The reactants of a combination, copying the species it uses more
+    than once so that mechanisms can edit each of them separately."""
+
+    reactants = []
+    for number, position in enumerate(combination):
+        molecule = mixture[position]
+        if position in combination[:number]:
+            molecule = deepcopy(molecule)
+        reactants.append(molecule)
+    return reactants
+
+
+def react_mixture(mixture, conditions, arity=None, repeats=False,
+                  __test=False):
+    """React every feasible combination of a mixture.
+
+    Each combination found by `feasible_reactions` is reacted as by
+    `react`, trying its mechanisms in order, but the outcome is recorded
+    as a `CAOS.delta.ReactionDelta` and the species are rolled back, so
+    the structures of the mixture are left unchanged.  The species are
+    annotated by the requirements, as described in `feasible_reactions`.
+
+    Parameters
+    ----------
+    mixture : collection[Molecule]
+        The species in the mixture.
+    conditions : mapping[str -> object]
+        The conditions of the reactions.
+    arity : Optional[int or collection[int]]
+        See `feasible_reactions`.
+    repeats : Optional[bool]
+        Whether or not a species can react with itself.
+    __test : bool
+        Whether or not to use the testing namespace.
+
+    Yields
+    ------
+    reaction : tuple[tuple[int], ReactionDelta]
+        The positions in `mixture` of the reactants, and the products of
+        the first mechanism that gave any.  Combinations no mechanism
+        could react are left out.
+    """
+
+    mixture = list(mixture)
+    for combination, mechanisms in feasible_reactions(
+            mixture, conditions, arity, repeats=repeats, __test=__test):
+        reactants = reactants_of(mixture, combination)
+        descriptors = Descriptors(reactants, conditions)
+        for mechanism in mechanisms:
+            logger.log(ReactionDispatcher._REACTION_ATTEMPT_MESSAGE.format(
+                reactants, conditions, mechanism
+            ))
+            delta = _attempt_delta(
+                mechanism, reactants, conditions, descriptors
+            )
+            if delta:
+                yield combination, delta
+                break
+        else:
+            logger.log(ReactionDispatcher._REACTION_FAILURE_MESSAGE.format(
+                reactants, conditions
+            ))
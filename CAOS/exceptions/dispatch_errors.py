@@ -20,3 +20,15 @@ class InvalidReactionError(DispatchException):
     """The reaction being registered is invalid in some way."""
 
     pass
+
+
+class ExistingDescriptorError(DispatchException):
+    """A descriptor with this name has already been registered."""
+
+    pass
+
+
+class InvalidDescriptorError(DispatchException):
+    """A descriptor is unknown or depends on itself."""
+
+    pass
@@ -8,3 +8,10 @@ class FailedReactionError(Exception):
     """Indicates that a reaction failed to occur."""
 
     pass
+
+
+class InvalidProductError(FailedReactionError):
+    """Indicates that a mechanism gave products that aren't chemically
+    sane, see `CAOS.validation`."""
+
+    pass
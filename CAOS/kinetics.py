@@ -0,0 +1,352 @@
+"""Mass-action kinetics of reaction networks.
+
+A `KineticModel` compiles a set of reactions (a
+`CAOS.network.ReactionNetwork`, say) into sparse stoichiometry: for
+each reaction, the species it consumes with their orders, and the net
+change it makes to each species it touches.  The rate of a reaction is
+its rate constant times the product of the concentrations of its
+reactants, each raised to its order (mass action), so
+
+    dc/dt = N r(c)
+
+where N is the net stoichiometry matrix.  Only its nonzero entries are
+stored, and the rates and derivatives are computed for all the
+reactions at once with NumPy.
+
+`simulate` integrates these equations with a two stage Rosenbrock
+method (ROS2), which is L-stable, so the fast and slow reactions of a
+network (proton transfers next to slow substitutions) don't force tiny
+steps.  Many sets of initial concentrations, and of rate constants, are
+integrated together as one batch, sharing their steps, for scans over
+conditions.
+
+Attributes
+----------
+KineticModel: class
+    The mass-action rate equations of a set of reactions.
+simulate: function
+    Integrates the concentrations of a model over time.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from . import logger
+
+# ROS2 (Verwer et al. 1999).
+_GAMMA = 1.0 + 1.0 / np.sqrt(2.0)
+_SAFETY = 0.9
+_MIN_FACTOR = 0.2
+_MAX_FACTOR = 5.0
+_DEFAULT_MAX_STEPS = 100000
+
+_REJECTED_MESSAGE = "Rejected a step of {} at t={} (error {})."
+
+
+class KineticModel(object):
+    """The mass-action rate equations of a set of reactions.
+
+    Parameters
+    ----------
+    species : sequence
+        Keys for the species, in the order of the concentration arrays.
+    reactions : sequence[tuple[mapping, mapping]]
+        For each reaction, the count of each reactant and of each
+        product, keyed as in `species`.
+    rate_constants : Optional[sequence[float]]
+        The rate constant of each reaction; 1 by default.  Can be
+        overridden in `rates` and `simulate`.
+
+    Attributes
+    ----------
+    orders : numpy.ndarray
+        The order of each reaction in each of its reactants, an array of
+        shape (reactions, most reactants); unused slots have order 0.
+    reactant_indices : numpy.ndarray
+        The species of each of those slots.
+    net_species, net_reactions, net_coefficients : numpy.ndarray
+        The nonzero entries of the net stoichiometry matrix, sorted by
+        species.
+    """
+
+    def __init__(self, species, reactions, rate_constants=None):
+        self.species = list(species)
+        positions = dict(
+            (key, position) for position, key in enumerate(self.species)
+        )
+        reactions = list(reactions)
+        if rate_constants is None:
+            rate_constants = np.ones(len(reactions))
+        self.rate_constants = np.asarray(rate_constants, dtype=float)
+        if self.rate_constants.shape != (len(reactions),):
+            raise ValueError("Expected {} rate constants, got {}.".format(
+                len(reactions), self.rate_constants.shape
+            ))
+
+        width = max([len(reactants) for reactants, _ in reactions] or [0])
+        self.orders = np.zeros((len(reactions), max(width, 1)))
+        self.reactant_indices = np.zeros(self.orders.shape, dtype=np.intp)
+        entries = []
+        for number, (reactants, products) in enumerate(reactions):
+            net = {}
+            for slot, key in enumerate(sorted(reactants, key=positions.get)):
+                self.reactant_indices[number, slot] = positions[key]
+                self.orders[number, slot] = reactants[key]
+                net[key] = net.get(key, 0) - reactants[key]
+            for key, count in products.items():
+                net[key] = net.get(key, 0) + count
+            entries.extend(
+                (positions[key], number, coefficient)
+                for key, coefficient in net.items() if coefficient
+            )
+
+        entries.sort()
+        entries = np.array(entries, dtype=float).reshape(-1, 3)
+        self.net_species = entries[:, 0].astype(np.intp)
+        self.net_reactions = entries[:, 1].astype(np.intp)
+        self.net_coefficients = entries[:, 2]
+        # The species with entries, and where their entries start, for
+        # np.add.reduceat.
+        self._present = np.unique(self.net_species)
+        self._starts = np.searchsorted(self.net_species, self._present)
+
+    @classmethod
+    def from_network(cls, network, rate_constants=None):
+        """Compile the reactions of a `CAOS.network.ReactionNetwork`.
+
+        Parameters
+        ----------
+        network : ReactionNetwork
+        rate_constants : Optional[sequence[float] or callable]
+            The rate constant of each reaction of
+            `ReactionNetwork.reactions`, or a function of the reaction
+            node's attributes (``mechanism``, ``delta`` and so on)
+            giving it.  1 by default.
+
+        Returns
+        -------
+        model : KineticModel
+            A model whose species are the keys of the network's species
+            nodes.
+        """
+
+        graph = network.graph
+        nodes = network.reactions
+        reactions = [
+            (dict((key, graph[key][node]['count'])
+                  for key in graph.predecessors(node)),
+             dict((key, graph[node][key]['count'])
+                  for key in graph.successors(node)))
+            for node in nodes
+        ]
+        if callable(rate_constants):
+            rate_constants = [
+                rate_constants(graph.node[node]) for node in nodes
+            ]
+        species = [
+            node for node, data in graph.nodes(data=True)
+            if data['bipartite'] == 0
+        ]
+        return cls(sorted(species), reactions, rate_constants)
+
+    def __len__(self):
+        return len(self.species)
+
+    def stoichiometry(self):
+        """The net stoichiometry matrix, as a dense array of shape
+        (species, reactions)."""
+
+        matrix = np.zeros((len(self.species), len(self.orders)))
+        matrix[self.net_species, self.net_reactions] = self.net_coefficients
+        return matrix
+
+    def _factors(self, concentrations):
+        # The concentration of the reactant of each slot, shape
+        # (batch, reactions, slots), and its power.
+        values = concentrations[:, self.reactant_indices]
+        return values, values ** self.orders
+
+    def rates(self, concentrations, rate_constants=None):
+        """The rate of every reaction.
+
+        Parameters
+        ----------
+        concentrations : numpy.ndarray
+            Concentrations of shape (batch, species).
+        rate_constants : Optional[numpy.ndarray]
+            Rate constants of shape (reactions,) or (batch, reactions).
+
+        Returns
+        -------
+        rates : numpy.ndarray
+            Rates of shape (batch, reactions).
+        """
+
+        if rate_constants is None:
+            rate_constants = self.rate_constants
+        _, powers = self._factors(concentrations)
+        return rate_constants * powers.prod(axis=2)
+
+    def _apply(self, values):
+        # N times values of shape (batch, reactions, ...), summing the
+        # contributions of each species' entries.
+        derivatives = np.zeros(
+            (values.shape[0], len(self.species)) + values.shape[2:]
+        )
+        if not len(self.net_species):
+            return derivatives
+        coefficients = self.net_coefficients.reshape(
+            (-1,) + (1,) * (values.ndim - 2)
+        )
+        contributions = values[:, self.net_reactions] * coefficients
+        derivatives[:, self._present] = np.add.reduceat(
+            contributions, self._starts, axis=1
+        )
+        return derivatives
+
+    def derivatives(self, concentrations, rate_constants=None):
+        """The time derivatives of the concentrations, of shape
+        (batch, species).  See `rates`."""
+
+        return self._apply(self.rates(concentrations, rate_constants))
+
+    def jacobian(self, concentrations, rate_constants=None):
+        """The derivatives of `derivatives` with respect to the
+        concentrations, of shape (batch, species, species).  See
+        `rates`."""
+
+        if rate_constants is None:
+            rate_constants = self.rate_constants
+        rate_constants = np.broadcast_to(
+            rate_constants, (len(concentrations), len(self.orders))
+        )
+        values, powers = self._factors(concentrations)
+        batch, count, width = values.shape
+
+        # d rate / d concentration of each slot: the slot's derivative
+        # times the other slots' powers.
+        slopes = np.empty(values.shape)
+        for slot in range(width):
+            order = self.orders[:, slot]
+            own = order * values[:, :, slot] ** np.maximum(order - 1, 0)
+            others = np.delete(powers, slot, axis=2).prod(axis=2)
+            slopes[:, :, slot] = rate_constants * own * others
+
+        # Jacobian of the rates, then N times it.
+        # A slot has one entry per reaction, so no index repeats in it.
+        rate_jacobian = np.zeros((batch, count, len(self.species)))
+        reactions = np.arange(count)
+        for slot in range(width):
+            rate_jacobian[:, reactions, self.reactant_indices[:, slot]] += \
+                slopes[:, :, slot]
+        return self._apply(rate_jacobian)
+
+
+def _error_norm(error, previous, current, rtol, atol):
+    scale = atol + rtol * np.maximum(np.abs(previous), np.abs(current))
+    return np.sqrt(np.mean((error / scale) ** 2, axis=1)).max()
+
+
+def simulate(model, initial, times, rate_constants=None, rtol=1e-3,
+             atol=1e-9, max_steps=_DEFAULT_MAX_STEPS):
+    """Integrate the concentrations of a model over time.
+
+    Parameters
+    ----------
+    model : KineticModel
+        The rate equations.
+    initial : array_like
+        Initial concentrations, of shape (species,), or (batch, species)
+        for a batch of runs integrated together.
+    times : array_like
+        Increasing times to report the concentrations at.  The first is
+        the time of `initial`.
+    rate_constants : Optional[array_like]
+        Rate constants of shape (reactions,), or (batch, reactions) to
+        give each run its own; those of the model by default.
+    rtol, atol : Optional[float]
+        Relative and absolute tolerances of the local error of a step.
+        The runs of a batch share their steps, so every run meets them.
+    max_steps : Optional[int]
+        The most steps, accepted or not, before giving up.
+
+    Returns
+    -------
+    concentrations : numpy.ndarray
+        The concentrations at each time, of shape (times, species), or
+        (batch, times, species) for a batch.
+
+    Raises
+    ------
+    ValueError
+        If the shapes of the arguments don't agree, or `times` aren't
+        increasing.
+    RuntimeError
+        If the integration takes more than `max_steps` steps.
+    """
+
+    initial = np.asarray(initial, dtype=float)
+    single = initial.ndim == 1
+    current = np.atleast_2d(initial).copy()
+    times = np.asarray(times, dtype=float)
+    if current.shape[1] != len(model):
+        raise ValueError("Expected {} species, got {}.".format(
+            len(model), current.shape[1]
+        ))
+    if len(times) and (np.diff(times) <= 0).any():
+        raise ValueError("Times must be increasing.")
+    if rate_constants is None:
+        rate_constants = model.rate_constants
+    rate_constants = np.asarray(rate_constants, dtype=float)
+
+    results = np.empty((len(current), len(times), len(model)))
+    if not len(times):
+        return results[0] if single else results
+    results[:, 0] = current
+
+    identity = np.eye(len(model))
+    time = times[0]
+    span = times[-1] - times[0]
+    step = span * 1e-6 if span else 0.0
+    steps = 0
+    for number in range(1, len(times)):
+        while time < times[number]:
+            if steps >= max_steps:
+                raise RuntimeError(
+                    "Integration took more than {} steps.".format(max_steps)
+                )
+            steps += 1
+            last = step >= times[number] - time
+            if last:
+                step = times[number] - time
+
+            slope = model.derivatives(current, rate_constants)
+            w = identity - _GAMMA * step * model.jacobian(
+                current, rate_constants
+            )
+            first = np.linalg.solve(w, slope[..., None])[..., 0]
+            midpoint = model.derivatives(current + step * first,
+                                         rate_constants)
+            second = np.linalg.solve(
+                w, (midpoint - 2 * first)[..., None]
+            )[..., 0]
+            proposed = current + step * (1.5 * first + 0.5 * second)
+
+            # The first order solution current + step * first differs by
+            # this much.
+            error = _error_norm(step * 0.5 * (first + second), current,
+                                proposed, rtol, atol)
+            if error <= 1.0:
+                time = times[number] if last else time + step
+                # Mass action needs nonnegative concentrations; the
+                # method can undershoot a species being used up.
+                current = np.maximum(proposed, 0.0)
+            else:
+                logger.log(_REJECTED_MESSAGE.format(step, time, error))
+            factor = _SAFETY * error ** -0.5 if error else _MAX_FACTOR
+            step *= min(_MAX_FACTOR, max(_MIN_FACTOR, factor))
+        results[:, number] = current
+
+    return results[0] if single else results
@@ -1,28 +1,55 @@
-"""Mechanisms for the CAOS system."""
+"""Mechanisms for the CAOS system.
+
+Built-in mechanisms are registered lazily from a static manifest: the
+dispatch system knows each mechanism's name and requirements up front,
+but the module implementing it is only imported the first time the
+mechanism's requirements pass for some reactants.  Mechanisms from other
+packages are discovered through entry points before the first dispatch,
+and registered in the same way, see `CAOS.mechanisms.plugins`.
+
+Attributes
+----------
+__manifest__ : dict[str, tuple[str]]
+    Mapping from the name of each built-in mechanism module to the names
+    of the requirements (in `requirements`) that it needs.  This must
+    agree with the ``__requirements__`` of the module itself.
+__arities__ : dict[str, tuple[int]]
+    The numbers of reactants each built-in mechanism module reacts,
+    agreeing with its ``__arity__``.
+__mechanisms__ : tuple[str]
+    The names of the built-in mechanism modules.
+"""
 
 from __future__ import print_function, division, unicode_literals, \
     absolute_import
 
-from importlib import import_module
+from . import plugins, requirements
 
-from . import requirements
+from ..dispatch import ReactionDispatcher, register_lazy_reaction_mechanism
 
-from ..dispatch import register_reaction_mechanism
+__manifest__ = {
+    'acid_base': ('pka',),
+}
 
-__mechanisms__ = ('acid_base',)
+__arities__ = {
+    'acid_base': (2,),
+}
 
+__mechanisms__ = tuple(sorted(__manifest__))
 
-for mechanism in __mechanisms__:
-    mechanism_module = import_module(
-        ".{}".format(mechanism), package="CAOS.mechanisms"
-    )
 
+for mechanism in __mechanisms__:
     function_requirements = [
         getattr(requirements, requirement_name)
-        for requirement_name in mechanism_module.__requirements__
+        for requirement_name in __manifest__[mechanism]
     ]
-    registrator = register_reaction_mechanism(function_requirements)
-    mechanism_function = getattr(
-        mechanism_module, "{}_reaction".format(mechanism)
+    register_lazy_reaction_mechanism(
+        "{}_reaction".format(mechanism), function_requirements,
+        "{}.{}".format(__name__, mechanism),
+        arity=__arities__.get(mechanism)
     )
-    registrator(mechanism_function)
+
+
+# Plugins are only discovered once something is dispatched, so that
+# importing CAOS doesn't touch the index on disk.
+ReactionDispatcher._add_discovery_hook(plugins.register_plugins)
@@ -1,37 +1,388 @@
-"""The acid base mechanism implementation."""
+"""The acid base mechanism implementation.
+
+Besides the usual single proton transfer between the strongest acid and
+the strongest base of the reactants, the mechanism has a mixture mode,
+enabled with the ``'mixture'`` condition, that considers every acidic
+hydrogen and every basic site of every reactant at once.  See
+`acid_base_mixture`.
+"""
 
 from __future__ import print_function, division, unicode_literals, \
     absolute_import
 
+import heapq
 from copy import deepcopy
 
+from ..descriptors import uses_descriptors
+from ..dispatch import register_retro_mechanism
+
 
 __requirements__ = ('pka',)
+__arity__ = 2
 
 
 def _get_ideal_hydrogen(acid):
-    # Todo: Actually compute this here instead of relying on an instance
-    # variable
+    # Set by the pka requirement, either from the conditions or from
+    # CAOS.structures.pka.
     return acid.pka_point
 
 
 def _get_hydrogen_acceptor(base):
-    # Todo: Actually compute this here instead of relying on an instance
-    # variable
-    return base.pka_point
+    return getattr(base, 'acceptor_point', base.pka_point)
+
+
+def _carries_hydrogen(molecule, atom_id):
+    # A hydrogen, or an atom with implicit ones.
+    return molecule.atoms[atom_id] == 'H' or \
+        molecule.hydrogen_count(atom_id) > 0
 
 
 def _move_hydrogen(conj_base, donate_id, conj_acid, accept_id):
-    conj_base.remove_node(donate_id)
-    id_ = conj_acid._next_free_atom_id
-    conj_acid._add_node(id_, 'H')
-    conj_acid._add_edge(
-        conj_acid._next_free_bond_id,
-        {'nodes': (id_, accept_id), 'order': 1}
+    # With implicit hydrogens, this only moves a count.
+    explicit = conj_base.atoms[donate_id] == 'H'
+    conj_base._remove_hydrogen(donate_id)
+    conj_acid._add_hydrogen(
+        accept_id, origin=(conj_base, donate_id) if explicit else None
     )
 
 
-def acid_base_reaction(reactants, conditions):
+class ProtonTransfer(object):
+    """A single proton transfer between two reactants of a mixture.
+
+    The products are only built when they are first asked for, so
+    transfers can be ranked and filtered cheaply.
+
+    Attributes
+    ----------
+    acid, base : Molecule
+        The reactants donating and accepting the hydrogen.
+    donor, acceptor : str
+        The ids of the donated hydrogen (or of the atom carrying it, if
+        it is implicit) and of the accepting atom.
+    delta_pka : float
+        The pKa of the conjugate acid formed minus the pKa of the acid.
+        Positive values are favorable transfers.
+    """
+
+    def __init__(self, acid, donor, base, acceptor, delta_pka):
+        self.acid = acid
+        self.donor = donor
+        self.base = base
+        self.acceptor = acceptor
+        self.delta_pka = delta_pka
+        self._products = None
+
+    @property
+    def products(self):
+        """The conjugate acid and the conjugate base, in that order."""
+
+        if self._products is None:
+            conjugate_acid = deepcopy(self.base)
+            conjugate_base = deepcopy(self.acid)
+            _move_hydrogen(
+                conjugate_base, self.donor, conjugate_acid, self.acceptor
+            )
+            self._products = [conjugate_acid, conjugate_base]
+        return self._products
+
+    def __repr__(self):
+        return "ProtonTransfer({} -> {}, delta_pka={})".format(
+            getattr(self.acid, 'id', self.donor),
+            getattr(self.base, 'id', self.acceptor),
+            self.delta_pka
+        )
+
+
+class MixtureSites(object):
+    """The donor and acceptor sites of all the reactants of a mixture.
+
+    Sites are estimated with `CAOS.structures.pka.estimate_many`, in one
+    batch for the whole mixture, and symmetry equivalent sites of a
+    reactant are only counted once.  A pKa given in the conditions
+    (under ``'pkas'`` and ``'pka_points'``, as for the ``pka``
+    requirement) replaces the estimate for that kind of site: it is a
+    donor if the given point is a hydrogen and an acceptor otherwise.
+
+    Parameters
+    ----------
+    reactants : list[Molecule]
+        The molecules in the mixture.
+    conditions : Optional[dict]
+        The conditions of the reaction.
+    descriptors : Optional[Descriptors]
+        The descriptors of the dispatch, to reuse its ``'pka_estimates'``
+        and ``'atom_classes'``.
+
+    Attributes
+    ----------
+    donor_owners, acceptor_owners : numpy.ndarray
+        The position in `reactants` of the molecule each site is on.
+    donor_atoms, acceptor_atoms : list[str]
+        The atom id of each site.
+    donor_pkas, acceptor_pkas : numpy.ndarray
+        The pKa of each donor, and of the conjugate acid of each
+        acceptor.
+    """
+
+    def __init__(self, reactants, conditions=None, descriptors=None):
+        # Imported here so that NumPy is only loaded once pkas are needed.
+        import numpy as np
+        from ..descriptors import Descriptors
+
+        conditions = conditions or {}
+        given_pkas = conditions.get('pkas', {})
+        given_points = conditions.get('pka_points', {})
+
+        self.reactants = list(reactants)
+        if descriptors is None:
+            descriptors = Descriptors(self.reactants, conditions)
+        donors = ([], [], [])
+        acceptors = ([], [], [])
+        for owner, (reactant, estimate, classes) in enumerate(zip(
+                self.reactants, descriptors['pka_estimates'],
+                descriptors['atom_classes'])):
+            acidic, basic = estimate.acidic, estimate.basic
+            id_ = getattr(reactant, 'id', None)
+            if id_ in given_pkas and id_ in given_points:
+                point = given_points[id_]
+                if reactant.atoms[point] == 'H':
+                    acidic = {point: given_pkas[id_]}
+                else:
+                    basic = {point: given_pkas[id_]}
+            for sites, table in ((donors, acidic), (acceptors, basic)):
+                seen = set()
+                for atom_id in sorted(table):
+                    if classes[atom_id] not in seen:
+                        seen.add(classes[atom_id])
+                        sites[0].append(owner)
+                        sites[1].append(atom_id)
+                        sites[2].append(table[atom_id])
+
+        self.donor_owners = np.array(donors[0], dtype=np.intp)
+        self.donor_atoms = donors[1]
+        self.donor_pkas = np.array(donors[2], dtype=float)
+        self.acceptor_owners = np.array(acceptors[0], dtype=np.intp)
+        self.acceptor_atoms = acceptors[1]
+        self.acceptor_pkas = np.array(acceptors[2], dtype=float)
+
+    def delta_matrix(self):
+        """The delta pKa of every donor and acceptor pair.
+
+        Returns
+        -------
+        deltas : numpy.ndarray
+            Array with one row per donor and one column per acceptor,
+            holding the pKa of the conjugate acid minus the pKa of the
+            donor.  Pairs on the same reactant are NaN.  The array has
+            ``len(donors) * len(acceptors)`` entries, so for large
+            mixtures prefer `transfers`.
+        """
+
+        import numpy as np
+
+        deltas = np.subtract.outer(self.acceptor_pkas, self.donor_pkas).T
+        deltas[np.equal.outer(self.donor_owners, self.acceptor_owners)] = \
+            np.nan
+        return deltas
+
+    def transfers(self, threshold=0.0, exclusive=False):
+        """Iterate over the favorable transfers, best first.
+
+        Acceptors are sorted once, so the favorable acceptors of each
+        donor are a prefix of that order; their number is found for all
+        donors with a single `numpy.searchsorted`.  The rows of the
+        delta pKa matrix are then merged lazily with a heap, so the matrix is
+        never built and stopping early costs nothing.
+
+        Parameters
+        ----------
+        threshold : Optional[float]
+            Only transfers with a delta pKa above this are favorable.
+        exclusive : Optional[bool]
+            If true, every reactant takes part in at most one transfer,
+            chosen greedily from the most favorable.
+
+        Yields
+        ------
+        transfer : ProtonTransfer
+            The transfers, by decreasing delta pKa.
+        """
+
+        pairing = self._pair(threshold)
+        for donor, rank, delta_pka in pairing.ranked_pairs(exclusive):
+            yield ProtonTransfer(
+                self.reactants[pairing.donor_owners[donor]],
+                self.donor_atoms[donor],
+                self.reactants[pairing.acceptor_owners[rank]],
+                self.acceptor_atoms[pairing.order[rank]],
+                delta_pka
+            )
+
+    def _pair(self, threshold):
+        """Find the favorable acceptors of every donor.
+
+        Returns
+        -------
+        pairing : _Pairing
+        """
+
+        import numpy as np
+
+        order = np.argsort(-self.acceptor_pkas, kind='mergesort')
+        ranked = self.acceptor_pkas[order]
+        counts = np.searchsorted(
+            -ranked, -(self.donor_pkas + threshold), side='left'
+        )
+        return _Pairing(
+            self.donor_pkas.tolist(), self.donor_owners.tolist(),
+            order.tolist(), ranked.tolist(),
+            self.acceptor_owners[order].tolist(), counts.tolist()
+        )
+
+
+class _Pairing(object):
+    """The favorable acceptors of each donor of a mixture.
+
+    Acceptors are referred to by their rank, their position when sorted
+    by decreasing pKa; the favorable acceptors of donor ``d`` are the
+    ranks below ``counts[d]``.
+    """
+
+    def __init__(self, donor_pkas, donor_owners, order, ranked,
+                 acceptor_owners, counts):
+        self.donor_pkas = donor_pkas
+        self.donor_owners = donor_owners
+        self.order = order
+        self.ranked = ranked
+        self.acceptor_owners = acceptor_owners
+        self.counts = counts
+
+    def ranked_pairs(self, exclusive=False):
+        """Merge the rows of favorable acceptors with a heap.
+
+        Yields
+        ------
+        pair : tuple[int, int, float]
+            The donor, the rank of the acceptor and the delta pKa, by
+            decreasing delta pKa.
+        """
+
+        ranks = _FreeRanks(self.acceptor_owners, exclusive)
+        heap = [
+            (self.donor_pkas[donor] - self.ranked[0], donor, 0)
+            for donor, count in enumerate(self.counts) if count
+        ]
+        heapq.heapify(heap)
+        used = set()
+        while heap:
+            negative_delta, donor, rank = heapq.heappop(heap)
+            owner = self.donor_owners[donor]
+            if owner in used:
+                continue
+            free = ranks.next_free(rank)
+            following = free if free != rank else rank + 1
+            if following < self.counts[donor]:
+                heapq.heappush(heap, (
+                    self.donor_pkas[donor] - self.ranked[following],
+                    donor, following
+                ))
+            partner = self.acceptor_owners[rank]
+            if free != rank or partner == owner:
+                continue
+            if exclusive:
+                used.update((owner, partner))
+                ranks.remove((owner, partner))
+            yield donor, rank, -negative_delta
+
+
+class _FreeRanks(object):
+    """The acceptor ranks still free to react.
+
+    In exclusive mode, the acceptors of reactants that have already
+    reacted are skipped by pointing their rank at the next one, so each
+    of them is stepped over only once (with path halving).
+    """
+
+    def __init__(self, acceptor_owners, exclusive):
+        self.skip = list(range(len(acceptor_owners) + 1))
+        self.ranks_of = {}
+        if exclusive:
+            for rank, owner in enumerate(acceptor_owners):
+                self.ranks_of.setdefault(owner, []).append(rank)
+
+    def next_free(self, rank):
+        """The first free rank from `rank` on."""
+
+        skip = self.skip
+        while skip[rank] != rank:
+            skip[rank] = skip[skip[rank]]
+            rank = skip[rank]
+        return rank
+
+    def remove(self, owners):
+        """Mark the acceptors of some reactants as taken."""
+
+        for owner in owners:
+            for rank in self.ranks_of.get(owner, ()):
+                self.skip[rank] = rank + 1
+
+
+def acid_base_mixture(reactants, conditions, threshold=0.0,
+                      exclusive=False, descriptors=None):
+    """Find the favorable proton transfers in a mixture.
+
+    Every acidic hydrogen of every reactant is paired with every basic
+    site of every other reactant.  See `MixtureSites`.
+
+    Parameters
+    ----------
+    reactants: list[Molecule]
+        The reactants in the mixture.
+    conditions: dict
+        The conditions under which the reaction should occur.
+    threshold : Optional[float]
+        The minimum delta pKa for a transfer to be favorable.
+    exclusive : Optional[bool]
+        If true, every reactant takes part in at most one transfer.
+    descriptors : Optional[Descriptors]
+        The descriptors of the dispatch, see `MixtureSites`.
+
+    Returns
+    -------
+    transfers : iterator[ProtonTransfer]
+        The transfers, most favorable first, whose products are only
+        built when asked for.
+    """
+
+    sites = MixtureSites(reactants, conditions, descriptors)
+    return sites.transfers(threshold, exclusive)
+
+
+def _mixture_products(reactants, conditions, descriptors):
+    transfers = acid_base_mixture(
+        reactants, conditions, conditions.get('min_delta_pka', 0.0),
+        exclusive=True, descriptors=descriptors
+    )
+    # Built now, while the reactants are as they were given.
+    return [product for transfer in transfers
+            for product in transfer.products]
+
+
+def _equilibrium_products(reactants, conditions):
+    # Imported here so that NumPy is only loaded once it is needed.
+    from ..structures.equilibrium import speciate
+
+    products = []
+    cutoff = conditions.get('abundance_cutoff', 0.0)
+    for form, concentration in speciate(reactants, conditions).products(
+            cutoff=cutoff):
+        form.abundance = concentration
+        products.append(form)
+    return products
+
+
+@uses_descriptors('pka_estimates', 'atom_classes')
+def acid_base_reaction(reactants, conditions, descriptors=None):
     """Perform an acid base reaction on the reactants.
 
     Parameters
@@ -39,14 +390,34 @@ def acid_base_reaction(reactants, conditions):
     reactants: list[Molecule]
         The reactants in the reaction.
     conditions: dict
-        The conditions under which the reaction should occur.
+        The conditions under which the reaction should occur.  If
+        ``'mixture'`` is true, every reactant may react, see
+        `acid_base_mixture`.  If ``'equilibrium'`` is true, the
+        reactants are brought to equilibrium instead, see
+        `CAOS.structures.equilibrium.speciate`.
+    descriptors: Descriptors, optional
+        The descriptors of the dispatch, used in mixture mode.
 
     Returns
     -------
     products: list[Molecule]
-        The products of the reaction.
+        The products of the reaction, made by changing the reactants in
+        place (the dispatcher copies them and rolls the changes back).
+        In mixture mode, the conjugate acid and conjugate base of each
+        transfer,
+        with every reactant reacting at most once and transfers with a
+        delta pKa below ``conditions['min_delta_pka']`` (0 by default)
+        skipped.  In equilibrium mode, every protonation state present
+        with a concentration above ``conditions['abundance_cutoff']`` (0
+        by default), most abundant first, with the concentration stored
+        as its ``abundance``.
     """
 
+    if conditions.get('equilibrium'):
+        return _equilibrium_products(reactants, conditions)
+    if conditions.get('mixture'):
+        return _mixture_products(reactants, conditions, descriptors)
+
     # Figure out the acid and the base
     acid = reactants[0]
     base = reactants[1]
@@ -60,10 +431,16 @@ def acid_base_reaction(reactants, conditions):
     # Figure out what is going to move and where
     donating_hydrogen_id = _get_ideal_hydrogen(acid)
     hydrogen_acceptor_id = _get_hydrogen_acceptor(base)
+    if donating_hydrogen_id is None or hydrogen_acceptor_id is None or \
+            not _carries_hydrogen(acid, donating_hydrogen_id):
+        return []
 
-    # Make the conjugate acids, bases, and salt
-    conjugate_acid = deepcopy(base)
-    conjugate_base = deepcopy(acid)
+    # Make the conjugate acids, bases, and salt.  The dispatcher runs
+    # mechanisms in a transaction on the reactants and copies the ones
+    # returned before rolling them back, so they are changed in place; a
+    # molecule acting as both acid and base is copied first.
+    conjugate_acid = deepcopy(base) if base is acid else base
+    conjugate_base = acid
     salt = None
 
     _move_hydrogen(
@@ -72,3 +449,59 @@ def acid_base_reaction(reactants, conditions):
     )
 
     return [conjugate_acid, conjugate_base, salt]
+
+
+@register_retro_mechanism(acid_base_reaction)
+def acid_base_retro(target, conditions, stock):
+    """Propose precursors of a proton transfer that gives `target`.
+
+    The target is either the conjugate acid of a transfer, made from
+    itself with a hydrogen less and an acid of the stock, or the
+    conjugate base, made from itself with a hydrogen more and a base of
+    the stock.  Only one site of each symmetry class is tried.
+
+    Parameters
+    ----------
+    target : Molecule
+        The molecule to make.
+    conditions : dict
+        The conditions of the reaction.
+    stock : list[Molecule]
+        The molecules available as partners.
+
+    Yields
+    ------
+    precursors : list[Molecule]
+        A new form of the target and a molecule of the stock.
+    """
+
+    from ..structures.canonical import atom_classes
+
+    classes = atom_classes(target)
+    seen = set()
+    for atom_id in sorted(target):
+        if classes[atom_id] in seen:
+            continue
+        seen.add(classes[atom_id])
+
+        if target.atoms[atom_id] == 'H':
+            # The target as a conjugate acid: this hydrogen was accepted.
+            neighbors = target.neighbors(atom_id)
+            if len(neighbors) != 1 or target.atoms[neighbors[0]] == 'H':
+                continue
+            base = deepcopy(target)
+            base._remove_hydrogen(atom_id)
+            for partner in stock:
+                yield [base, partner]
+            continue
+
+        if target.hydrogen_count(atom_id):
+            base = deepcopy(target)
+            base._remove_hydrogen(atom_id)
+            for partner in stock:
+                yield [base, partner]
+        # The target as a conjugate base: this atom donated a hydrogen.
+        acid = deepcopy(target)
+        acid._add_hydrogen(atom_id)
+        for partner in stock:
+            yield [acid, partner]
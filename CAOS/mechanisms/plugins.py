@@ -0,0 +1,385 @@
+"""Discovery of mechanisms shipped in external packages.
+
+External packages make mechanisms available by declaring entry points in
+the ``CAOS.mechanisms`` group, pointing at the mechanism function::
+
+    [CAOS.mechanisms]
+    aldol = my_mechanisms.aldol:aldol_reaction
+
+The module containing the function must define ``__requirements__``, in
+the same way as the built-in mechanisms.  Each requirement is either the
+name of a function in `CAOS.mechanisms.requirements` or a reference of
+the form ``"package.module:function"``.  It may also define
+``__arity__``, the number (or numbers) of reactants the mechanism
+reacts, see `CAOS.enumeration`.
+
+Importing each plugin to read its requirements is slow, so the result
+is stored in an index file on disk.  The index is keyed on the name,
+version and entry points of every distribution declaring plugins, and
+reused as long as those don't change.  Reading the metadata of every
+installed distribution is slow as well, so it is only done when the
+modification time of a site directory changed since the index was
+written, as it does when a distribution is installed, upgraded or
+removed.  Pass ``refresh=True`` to `discover` after changing the
+metadata of a distribution in place.  Discovery itself only runs
+before the first dispatch, not on ``import CAOS``, and plugin
+mechanisms are registered lazily, so their modules are only imported
+when they are first considered for a reaction.
+
+Attributes
+----------
+ENTRY_POINT_GROUP : str
+    The entry point group scanned for mechanisms.
+INDEX_VERSION : int
+    Version of the index file format.  Indexes with another version are
+    ignored.
+CACHE_DIR_VARIABLE : str
+    Environment variable that overrides the directory the index is
+    written to.
+DISABLE_VARIABLE : str
+    Environment variable that, if set to a non-empty value, disables
+    plugin discovery.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import json
+import os
+import sys
+import time
+from importlib import import_module
+
+from . import requirements as builtin_requirements
+from .. import logger
+from ..dispatch import register_lazy_reaction_mechanism
+from ..exceptions.dispatch_errors import DispatchException
+
+ENTRY_POINT_GROUP = 'CAOS.mechanisms'
+INDEX_VERSION = 3
+CACHE_DIR_VARIABLE = 'CAOS_CACHE_DIR'
+DISABLE_VARIABLE = 'CAOS_NO_PLUGINS'
+
+_INDEX_FILE_NAME = 'mechanism_index.json'
+_PLUGIN_LOAD_FAILED = "Couldn't load mechanism plugin {}: {}"
+_PLUGIN_REGISTER_FAILED = "Couldn't register mechanism plugin {}: {}"
+_INDEX_WRITE_FAILED = "Couldn't write mechanism index {}: {}"
+# Modification times this close to the time the index is written may
+# not change again when a directory is changed right after, so they
+# aren't trusted.
+_RACY_SECONDS = 2
+
+
+def index_path():
+    """Get the path of the discovery index file.
+
+    Returns
+    -------
+    path : str
+        The ``$CAOS_CACHE_DIR`` directory if set, otherwise a ``CAOS``
+        directory in the user's cache directory.
+    """
+
+    directory = os.environ.get(CACHE_DIR_VARIABLE)
+    if not directory:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+            os.path.expanduser('~'), '.cache'
+        )
+        directory = os.path.join(cache_home, 'CAOS')
+    return os.path.join(directory, _INDEX_FILE_NAME)
+
+
+def _site_directories():
+    """The directories of `sys.path` that distributions are installed in.
+
+    The current directory and the directories of scripts aren't scanned,
+    so working in them doesn't invalidate the index.
+    """
+
+    import site
+
+    sites = set()
+    if hasattr(site, 'getsitepackages'):
+        sites.update(site.getsitepackages())
+    if hasattr(site, 'getusersitepackages'):
+        sites.add(site.getusersitepackages())
+    sites = set(os.path.realpath(directory) for directory in sites)
+    current = os.path.realpath(os.getcwd())
+
+    directories = []
+    for entry in sys.path:
+        if not entry:
+            continue
+        real = os.path.realpath(entry)
+        if real != current and (real in sites or os.path.basename(real) in
+                                ('site-packages', 'dist-packages')):
+            directories.append(entry)
+    return directories
+
+
+def _site_times(path):
+    """The modification time of each directory scanned, or None for
+    those that don't exist."""
+
+    times = []
+    for directory in path:
+        try:
+            times.append([directory, os.stat(directory).st_mtime])
+        except (IOError, OSError):
+            times.append([directory, None])
+    return times
+
+
+def _metadata_module():
+    """`importlib.metadata` or its backport, or None if neither is
+    available."""
+
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            return None
+    return metadata
+
+
+def _metadata_distributions(metadata, path):
+    for distribution in metadata.distributions(path=list(path)):
+        entry_points = []
+        for entry_point in distribution.entry_points:
+            if entry_point.group == ENTRY_POINT_GROUP:
+                module, _, attribute = entry_point.value.partition(':')
+                entry_points.append(
+                    [entry_point.name, module.strip(), attribute.strip()]
+                )
+        if entry_points:
+            yield (distribution.metadata['Name'],
+                   distribution.metadata['Version'], entry_points)
+
+
+def _pkg_resources_distributions(path):
+    import pkg_resources
+
+    for distribution in pkg_resources.WorkingSet(list(path)):
+        entry_points = [
+            [entry_point.name, entry_point.module_name,
+             '.'.join(entry_point.attrs)]
+            for entry_point in distribution.get_entry_map(
+                ENTRY_POINT_GROUP).values()
+        ]
+        if entry_points:
+            yield (distribution.project_name, distribution.version,
+                   entry_points)
+
+
+def _distributions(path):
+    """Find the distributions declaring mechanism plugins.
+
+    Only distribution metadata is read; no plugin is imported.
+
+    Returns
+    -------
+    distributions : list[list]
+        The name, version and entry points (as ``[name, module,
+        attribute]``) of each distribution, sorted so that the list can
+        be compared with the one stored in the index.
+    """
+
+    metadata = _metadata_module()
+    if metadata is not None:
+        found = _metadata_distributions(metadata, path)
+    else:
+        found = _pkg_resources_distributions(path)
+    return sorted(
+        [name, version, sorted(entry_points)]
+        for name, version, entry_points in found
+    )
+
+
+def _scan(distributions):
+    """Read the requirements of the mechanism plugins.
+
+    Every plugin module is imported once to read its requirements.
+    Plugins that can't be imported are logged and left out.
+
+    Parameters
+    ----------
+    distributions : list[list]
+        The distributions declaring plugins, see `_distributions`.
+
+    Returns
+    -------
+    plugins : list[dict]
+        One entry per plugin, as stored in the index.
+    """
+
+    plugins = []
+    seen = set()
+    for distribution, _, entry_points in distributions:
+        for name, module_name, attribute in entry_points:
+            if (module_name, attribute) in seen:
+                continue
+            seen.add((module_name, attribute))
+            plugin = _read_plugin(distribution, name, module_name, attribute)
+            if plugin is not None:
+                plugins.append(plugin)
+    return plugins
+
+
+def _read_plugin(distribution, name, module_name, attribute):
+    try:
+        module = import_module(module_name)
+        getattr(module, attribute)
+        plugin_requirements = list(module.__requirements__)
+        arity = getattr(module, '__arity__', None)
+        if arity is not None and not isinstance(arity, int):
+            arity = sorted(arity)
+    except Exception as error:
+        logger.error(_PLUGIN_LOAD_FAILED.format(name, error))
+        return None
+
+    return {
+        'distribution': distribution,
+        'entry_point': name,
+        'module': module_name,
+        'attribute': attribute,
+        'requirements': plugin_requirements,
+        'arity': arity
+    }
+
+
+def _read_index(path_to_index):
+    try:
+        with open(path_to_index) as index_file:
+            index = json.load(index_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if index.get('version') != INDEX_VERSION:
+        return None
+    return index
+
+
+def _write_index(path_to_index, sites, fingerprint, plugins):
+    racy = time.time() - _RACY_SECONDS
+    if any(mtime is not None and mtime > racy for _, mtime in sites):
+        sites = None
+    index = {
+        'version': INDEX_VERSION,
+        'sites': sites,
+        'fingerprint': fingerprint,
+        'plugins': plugins
+    }
+    temporary = '{}.{}.tmp'.format(path_to_index, os.getpid())
+    try:
+        directory = os.path.dirname(path_to_index)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(temporary, 'w') as index_file:
+            json.dump(index, index_file, indent=1, sort_keys=True)
+        os.rename(temporary, path_to_index)
+    except (IOError, OSError) as error:
+        logger.error(_INDEX_WRITE_FAILED.format(path_to_index, error))
+
+
+def discover(refresh=False, path=None):
+    """Find the mechanism plugins of the installed distributions.
+
+    Parameters
+    ----------
+    refresh : Optional[bool]
+        Whether to ignore the index on disk and rescan.
+    path : Optional[list[str]]
+        Directories to scan.  Defaults to the site directories of
+        `sys.path`.
+
+    Returns
+    -------
+    plugins : list[dict]
+        The ``module``, ``attribute``, ``requirements``, ``entry_point``
+        and ``distribution`` of every plugin.
+    """
+
+    path = _site_directories() if path is None else list(path)
+    sites = _site_times(path)
+    path_to_index = index_path()
+
+    index = None if refresh else _read_index(path_to_index)
+    if index is not None and index['sites'] == sites:
+        return index['plugins']
+
+    distributions = _distributions(path)
+    if index is not None and index['fingerprint'] == distributions:
+        plugins = index['plugins']
+    else:
+        plugins = _scan(distributions)
+    _write_index(path_to_index, sites, distributions, plugins)
+    return plugins
+
+
+class _LazyRequirement(object):
+    """A requirement from another module, imported on first use."""
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.__name__ = str(reference)
+        self._function = None
+
+    def __call__(self, reactants, conditions):
+        if self._function is None:
+            module_name, _, attribute = self.reference.partition(':')
+            self._function = getattr(import_module(module_name), attribute)
+        return self._function(reactants, conditions)
+
+    def __repr__(self):
+        return "<requirement {}>".format(self.reference)
+
+
+def _resolve_requirement(reference):
+    if ':' in reference:
+        return _LazyRequirement(reference)
+    return getattr(builtin_requirements, reference)
+
+
+def register_plugins(refresh=False, path=None):
+    """Register every discovered plugin with the dispatch system.
+
+    Plugins whose requirements can't be resolved, or whose name clashes
+    with an existing mechanism, are logged and skipped.
+
+    Parameters
+    ----------
+    refresh : Optional[bool]
+        Whether to ignore the index on disk and rescan.
+    path : Optional[list[str]]
+        Directories to scan.  Defaults to the site directories of
+        `sys.path`.
+
+    Returns
+    -------
+    names : list[str]
+        Names of the mechanisms that were registered.
+    """
+
+    if os.environ.get(DISABLE_VARIABLE):
+        return []
+
+    names = []
+    for plugin in discover(refresh, path):
+        try:
+            plugin_requirements = [
+                _resolve_requirement(reference)
+                for reference in plugin['requirements']
+            ]
+            register_lazy_reaction_mechanism(
+                plugin['attribute'], plugin_requirements, plugin['module'],
+                arity=plugin.get('arity')
+            )
+        except (AttributeError, DispatchException) as error:
+            logger.error(_PLUGIN_REGISTER_FAILED.format(
+                plugin['entry_point'], error
+            ))
+        else:
+            names.append(plugin['attribute'])
+    return names
@@ -3,14 +3,22 @@
 from __future__ import print_function, division, unicode_literals, \
     absolute_import
 
+from ...descriptors import uses_descriptors
+from ...dispatch import register_batch_requirement, \
+    register_species_requirement
+from ...structures.substructure import Pattern, has_match
 
-def pka(reactants, conditions):
+
+@uses_descriptors('pka_estimates')
+def pka(reactants, conditions, descriptors=None):
     """Compute the pka of every molecule in the reactants.
 
     The pka, as well as the id of the "pka_point" is stored in the
     molecule.  The "pka_point" is the id of the Hydrogen most likely to
     be donated, or the id of the atom most likely to accept a Hydrogen.
-    The pka is based off of the pka_point of the atom.
+    The pka is based off of the pka_point of the atom.  The id of the
+    atom most likely to accept a Hydrogen is also stored separately, as
+    the "acceptor_point".
 
     Parameters
     ----------
@@ -18,17 +26,142 @@ def pka(reactants, conditions):
         A list of reactant molecules.
     conditions: dict
         Dictionary of conditions.
+    descriptors: Descriptors, optional
+        The descriptors of the dispatch, whose ``'pka_estimates'`` are
+        used if some reactant needs estimating.
 
     Notes
     -----
-    Eventually this will be computed, however right now it just pulls
-    specified information from the conditions dict.
+    Values given in the conditions, under ``'pkas'`` and
+    ``'pka_points'`` and keyed by the ``id`` of the reactant, take
+    precedence.  Every other reactant is scored by
+    `CAOS.structures.pka`, all in one batch, or taken from the
+    `CAOS.structures.store.DescriptorStore` given as
+    ``'descriptor_store'``.  The requirement fails if some reactant has
+    neither an acidic hydrogen nor a basic site.
     """
 
-    if 'pkas' in conditions and 'pka_points' in conditions:
-        for reactant in reactants:
-            id_ = reactant.id
-            reactant.pka = conditions['pkas'][id_]
-            reactant.pka_point = conditions['pka_points'][id_]
+    # Imported here so that NumPy is only loaded once pkas are needed.
+    from ...structures.store import pka_estimates
+
+    given_pkas = conditions.get('pkas', {})
+    given_points = conditions.get('pka_points', {})
+
+    missing = []
+    for position, reactant in enumerate(reactants):
+        id_ = getattr(reactant, 'id', None)
+        if id_ in given_pkas and id_ in given_points:
+            reactant.pka = given_pkas[id_]
+            reactant.pka_point = reactant.acceptor_point = given_points[id_]
+        else:
+            missing.append(position)
+
+    if not missing:
         return True
-    return False
+    elif descriptors is not None:
+        estimates = descriptors['pka_estimates']
+    else:
+        estimates = dict(zip(missing, pka_estimates(
+            (reactants[position] for position in missing), conditions
+        )))
+
+    for position in missing:
+        reactant, estimate = reactants[position], estimates[position]
+        if estimate.acid_site is None and estimate.base_site is None:
+            return False
+        reactant.pka = estimate.acid_pka
+        reactant.pka_point = estimate.acid_site
+        reactant.acceptor_point = estimate.base_site
+    return True
+
+
+@register_batch_requirement(pka)
+def _pka_batch(reactant_sets, conditions):
+    """Evaluate `pka` for many reactant sets at once.
+
+    Every reactant that needs estimating, in all of the sets, is scored
+    in a single batch, and the sets that pass are found with one NumPy
+    reduction over all of the reactants.
+    """
+
+    import numpy as np
+    from ...structures.store import pka_estimates
+
+    owners = []
+    missing = []
+    for row, (reactants, row_conditions) in enumerate(
+            zip(reactant_sets, conditions)):
+        given_pkas = row_conditions.get('pkas', {})
+        given_points = row_conditions.get('pka_points', {})
+        for reactant in reactants:
+            id_ = getattr(reactant, 'id', None)
+            if id_ in given_pkas and id_ in given_points:
+                reactant.pka = given_pkas[id_]
+                reactant.pka_point = reactant.acceptor_point = \
+                    given_points[id_]
+            else:
+                owners.append(row)
+                missing.append(reactant)
+
+    has_site = np.ones(len(missing), dtype=bool)
+    for position, (reactant, estimate) in enumerate(
+            zip(missing, pka_estimates(
+                missing, [conditions[row] for row in owners]))):
+        has_site[position] = (estimate.acid_site is not None or
+                              estimate.base_site is not None)
+        reactant.pka = estimate.acid_pka
+        reactant.pka_point = estimate.acid_site
+        reactant.acceptor_point = estimate.base_site
+
+    failures = np.bincount(
+        np.array(owners, dtype=np.intp)[~has_site],
+        minlength=len(reactant_sets)
+    )
+    return failures == 0
+
+
+@register_species_requirement(pka, mode='all', exact=True)
+def _pka_species(species, conditions):
+    """Evaluate `pka` for every molecule of a mixture.
+
+    A combination passes `pka` exactly when each of its reactants does
+    on its own, and the attributes set on a reactant don't depend on
+    the others.  They are set on the molecules of the mixture, and kept
+    there for the mechanisms of every combination.
+    """
+
+    return _pka_batch([[molecule] for molecule in species],
+                      [conditions] * len(species))
+
+
+def has_substructure(pattern, name=None):
+    """Build a requirement that some reactant contains a substructure.
+
+    Parameters
+    ----------
+    pattern : Pattern, str
+        The substructure, or a string accepted by `Pattern.from_string`.
+    name : Optional[str]
+        Name of the requirement, used in log messages.  Defaults to one
+        derived from the pattern.
+
+    Returns
+    -------
+    requirement : callable
+        A requirement function that passes if at least one of the
+        reactants contains the pattern.
+    """
+
+    if not isinstance(pattern, Pattern):
+        name = name or "has_substructure({})".format(pattern)
+        pattern = Pattern.from_string(pattern)
+
+    def requirement(reactants, conditions):
+        return any(has_match(pattern, reactant) for reactant in reactants)
+
+    @register_species_requirement(requirement, mode='any', exact=True)
+    def species(molecules, conditions):
+        return [has_match(pattern, molecule) for molecule in molecules]
+
+    requirement.__name__ = str(name or "has_substructure")
+    return requirement
@@ -0,0 +1,321 @@
+"""Networks of the reactions reachable from a mixture.
+
+Feeding the products of `react` back in as reactants finds what a
+mixture can turn into in several steps, but doing it naively reacts the
+same species over and over: every product that is already known, and
+every combination that was already tried, is dispatched again.  A
+`ReactionNetwork` expands a mixture one generation at a time instead:
+
+1. Species are kept in a table keyed on their
+   `CAOS.structures.canonical.canonical_hash`, so a product that is
+   already known is recognised instead of being added (and reacted)
+   again.  The hash is canonical, so species only share a node if
+   they are isomorphic.
+2. The species new to the previous generation are the frontier.  Only
+   the combinations with a reactant from the frontier are tried, found
+   for the whole generation by `CAOS.enumeration.feasible_reactions`,
+   and their products are hashed in one batch.
+3. The outcome of every combination tried is memoized on the keys of
+   its reactants, so expanding a network again never repeats one.
+4. Expansion stops after a number of generations, or once the table
+   holds a maximum number of species.
+
+The network is a bipartite `networkx.DiGraph`: species nodes (keyed on
+their hash, with ``bipartite=0``) have edges to the reactions they take
+part in, and reaction nodes (``"r0"``, ``"r1"``, ..., with
+``bipartite=1``) have edges to their products.  Edges have a ``count``
+attribute for reactants or products that appear more than once.
+
+Attributes
+----------
+ReactionNetwork: class
+    A network of species and the reactions between them.
+expand_network: function
+    Builds the network of the reactions reachable from a mixture.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from collections import Counter
+
+import networkx as nx
+
+from .delta import _attempt_delta
+from .descriptors import Descriptors
+from .enumeration import _DEFAULT_CHUNK, feasible_reactions, \
+    reactants_of
+from .structures.canonical import canonical_hashes
+from . import logger
+
+_GENERATION_MESSAGE = ("Generation {}: tried {} combinations, found {}"
+                       " reactions and {} new species.")
+_LIMIT_MESSAGE = "Species limit {} reached; {} products left out."
+
+
+class ReactionNetwork(object):
+    """A network of species and the reactions between them.
+
+    Parameters
+    ----------
+    conditions : mapping[str -> object]
+        The conditions of every reaction.
+    arity : Optional[int or collection[int]]
+        The numbers of reactants to combine, see
+        `CAOS.enumeration.feasible_reactions`.
+    max_species : Optional[int]
+        The most species the network may hold.  Products that would
+        exceed it are left out, along with the reactions giving them.
+    repeats : Optional[bool]
+        Whether or not a species can react with itself (two molecules
+        of water, for instance).  True by default.
+    __test : bool
+        Whether or not to use the testing namespace.
+
+    Attributes
+    ----------
+    graph : networkx.DiGraph
+        The bipartite graph of species and reactions.  Species nodes
+        have the attributes ``molecule`` and ``generation``, reaction
+        nodes ``mechanism``, ``delta`` and ``generation``.
+    generation : int
+        The number of generations expanded so far.
+    truncated : bool
+        Whether or not products were left out because of `max_species`.
+    """
+
+    def __init__(self, conditions, arity=None, max_species=None,
+                 repeats=True, __test=False):
+        self.conditions = conditions
+        self.arity = arity
+        self.max_species = max_species
+        self.repeats = repeats
+        self._test = __test
+
+        self.graph = nx.DiGraph()
+        self.generation = 0
+        self.truncated = False
+        self._keys = []
+        self._positions = {}
+        self._molecules = []
+        self._frontier = []
+        self._reactions = []
+        self._outcomes = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, molecule):
+        return canonical_hashes([molecule])[0] in self.graph
+
+    @property
+    def species(self):
+        """The species of the network, in the order they were found.
+
+        Returns
+        -------
+        species : list[Molecule]
+        """
+
+        return list(self._molecules)
+
+    @property
+    def reactions(self):
+        """The reaction nodes of the network, in the order they were
+        found.
+
+        Returns
+        -------
+        reactions : list[str]
+        """
+
+        return list(self._reactions)
+
+    def add_species(self, molecules):
+        """Add molecules to the network, in the current generation.
+
+        New species join the frontier, so the next call to `expand`
+        reacts them.  Molecules already in the network are ignored.
+
+        Returns
+        -------
+        keys : list[str]
+            The keys of the species that were added.
+        """
+
+        molecules = list(molecules)
+        return self._admit(molecules, canonical_hashes(molecules))
+
+    def _admit(self, molecules, keys):
+        added = []
+        for molecule, key in zip(molecules, keys):
+            if key in self.graph:
+                continue
+            if self.max_species is not None \
+                    and len(self._keys) >= self.max_species:
+                self.truncated = True
+                continue
+            self.graph.add_node(key, {
+                'bipartite': 0,
+                'molecule': molecule,
+                'generation': self.generation,
+            })
+            self._positions[key] = len(self._keys)
+            self._keys.append(key)
+            self._molecules.append(molecule)
+            self._frontier.append(self._positions[key])
+            added.append(key)
+        return added
+
+    def _fits(self, keys):
+        """Whether or not the species among `keys` that are new fit in
+        the network together."""
+
+        if self.max_species is None:
+            return True
+        new = set(key for key in keys if key not in self.graph)
+        return len(self._keys) + len(new) <= self.max_species
+
+    def expand(self, depth=1):
+        """React the frontier for some generations.
+
+        Parameters
+        ----------
+        depth : Optional[int]
+            The most generations to expand.  Expansion stops early when
+            a generation finds no new species.
+
+        Returns
+        -------
+        network : ReactionNetwork
+            This network.
+        """
+
+        for _ in range(depth):
+            if not self._frontier:
+                break
+            self._expand_generation()
+        return self
+
+    def _expand_generation(self):
+        frontier, self._frontier = self._frontier, []
+        self.generation += 1
+        conditions = self.conditions
+        tried = 0
+
+        outcomes = []
+        for combination, mechanisms in feasible_reactions(
+                self._molecules, conditions, self.arity, _DEFAULT_CHUNK,
+                frontier, self.repeats, self._test):
+            keys = tuple(self._keys[position] for position in combination)
+            if keys in self._outcomes:
+                continue
+            tried += 1
+            self._outcomes[keys] = None
+            reactants = reactants_of(self._molecules, combination)
+            descriptors = Descriptors(reactants, conditions)
+            for mechanism in mechanisms:
+                delta = _attempt_delta(
+                    mechanism, reactants, conditions, descriptors
+                )
+                if delta:
+                    outcomes.append((keys, mechanism.__name__, delta))
+                    break
+
+        # Every product of the generation is hashed in one batch.
+        products = [
+            [product for product in delta.products if product is not None]
+            for _, _, delta in outcomes
+        ]
+        product_keys = iter(canonical_hashes(
+            product for row in products for product in row
+        ))
+        product_keys = [[next(product_keys) for _ in row] for row in products]
+
+        added = 0
+        left_out = 0
+        for (keys, mechanism, delta), row, row_keys in zip(
+                outcomes, products, product_keys):
+            # A reaction is added with all of its products or not at
+            # all, so every species has a reaction giving it.
+            if not self._fits(row_keys):
+                # Not memoized, so raising the limit lets it be found.
+                self.truncated = True
+                del self._outcomes[keys]
+                left_out += 1
+                continue
+            added += len(self._admit(row, row_keys))
+            self._outcomes[keys] = self._add_reaction(
+                keys, row_keys, mechanism, delta
+            )
+
+        logger.log(_GENERATION_MESSAGE.format(
+            self.generation, tried, len(outcomes) - left_out, added
+        ))
+        if left_out:
+            logger.log(_LIMIT_MESSAGE.format(self.max_species, left_out))
+
+    def _add_reaction(self, reactant_keys, product_keys, mechanism, delta):
+        node = "r{}".format(len(self._reactions))
+        self._reactions.append(node)
+        self.graph.add_node(node, {
+            'bipartite': 1,
+            'mechanism': mechanism,
+            'delta': delta,
+            'generation': self.generation,
+        })
+        for key, count in Counter(reactant_keys).items():
+            self.graph.add_edge(key, node, count=count)
+        for key, count in Counter(product_keys).items():
+            self.graph.add_edge(node, key, count=count)
+        return node
+
+    def outcome(self, reactants):
+        """The reaction node of a combination of species, if it reacted.
+
+        Returns
+        -------
+        node : Optional[str]
+            ``None`` if the combination didn't react or wasn't tried.
+        """
+
+        keys = canonical_hashes(reactants)
+        if not all(key in self.graph for key in keys):
+            return None
+        positions = sorted(self._positions[key] for key in keys)
+        return self._outcomes.get(
+            tuple(self._keys[position] for position in positions)
+        )
+
+
+def expand_network(mixture, conditions, depth=1, max_species=None,
+                   arity=None, repeats=True, __test=False):
+    """Build the network of the reactions reachable from a mixture.
+
+    Parameters
+    ----------
+    mixture : collection[Molecule]
+        The starting species.  They are left unchanged.
+    conditions : mapping[str -> object]
+        The conditions of every reaction.
+    depth : Optional[int]
+        The most generations of reactions.
+    max_species : Optional[int]
+        The most species the network may hold.
+    arity : Optional[int or collection[int]]
+        The numbers of reactants to combine.
+    repeats : Optional[bool]
+        Whether or not a species can react with itself.
+    __test : bool
+        Whether or not to use the testing namespace.
+
+    Returns
+    -------
+    network : ReactionNetwork
+        The network; call `ReactionNetwork.expand` to go further.
+    """
+
+    network = ReactionNetwork(conditions, arity, max_species, repeats,
+                              __test)
+    network.add_species(mixture)
+    return network.expand(depth)
@@ -0,0 +1,289 @@
+"""Retrosynthetic search over the registered mechanisms.
+
+`react` predicts forward: given reactants, what they turn into.
+`retrosynthesis` works backwards from a target molecule to molecules of
+a stock (the purchasable ones, say), using the mechanisms that have a
+reverse implementation (see `CAOS.dispatch.register_retro_mechanism`):
+
+1. A search state is the list of molecules that still have to be made,
+   those not in the stock.  Expanding a state replaces one of them by
+   the precursors a reverse mechanism proposes, once the mechanism has
+   been run forward on them and shown to give it.
+2. States are expanded best first, by the number of steps so far plus
+   the number of molecules left to make.  Each of those needs a step
+   at least, so the estimate never overshoots and routes are found
+   shortest first, as in A*.
+3. A transposition table keyed on the canonical hashes of the molecules
+   left to make (see `CAOS.structures.canonical`) skips states already
+   reached in as few steps by another route.
+4. The search stops after a number of routes, or once its budget of
+   expanded states or of time is spent.
+
+Attributes
+----------
+RetroStep: class
+    One reaction of a route.
+Route: class
+    A sequence of reactions from stock molecules to a target.
+retrosynthesis: function
+    Searches for routes to a target.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import heapq
+from itertools import count
+import time
+
+import six
+
+from .delta import _attempt_delta
+from .descriptors import Descriptors
+from .dispatch import ReactionDispatcher
+from .structures.canonical import canonical_hashes
+from . import logger
+
+_ROUTE_MESSAGE = "Found a route of {} steps after expanding {} states."
+_BUDGET_MESSAGE = "Retrosynthesis stopped after expanding {} states."
+
+
+class RetroStep(object):
+    """One reaction of a route.
+
+    Attributes
+    ----------
+    product : Molecule
+        The molecule the reaction makes.
+    mechanism : str
+        The name of the mechanism.
+    precursors : list[Molecule]
+        The reactants of the reaction.
+    """
+
+    def __init__(self, product, mechanism, precursors):
+        self.product = product
+        self.mechanism = mechanism
+        self.precursors = precursors
+
+    def __repr__(self):
+        return "RetroStep({} -> {})".format(
+            self.mechanism, getattr(self.product, 'id', None)
+        )
+
+
+class Route(object):
+    """A sequence of reactions from stock molecules to a target.
+
+    Attributes
+    ----------
+    steps : list[RetroStep]
+        The reactions, in the order they would be carried out: the
+        last one makes the target.
+    cost : int
+        The number of steps.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.cost = len(steps)
+
+    def __len__(self):
+        return self.cost
+
+    def __repr__(self):
+        return "Route({})".format(self.steps)
+
+
+class _Node(object):
+    """A search state: the molecules left to make and the steps so far,
+    most recent first, as a linked list shared with the parent states.
+    """
+
+    def __init__(self, remaining, keys, steps, cost):
+        self.remaining = remaining
+        self.keys = keys
+        self.steps = steps
+        self.cost = cost
+
+    def route(self):
+        steps = []
+        node = self.steps
+        while node is not None:
+            step, node = node
+            steps.append(step)
+        return Route(steps)
+
+
+def _retro_mechanisms(namespace):
+    mechanisms = []
+    for name, info in six.iteritems(namespace):
+        mechanism = ReactionDispatcher._load_mechanism(name, info)
+        if getattr(mechanism, 'retro', None) is not None:
+            mechanisms.append((name, info, mechanism))
+    return mechanisms
+
+
+def _gives(name, info, precursors, conditions, key):
+    """Whether a mechanism turns the precursors into the molecule with
+    the canonical hash `key`.  The precursors are left unchanged."""
+
+    descriptors = Descriptors(precursors, conditions)
+    passing = ReactionDispatcher._generate_likely_reactions(
+        precursors, conditions, {name: info}, descriptors
+    )
+    for mechanism in passing:
+        delta = _attempt_delta(mechanism, precursors, conditions, descriptors)
+        if delta and key in canonical_hashes(
+                product for product in delta.products if product is not None):
+            return True
+    return False
+
+
+class _Expansion(object):
+    """What expanding a search state needs, shared by every state.
+
+    Forward checks (`_gives`) are memoized on the mechanism, the
+    canonical hashes of the precursors and the molecule they should
+    give, so the same precursors proposed from different states are
+    only reacted once.
+    """
+
+    def __init__(self, mechanisms, conditions, stock):
+        self.mechanisms = mechanisms
+        self.conditions = conditions
+        self.stock = stock
+        self.stock_keys = set(canonical_hashes(stock))
+        self.best = {}
+        self.checked = {}
+
+    def gives(self, name, info, precursors, precursor_keys, key):
+        """`_gives`, memoized."""
+
+        memo_key = (name, tuple(precursor_keys), key)
+        if memo_key not in self.checked:
+            self.checked[memo_key] = _gives(
+                name, info, precursors, self.conditions, key
+            )
+        return self.checked[memo_key]
+
+    def child(self, node, name, precursors, precursor_keys):
+        """The state made by replacing the first molecule of `node` by
+        the precursors that aren't in the stock or already to make."""
+
+        remaining, keys = list(node.remaining[1:]), list(node.keys[1:])
+        for precursor, precursor_key in zip(precursors, precursor_keys):
+            if precursor_key not in self.stock_keys and \
+                    precursor_key not in keys:
+                remaining.append(precursor)
+                keys.append(precursor_key)
+        step = RetroStep(node.remaining[0], name, precursors)
+        return _Node(remaining, keys, (step, node.steps), node.cost + 1)
+
+    def improves(self, node):
+        """Whether no other route reached the state of `node` in as few
+        steps, recording it in the transposition table if so."""
+
+        if not node.keys:
+            return True
+        state = tuple(sorted(node.keys))
+        if self.best.get(state, node.cost + 1) <= node.cost:
+            return False
+        self.best[state] = node.cost
+        return True
+
+    def stale(self, node):
+        """Whether another route reached the state of `node` in fewer
+        steps since it was queued."""
+
+        return self.best.get(tuple(sorted(node.keys)), node.cost) < node.cost
+
+    def expand(self, node):
+        """Yield the children of a state: one for each set of precursors
+        a reverse mechanism proposes for its first molecule, that the
+        mechanism turns into it, and whose state is new."""
+
+        molecule, key = node.remaining[0], node.keys[0]
+        for name, info, mechanism in self.mechanisms:
+            for precursors in mechanism.retro(
+                    molecule, self.conditions, self.stock):
+                precursors = list(precursors)
+                precursor_keys = canonical_hashes(precursors)
+                if not self.gives(name, info, precursors, precursor_keys,
+                                  key):
+                    continue
+                child = self.child(node, name, precursors, precursor_keys)
+                if self.improves(child):
+                    yield child
+
+
+def retrosynthesis(target, stock, conditions, max_routes=5, max_depth=5,
+                   max_nodes=1000, max_time=None, __test=False):
+    """Search for routes from a stock to a target.
+
+    Parameters
+    ----------
+    target : Molecule
+        The molecule to make.
+    stock : collection[Molecule]
+        The molecules available.  They are also the partners the
+        reverse mechanisms may propose.
+    conditions : mapping[str -> object]
+        The conditions of every reaction.
+    max_routes : Optional[int]
+        The most routes to return.
+    max_depth : Optional[int]
+        The most steps a route may have.
+    max_nodes : Optional[int]
+        The most search states to expand.
+    max_time : Optional[float]
+        The most seconds to search for, or ``None`` for no limit.
+    __test : bool
+        Whether or not to use the testing namespace.
+
+    Returns
+    -------
+    routes : list[Route]
+        The routes found, fewest steps first.  A target in the stock
+        has a single route with no steps.
+    """
+
+    stock = list(stock)
+    expansion = _Expansion(
+        _retro_mechanisms(ReactionDispatcher._dispatch_namespace(__test)),
+        conditions, stock
+    )
+    target_key = canonical_hashes([target])[0]
+    if target_key in expansion.stock_keys:
+        return [Route([])]
+
+    deadline = None if max_time is None else time.time() + max_time
+
+    # Entries are (estimate, tie breaker, node); ties go to the oldest.
+    order = count()
+    root = _Node([target], [target_key], None, 0)
+    queue = [(1, next(order), root)]
+    expansion.best[(target_key,)] = 0
+    routes = []
+    expanded = 0
+
+    while queue and len(routes) < max_routes:
+        if expanded >= max_nodes or \
+                (deadline is not None and time.time() >= deadline):
+            logger.log(_BUDGET_MESSAGE.format(expanded))
+            break
+        _, _, node = heapq.heappop(queue)
+        if not node.remaining:
+            routes.append(node.route())
+            logger.log(_ROUTE_MESSAGE.format(node.cost, expanded))
+            continue
+        if node.cost >= max_depth or expansion.stale(node):
+            continue
+        expanded += 1
+
+        for child in expansion.expand(node):
+            heapq.heappush(
+                queue, (child.cost + len(child.keys), next(order), child)
+            )
+
+    return routes
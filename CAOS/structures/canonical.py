@@ -0,0 +1,610 @@
+"""Canonical, id-independent hashes of molecules and atoms.
+
+Atoms are classified by iterative refinement of their labels (the
+Weisfeiler-Lehman / Morgan procedure): an atom starts with its element
+and number of implicit hydrogens, and at every step its label is
+combined with the labels of its neighbors and the orders of the bonds
+to them.  After ``k`` steps an atom's label summarizes its environment
+up to ``k`` bonds away, without depending on the ids used in the
+molecule.
+
+Labels are 64 bit integers computed with NumPy for all atoms at once;
+the neighbors of an atom are combined with a sum, so no sorting is
+needed and a refinement step costs a few array operations.  The mixing
+function is fixed, so labels are stable between processes, comparable
+between molecules, and can be stored on disk.
+
+Refinement alone can't tell some symmetric cyclic molecules apart
+(decalin and bicyclopentyl get the same labels), so the labels only
+make the hash when they provably identify the molecule, see
+`_identified`.  The others are hashed from a canonical order of their
+atoms, found by individualization and refinement (`_Search`).  Two
+molecules then have the same hash if and only if they are isomorphic,
+bond orders included, short of a collision of the 64 bit digest.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import hashlib
+
+import numpy as np
+import six
+
+_DIGEST_SIZE = 16
+_CLASSES_KEY = 'atom_classes'
+_HASH_KEY = 'canonical_hash'
+
+_NEIGHBOR_SALT = np.uint64(0x9e3779b97f4a7c15)
+_SELF_SALT = np.uint64(0xc2b2ae3d27d4eb4f)
+_INDIVIDUAL_SALT = np.uint64(0x165667b19e3779f9)
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:_DIGEST_SIZE]
+
+
+def mix(values):
+    """Scramble an array of 64 bit integers.
+
+    This is the finalizer of splitmix64, the function the labels are
+    built with.  It is fixed, so its results are stable between
+    processes, and it spreads keys that differ in a few bits over all
+    64, which makes it usable to derive more hashes from a key.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Array of ``uint64``.
+
+    Returns
+    -------
+    mixed : numpy.ndarray
+        Array of ``uint64`` of the same shape.
+    """
+
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xbf58476d1ce4e5b9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def _symbol_label(symbol):
+    return int(hashlib.sha1(symbol.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class _Graph(object):
+    """One or more molecules as arrays, and their labels after each
+    refinement.
+
+    Refining several molecules together costs about as much as refining
+    one, since every step is a handful of array operations over all of
+    their atoms.
+    """
+
+    def __init__(self, molecules):
+        self.molecules = molecules
+        self.atom_ids = []
+        owners = []
+        symbols = []
+        first, second, orders = [], [], []
+        for number, molecule in enumerate(molecules):
+            offset = len(self.atom_ids)
+            positions = {}
+            for atom_id in molecule:
+                positions[atom_id] = offset + len(positions)
+                self.atom_ids.append(atom_id)
+                owners.append(number)
+                count = molecule.node[atom_id].get('hydrogens', 0)
+                symbols.append(
+                    "{}H{}".format(molecule.atoms[atom_id], count)
+                    if count else molecule.atoms[atom_id]
+                )
+            for u, v, attributes in molecule.edges(data=True):
+                first.append(positions[u])
+                second.append(positions[v])
+                orders.append(attributes.get('order', 1))
+
+        self.symbols = symbols
+        self.owners = np.array(owners, dtype=np.intp)
+        self.bounds = np.searchsorted(
+            self.owners, np.arange(len(molecules) + 1)
+        )
+        # Each bond appears in both directions, sorted by source atom so
+        # neighbors can be summed with a single reduceat.
+        sources = np.array(first + second, dtype=np.intp)
+        by_source = np.argsort(sources, kind='mergesort')
+        self.sources = sources[by_source]
+        self.targets = np.array(second + first, dtype=np.intp)[by_source]
+        self.orders = np.array(orders + orders, dtype=np.uint64)[by_source]
+        self.bonded, self.starts = np.unique(
+            self.sources, return_index=True
+        )
+
+        symbol_labels = dict(
+            (symbol, _symbol_label(symbol)) for symbol in set(symbols)
+        )
+        self.labels = [np.array(
+            [symbol_labels[symbol] for symbol in symbols], dtype=np.uint64
+        )]
+        self.stable = None
+
+    def refine(self):
+        """Compute one more round of labels."""
+
+        self.labels.append(self.refined(self.labels[-1]))
+
+    def refined(self, labels):
+        """Refine any labels of the atoms by one round."""
+
+        contributions = mix(labels[self.targets] ^ (
+            self.orders * _NEIGHBOR_SALT
+        ))
+        neighborhood = np.zeros(len(labels), dtype=np.uint64)
+        if len(contributions):
+            neighborhood[self.bonded] = np.add.reduceat(
+                contributions, self.starts
+            )
+        return mix(mix(labels ^ _SELF_SALT) + neighborhood)
+
+    def at_radius(self, radius):
+        while len(self.labels) <= radius:
+            self.refine()
+        return self.labels[radius]
+
+    def _class_counts(self, labels):
+        """Count the distinct labels of each molecule."""
+
+        order = np.lexsort((labels, self.owners))
+        owners = self.owners[order]
+        labels = labels[order]
+        new_class = np.ones(len(labels), dtype=bool)
+        new_class[1:] = (owners[1:] != owners[:-1]) | \
+            (labels[1:] != labels[:-1])
+        return np.bincount(
+            owners[new_class], minlength=len(self.molecules)
+        )
+
+    def stable_labels(self):
+        """Refine until the partition of every molecule's atoms stops
+        changing, and return the labels at that point."""
+
+        if self.stable is None:
+            stable = self.at_radius(0).copy()
+            counts = self._class_counts(stable)
+            done = np.zeros(len(self.molecules), dtype=bool)
+            radius = 0
+            while not done.all() and radius < len(self.atom_ids):
+                radius += 1
+                labels = self.at_radius(radius)
+                refined = self._class_counts(labels)
+                done |= refined == counts
+                changing = ~done[self.owners]
+                stable[changing] = labels[changing]
+                counts = refined
+            self.stable = stable
+        return self.stable
+
+    def part(self, number):
+        """The graph of one of the molecules, with its labels so far."""
+
+        start, end = self.bounds[number], self.bounds[number + 1]
+        first, last = np.searchsorted(self.sources, [start, end])
+        part = _Graph.__new__(_Graph)
+        part.molecules = [self.molecules[number]]
+        part.atom_ids = self.atom_ids[start:end]
+        part.symbols = self.symbols[start:end]
+        part.owners = np.zeros(end - start, dtype=np.intp)
+        part.bounds = np.array([0, end - start])
+        part.sources = self.sources[first:last] - start
+        part.targets = self.targets[first:last] - start
+        part.orders = self.orders[first:last]
+        part.bonded, part.starts = np.unique(part.sources, return_index=True)
+        part.labels = [labels[start:end] for labels in self.labels]
+        part.stable = None if self.stable is None \
+            else self.stable[start:end]
+        return part
+
+    def as_dicts(self, labels):
+        """Split labels into one ``{atom id: label}`` dict per molecule."""
+
+        text = ["{:016x}".format(int(label)) for label in labels]
+        return [
+            dict(zip(self.atom_ids[start:end], text[start:end]))
+            for start, end in zip(self.bounds[:-1], self.bounds[1:])
+        ]
+
+
+def _graph(molecule):
+    return molecule._cached('canonical_graph', lambda m: _Graph([m]))
+
+
+def environment_labels(molecule, radius):
+    """Label every atom by its environment up to `radius` bonds away.
+
+    Parameters
+    ----------
+    molecule : Molecule
+        The molecule whose atoms are labelled.
+    radius : int
+        The number of refinement steps.  With a radius of 0 the label
+        depends only on the element.
+
+    Returns
+    -------
+    labels : dict[str, str]
+        Mapping from atom id to label.  Atoms with identical
+        environments (up to `radius`) have identical labels, in this or
+        any other molecule.
+    """
+
+    def compute(molecule):
+        graph = _graph(molecule)
+        return graph.as_dicts(graph.at_radius(radius))[0]
+
+    return molecule._cached('environment_labels_{}'.format(radius), compute)
+
+
+def label_arrays(molecules, radius):
+    """Label the atoms of many molecules at every radius, as arrays.
+
+    This is the array form of `environment_labels_many`, for callers
+    that reduce the labels with NumPy (into fingerprints, for instance)
+    rather than look them up by atom id.  Nothing is cached.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+        The molecules to label.
+    radius : int
+        The largest number of refinement steps.
+
+    Returns
+    -------
+    owners : numpy.ndarray
+        The position among `molecules` of the molecule of each atom.
+    labels : list[numpy.ndarray]
+        The ``uint64`` labels of every atom after 0 to `radius` steps,
+        in the same order as `owners`.
+    """
+
+    graph = _Graph(list(molecules))
+    return graph.owners, [
+        graph.at_radius(current) for current in range(radius + 1)
+    ]
+
+
+def environment_labels_many(molecules, radius):
+    """Compute `environment_labels` for many molecules in one batch.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+        The molecules to label.  Results are cached on each molecule.
+    radius : int
+        The number of refinement steps.
+
+    Returns
+    -------
+    labels : list[dict[str, str]]
+        The labels of each molecule, in the same order.
+    """
+
+    key = 'environment_labels_{}'.format(radius)
+    molecules = list(molecules)
+    missing = [
+        molecule for molecule in molecules
+        if key not in (molecule._cache or {})
+    ]
+    if missing:
+        graph = _Graph(missing)
+        for molecule, labels in zip(
+                missing, graph.as_dicts(graph.at_radius(radius))):
+            molecule._cached(key, lambda _: labels)
+    return [molecule._cache[key] for molecule in molecules]
+
+
+def atom_classes(molecule):
+    """Partition the atoms of a molecule into equivalence classes.
+
+    Refinement continues until the partition stops getting finer, so
+    atoms in the same class can't be told apart by their environment at
+    any distance (they are symmetry equivalent in all but pathological
+    cases).
+
+    Returns
+    -------
+    classes : dict[str, str]
+        Mapping from atom id to a class label that is the same for
+        equivalent atoms of isomorphic molecules.
+    """
+
+    return atom_classes_many([molecule])[0]
+
+
+def atom_classes_many(molecules):
+    """Compute `atom_classes` for many molecules in one batch.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+        The molecules to classify.  Results are cached on each molecule.
+
+    Returns
+    -------
+    classes : list[dict[str, str]]
+        The classes of each molecule, in the same order.
+    """
+
+    molecules = list(molecules)
+    missing = [
+        molecule for molecule in molecules
+        if _CLASSES_KEY not in (molecule._cache or {})
+    ]
+    if missing:
+        graph = _Graph(missing)
+        for molecule, classes in zip(
+                missing, graph.as_dicts(graph.stable_labels())):
+            molecule._cached(_CLASSES_KEY, lambda _: classes)
+    return [molecule._cache[_CLASSES_KEY] for molecule in molecules]
+
+
+def _hash_classes(molecule, classes):
+    labels = sorted(six.itervalues(classes))
+    return _digest("{}|{}|{}".format(
+        len(labels), molecule.number_of_edges(), ",".join(labels)
+    ))
+
+
+def _identified(molecule, classes):
+    """Whether or not refinement alone identifies a molecule.
+
+    It does for acyclic molecules, as refinement identifies every
+    forest (Immerman and Lander), and for molecules where every class
+    of more than one atom is a set of twins: atoms bonded to the same
+    atoms with the same orders, like the hydrogens of a methyl.  Every
+    pair of classes is then either fully bonded or not bonded at all,
+    so the classes and the number of bonds between them (which is what
+    the labels summarize) describe the molecule completely.  Either
+    way, any molecule with the same labels is isomorphic to it.
+    """
+
+    members = {}
+    for atom_id, label in six.iteritems(classes):
+        members.setdefault(label, []).append(atom_id)
+    if all(_twins(molecule, atoms) for atoms in six.itervalues(members)
+           if len(atoms) > 1):
+        return True
+    return _acyclic(molecule)
+
+
+def _acyclic(molecule):
+    adjacency = molecule.adj
+    bonds = sum(len(neighbors) for neighbors in six.itervalues(adjacency))
+    components = 0
+    seen = set()
+    for atom_id in adjacency:
+        if atom_id in seen:
+            continue
+        components += 1
+        seen.add(atom_id)
+        pending = [atom_id]
+        while pending:
+            for neighbor in adjacency[pending.pop()]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    pending.append(neighbor)
+    return bonds // 2 == len(adjacency) - components
+
+
+def _twins(molecule, atom_ids):
+    first = molecule.adj[atom_ids[0]]
+    for atom_id in atom_ids[1:]:
+        bonds = molecule.adj[atom_id]
+        if len(bonds) != len(first) or any(
+                neighbor not in first or
+                first[neighbor].get('order', 1) != data.get('order', 1)
+                for neighbor, data in six.iteritems(bonds)):
+            return False
+    return True
+
+
+class _Search(object):
+    """Canonical order of the atoms of a molecule that refinement
+    alone doesn't identify, by individualization and refinement.
+
+    Starting from the stable labels, the atoms of a class are given
+    distinct labels one at a time (individualized) and the labels
+    refined again, until every atom has a label of its own.  Ordering
+    the atoms by these labels relabels the molecule, and the smallest
+    relabelling over all the choices is canonical.  Choices that are
+    images of each other under an automorphism give the same
+    relabellings, so twins of a choice already tried are skipped, as
+    are the choices that automorphisms found along the way (from leaves
+    with the same relabelling) map onto one already tried.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        atoms = len(graph.atom_ids)
+        neighbors = [[] for _ in range(atoms)]
+        for source, target, order in zip(graph.sources.tolist(),
+                                         graph.targets.tolist(),
+                                         graph.orders.tolist()):
+            neighbors[source].append((target, order))
+        self.signatures = [tuple(sorted(pairs)) for pairs in neighbors]
+        self.bonds = [
+            (source, target, order) for source, pairs in enumerate(neighbors)
+            for target, order in pairs if source < target
+        ]
+        self.best = None
+        self.best_order = None
+        self.automorphisms = []
+
+    def _refine(self, labels):
+        """Refine until no class splits any more."""
+
+        count = len(np.unique(labels))
+        while True:
+            labels = self.graph.refined(labels)
+            refined = len(np.unique(labels))
+            if refined == count:
+                return labels
+            count = refined
+
+    def _split_twins(self, labels):
+        """Individualize the atoms of every class made of twins.
+
+        Any order gives the same relabellings, and none of the other
+        classes split, so the labels need no refining afterwards.
+
+        Returns
+        -------
+        labels : numpy.ndarray
+        cells : list[list[int]]
+            The classes of more than one atom left.
+        """
+
+        members = {}
+        for atom, label in enumerate(labels.tolist()):
+            members.setdefault(label, []).append(atom)
+        labels = labels.copy()
+        cells = []
+        for atoms in six.itervalues(members):
+            if len(atoms) == 1:
+                continue
+            if len(set(self.signatures[atom] for atom in atoms)) > 1:
+                cells.append(atoms)
+                continue
+            salts = np.arange(1, len(atoms) + 1, dtype=np.uint64)
+            labels[atoms] = mix(labels[atoms] ^ salts * _INDIVIDUAL_SALT)
+        return labels, cells
+
+    def _orbit(self, atom, prefix):
+        """The atoms the automorphisms fixing `prefix` map `atom` to."""
+
+        generators = [
+            automorphism for automorphism in self.automorphisms
+            if all(automorphism[fixed] == fixed for fixed in prefix)
+        ]
+        orbit = set([atom])
+        pending = [atom]
+        while pending:
+            current = pending.pop()
+            for automorphism in generators:
+                image = automorphism[current]
+                if image not in orbit:
+                    orbit.add(image)
+                    pending.append(image)
+        return orbit
+
+    def _leaf(self, labels):
+        order = np.argsort(labels, kind='mergesort').tolist()
+        rank = [0] * len(order)
+        for position, atom in enumerate(order):
+            rank[atom] = position
+        relabelled = (
+            tuple(self.graph.symbols[atom] for atom in order),
+            tuple(sorted(
+                (min(rank[first], rank[second]),
+                 max(rank[first], rank[second]), bond_order)
+                for first, second, bond_order in self.bonds
+            ))
+        )
+        if self.best is None or relabelled < self.best:
+            self.best, self.best_order = relabelled, order
+        elif relabelled == self.best:
+            automorphism = [0] * len(order)
+            for atom, image in zip(order, self.best_order):
+                automorphism[atom] = image
+            self.automorphisms.append(automorphism)
+
+    def search(self, labels, prefix=()):
+        labels, cells = self._split_twins(labels)
+        if not cells:
+            self._leaf(labels)
+            return
+        # The smallest class, the one with the smallest label among
+        # those, doesn't depend on the atom ids.
+        cell = min(cells, key=lambda atoms: (len(atoms), labels[atoms[0]]))
+        tried = []
+        for atom in cell:
+            if any(self.signatures[atom] == self.signatures[other]
+                   for other in tried):
+                continue
+            if self._orbit(atom, prefix).intersection(tried):
+                continue
+            tried.append(atom)
+            child = labels.copy()
+            child[[atom]] = mix(child[[atom]] ^ _INDIVIDUAL_SALT)
+            self.search(self._refine(child), prefix + (atom,))
+
+    def hash(self):
+        """The canonical hash of the molecule."""
+
+        self.search(self.graph.stable_labels())
+        symbols, bonds = self.best
+        return _digest("search|{}|{}".format(
+            ",".join(symbols),
+            ",".join("{}-{}-{}".format(*bond) for bond in bonds)
+        ))
+
+
+def canonical_hash(molecule):
+    """Hash a molecule independently of its atom and bond ids.
+
+    Returns
+    -------
+    key : str
+        A hexadecimal string that is equal for isomorphic molecules,
+        and only for them.
+    """
+
+    return canonical_hashes([molecule])[0]
+
+
+def canonical_hashes(molecules, classes=None):
+    """Compute `canonical_hash` for many molecules in one batch.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+        The molecules to hash.  Results are cached on each molecule.
+    classes : Optional[list[dict[str, str]]]
+        The `atom_classes` of each molecule, if already computed.
+
+    Returns
+    -------
+    keys : list[str]
+        The hash of each molecule, in the same order.
+    """
+
+    molecules = list(molecules)
+    missing = [
+        position for position, molecule in enumerate(molecules)
+        if _HASH_KEY not in (molecule._cache or {})
+    ]
+    if classes is None:
+        classes = atom_classes_many(
+            molecules[position] for position in missing
+        )
+    else:
+        classes = [classes[position] for position in missing]
+    searched = []
+    for position, labels in zip(missing, classes):
+        molecule = molecules[position]
+        if _identified(molecule, labels):
+            molecule._cached(
+                _HASH_KEY, lambda molecule: _hash_classes(molecule, labels)
+            )
+        else:
+            searched.append(molecule)
+    # The others are searched one by one, from labels refined together.
+    if searched:
+        graph = _Graph(searched)
+        graph.stable_labels()
+        for number, molecule in enumerate(searched):
+            key = _Search(graph.part(number)).hash()
+            molecule._cached(_HASH_KEY, lambda _: key)
+    return [molecule._cache[_HASH_KEY] for molecule in molecules]
@@ -0,0 +1,175 @@
+"""Decisions about reaction centers, cached by local environment.
+
+Whether an atom is an acidic site, which of its neighbors would take a
+proton, how strongly it binds, ... only depend on the atoms a few bonds
+away from it.  A `CenterCache` stores such per-atom decisions under the
+atom's environment label of a fixed radius (see
+`canonical.environment_labels`), so an atom in any other molecule with
+the same surroundings reuses the decision: molecules of a combinatorial
+library that share a functional group are only scored for the parts
+that differ.
+
+The radius must be large enough to cover everything the decision
+depends on; a decision reading the bond orders of an atom's neighbors,
+for instance, needs a radius of at least 2.
+
+Caches are shared by name, see `center_cache`.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from collections import OrderedDict
+
+import six
+
+from .canonical import environment_labels_many
+
+_DEFAULT_SIZE = 100000
+_caches = {}
+
+# Stored for atoms about which nothing was decided, so that they don't
+# count as missing.
+_NOTHING = None
+
+
+class CenterCache(object):
+    """Per-atom decisions, keyed on the environment of each atom.
+
+    Parameters
+    ----------
+    radius : int
+        The radius of the environments compared.
+    size : Optional[int]
+        The number of environments kept.  The oldest entries are
+        dropped first.
+
+    Attributes
+    ----------
+    hits, misses : int
+        The number of molecules whose decisions were all found in the
+        cache (or computed for other molecules of the same batch), and
+        the number that had to be computed.
+    """
+
+    def __init__(self, radius, size=_DEFAULT_SIZE):
+        self.radius = radius
+        self.size = size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Forget every decision."""
+
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def decisions(self, molecules, compute):
+        """Get the decisions for every atom of many molecules.
+
+        Parameters
+        ----------
+        molecules : collection[Molecule]
+            The molecules.
+        compute : callable
+            Called with the list of molecules that have an atom whose
+            environment isn't cached yet.  Returns, for each of them, a
+            dict from atom id to the decision about that atom; atoms
+            left out have no decision.
+
+        Returns
+        -------
+        decisions : list[dict[str, object]]
+            The decisions about the atoms of each molecule, leaving out
+            the atoms without one.
+        """
+
+        molecules = list(molecules)
+        labels = environment_labels_many(molecules, self.radius)
+        entries = self._entries
+        results = [None] * len(molecules)
+        # Molecules with a new environment are computed; the others
+        # wait for them if the environment is new in this batch only.
+        scheduled = set()
+        computing = []
+        waiting = []
+        for number, atom_labels in enumerate(labels):
+            missing = [
+                label for label in six.itervalues(atom_labels)
+                if label not in entries
+            ]
+            if not missing:
+                results[number] = self._collect(atom_labels)
+            elif scheduled.issuperset(missing):
+                waiting.append(number)
+            else:
+                scheduled.update(missing)
+                computing.append(number)
+        self.hits += len(molecules) - len(computing)
+        self.misses += len(computing)
+
+        if computing:
+            computed = compute([molecules[number] for number in computing])
+            for number, decided in zip(computing, computed):
+                for atom, label in six.iteritems(labels[number]):
+                    entries[label] = decided.get(atom, _NOTHING)
+                results[number] = decided
+            for number in waiting:
+                results[number] = self._collect(labels[number])
+            while len(entries) > self.size:
+                entries.popitem(last=False)
+        return results
+
+    def _collect(self, atom_labels):
+        entries = self._entries
+        decided = {}
+        for atom, label in six.iteritems(atom_labels):
+            decision = entries[label]
+            if decision is not _NOTHING:
+                decided[atom] = decision
+        return decided
+
+
+def center_cache(name, radius, size=_DEFAULT_SIZE):
+    """Get the cache shared under a name, creating it if needed.
+
+    Parameters
+    ----------
+    name : str
+        The name of the decision, such as ``'pka'``.
+    radius : int
+        The radius of the environments it depends on.
+    size : Optional[int]
+        The number of environments kept, when the cache is created.
+
+    Returns
+    -------
+    cache : CenterCache
+
+    Raises
+    ------
+    ValueError
+        If a cache with this name exists with another radius.
+    """
+
+    cache = _caches.get(name)
+    if cache is None:
+        cache = _caches[name] = CenterCache(radius, size)
+    elif cache.radius != radius:
+        raise ValueError(
+            "Center cache {} has radius {}, not {}.".format(
+                name, cache.radius, radius
+            )
+        )
+    return cache
+
+
+def clear_center_caches():
+    """Forget the decisions of every shared cache."""
+
+    for cache in six.itervalues(_caches):
+        cache.clear()
@@ -0,0 +1,79 @@
+"""Data about the chemical elements used by the structure modules.
+
+Attributes
+----------
+VALENCES : dict[str, int]
+    The usual valence (number of bonds) of each element when neutral.
+MAX_VALENCES : dict[str, int]
+    The largest sum of bond orders an atom of each element can have,
+    allowing for onium ions and hypervalent atoms.
+LONE_PAIR_ELEMENTS : frozenset[str]
+    Elements whose neutral atoms carry lone pairs, for which a change in
+    the number of bonds means a formal charge rather than a radical.
+MASSES : dict[str, float]
+    The standard atomic weight of each element, in g/mol.
+MONOISOTOPIC_MASSES : dict[str, float]
+    The mass of the most abundant isotope of each element, in Da.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+VALENCES = {
+    'H': 1, 'B': 3, 'C': 4, 'N': 3, 'O': 2, 'F': 1, 'Si': 4, 'P': 3,
+    'S': 2, 'Cl': 1, 'Se': 2, 'Br': 1, 'I': 1, 'Li': 1, 'Na': 1, 'K': 1,
+    'Mg': 2
+}
+
+MAX_VALENCES = {
+    'H': 1, 'B': 4, 'C': 4, 'N': 4, 'O': 3, 'F': 1, 'Si': 6, 'P': 6,
+    'S': 6, 'Cl': 7, 'Se': 6, 'Br': 5, 'I': 7, 'Li': 1, 'Na': 1, 'K': 1,
+    'Mg': 2
+}
+
+MASSES = {
+    'H': 1.008, 'B': 10.81, 'C': 12.011, 'N': 14.007, 'O': 15.999,
+    'F': 18.998, 'Si': 28.085, 'P': 30.974, 'S': 32.06, 'Cl': 35.45,
+    'Se': 78.971, 'Br': 79.904, 'I': 126.904, 'Li': 6.94, 'Na': 22.990,
+    'K': 39.098, 'Mg': 24.305
+}
+
+MONOISOTOPIC_MASSES = {
+    'H': 1.007825, 'B': 11.009305, 'C': 12.0, 'N': 14.003074,
+    'O': 15.994915, 'F': 18.998403, 'Si': 27.976927, 'P': 30.973762,
+    'S': 31.972071, 'Cl': 34.968853, 'Se': 79.916522, 'Br': 78.918338,
+    'I': 126.904473, 'Li': 7.016004, 'Na': 22.989770, 'K': 38.963707,
+    'Mg': 23.985042
+}
+
+LONE_PAIR_ELEMENTS = frozenset(
+    ['N', 'O', 'F', 'P', 'S', 'Cl', 'Se', 'Br', 'I']
+)
+
+
+def implied_charge(symbol, bond_order_sum):
+    """Work out the formal charge of an atom from its bonds.
+
+    Molecules don't store charges, so they are implied by the valence:
+    an oxygen with three bonds is an oxonium (+1) and one with a single
+    bond an oxide (-1).  Only elements with lone pairs are treated this
+    way, and a hydrogen with no bonds is a proton (+1).
+
+    Parameters
+    ----------
+    symbol : str
+        The element of the atom.
+    bond_order_sum : int
+        The sum of the orders of the atom's bonds.
+
+    Returns
+    -------
+    charge : int
+        The implied formal charge, or 0 if there is none.
+    """
+
+    if symbol in LONE_PAIR_ELEMENTS:
+        return bond_order_sum - VALENCES[symbol]
+    elif symbol == 'H' and bond_order_sum == 0:
+        return 1
+    return 0
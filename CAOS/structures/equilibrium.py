@@ -0,0 +1,467 @@
+"""Acid-base equilibria of many species at once.
+
+A species with ``n`` acidic protons exists in ``n + 1`` protonation
+states.  At a given pH, the ratio between successive states follows
+from the pKa of each step, so the fraction of every species in every
+state is a closed form that is computed for all species and all pH
+values with a few NumPy operations.
+
+If the pH isn't fixed (by a buffer, say), it is the one at which the
+charges of all species, of hydronium and of hydroxide balance.  The net
+charge only falls as the pH rises, so it has a single root, found with
+Newton's method for all solutions at once, falling back to bisection
+whenever a step leaves the bracket known to contain the root.
+
+States are numbered by the number of protons lost, starting from the
+fully protonated form.  Arrays of pKas have one row per species, with
+species that have fewer steps padded with NaN.
+
+Attributes
+----------
+PKW : float
+    The negative log of the ion product of water.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+import numpy as np
+
+from . import pka as _pka
+from ..compatibility import range
+from .elements import implied_charge
+
+PKW = 14.0
+
+_LN10 = np.log(10)
+_PH_BRACKET = (-10.0, 24.0)
+_MAX_STEP = 1.0
+_RESIDUAL = 1e-13
+
+
+def pka_table(pkas):
+    """Pad the pKas of several species into a single array.
+
+    Parameters
+    ----------
+    pkas : collection[float or collection[float]]
+        The pKa of each step of each species, starting from the most
+        protonated state (for a polyprotic acid, the most acidic step
+        first).  A single number is a species with one step.
+
+    Returns
+    -------
+    table : numpy.ndarray
+        Array with one row per species and one column per step, padded
+        with NaN.
+    """
+
+    rows = [np.atleast_1d(np.asarray(row, dtype=float)) for row in pkas]
+    width = max([len(row) for row in rows] + [1])
+    table = np.full((len(rows), width), np.nan)
+    for number, row in enumerate(rows):
+        table[number, :len(row)] = row
+    return table
+
+
+def _state_fractions(pkas, ph):
+    """Like `fractions`, with the states on the first axis.
+
+    Reductions over the states are then operations between contiguous
+    arrays, which is several times faster than reducing a short last
+    axis.
+    """
+
+    pkas = np.asarray(pkas, dtype=float)
+    ph = np.atleast_1d(np.asarray(ph, dtype=float))
+
+    # log10 of the weight of the state that has lost k protons is
+    # k * pH minus the sum of the first k pKas.  Missing steps make all
+    # the states after them impossible.
+    offsets = np.concatenate(
+        (np.zeros((len(pkas), 1)),
+         np.cumsum(np.where(np.isnan(pkas), np.inf, pkas), axis=1)),
+        axis=1
+    )
+    lost = np.arange(offsets.shape[1])
+    logs = (lost[:, None, None] * ph[None, :, None] -
+            offsets.T[:, None, :]) * _LN10
+    logs -= logs.max(axis=0)
+    weights = np.exp(logs)
+    weights /= weights.sum(axis=0)
+    return weights
+
+
+def fractions(pkas, ph):
+    """Compute the fraction of each species in each protonation state.
+
+    Parameters
+    ----------
+    pkas : array_like
+        The pKas of each species, as returned by `pka_table`.
+    ph : array_like
+        The pH values to evaluate at.
+
+    Returns
+    -------
+    fractions : numpy.ndarray
+        Array of shape ``(len(ph), len(pkas), steps + 1)``.  States a
+        species doesn't have get a fraction of 0.
+    """
+
+    return np.moveaxis(_state_fractions(pkas, ph), 0, 2)
+
+
+def _charge_balance(pkas, charges, totals, background, pkw, ph):
+    """The net charge of each solution, its derivative by pH, and the
+    size of the charges that cancel out in it."""
+
+    alpha = _state_fractions(pkas, ph)
+    mean = np.zeros(alpha.shape[1:])
+    square = np.zeros(alpha.shape[1:])
+    for lost in range(1, len(alpha)):
+        mean += lost * alpha[lost]
+        square += lost ** 2 * alpha[lost]
+    variance = square - mean ** 2
+
+    hydronium = 10.0 ** -ph
+    hydroxide = 10.0 ** (ph - pkw)
+    species = totals * (charges - mean)
+    net = species.sum(axis=1) + hydronium - hydroxide + background
+    scale = np.abs(species).sum(axis=1) + hydronium + hydroxide + \
+        np.abs(background)
+    slope = -_LN10 * (
+        (totals * variance).sum(axis=1) + hydronium + hydroxide
+    )
+    return net, slope, scale
+
+
+def solve_ph(pkas, charges, totals, background=0.0, pkw=PKW,
+             tolerance=1e-10, max_iterations=100):
+    """Find the pH of one or more solutions from their charge balance.
+
+    Parameters
+    ----------
+    pkas : array_like
+        The pKas of each species, as returned by `pka_table`.
+    charges : array_like
+        The charge of the fully protonated state of each species.
+    totals : array_like
+        The total concentration of each species, in mol/L.  A two
+        dimensional array holds one row per solution, and all solutions
+        are solved together.
+    background : Optional[array_like]
+        Net charge concentration of spectator ions in each solution,
+        such as the sodium of added sodium hydroxide.
+    pkw : Optional[float]
+        The ion product of water.
+    tolerance : Optional[float]
+        A solution is solved once its pH changes by less than this, or
+        its charges balance to within rounding errors.
+    max_iterations : Optional[int]
+        Stop after this many steps.
+
+    Returns
+    -------
+    ph : numpy.ndarray
+        The pH of each solution.
+    """
+
+    pkas = np.asarray(pkas, dtype=float)
+    charges = np.asarray(charges, dtype=float)
+    totals = np.atleast_2d(np.asarray(totals, dtype=float))
+    points = np.broadcast(totals[:, 0], np.asarray(background)).size
+    totals = np.broadcast_to(totals, (points, len(pkas)))
+    background = np.broadcast_to(
+        np.asarray(background, dtype=float), (points,)
+    )
+
+    low = np.full(points, _PH_BRACKET[0])
+    high = np.full(points, _PH_BRACKET[1])
+    ph = np.full(points, pkw / 2)
+    # Only the solutions that haven't converged yet are evaluated.
+    active = np.arange(points)
+    for _ in range(max_iterations):
+        current = ph[active]
+        net, slope, scale = _charge_balance(
+            pkas, charges, totals[active], background[active], pkw, current
+        )
+        # The net charge falls with pH, so a positive one means the
+        # root is above the current guess.
+        above = net > 0
+        low[active] = np.where(above, current, low[active])
+        high[active] = np.where(above, high[active], current)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = current - np.clip(net / slope, -_MAX_STEP, _MAX_STEP)
+        outside = ~((step > low[active]) & (step < high[active]))
+        step = np.where(outside, (low[active] + high[active]) / 2, step)
+        # Rounding errors in the net charge limit the precision of the
+        # steps where the charge barely depends on pH.
+        balanced = np.abs(net) <= _RESIDUAL * scale
+        ph[active] = np.where(balanced, current, step)
+        settled = balanced | (np.abs(step - current) < tolerance)
+        active = active[~settled]
+        if not len(active):
+            break
+    return ph
+
+
+def _charge(molecule):
+    return sum(
+        implied_charge(
+            molecule.atoms[atom_id],
+            molecule.degree(atom_id, weight='order') +
+            molecule.hydrogen_count(atom_id)
+        ) for atom_id in molecule
+    )
+
+
+class _Site(object):
+    """How a reactant gains and loses protons.
+
+    Every basic atom of a reactant can gain a proton and every acidic
+    atom lose one; the estimates hold for the first proton an atom
+    gains or loses, so equivalent hydrogens on one atom make a single
+    step rather than one each at the same pKa.  The steps are taken in
+    order of pKa, so the state that has lost ``k`` protons has lost
+    those of the ``k`` most acidic steps and holds one at every other
+    site.  The given form has all of its acidic protons and none at its
+    basic sites, so it has the charge of the state numbered by its
+    basic sites, though that state may put the protons elsewhere (as in
+    a zwitterion).
+
+    Parameters
+    ----------
+    acceptors : dict[str, float]
+        The pKa of the conjugate acid of each basic atom.
+    donors : dict[str, float]
+        The pKa of each acidic site, at most one per atom, see
+        `CAOS.structures.pka`.
+    """
+
+    def __init__(self, acceptors, donors):
+        self._steps = sorted(
+            [(value, False, atom_id) for atom_id, value in acceptors.items()] +
+            [(value, True, atom_id) for atom_id, value in donors.items()]
+        )
+        self.pkas = [value for value, _, _ in self._steps]
+        self.given = len(acceptors)
+
+    def changes(self, state):
+        """The atoms that gain a proton and the sites that lose one to
+        turn the given form into a state."""
+
+        gained = [atom_id for _, donor, atom_id in self._steps[state:]
+                  if not donor]
+        lost = [atom_id for _, donor, atom_id in self._steps[:state]
+                if donor]
+        return gained, lost
+
+
+def _titratable(pkas):
+    """Leave out the steps outside the range of pH searched by
+    `solve_ph`, which are never titrated."""
+
+    return dict(
+        (atom_id, value) for atom_id, value in pkas.items()
+        if _PH_BRACKET[0] <= value <= _PH_BRACKET[1]
+    )
+
+
+def _one_per_atom(reactant, acidic):
+    """Keep the most acidic hydrogen of each atom.
+
+    Hydrogens on the same atom are equivalent, and once one is lost the
+    estimate no longer holds for the rest (NH4+ loses one proton at pH
+    9.25, not four).
+    """
+
+    kept = {}
+    for site_id, value in sorted(acidic.items(),
+                                 key=lambda item: (item[1], item[0])):
+        atom_id = site_id
+        if reactant.atoms[site_id] == 'H':
+            atom_id = next(iter(reactant[site_id]), site_id)
+        kept.setdefault(atom_id, (site_id, value))
+    return dict(kept.values())
+
+
+def _titration_sites(reactants, conditions):
+    """Work out the `_Site` of each reactant."""
+
+    given_pkas = conditions.get('pkas', {})
+    given_points = conditions.get('pka_points', {})
+    sites = [None] * len(reactants)
+    missing = []
+    for position, reactant in enumerate(reactants):
+        id_ = getattr(reactant, 'id', None)
+        if id_ in given_pkas and id_ in given_points:
+            step = {given_points[id_]: given_pkas[id_]}
+            if reactant.atoms[given_points[id_]] == 'H':
+                sites[position] = _Site({}, step)
+            else:
+                sites[position] = _Site(step, {})
+        else:
+            missing.append(position)
+
+    estimates = _pka.estimate_many(reactants[position] for position in missing)
+    for position, estimate in zip(missing, estimates):
+        if not estimate.acidic and not estimate.basic:
+            raise ValueError("Reactant {} has no acidic or basic site.".format(
+                getattr(reactants[position], 'id', position)
+            ))
+        sites[position] = _Site(
+            _titratable(estimate.basic),
+            _one_per_atom(reactants[position], _titratable(estimate.acidic))
+        )
+    return sites
+
+
+class Speciation(object):
+    """The equilibrium composition of a set of acid-base pairs.
+
+    Every reactant is one species that can gain a proton at each of its
+    basic sites and lose one from each of its acidic sites, so a species
+    with ``n`` such sites has ``n + 1`` states, 0 being the most
+    protonated one.  Sites with an estimated pKa outside the range of
+    pH searched by `solve_ph` are left out.
+
+    Attributes
+    ----------
+    reactants : list[Molecule]
+        The species, as given.
+    pkas : numpy.ndarray
+        The pKas of the steps of each species, see `pka_table`.
+    ph : numpy.ndarray
+        The pH of each solution (or point of a pH sweep).
+    fractions : numpy.ndarray
+        Fraction of each species in each state, of shape
+        ``(len(ph), len(reactants), steps + 1)``.
+    totals : numpy.ndarray
+        Total concentration of each species, with one row per pH value.
+    """
+
+    def __init__(self, reactants, sites, ph, totals):
+        self.reactants = reactants
+        self.pkas = pka_table([site.pkas for site in sites])
+        self.ph = ph
+        self.totals = totals
+        self.fractions = fractions(self.pkas, ph)
+        self._sites = sites
+        self._forms = {}
+
+    @property
+    def concentrations(self):
+        """The concentration of every state of every species."""
+
+        return self.fractions * self.totals[:, :, None]
+
+    def form(self, species, state):
+        """Build (once) the molecule of a species in a given state.
+
+        Parameters
+        ----------
+        species : int
+            The position of the species among the reactants.
+        state : int
+            The number of protons lost from the most protonated state.
+
+        Returns
+        -------
+        form : Molecule
+        """
+
+        key = (species, state)
+        if key not in self._forms:
+            form = deepcopy(self.reactants[species])
+            gained, lost = self._sites[species].changes(state)
+            for atom_id in gained:
+                form._add_hydrogen(atom_id)
+            for site_id in lost:
+                form._remove_hydrogen(site_id)
+            self._forms[key] = form
+        return self._forms[key]
+
+    def products(self, point=0, cutoff=0.0):
+        """The forms present at one pH, weighted by their abundance.
+
+        Parameters
+        ----------
+        point : Optional[int]
+            Which of the pH values to use.
+        cutoff : Optional[float]
+            Forms with a concentration at or below this are left out.
+
+        Returns
+        -------
+        products : list[tuple[Molecule, float]]
+            Each form present with its concentration, most abundant
+            first.  Forms are only built for the states that are
+            present.
+        """
+
+        concentrations = self.concentrations[point]
+        present = np.argwhere(concentrations > cutoff)
+        order = np.argsort(
+            -concentrations[present[:, 0], present[:, 1]], kind='mergesort'
+        )
+        return [
+            (self.form(species, state),
+             float(concentrations[species, state]))
+            for species, state in present[order].tolist()
+        ]
+
+
+def speciate(reactants, conditions, ph=None):
+    """Compute the equilibrium speciation of the reactants.
+
+    Parameters
+    ----------
+    reactants : list[Molecule]
+        The species in solution.
+    conditions : dict
+        The conditions of the reaction.  A pKa and pKa point given for
+        a reactant in ``'pkas'`` and ``'pka_points'`` (keyed by reactant
+        ``id``, like for the ``pka`` requirement) is its only step, as
+        an acid if the point is a hydrogen and as a base otherwise.
+        Other reactants are estimated with `CAOS.structures.pka`.
+        Total concentrations (a number or an array with one value per
+        pH point) come from ``'concentrations'`` and default to 1 mol/L.
+        ``'ph'`` fixes the pH, and ``'background_charge'`` is passed to
+        `solve_ph` if it isn't.
+    ph : Optional[array_like]
+        The pH values to evaluate at, taking precedence over the
+        conditions.  If neither gives one, the pH is found from the
+        charge balance.
+
+    Returns
+    -------
+    speciation : Speciation
+    """
+
+    reactants = list(reactants)
+    sites = _titration_sites(reactants, conditions)
+
+    given = conditions.get('concentrations', {})
+    totals = np.stack(np.broadcast_arrays(*[
+        np.atleast_1d(np.asarray(
+            given.get(getattr(reactant, 'id', None), 1.0), dtype=float
+        )) for reactant in reactants
+    ]), axis=1)
+
+    if ph is None:
+        ph = conditions.get('ph')
+    if ph is None:
+        charges = np.array([
+            _charge(reactant) + site.given
+            for reactant, site in zip(reactants, sites)
+        ], dtype=float)
+        ph = solve_ph(
+            pka_table([site.pkas for site in sites]), charges, totals,
+            conditions.get('background_charge', 0.0)
+        )
+    ph = np.atleast_1d(np.asarray(ph, dtype=float))
+    totals = np.broadcast_to(totals, (len(ph), len(reactants)))
+    return Speciation(reactants, sites, ph, totals)
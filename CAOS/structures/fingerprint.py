@@ -0,0 +1,454 @@
+"""Circular fingerprints and similarity search over molecule libraries.
+
+A fingerprint is a fixed size bit array with one bit set for every
+distinct atom environment of a molecule, up to some radius (in the
+manner of ECFP).  The environments are the labels of
+`canonical.environment_labels`, so fingerprints don't depend on atom
+ids and are stable between processes.  Fingerprints are packed eight
+bits to a byte, one row per molecule, and compared with the Tanimoto
+coefficient: the number of bits two fingerprints share over the number
+of bits set in either.
+
+A `FingerprintIndex` keeps the fingerprints of a library and answers
+"the most similar molecules to this one" queries.  Scores are computed
+with a few array operations per block of rows, counting bits with a
+lookup table over 16 bit words; for threshold queries, rows whose
+number of bits alone rules them out are skipped.  An index can be
+stored in a directory and appended to; stored fingerprints are memory
+mapped rather than read, so opening a large index is cheap.
+
+Hydrogens count like any other atom, so the implicit and explicit forms
+of a molecule (see `Molecule.to_implicit`) have different fingerprints;
+compare molecules in the same form.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import json
+import os
+
+import numpy as np
+
+from .canonical import label_arrays
+
+DEFAULT_RADIUS = 2
+DEFAULT_SIZE = 2048
+
+_INDEX_VERSION = 1
+_META = 'index.json'
+_FINGERPRINTS = 'fingerprints.bin'
+_KEYS = 'keys.jsonl'
+# Molecules fingerprinted per batch, and rows scored per block.
+_BATCH = 4096
+_BLOCK = 1 << 16
+
+_WORDS = np.arange(1 << 16, dtype=np.uint32)
+_POPCOUNT = np.zeros(1 << 16, dtype=np.uint8)
+for _bit in range(16):
+    _POPCOUNT += ((_WORDS >> _bit) & 1).astype(np.uint8)
+del _WORDS, _bit
+
+
+def _check_size(size):
+    if size <= 0 or size % 64:
+        raise ValueError(
+            "Fingerprint size must be a positive multiple of 64, "
+            "not {}.".format(size)
+        )
+
+
+def _cache_key(radius, size):
+    return 'fingerprint_{}_{}'.format(radius, size)
+
+
+def popcounts(fingerprints):
+    """Count the bits set in each row of packed fingerprints.
+
+    Parameters
+    ----------
+    fingerprints : numpy.ndarray
+        Array of ``uint8`` with one fingerprint per row, or a single
+        fingerprint.
+
+    Returns
+    -------
+    counts : numpy.ndarray or int
+    """
+
+    fingerprints = np.ascontiguousarray(fingerprints, dtype=np.uint8)
+    words = fingerprints.view(np.uint16)
+    return _POPCOUNT[words].sum(axis=-1, dtype=np.int32)
+
+
+def fingerprints(molecules, radius=DEFAULT_RADIUS, size=DEFAULT_SIZE):
+    """Compute the fingerprints of many molecules in one batch.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+        The molecules.  Fingerprints are cached on each molecule.
+    radius : Optional[int]
+        The largest environment radius included.
+    size : Optional[int]
+        The number of bits, a multiple of 64.
+
+    Returns
+    -------
+    fingerprints : numpy.ndarray
+        Array of ``uint8`` with shape ``(len(molecules), size // 8)``.
+    """
+
+    _check_size(size)
+    key = _cache_key(radius, size)
+    molecules = list(molecules)
+    missing = [
+        molecule for molecule in molecules
+        if key not in (molecule._cache or {})
+    ]
+    for start in range(0, len(missing), _BATCH):
+        batch = missing[start:start + _BATCH]
+        owners, labels = label_arrays(batch, radius)
+        bits = np.zeros((len(batch), size), dtype=bool)
+        for current in labels:
+            positions = current % np.uint64(size)
+            bits[owners, positions.astype(np.intp)] = True
+        for molecule, row in zip(batch, np.packbits(bits, axis=1)):
+            molecule._cached(key, lambda _: row)
+
+    result = np.empty((len(molecules), size // 8), dtype=np.uint8)
+    for number, molecule in enumerate(molecules):
+        result[number] = molecule._cache[key]
+    return result
+
+
+def fingerprint(molecule, radius=DEFAULT_RADIUS, size=DEFAULT_SIZE):
+    """Compute the fingerprint of a molecule.  See `fingerprints`."""
+
+    return fingerprints([molecule], radius, size)[0]
+
+
+def tanimoto(query, fingerprints):
+    """The Tanimoto similarity of a fingerprint to many others.
+
+    Parameters
+    ----------
+    query : numpy.ndarray
+        A packed fingerprint.
+    fingerprints : numpy.ndarray
+        Packed fingerprints of the same size, one per row.
+
+    Returns
+    -------
+    similarities : numpy.ndarray
+        One value between 0 and 1 per row.  Two empty fingerprints have
+        a similarity of 0.
+    """
+
+    query = np.asarray(query, dtype=np.uint8)
+    fingerprints = np.asarray(fingerprints, dtype=np.uint8)
+    return _scores(query, int(popcounts(query)), fingerprints,
+                   popcounts(fingerprints))
+
+
+def _scores(query, query_count, rows, counts):
+    common = popcounts(rows & query)
+    union = counts + query_count - common
+    return np.where(union > 0, common / np.maximum(union, 1), 0.0)
+
+
+def _top(scores, k):
+    """The positions of the `k` best scores, the first ones among
+    equals, in order."""
+
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    return np.sort(np.concatenate([above, ties]))
+
+
+class FingerprintIndex(object):
+    """The fingerprints of a library of molecules, for similarity search.
+
+    Parameters
+    ----------
+    path : Optional[str]
+        A directory to store the index in.  If it already holds an
+        index, that index is opened and molecules added later are
+        appended to it; otherwise a new one is created there.  Without
+        a path the index is only kept in memory.
+    radius, size : Optional[int]
+        The fingerprint settings, see `fingerprints`.  They default to
+        those of the stored index, if any.
+
+    Raises
+    ------
+    ValueError
+        If `radius` or `size` differ from those of the stored index.
+
+    Examples
+    --------
+    >>> from CAOS.structures.molecule import Molecule
+    >>> water = Molecule(
+    ...     {'a1': 'H', 'a2': 'H', 'a3': 'O'},
+    ...     {'b1': {'nodes': ('a1', 'a3'), 'order': 1},
+    ...      'b2': {'nodes': ('a2', 'a3'), 'order': 1}}
+    ... )
+    >>> index = FingerprintIndex()
+    >>> index.add([water], keys=['water'])
+    >>> index.search(water, k=1)
+    [('water', 1.0)]
+    """
+
+    def __init__(self, path=None, radius=None, size=None):
+        self.path = path
+        self.keys = []
+        # Pairs of (fingerprints, bit counts), the first one possibly
+        # memory mapped from disk.
+        self._chunks = []
+        self._keys_size = 0
+
+        meta = self._read_meta() if path is not None else None
+        if meta is not None:
+            for name, value in (('radius', radius), ('size', size)):
+                if value is not None and value != meta[name]:
+                    raise ValueError(
+                        "The index at {} has {} {}, not {}.".format(
+                            path, name, meta[name], value
+                        )
+                    )
+            radius, size = meta['radius'], meta['size']
+        self.radius = DEFAULT_RADIUS if radius is None else radius
+        self.size = DEFAULT_SIZE if size is None else size
+        _check_size(self.size)
+
+        if meta is not None:
+            self._open(meta)
+        elif path is not None:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self._write_meta(0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file(_META)) as meta_file:
+                meta = json.load(meta_file)
+        except (IOError, OSError):
+            return None
+        if meta.get('version') != _INDEX_VERSION:
+            raise ValueError(
+                "The index at {} has an unknown version.".format(self.path)
+            )
+        return meta
+
+    def _write_meta(self, count):
+        # Written last, and atomically: rows past the recorded count
+        # are the remains of an interrupted append, and are dropped.
+        meta = {
+            'version': _INDEX_VERSION,
+            'radius': self.radius,
+            'size': self.size,
+            'count': count,
+            'keys_size': self._keys_size,
+        }
+        path = self._file(_META)
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'w') as meta_file:
+            json.dump(meta, meta_file, indent=1, sort_keys=True)
+        os.rename(temporary, path)
+
+    def _open(self, meta):
+        count = meta['count']
+        self._keys_size = meta['keys_size']
+        if count:
+            with open(self._file(_KEYS), 'rb') as keys_file:
+                lines = keys_file.read(self._keys_size).decode('utf-8')
+            self.keys = [json.loads(line) for line in lines.splitlines()]
+            stored = np.memmap(
+                self._file(_FINGERPRINTS), dtype=np.uint8, mode='r',
+                shape=(count, self.size // 8)
+            )
+            self._chunks.append((stored, None))
+
+    def add(self, molecules, keys=None):
+        """Add the fingerprints of molecules to the index.
+
+        Parameters
+        ----------
+        molecules : collection[Molecule]
+            The molecules.
+        keys : Optional[collection]
+            What queries return for each molecule.  Stored indexes
+            need keys that can be written as JSON.  Defaults to the
+            ``id`` of each molecule if it has one, and its position in
+            the index otherwise.
+        """
+
+        molecules = list(molecules)
+        if keys is None:
+            keys = [
+                getattr(molecule, 'id', len(self) + number)
+                for number, molecule in enumerate(molecules)
+            ]
+        self.add_fingerprints(
+            fingerprints(molecules, self.radius, self.size), keys
+        )
+
+    def add_fingerprints(self, rows, keys):
+        """Add precomputed fingerprints to the index.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Packed fingerprints with the settings of the index, one per
+            row.
+        keys : collection
+            The key of each row, see `add`.
+        """
+
+        rows = np.ascontiguousarray(rows, dtype=np.uint8)
+        keys = list(keys)
+        if rows.shape != (len(keys), self.size // 8):
+            raise ValueError(
+                "Expected {} fingerprints of {} bytes, got an array of "
+                "shape {}.".format(len(keys), self.size // 8, rows.shape)
+            )
+        if not keys:
+            return
+        if self.path is not None:
+            self._append(rows, keys)
+        self._chunks.append((rows, popcounts(rows)))
+        self.keys.extend(keys)
+
+    def _append(self, rows, keys):
+        lines = ''.join(
+            json.dumps(key) + '\n' for key in keys
+        ).encode('utf-8')
+        for name, offset, data in (
+                (_FINGERPRINTS, len(self.keys) * (self.size // 8),
+                 rows.tobytes()),
+                (_KEYS, self._keys_size, lines)):
+            mode = 'r+b' if os.path.exists(self._file(name)) else 'wb'
+            with open(self._file(name), mode) as stored:
+                stored.seek(offset)
+                stored.truncate()
+                stored.write(data)
+        self._keys_size += len(lines)
+        self._write_meta(len(self.keys) + len(keys))
+
+    def _blocks(self):
+        """Iterate over ``(first row, fingerprints, counts)`` blocks."""
+
+        offset = 0
+        for number, (rows, counts) in enumerate(self._chunks):
+            if counts is None:
+                counts = popcounts(rows)
+                self._chunks[number] = (rows, counts)
+            for start in range(0, len(rows), _BLOCK):
+                yield (offset + start, rows[start:start + _BLOCK],
+                       counts[start:start + _BLOCK])
+            offset += len(rows)
+
+    def _query(self, query):
+        if not isinstance(query, np.ndarray):
+            query = fingerprint(query, self.radius, self.size)
+        if query.shape != (self.size // 8,):
+            raise ValueError(
+                "Expected a fingerprint of {} bytes, got an array of shape "
+                "{}.".format(self.size // 8, query.shape)
+            )
+        return query.astype(np.uint8), int(popcounts(query))
+
+    def similarities(self, query):
+        """The similarity of a molecule to every molecule of the index.
+
+        Parameters
+        ----------
+        query : Molecule or numpy.ndarray
+            A molecule, or its fingerprint.
+
+        Returns
+        -------
+        similarities : numpy.ndarray
+            The Tanimoto similarity to each molecule, in the order they
+            were added.
+        """
+
+        query, query_count = self._query(query)
+        result = np.zeros(len(self), dtype=float)
+        for start, rows, counts in self._blocks():
+            result[start:start + len(rows)] = _scores(
+                query, query_count, rows, counts
+            )
+        return result
+
+    def search(self, query, k=10, threshold=0.0):
+        """Find the molecules most similar to a molecule.
+
+        Parameters
+        ----------
+        query : Molecule or numpy.ndarray
+            A molecule, or its fingerprint.
+        k : Optional[int]
+            The number of results.  ``None`` gives every molecule above
+            the threshold.
+        threshold : Optional[float]
+            Only molecules with a similarity of at least this much are
+            returned.
+
+        Returns
+        -------
+        results : list[tuple[object, float]]
+            The keys of the molecules and their similarity, most similar
+            first (and in the order they were added among equals).
+        """
+
+        if k is not None and k <= 0:
+            return []
+        query, query_count = self._query(query)
+        # A row with c bits set has a similarity of at most
+        # min(c, q) / max(c, q) to a query with q bits set.
+        if threshold > 0:
+            low = threshold * query_count
+            high = query_count / threshold
+        positions = []
+        scores = []
+        for start, rows, counts in self._blocks():
+            if threshold > 0:
+                candidates = np.flatnonzero((counts >= low) & (counts <= high))
+                block = _scores(
+                    query, query_count, rows[candidates], counts[candidates]
+                )
+            else:
+                candidates = np.arange(len(rows))
+                block = _scores(query, query_count, rows, counts)
+            keep = block >= threshold
+            candidates, block = candidates[keep], block[keep]
+            if k is not None and len(block) > k:
+                best = _top(block, k)
+                candidates, block = candidates[best], block[best]
+            positions.append(candidates + start)
+            scores.append(block)
+
+        if not positions:
+            return []
+        positions = np.concatenate(positions)
+        scores = np.concatenate(scores)
+        order = np.lexsort((positions, -scores))[:k]
+        keys = self.keys
+        return [
+            (keys[position], score) for position, score in
+            zip(positions[order].tolist(), scores[order].tolist())
+        ]
+
+    def __repr__(self):
+        return "FingerprintIndex({} molecules, radius={}, size={}{})".format(
+            len(self), self.radius, self.size,
+            '' if self.path is None else ', path={!r}'.format(self.path)
+        )
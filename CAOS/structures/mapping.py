@@ -0,0 +1,318 @@
+"""Maps from the atoms of products to the atoms of reactants.
+
+Mechanisms record where atoms go as they edit the reactants (see
+`Molecule.changes` and `CAOS.delta.ReactionDelta.atom_map`).  For
+reactions that weren't produced by a mechanism, `map_atoms` finds a map
+without general subgraph isomorphism:
+
+1. Atoms are labelled by their environment (`canonical.environment_labels`),
+   starting with a large radius.  A product atom is only matched to a
+   reactant atom with the same label, so it has the same surroundings
+   up to that radius; away from the reaction center most atoms are
+   matched this way.
+2. The matching is constrained by the atoms already matched: a product
+   atom next to matched atoms is matched to a neighbor of their images
+   if possible, so equivalent atoms are matched consistently.  Atoms
+   with nothing to be consistent with go to the candidate whose free
+   neighbors best fit their own unmatched neighbors.
+3. The radius is lowered one step at a time, down to 0, where only the
+   elements have to agree, to match the atoms near the reaction center.
+
+Each step costs time proportional to the number of atoms and bonds.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from collections import Counter, deque
+
+import six
+
+from .canonical import environment_labels
+
+_DEFAULT_RADIUS = 3
+
+
+class AtomMap(object):
+    """Where the atoms of each product come from.
+
+    Parameters
+    ----------
+    products : sequence[mapping[str -> tuple[int, str]]]
+        For every product, a mapping from its atom ids to the position
+        of a reactant and the id of an atom in it.  Atoms without an
+        origin are left out.
+    """
+
+    def __init__(self, products):
+        self.products = [dict(atoms) for atoms in products]
+
+    def __getitem__(self, key):
+        product, atom = key
+        return self.products[product][atom]
+
+    def get(self, key, default=None):
+        """The origin of ``(product position, atom id)``, if any."""
+
+        try:
+            return self[key]
+        except (KeyError, IndexError):
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return sum(len(atoms) for atoms in self.products)
+
+    def __iter__(self):
+        for number, atoms in enumerate(self.products):
+            for atom in atoms:
+                yield number, atom
+
+    def items(self):
+        """Pairs of ``((product, atom), (reactant, atom))``."""
+
+        return [
+            ((number, atom), origin)
+            for number, atoms in enumerate(self.products)
+            for atom, origin in six.iteritems(atoms)
+        ]
+
+    def inverse(self):
+        """Map the atoms of the reactants to those of the products.
+
+        Returns
+        -------
+        inverse : dict[tuple[int, str], tuple[int, str]]
+            Mapping from ``(reactant, atom)`` to ``(product, atom)``.
+        """
+
+        return dict((origin, key) for key, origin in self.items())
+
+    def __eq__(self, other):
+        return isinstance(other, AtomMap) and self.products == other.products
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_dict(self):
+        """A JSON serializable representation."""
+
+        return [
+            dict((atom, list(origin)) for atom, origin in six.iteritems(atoms))
+            for atoms in self.products
+        ]
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a map from `to_dict`."""
+
+        return cls([
+            dict((atom, tuple(origin))
+                 for atom, origin in six.iteritems(atoms))
+            for atoms in data
+        ])
+
+    def __repr__(self):
+        return "AtomMap({})".format(self.products)
+
+
+class _Matcher(object):
+    """The state of `map_atoms` as the radius is lowered.
+
+    Parameters
+    ----------
+    reactants, products : list[Molecule]
+    partial : Optional[AtomMap]
+    """
+
+    def __init__(self, reactants, products, partial):
+        self.reactants = reactants
+        self.products = products
+        self.maps = [{} for _ in products]
+        if partial is not None:
+            for number, atoms in enumerate(partial.products[:len(products)]):
+                self.maps[number].update(atoms)
+        self.used = set(
+            origin for atoms in self.maps for origin in six.itervalues(atoms)
+        )
+
+    def seed(self, radius):
+        """Label the atoms at `radius`, and pool the free reactant atoms
+        by label.
+
+        Returns
+        -------
+        left : bool
+            Whether any reactant atom is still free.
+        """
+
+        self.reactant_labels = [
+            environment_labels(reactant, radius)
+            for reactant in self.reactants
+        ]
+        self.product_labels = [
+            None if product is None else environment_labels(product, radius)
+            for product in self.products
+        ]
+        self.pools = {}
+        for number, reactant in enumerate(self.reactants):
+            labels = self.reactant_labels[number]
+            for atom in sorted(reactant):
+                if (number, atom) not in self.used:
+                    self.pools.setdefault(labels[atom], []).append(
+                        (number, atom)
+                    )
+        return bool(self.pools)
+
+    def _pending(self):
+        # Atoms with rare labels are matched first, since their partners
+        # are the least ambiguous.
+        return deque(sorted(
+            ((number, atom)
+             for number, product in enumerate(self.products)
+             if product is not None
+             for atom in product
+             if atom not in self.maps[number] and
+             self.product_labels[number][atom] in self.pools),
+            key=lambda key: (
+                len(self.pools[self.product_labels[key[0]][key[1]]]), key
+            )
+        ))
+
+    def propagate(self, last):
+        """Match the atoms whose label has free reactant atoms, spreading
+        out from each match to its neighbors.
+
+        Parameters
+        ----------
+        last : bool
+            Whether this is the last radius, where atoms that can't be
+            matched consistently with their neighbors are matched anyway
+            (see `fallback`).
+        """
+
+        pending = self._pending()
+        while pending:
+            number, atom = pending.popleft()
+            if atom in self.maps[number]:
+                continue
+            label = self.product_labels[number][atom]
+            origin, anchored = self.consistent(number, atom, label)
+            if origin is None and (last or not anchored):
+                # Nothing to be consistent with (yet), or the last
+                # chance to match the atom at all.
+                origin = self.fallback(number, atom, label)
+            if origin is None:
+                continue
+            self.maps[number][atom] = origin
+            self.used.add(origin)
+            pending.extendleft(
+                (number, neighbor)
+                for neighbor in self.products[number].adj[atom]
+                if neighbor not in self.maps[number]
+            )
+
+    def consistent(self, number, atom, label):
+        """A free reactant atom with the label, bonded to the images of
+        as many matched neighbors of `atom` as possible (ties going to
+        the best `fit`), and whether `atom` has matched neighbors at
+        all."""
+
+        votes = {}
+        anchored = False
+        for neighbor in self.products[number].adj[atom]:
+            origin = self.maps[number].get(neighbor)
+            if origin is None:
+                continue
+            anchored = True
+            reactant, image = origin
+            labels = self.reactant_labels[reactant]
+            for candidate in self.reactants[reactant].adj[image]:
+                key = (reactant, candidate)
+                if key not in self.used and labels[candidate] == label:
+                    votes[key] = votes.get(key, 0) + 1
+        if not votes:
+            return None, anchored
+        return max(sorted(votes), key=lambda key: (
+            votes[key], self.fit(number, atom, key)
+        )), anchored
+
+    def fallback(self, number, atom, label):
+        """The free reactant atom with the label that best `fit`s
+        `atom`.  Ties go to the first atom in id order."""
+
+        pool = self.pools[label]
+        pool[:] = [key for key in pool if key not in self.used]
+        if not pool:
+            return None
+        return max(pool, key=lambda key: self.fit(number, atom, key))
+
+    def fit(self, number, atom, key):
+        """How well the free neighbors of a reactant atom match the
+        unmatched neighbors of a product atom, so that the bonds still
+        to be matched around it can be kept.
+
+        Returns
+        -------
+        fit : tuple[int, int]
+            The number of those neighbors whose labels pair up, and
+            minus the difference in degree.
+        """
+
+        product = self.products[number]
+        labels = self.product_labels[number]
+        wanted = Counter(
+            labels[neighbor] for neighbor in product.adj[atom]
+            if neighbor not in self.maps[number]
+        )
+        reactant, candidate = key
+        reactant_labels = self.reactant_labels[reactant]
+        adjacency = self.reactants[reactant].adj[candidate]
+        offered = Counter(
+            reactant_labels[neighbor] for neighbor in adjacency
+            if (reactant, neighbor) not in self.used
+        )
+        return (sum(six.itervalues(offered & wanted)),
+                -abs(len(adjacency) - len(product.adj[atom])))
+
+
+def map_atoms(reactants, products, partial=None, radius=_DEFAULT_RADIUS):
+    """Map the atoms of products to the atoms of reactants.
+
+    Parameters
+    ----------
+    reactants : sequence[Molecule]
+        The reactants.
+    products : sequence[Optional[Molecule]]
+        The products; ``None`` entries are skipped.
+    partial : Optional[AtomMap]
+        Origins that are already known, which are kept.
+    radius : Optional[int]
+        The largest environment radius compared.
+
+    Returns
+    -------
+    atom_map : AtomMap
+        The map.  Every product atom is mapped as long as the reactants
+        have an unmapped atom of the same element left.
+
+    Notes
+    -----
+    The map is heuristic: it keeps atoms whose environments didn't
+    change together, which for reactions changing a few bonds gives the
+    map with the fewest bonds broken and formed in all but contrived
+    cases.  Each atom is matched greedily, to the candidate bonded to
+    the images of the most matched neighbors, or failing that to the
+    one whose free neighbors best fit its unmatched ones; choices are
+    never revisited, so there is no guarantee of a minimal map when
+    several symmetric centers change at once.
+    """
+
+    matcher = _Matcher(list(reactants), list(products), partial)
+    for current in range(radius, -1, -1):
+        if not matcher.seed(current):
+            break
+        matcher.propagate(last=current == 0)
+    return AtomMap(matcher.maps)
@@ -1,8 +1,22 @@
-"""Classes and functions associated with default molecule objects."""
+"""Classes and functions associated with default molecule objects.
+
+Hydrogens are normally explicit atoms, like any other.  A molecule can
+instead keep them as counts on the atoms they are bonded to (see
+`Molecule.to_implicit`), which usually more than halves the size of the
+graph; `Molecule.to_explicit` builds the explicit form again when it is
+needed.
+
+The formula, masses, bond order sums and formal charges of a molecule
+are summarized the first time one of them is asked for, and the summary
+is then updated by every change to the molecule rather than rebuilt, so
+checking them after each step of a mechanism costs O(1) per query.
+"""
 
 from __future__ import print_function, division, unicode_literals, \
     absolute_import
 
+from contextlib import contextmanager
+from copy import deepcopy
 import json
 
 import networkx as nx
@@ -11,6 +25,8 @@ import six
 
 from .. import logger
 from ..compatibility import range
+from .elements import MASSES, MONOISOTOPIC_MASSES, implied_charge
+from .rings import ring_info
 
 
 class Molecule(nx.Graph):
@@ -117,7 +133,7 @@ class Molecule(nx.Graph):
         for id_, symbol in six.iteritems(atom_dict):
             self._add_node(id_, symbol)
 
-    def _add_node(self, id_, atomic_symbol):
+    def _add_node(self, id_, atomic_symbol, origin=None):
         """Add a node (atom) to the molecule.
 
         Parameters
@@ -126,6 +142,11 @@ class Molecule(nx.Graph):
             Id of this atom.
         atomic_symbol : str
             Symbol associated with this atom (i.e. 'H' for Hydrogen).
+        origin : Optional[tuple[Molecule, str]]
+            The molecule and id of the atom this one was moved from, if
+            any.  Inside a transaction it is reported by `changes`, so
+            mechanisms moving atoms between molecules keep track of
+            them.
 
         Raises
         ------
@@ -141,6 +162,10 @@ class Molecule(nx.Graph):
         else:
             self.add_node(id_, {'symbol': atomic_symbol})
             self.atoms[id_] = atomic_symbol
+            if self._summary is not None:
+                self._summary.add_atom(self, id_)
+            self._record('_undo_add_node', id_, origin)
+            self._invalidate()
 
     _bonds = None
 
@@ -197,6 +222,13 @@ class Molecule(nx.Graph):
             raise KeyError(message)
         else:
             first, second = bond['nodes']
+            # Bonding a pair that is already bonded overwrites the data
+            # of its edge, which has to be put back on rollback.
+            previous = None
+            if self.has_edge(first, second):
+                previous = dict(self.adj[first][second])
+                if self._summary is not None:
+                    self._summary.remove_bond(self, first, second)
             self.add_edge(
                 first, second,
                 dict((key, value)
@@ -204,6 +236,569 @@ class Molecule(nx.Graph):
                      if key != 'nodes')
             )
             self.bonds[id_] = bond
+            if self._summary is not None:
+                self._summary.add_bond(self, first, second)
+            self._record('_undo_add_edge', id_, first, second, previous)
+            self._invalidate()
+
+    _implicit = False
+
+    @property
+    def implicit_hydrogens(self):
+        """Whether hydrogens gained by the molecule become counts.
+
+        Set for the molecules built by `to_implicit`.  Hydrogens already
+        explicit are left as they are either way.
+        """
+
+        return self._implicit
+
+    def hydrogen_count(self, atom_id):
+        """The number of implicit hydrogens on an atom.
+
+        Parameters
+        ----------
+        atom_id : str
+            The id of the atom.
+
+        Returns
+        -------
+        count : int
+            The hydrogens the atom carries as a count, not counting
+            explicit hydrogen neighbors.
+        """
+
+        return self.node[atom_id].get('hydrogens', 0)
+
+    def total_hydrogens(self, atom_id):
+        """The number of hydrogens on an atom, implicit or explicit."""
+
+        return self.hydrogen_count(atom_id) + sum(
+            1 for neighbor in self.adj[atom_id]
+            if self.node[neighbor]['symbol'] == 'H'
+        )
+
+    def _set_hydrogens(self, atom_id, count):
+        """Set the number of implicit hydrogens on an atom.
+
+        Parameters
+        ----------
+        atom_id : str
+            The id of the atom.
+        count : int
+            The new count.
+
+        Raises
+        ------
+        ValueError
+            If the count is negative.
+        """
+
+        if count < 0:
+            raise ValueError(
+                "Atom {} can't have {} hydrogens.".format(atom_id, count)
+            )
+        attributes = self.node[atom_id]
+        previous = attributes.get('hydrogens', 0)
+        self._record('_undo_set_hydrogens', atom_id, previous)
+        if count:
+            attributes['hydrogens'] = count
+        else:
+            attributes.pop('hydrogens', None)
+        if self._summary is not None:
+            self._summary.change_hydrogens(self, atom_id, previous)
+        self._invalidate()
+
+    def _add_hydrogen(self, atom_id, origin=None):
+        """Bond a new hydrogen to an atom.
+
+        The hydrogen is a count if the molecule has `implicit_hydrogens`
+        and an explicit atom otherwise.
+
+        Parameters
+        ----------
+        atom_id : str
+            The atom gaining the hydrogen.
+        origin : Optional[tuple[Molecule, str]]
+            Where the hydrogen comes from, see `_add_node`.
+
+        Returns
+        -------
+        id_ : str
+            The id of the new hydrogen, or `atom_id` if it is implicit.
+        """
+
+        if self._implicit:
+            self._set_hydrogens(atom_id, self.hydrogen_count(atom_id) + 1)
+            return atom_id
+        id_ = self._next_free_atom_id
+        self._add_node(id_, 'H', origin=origin)
+        self._add_edge(
+            self._next_free_bond_id, {'nodes': (id_, atom_id), 'order': 1}
+        )
+        return id_
+
+    def _remove_hydrogen(self, id_):
+        """Remove a hydrogen.
+
+        Parameters
+        ----------
+        id_ : str
+            An explicit hydrogen, or an atom with implicit hydrogens, in
+            which case one of them is removed.
+
+        Raises
+        ------
+        ValueError
+            If `id_` is neither.
+        """
+
+        if self.node[id_]['symbol'] == 'H':
+            self.remove_node(id_)
+        else:
+            count = self.hydrogen_count(id_)
+            if not count:
+                raise ValueError(
+                    "Atom {} has no implicit hydrogen.".format(id_)
+                )
+            self._set_hydrogens(id_, count - 1)
+
+    def to_implicit(self):
+        """Build a copy keeping hydrogens as counts.
+
+        Every hydrogen singly bonded to exactly one other (non hydrogen)
+        atom becomes a count on that atom.  Other hydrogens, such as
+        protons or the atoms of H2, stay explicit.  Atoms, bonds and
+        other attributes (such as an ``id``) are kept.
+
+        Returns
+        -------
+        molecule : Molecule
+            The implicit form, with `implicit_hydrogens` set.
+        """
+
+        molecule = deepcopy(self)
+        for atom, attributes in molecule.nodes(data=True):
+            if attributes['symbol'] != 'H' or len(molecule.adj[atom]) != 1:
+                continue
+            (partner, data), = molecule.adj[atom].items()
+            if molecule.node[partner]['symbol'] == 'H' or \
+                    data.get('order', 1) != 1:
+                continue
+            partner = molecule.node[partner]
+            partner['hydrogens'] = partner.get('hydrogens', 0) + 1
+            molecule.bonds.pop(data['id'], None)
+            molecule.atoms.pop(atom, None)
+            nx.Graph.remove_node(molecule, atom)
+        molecule._implicit = True
+        molecule._summary = None
+        molecule._invalidate()
+        return molecule
+
+    def to_explicit(self):
+        """Build a copy with every hydrogen as an atom.
+
+        Implicit hydrogens get new atom and bond ids, after the ids
+        already used; other atoms, bonds and attributes are kept.
+
+        Returns
+        -------
+        molecule : Molecule
+        """
+
+        molecule = deepcopy(self)
+        atom_ids = _fresh_ids('a', molecule.atoms)
+        bond_ids = _fresh_ids('b', molecule.bonds)
+        for atom in sorted(molecule):
+            for _ in range(molecule.node[atom].pop('hydrogens', 0)):
+                hydrogen = next(atom_ids)
+                molecule._add_node(hydrogen, 'H')
+                molecule._add_edge(
+                    next(bond_ids), {'nodes': (atom, hydrogen), 'order': 1}
+                )
+        molecule._implicit = False
+        molecule._summary = None
+        molecule._invalidate()
+        return molecule
+
+    def remove_node(self, n):
+        """Remove a node (atom) from the underlying graph.
+
+        The atom and its bonds are also removed from `atoms` and
+        `bonds`.
+
+        Parameters
+        ----------
+        n : str
+            The id of the atom to remove.
+        """
+
+        if n in self.node:
+            edges = [(neighbor, data) for neighbor, data
+                     in six.iteritems(self.adj[n])]
+            entries = self._pop_entries(n, edges)
+            self._record('_undo_remove_node', n, self.node[n], edges, entries)
+            if self._summary is not None:
+                self._summary.remove_atom(self, n)
+        super(Molecule, self).remove_node(n)
+        self._invalidate()
+
+    def remove_edge(self, u, v):
+        """Remove an edge (bond) from the underlying graph.
+
+        The bond is also removed from `bonds`.
+
+        Parameters
+        ----------
+        u, v : str
+            The ids of the atoms the bond connects.
+        """
+
+        if self.has_edge(u, v):
+            data = self.adj[u][v]
+            entries = self._pop_entries(None, [(v, data)])
+            self._record('_undo_remove_edge', u, v, data, entries)
+            if self._summary is not None:
+                self._summary.remove_bond(self, u, v)
+        super(Molecule, self).remove_edge(u, v)
+        self._invalidate()
+
+    def _pop_entries(self, atom, edges):
+        """Remove an atom (unless None) and the bonds of some edges from
+        `atoms` and `bonds`, returning what was removed."""
+
+        symbol = self.atoms.pop(atom, None) if atom is not None else None
+        bonds = [
+            (data['id'], self.bonds.pop(data['id']))
+            for _, data in edges if data.get('id') in self.bonds
+        ]
+        return atom, symbol, bonds
+
+    def _restore_entries(self, entries):
+        atom, symbol, bonds = entries
+        if symbol is not None:
+            self.atoms[atom] = symbol
+        self.bonds.update(bonds)
+
+    # Transactions.  While one is open every change made through
+    # `_add_node`, `_add_edge`, `remove_node` or `remove_edge` is
+    # recorded as the name of a method undoing it and its arguments.
+    _undo_log = None
+    _savepoints = None
+
+    def begin(self):
+        """Start recording changes, so that they can be rolled back.
+
+        Transactions can be nested: `rollback` only undoes the changes
+        made since the matching `begin`.
+        """
+
+        if self._savepoints is None:
+            self._savepoints = []
+            self._undo_log = []
+        self._savepoints.append((len(self._undo_log), self._cache))
+
+    def commit(self):
+        """Keep the changes made since the last `begin`."""
+
+        self._end_transaction()
+
+    def rollback(self):
+        """Undo the changes made since the last `begin`.
+
+        This costs time proportional to the number of changes, not to
+        the size of the molecule.  Cached values are restored as they
+        were when the transaction began.
+        """
+
+        if not self._savepoints:
+            raise RuntimeError("No transaction is open.")
+        start, cache = self._savepoints[-1]
+        log = self._undo_log
+        while len(log) > start:
+            undo, arguments = log.pop()
+            getattr(self, undo)(*arguments)
+        self._cache = cache
+        self._end_transaction()
+
+    @contextmanager
+    def transaction(self):
+        """Context manager committing the changes made in its block, or
+        rolling them back if it raises.
+
+        Examples
+        --------
+        >>> molecule = Molecule(
+        ...     {'a1': 'H', 'a2': 'O'}, {'b1': {'nodes': ('a1', 'a2')}}
+        ... )
+        >>> with molecule.transaction():
+        ...     molecule.remove_node('a1')
+        >>> 'a1' in molecule
+        False
+        """
+
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    @property
+    def in_transaction(self):
+        """Whether or not changes are currently being recorded."""
+
+        return self._savepoints is not None
+
+    def changes(self):
+        """The net changes made since the last `begin`.
+
+        Atoms and bonds that were added and then removed again within
+        the transaction don't appear.  A bond that was removed and
+        replaced by a bond between the same atoms is reported as
+        changed, under its original id.
+
+        Returns
+        -------
+        changes : dict
+            With the keys ``'removed_atoms'`` (list of atom ids),
+            ``'added_atoms'`` (dict from atom id to symbol),
+            ``'removed_bonds'`` (list of bond ids, including the bonds
+            of removed atoms), ``'added_bonds'`` (dict from bond id to
+            ``(first, second, order)``), ``'changed_bonds'`` (dict
+            from bond id to its new order) and ``'moved_atoms'`` (dict
+            from the id of an added atom to the origin it was added
+            with, see `_add_node`) and ``'changed_hydrogens'`` (dict
+            from atom id to its new number of implicit hydrogens, for
+            the atoms where it changed, including added atoms).
+
+        Raises
+        ------
+        RuntimeError
+            If no transaction is open.
+        """
+
+        if not self._savepoints:
+            raise RuntimeError("No transaction is open.")
+        start = self._savepoints[-1][0]
+        net = _NetChanges()
+        for undo, arguments in self._undo_log[start:]:
+            _NET_CHANGE_RECORDERS[undo](net, *arguments)
+        return net.summary(self)
+
+    def _touched_atoms(self):
+        """The ids of the atoms changed since the last `begin`: added,
+        removed, with a new hydrogen count or at either end of an added
+        or removed bond.  None if no transaction is open."""
+
+        if not self._savepoints:
+            return None
+        start = self._savepoints[-1][0]
+        touched = set()
+        for undo, arguments in self._undo_log[start:]:
+            if undo == '_undo_add_edge':
+                touched.update(arguments[1:3])
+            elif undo == '_undo_remove_node':
+                touched.add(arguments[0])
+                touched.update(neighbor for neighbor, _ in arguments[2])
+            elif undo == '_undo_remove_edge':
+                touched.update(arguments[:2])
+            else:
+                touched.add(arguments[0])
+        return touched
+
+    def _end_transaction(self):
+        if not self._savepoints:
+            raise RuntimeError("No transaction is open.")
+        self._savepoints.pop()
+        if not self._savepoints:
+            self._savepoints = self._undo_log = None
+
+    def _record(self, undo, *arguments):
+        if self._undo_log is not None:
+            self._undo_log.append((undo, arguments))
+
+    def _undo_add_node(self, id_, origin=None):
+        if self._summary is not None:
+            self._summary.remove_atom(self, id_)
+        nx.Graph.remove_node(self, id_)
+        del self.atoms[id_]
+
+    def _undo_add_edge(self, id_, first, second, previous=None):
+        if self._summary is not None:
+            self._summary.remove_bond(self, first, second)
+        del self.bonds[id_]
+        if previous is None:
+            nx.Graph.remove_edge(self, first, second)
+            return
+        data = self.adj[first][second]
+        data.clear()
+        data.update(previous)
+        if self._summary is not None:
+            self._summary.add_bond(self, first, second)
+
+    def _undo_remove_node(self, n, attributes, edges, entries=None):
+        nx.Graph.add_node(self, n, attributes)
+        if entries is not None:
+            self._restore_entries(entries)
+        if self._summary is not None:
+            self._summary.add_atom(self, n)
+        for neighbor, data in edges:
+            nx.Graph.add_edge(self, n, neighbor, data)
+            if self._summary is not None:
+                self._summary.add_bond(self, n, neighbor)
+
+    def _undo_remove_edge(self, u, v, data, entries=None):
+        nx.Graph.add_edge(self, u, v, data)
+        if entries is not None:
+            self._restore_entries(entries)
+        if self._summary is not None:
+            self._summary.add_bond(self, u, v)
+
+    def _undo_set_hydrogens(self, atom_id, count):
+        previous = self.hydrogen_count(atom_id)
+        if count:
+            self.node[atom_id]['hydrogens'] = count
+        else:
+            self.node[atom_id].pop('hydrogens', None)
+        if self._summary is not None:
+            self._summary.change_hydrogens(self, atom_id, previous)
+
+    def __getstate__(self):
+        # Copies and pickles start outside of any transaction.
+        state = self.__dict__.copy()
+        state.pop('_undo_log', None)
+        state.pop('_savepoints', None)
+        return state
+
+    _cache = None
+
+    def _cached(self, key, function):
+        """Get a value derived from the structure, computing it once.
+
+        The cache is cleared whenever the molecule is changed through
+        `_add_node`, `_add_edge`, `remove_node`, `remove_edge` or
+        `_set_hydrogens`, and restored by `rollback`.
+
+        Parameters
+        ----------
+        key : str
+            Name the value is cached under.
+        function : callable
+            Called with the molecule to compute the value if it isn't
+            already cached.
+
+        Returns
+        -------
+        value : object
+            The cached or newly computed value.
+        """
+
+        if self._cache is None:
+            self._cache = {}
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = function(self)
+            return value
+
+    def _invalidate(self):
+        """Forget every cached value derived from the structure."""
+
+        self._cache = None
+
+    def ring_info(self):
+        """The rings of the molecule, perceived once and cached until it
+        changes (see `CAOS.structures.rings`).
+
+        Returns
+        -------
+        info : RingInfo
+            The smallest set of smallest rings, and which atoms and
+            bonds are in a ring.
+        """
+
+        return ring_info(self)
+
+    # Summaries.  Built on first use, then kept up to date by every
+    # change rather than cleared with the cache.
+    _summary = None
+
+    def _summarized(self):
+        if self._summary is None:
+            self._summary = _Summary(self)
+        return self._summary
+
+    def element_counts(self):
+        """The number of atoms of each element, implicit hydrogens
+        included.
+
+        Returns
+        -------
+        counts : dict[str, int]
+            A copy; elements that aren't in the molecule are left out.
+
+        Examples
+        --------
+        >>> molecule = Molecule(
+        ...     {'a1': 'H', 'a2': 'O'}, {'b1': {'nodes': ('a1', 'a2')}}
+        ... )
+        >>> molecule.element_counts() == {'H': 1, 'O': 1}
+        True
+        """
+
+        return dict(self._summarized().elements)
+
+    @property
+    def formula(self):
+        """The molecular formula in Hill order: carbon, then hydrogen,
+        then the other elements alphabetically (all of them
+        alphabetically if there is no carbon), such as ``'C2H6O'``."""
+
+        counts = self._summarized().elements
+        if 'C' in counts:
+            first = [symbol for symbol in ('C', 'H') if symbol in counts]
+        else:
+            first = []
+        rest = sorted(symbol for symbol in counts if symbol not in first)
+        return ''.join(
+            symbol + (str(counts[symbol]) if counts[symbol] > 1 else '')
+            for symbol in first + rest
+        )
+
+    @property
+    def average_mass(self):
+        """The molar mass from standard atomic weights, in g/mol; NaN for
+        elements without one (see `CAOS.structures.elements.MASSES`)."""
+
+        return self._summarized().mass(MASSES)
+
+    @property
+    def monoisotopic_mass(self):
+        """The mass of the molecule made of the most abundant isotope of
+        each element, in Da."""
+
+        return self._summarized().mass(MONOISOTOPIC_MASSES)
+
+    def bond_order_sum(self, atom_id):
+        """The sum of the orders of an atom's bonds, one for each of its
+        implicit hydrogens."""
+
+        return self._summarized().valences[atom_id] + \
+            self.hydrogen_count(atom_id)
+
+    def formal_charge(self, atom_id):
+        """The formal charge of an atom, as implied by its bonds (see
+        `CAOS.structures.elements.implied_charge`)."""
+
+        return self._summarized().charges.get(atom_id, 0)
+
+    @property
+    def charge(self):
+        """The net formal charge of the molecule."""
+
+        return self._summarized().charge
 
     @property
     def _next_free_atom_id(self):
@@ -243,10 +838,12 @@ class Molecule(nx.Graph):
         -------
         bool
             Whether or not two nodes are isographically equivalent, in
-            this case meaning that they have the same atomic symbol.
+            this case meaning that they have the same atomic symbol and
+            the same number of implicit hydrogens.
         """
 
-        return first['symbol'] == second['symbol']
+        return first['symbol'] == second['symbol'] and \
+            first.get('hydrogens', 0) == second.get('hydrogens', 0)
 
     def __eq__(self, other):
         return is_isomorphic(self, other, node_match=self._node_matcher)
@@ -255,9 +852,219 @@ class Molecule(nx.Graph):
         return not self == other
 
     def __repr__(self):
-        return '\n'.join(
-            [
-                json.dumps(self.atoms),
-                json.dumps(self.bonds)
-            ]
+        lines = [
+            json.dumps(self.atoms),
+            json.dumps(self.bonds)
+        ]
+        hydrogens = dict(
+            (atom, data['hydrogens']) for atom, data in self.nodes(data=True)
+            if data.get('hydrogens')
         )
+        if hydrogens:
+            lines.append(json.dumps(hydrogens))
+        return '\n'.join(lines)
+
+
+class _NetChanges(object):
+    """Accumulates the net changes of an undo log, see
+    `Molecule.changes`.  Each kind of record is read by the method
+    `_NET_CHANGE_RECORDERS` maps it to."""
+
+    def __init__(self):
+        # Added atoms map to their origin, removed bonds to their atoms,
+        # and hydrogens to the count before the first change.
+        self.added_atoms = {}
+        self.removed_atoms = []
+        self.added_bonds = {}
+        self.removed_bonds = {}
+        self.hydrogens = {}
+
+    def _remove_bond(self, id_, first, second):
+        if id_ in self.added_bonds:
+            del self.added_bonds[id_]
+        else:
+            self.removed_bonds[id_] = (first, second)
+
+    def add_node(self, id_, origin=None):
+        self.added_atoms[id_] = origin
+
+    def add_edge(self, id_, first, second, previous=None):
+        self.added_bonds[id_] = (first, second)
+
+    def remove_node(self, n, attributes, edges, entries=None):
+        for neighbor, data in edges:
+            self._remove_bond(data.get('id'), n, neighbor)
+        if n in self.added_atoms:
+            del self.added_atoms[n]
+        else:
+            self.removed_atoms.append(n)
+
+    def remove_edge(self, u, v, data, entries=None):
+        self._remove_bond(data.get('id'), u, v)
+
+    def set_hydrogens(self, atom_id, count):
+        self.hydrogens.setdefault(atom_id, count)
+
+    def _changed_bonds(self, molecule):
+        """Turn bonds removed and replaced between the same atoms into
+        changed bonds."""
+
+        changed_bonds = {}
+        added_pairs = dict(
+            (frozenset(nodes), id_)
+            for id_, nodes in six.iteritems(self.added_bonds)
+        )
+        for id_, nodes in list(six.iteritems(self.removed_bonds)):
+            replacement = added_pairs.get(frozenset(nodes))
+            if replacement is not None:
+                first, second = self.added_bonds.pop(replacement)
+                changed_bonds[id_] = molecule.adj[first][second].get(
+                    'order', 1
+                )
+                del self.removed_bonds[id_]
+        return changed_bonds
+
+    def _changed_hydrogens(self, molecule):
+        added = self.added_atoms
+        return dict(
+            (atom, molecule.hydrogen_count(atom))
+            for atom in set(self.hydrogens).union(added)
+            if atom in molecule.node and molecule.hydrogen_count(atom) != (
+                0 if atom in added else self.hydrogens[atom]
+            )
+        )
+
+    def summary(self, molecule):
+        """The changes, as returned by `Molecule.changes`."""
+
+        changed_bonds = self._changed_bonds(molecule)
+        return {
+            'removed_atoms': self.removed_atoms,
+            'added_atoms': dict(
+                (id_, molecule.node[id_]['symbol'])
+                for id_ in self.added_atoms
+            ),
+            'removed_bonds': sorted(self.removed_bonds, key=repr),
+            'added_bonds': dict(
+                (id_, (first, second,
+                       molecule.adj[first][second].get('order', 1)))
+                for id_, (first, second) in six.iteritems(self.added_bonds)
+            ),
+            'changed_bonds': changed_bonds,
+            'moved_atoms': dict(
+                (id_, origin)
+                for id_, origin in six.iteritems(self.added_atoms)
+                if origin is not None
+            ),
+            'changed_hydrogens': self._changed_hydrogens(molecule),
+        }
+
+
+_NET_CHANGE_RECORDERS = {
+    '_undo_add_node': _NetChanges.add_node,
+    '_undo_add_edge': _NetChanges.add_edge,
+    '_undo_remove_node': _NetChanges.remove_node,
+    '_undo_remove_edge': _NetChanges.remove_edge,
+    '_undo_set_hydrogens': _NetChanges.set_hydrogens,
+}
+
+
+class _Summary(object):
+    """The element counts, bond order sums and formal charges of a
+    molecule, updated by each change made to it.
+
+    Attributes
+    ----------
+    elements : dict[str, int]
+        The number of atoms of each element, implicit hydrogens
+        included.
+    valences : dict[str, int]
+        The sum of the orders of each atom's bonds, not counting its
+        implicit hydrogens.
+    charges : dict[str, int]
+        The nonzero formal charges, by atom.
+    charge : int
+        Their sum.
+    """
+
+    def __init__(self, molecule):
+        self.elements = {}
+        self.valences = {}
+        self.charges = {}
+        self.charge = 0
+        for atom in molecule:
+            self._count(molecule.node[atom]['symbol'], 1)
+            self._count('H', molecule.hydrogen_count(atom))
+            self.valences[atom] = molecule.degree(atom, weight='order')
+            self._charge(molecule, atom)
+
+    def _count(self, symbol, change):
+        count = self.elements.get(symbol, 0) + change
+        if count:
+            self.elements[symbol] = count
+        else:
+            self.elements.pop(symbol, None)
+
+    def _charge(self, molecule, atom):
+        charge = implied_charge(
+            molecule.node[atom]['symbol'],
+            self.valences[atom] + molecule.hydrogen_count(atom)
+        )
+        self.charge += charge - self.charges.pop(atom, 0)
+        if charge:
+            self.charges[atom] = charge
+
+    def mass(self, masses):
+        return sum(masses.get(symbol, float('nan')) * count
+                   for symbol, count in six.iteritems(self.elements))
+
+    def add_atom(self, molecule, atom):
+        # Called once the atom is in the graph, before its bonds.
+        self._count(molecule.node[atom]['symbol'], 1)
+        self._count('H', molecule.hydrogen_count(atom))
+        self.valences[atom] = 0
+        self._charge(molecule, atom)
+
+    def remove_atom(self, molecule, atom):
+        # Called while the atom and its bonds are still in the graph.
+        for neighbor in list(molecule.adj[atom]):
+            self.remove_bond(molecule, atom, neighbor)
+        self._count(molecule.node[atom]['symbol'], -1)
+        self._count('H', -molecule.hydrogen_count(atom))
+        del self.valences[atom]
+        self.charge -= self.charges.pop(atom, 0)
+
+    def add_bond(self, molecule, first, second):
+        # Called once the bond is in the graph.
+        self._change_bond(molecule, first, second, 1)
+
+    def remove_bond(self, molecule, first, second):
+        # Called while the bond is still in the graph.
+        self._change_bond(molecule, first, second, -1)
+
+    def _change_bond(self, molecule, first, second, sign):
+        order = molecule.adj[first][second].get('order', 1)
+        for atom in (first, second):
+            self.valences[atom] += sign * order
+            self._charge(molecule, atom)
+
+    def change_hydrogens(self, molecule, atom, previous):
+        # Called once the atom has its new count.
+        self._count('H', molecule.hydrogen_count(atom) - previous)
+        self._charge(molecule, atom)
+
+
+def _fresh_ids(letter, used):
+    """Generate the ids not in `used`, in the order of `Molecule._next_id`."""
+
+    taken = set()
+    for id_ in used:
+        try:
+            taken.add(int(id_[1:]))
+        except ValueError:
+            pass
+    number = 0
+    while True:
+        if number not in taken:
+            yield "{}{}".format(letter, number)
+        number += 1
@@ -0,0 +1,416 @@
+"""Estimation of pKa values from molecular structure.
+
+Every hydrogen of a molecule is scored as a potential acidic proton, and
+every atom with a lone pair (or negative charge) as a potential base,
+using a small group-contribution table.  The estimate for a hydrogen is
+the pKa of the group it belongs to; the estimate for a basic site is the
+pKa of its conjugate acid, i.e. of the group it would form if it gained
+a proton.  Higher values for a basic site mean a stronger base.  In
+molecules with implicit hydrogens (see `Molecule.to_implicit`), an atom
+carrying hydrogens stands for them: its id is the acidic site.
+
+The groups are recognized from a handful of per-atom features (element,
+implied charge, hydrogen count, bond orders, and whether the atom is
+bonded to a carbonyl carbon).  These are computed with NumPy for every
+atom of every molecule passed to `estimate_many` at once, and the table
+lookups are vectorized over the same arrays.
+
+The estimate for an atom only depends on the atoms up to three bonds
+away from it (a hydrogen's partner, the partner's neighbors, and their
+double bonds), so estimates are cached per atom environment with
+`centers.CenterCache`: a molecule is only scored if it has an atom
+whose environment hasn't been seen, and molecules of a library sharing
+their functional groups are scored once between them.
+
+Attributes
+----------
+ACID_TABLE : dict[str, float]
+    pKa of the acidic hydrogens of each group.
+BASE_TABLE : dict[str, float]
+    pKa of the conjugate acid of each kind of basic site.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from .centers import center_cache
+from .elements import LONE_PAIR_ELEMENTS, VALENCES
+
+ACID_TABLE = {
+    'oxonium': -1.74,
+    'hydroxide': 36.0,
+    'carboxylic_acid': 4.76,
+    'water': 15.7,
+    'alcohol': 16.0,
+    'ammonium': 9.25,
+    'alkylammonium': 10.6,
+    'amide': 17.0,
+    'amine': 38.0,
+    'hydrogen_sulfide': 7.0,
+    'thiol': 10.5,
+    'hydrogen_fluoride': 3.17,
+    'hydrogen_chloride': -7.0,
+    'hydrogen_bromide': -9.0,
+    'hydrogen_iodide': -10.0,
+    'alkyne': 25.0,
+    'alpha_carbonyl': 20.0,
+    'alkene': 44.0,
+    'alkane': 50.0,
+}
+
+BASE_TABLE = {
+    'carboxylate': 4.76,
+    'hydroxide': 15.7,
+    'alkoxide': 16.0,
+    'carbonyl': -7.0,
+    'water': -1.74,
+    'alcohol': -2.0,
+    'ether': -3.5,
+    'amide_anion': 38.0,
+    'amide': -0.5,
+    'nitrile': -10.0,
+    'imine': 7.0,
+    'ammonia': 9.25,
+    'amine': 10.6,
+    'hydrosulfide': 7.0,
+    'thiolate': 10.5,
+    'thiol': -7.0,
+    'fluoride': 3.17,
+    'chloride': -7.0,
+    'bromide': -9.0,
+    'iodide': -10.0,
+}
+
+_CACHE_KEY = 'pka_estimate'
+_RADIUS = 3
+_centers = center_cache('pka', _RADIUS)
+
+_SYMBOLS = ('?',) + tuple(sorted(VALENCES))
+_CODES = dict((symbol, code) for code, symbol in enumerate(_SYMBOLS))
+_VALENCE = np.array([0] + [VALENCES[s] for s in _SYMBOLS[1:]])
+_HAS_LONE_PAIRS = np.array([s in LONE_PAIR_ELEMENTS for s in _SYMBOLS])
+
+
+def _code(symbol):
+    return _CODES[symbol] if symbol in _CODES else 0
+
+
+class PkaEstimate(object):
+    """The estimated acidic and basic sites of a molecule.
+
+    Attributes
+    ----------
+    acidic : dict[str, float]
+        Estimated pKa of each hydrogen that could be donated, or of the
+        implicit hydrogens of an atom, by the id of that atom.
+    basic : dict[str, float]
+        Estimated pKa of the conjugate acid of each atom that could
+        accept a hydrogen.
+    """
+
+    def __init__(self, acidic, basic):
+        self.acidic = acidic
+        self.basic = basic
+
+    @property
+    def acid_site(self):
+        """The id of the most acidic hydrogen, or ``None``."""
+
+        if not self.acidic:
+            return None
+        return min(sorted(self.acidic), key=self.acidic.get)
+
+    @property
+    def acid_pka(self):
+        """The pKa of the most acidic hydrogen, or infinity."""
+
+        site = self.acid_site
+        return self.acidic[site] if site is not None else float('inf')
+
+    @property
+    def base_site(self):
+        """The id of the most basic atom, or ``None``."""
+
+        if not self.basic:
+            return None
+        return max(sorted(self.basic), key=self.basic.get)
+
+    @property
+    def base_pka(self):
+        """The pKa of the conjugate acid of the most basic atom."""
+
+        site = self.base_site
+        return self.basic[site] if site is not None else float('-inf')
+
+    def __repr__(self):
+        return "PkaEstimate(acid={} at {}, base={} at {})".format(
+            self.acid_pka, self.acid_site, self.base_pka, self.base_site
+        )
+
+
+def _features(molecules):
+    """Build per-atom feature arrays for all atoms of many molecules."""
+
+    atom_ids = []
+    owners = []
+    codes = []
+    implicit = []
+    positions = {}
+    first = []
+    second = []
+    orders = []
+
+    for number, molecule in enumerate(molecules):
+        for atom_id in molecule:
+            positions[(number, atom_id)] = len(atom_ids)
+            atom_ids.append(atom_id)
+            owners.append(number)
+            codes.append(_code(molecule.atoms[atom_id]))
+            implicit.append(molecule.node[atom_id].get('hydrogens', 0))
+        for u, v, attributes in molecule.edges(data=True):
+            first.append(positions[(number, u)])
+            second.append(positions[(number, v)])
+            orders.append(attributes.get('order', 1))
+
+    count = len(atom_ids)
+    codes = np.array(codes, dtype=int)
+    u = np.array(first, dtype=int)
+    v = np.array(second, dtype=int)
+    order = np.array(orders, dtype=float)
+    implicit = np.array(implicit, dtype=float)
+
+    def per_atom(weights_u, weights_v=None):
+        weights_v = weights_u if weights_v is None else weights_v
+        return (np.bincount(u, weights=weights_u, minlength=count) +
+                np.bincount(v, weights=weights_v, minlength=count))
+
+    hydrogen = codes == _CODES['H']
+    carbon = codes == _CODES['C']
+    oxygen = codes == _CODES['O']
+
+    valence = per_atom(order) + implicit
+    charge = np.where(_HAS_LONE_PAIRS[codes], valence - _VALENCE[codes], 0)
+    charge = np.where(hydrogen & (valence == 0), 1, charge)
+
+    double = per_atom((order == 2).astype(float)) > 0
+    triple = per_atom((order == 3).astype(float)) > 0
+    hydrogens = per_atom(
+        hydrogen[v].astype(float), hydrogen[u].astype(float)
+    ) + implicit
+
+    carbonyl_bond = (order == 2) & (
+        (carbon[u] & oxygen[v]) | (oxygen[u] & carbon[v])
+    )
+    carbonyl_carbon = np.zeros(count, dtype=bool)
+    carbonyl_carbon[u[carbonyl_bond & carbon[u]]] = True
+    carbonyl_carbon[v[carbonyl_bond & carbon[v]]] = True
+
+    single = order == 1
+    by_carbonyl = per_atom(
+        (single & carbonyl_carbon[v]).astype(float),
+        (single & carbonyl_carbon[u]).astype(float)
+    ) > 0
+
+    # The heavy atom each hydrogen is bonded to (-1 for bare protons).
+    partner = np.full(count, -1, dtype=int)
+    partner[u[hydrogen[u]]] = v[hydrogen[u]]
+    partner[v[hydrogen[v]]] = u[hydrogen[v]]
+
+    return {
+        'atom_ids': atom_ids,
+        'owners': np.array(owners, dtype=int),
+        'codes': codes,
+        'hydrogen': hydrogen,
+        'implicit': implicit > 0,
+        'charge': charge,
+        'degree': per_atom(np.ones(len(u))) + implicit,
+        'double': double,
+        'triple': triple,
+        'hydrogens': hydrogens,
+        'by_carbonyl': by_carbonyl,
+        'partner': partner
+    }
+
+
+def _select(choices, default=np.nan):
+    conditions = [condition for condition, _ in choices]
+    values = [value for _, value in choices]
+    return np.select(conditions, values, default=default)
+
+
+def _acid_pkas(features):
+    """Score every atom as an acidic hydrogen, or as carrying implicit
+    ones (NaN if it is neither)."""
+
+    partner = features['partner']
+    hydrogen = features['hydrogen'] & (partner >= 0)
+    valid = hydrogen | features['implicit']
+    heavy = np.where(hydrogen, partner, np.arange(len(partner)))
+
+    codes = features['codes'][heavy]
+    charge = features['charge'][heavy]
+    hydrogens = features['hydrogens'][heavy]
+    by_carbonyl = features['by_carbonyl'][heavy]
+    double = features['double'][heavy]
+    triple = features['triple'][heavy]
+
+    def element(symbol):
+        return valid & (codes == _CODES[symbol])
+
+    oxygen, nitrogen, sulfur, carbon = (
+        element('O'), element('N'), element('S'), element('C')
+    )
+    table = ACID_TABLE
+    return _select([
+        (oxygen & (charge > 0), table['oxonium']),
+        (oxygen & (charge < 0), table['hydroxide']),
+        (oxygen & by_carbonyl, table['carboxylic_acid']),
+        (oxygen & (hydrogens == 2), table['water']),
+        (oxygen, table['alcohol']),
+        (nitrogen & (charge > 0) & (hydrogens == 4), table['ammonium']),
+        (nitrogen & (charge > 0), table['alkylammonium']),
+        (nitrogen & by_carbonyl, table['amide']),
+        (nitrogen, table['amine']),
+        (sulfur & (hydrogens == 2), table['hydrogen_sulfide']),
+        (sulfur, table['thiol']),
+        (element('F'), table['hydrogen_fluoride']),
+        (element('Cl'), table['hydrogen_chloride']),
+        (element('Br'), table['hydrogen_bromide']),
+        (element('I'), table['hydrogen_iodide']),
+        (carbon & triple, table['alkyne']),
+        (carbon & by_carbonyl, table['alpha_carbonyl']),
+        (carbon & double, table['alkene']),
+        (carbon, table['alkane']),
+    ])
+
+
+def _base_pkas(features):
+    """Score every atom as a basic site (NaN if it isn't one)."""
+
+    codes = features['codes']
+    charge = features['charge']
+    hydrogens = features['hydrogens']
+    degree = features['degree']
+    by_carbonyl = features['by_carbonyl']
+    double = features['double']
+    triple = features['triple']
+
+    def element(symbol):
+        return codes == _CODES[symbol]
+
+    oxygen, nitrogen, sulfur = element('O'), element('N'), element('S')
+    anion = charge < 0
+    neutral = charge == 0
+    halide = anion & (degree == 0)
+    table = BASE_TABLE
+    return _select([
+        (oxygen & anion & by_carbonyl, table['carboxylate']),
+        (oxygen & anion & (hydrogens == 1), table['hydroxide']),
+        (oxygen & anion, table['alkoxide']),
+        (oxygen & neutral & double, table['carbonyl']),
+        (oxygen & neutral & (hydrogens == 2), table['water']),
+        (oxygen & neutral & (hydrogens == 1), table['alcohol']),
+        (oxygen & neutral, table['ether']),
+        (nitrogen & anion, table['amide_anion']),
+        (nitrogen & neutral & by_carbonyl, table['amide']),
+        (nitrogen & neutral & triple, table['nitrile']),
+        (nitrogen & neutral & double, table['imine']),
+        (nitrogen & neutral & (hydrogens == 3), table['ammonia']),
+        (nitrogen & neutral, table['amine']),
+        (sulfur & anion & (hydrogens == 1), table['hydrosulfide']),
+        (sulfur & anion, table['thiolate']),
+        (sulfur & neutral, table['thiol']),
+        (halide & element('F'), table['fluoride']),
+        (halide & element('Cl'), table['chloride']),
+        (halide & element('Br'), table['bromide']),
+        (halide & element('I'), table['iodide']),
+    ])
+
+
+def _compute(molecules):
+    """Score every atom of the molecules, as ``{atom id: (acid pKa,
+    base pKa)}`` per molecule, with ``None`` for the roles an atom
+    can't play."""
+
+    if not molecules:
+        return []
+
+    features = _features(molecules)
+    acid = _acid_pkas(features)
+    base = _base_pkas(features)
+    atom_ids = features['atom_ids']
+    owners = features['owners']
+
+    sites = np.flatnonzero(~(np.isnan(acid) & np.isnan(base)))
+    decisions = [{} for _ in molecules]
+    for index, owner, acid_pka, base_pka in zip(
+            sites.tolist(), owners[sites].tolist(), acid[sites].tolist(),
+            base[sites].tolist()):
+        # NaN is the only value not equal to itself.
+        decisions[owner][atom_ids[index]] = (
+            acid_pka if acid_pka == acid_pka else None,
+            base_pka if base_pka == base_pka else None
+        )
+    return decisions
+
+
+def _from_decisions(decisions):
+    acidic = {}
+    basic = {}
+    for atom_id, (acid, base) in decisions.items():
+        if acid is not None:
+            acidic[atom_id] = acid
+        if base is not None:
+            basic[atom_id] = base
+    return PkaEstimate(acidic, basic)
+
+
+def estimate_many(molecules):
+    """Estimate the acidic and basic sites of many molecules at once.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+        The molecules to score.
+
+    Returns
+    -------
+    estimates : list[PkaEstimate]
+        One estimate per molecule, in the same order.
+    """
+
+    molecules = list(molecules)
+    estimates = [
+        (molecule._cache or {}).get(_CACHE_KEY) for molecule in molecules
+    ]
+    pending = [
+        position for position, estimate in enumerate(estimates)
+        if estimate is None
+    ]
+
+    # Molecules with an atom in a new environment are scored in one
+    # batch; the others are put together from cached decisions.
+    decisions = _centers.decisions(
+        [molecules[position] for position in pending], _compute
+    )
+    for position, decided in zip(pending, decisions):
+        estimates[position] = molecules[position]._cached(
+            _CACHE_KEY, lambda _: _from_decisions(decided)
+        )
+    return estimates
+
+
+def estimate(molecule):
+    """Estimate the acidic and basic sites of a molecule.
+
+    See `estimate_many`.
+
+    Returns
+    -------
+    estimate : PkaEstimate
+        The estimate for the molecule.
+    """
+
+    return estimate_many([molecule])[0]
@@ -0,0 +1,334 @@
+"""Ring perception.
+
+The rings of a molecule are described by a smallest set of smallest
+rings (SSSR): as many rings as the molecule has independent cycles (its
+bonds, less its atoms, plus its fragments), chosen as short as possible.
+They are found as follows:
+
+1. The molecule is split into its biconnected components.  A component
+   of a single bond is a bridge between rings (or a chain bond); the
+   bonds of every other component are ring bonds, and a component with
+   as many bonds as atoms is a single ring.
+2. For the other components, candidate rings are made as by Horton: for
+   a root atom and a bond, the shortest paths from the root to both
+   ends of the bond, joined by the bond.  Candidates are ranked by size,
+   and the searches from each root only go as deep as the largest size
+   considered, which is doubled until enough rings are found, so fused
+   ring systems cost little more than their size.  Doubling takes the
+   searches deeper from where they stopped and keeps the rings already
+   found.
+3. A candidate is kept if it is independent of the rings kept before.
+   Rings are sets of bonds, encoded as the bits of an integer, and
+   reduced against the kept ones by Gaussian elimination over GF(2), so
+   the check costs a few integer operations per kept ring.
+
+The result is a `RingInfo`, cached on the molecule until it next
+changes (see `Molecule.ring_info`).
+
+Attributes
+----------
+RingInfo: class
+    The rings of a molecule and the atoms and bonds in them.
+ring_info: function
+    Perceives the rings of a molecule.
+ring_info_many: function
+    Perceives the rings of many molecules.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from collections import deque
+
+import networkx as nx
+
+_RINGS_KEY = 'ring_info'
+# Candidate rings are first looked for among those of up to
+# 2 * _FIRST_DEPTH + 1 atoms.
+_FIRST_DEPTH = 4
+
+
+class RingInfo(object):
+    """The rings of a molecule and the atoms and bonds in them.
+
+    Attributes
+    ----------
+    rings : list[tuple[str]]
+        The smallest set of smallest rings, smallest first, each given
+        by the ids of its atoms in order around it.
+    atom_rings : dict[str, list[int]]
+        The positions in `rings` of the rings each ring atom is in.
+    ring_bonds : frozenset[frozenset[str]]
+        The bonds in a ring, as the pairs of atoms they join.  Every
+        ring bond is in one of `rings`.
+    """
+
+    def __init__(self, rings, ring_bonds):
+        self.rings = rings
+        self.ring_bonds = frozenset(ring_bonds)
+        self.atom_rings = {}
+        for position, ring in enumerate(rings):
+            for atom in ring:
+                self.atom_rings.setdefault(atom, []).append(position)
+
+    def __len__(self):
+        return len(self.rings)
+
+    def __repr__(self):
+        return "RingInfo({})".format(self.rings)
+
+    def in_ring(self, atom_id):
+        """Whether or not an atom is in a ring."""
+
+        return atom_id in self.atom_rings
+
+    def is_ring_bond(self, first, second):
+        """Whether or not the bond between two atoms is in a ring."""
+
+        return frozenset((first, second)) in self.ring_bonds
+
+    def ring_sizes(self, atom_id):
+        """The sizes of the rings of `rings` an atom is in, smallest
+        first; empty if it isn't in a ring."""
+
+        return sorted(
+            len(self.rings[position])
+            for position in self.atom_rings.get(atom_id, ())
+        )
+
+
+def _cycle_order(adjacency):
+    """The atoms of a component that is a single ring, in order around
+    it."""
+
+    start = min(adjacency)
+    previous, atom = start, min(adjacency[start])
+    ring = [start]
+    while atom != start:
+        ring.append(atom)
+        previous, atom = atom, next(
+            neighbor for neighbor in adjacency[atom] if neighbor != previous
+        )
+    return ring
+
+
+def _normalize(ring):
+    # Start from the smallest atom, towards its smaller neighbor.
+    start = ring.index(min(ring))
+    ring = ring[start:] + ring[:start]
+    if len(ring) > 2 and ring[-1] < ring[1]:
+        ring = ring[:1] + ring[:0:-1]
+    return tuple(ring)
+
+
+class _BreadthFirst(object):
+    """Breadth first search from a root, that can be taken deeper.
+
+    Attributes
+    ----------
+    parents, depths : dict
+        The atom each atom reached was first reached from, and its
+        distance from the root.
+    """
+
+    def __init__(self, adjacency, root):
+        self.adjacency = adjacency
+        self.parents = {root: None}
+        self.depths = {root: 0}
+        self._queue = deque([root])
+        self._reached = [root]
+
+    def deepen(self, depth):
+        """Continue the search up to `depth` bonds deep.
+
+        Returns
+        -------
+        reached : list[str]
+            The atoms reached since the last call.
+        """
+
+        reached, self._reached = self._reached, []
+        waiting = deque()
+        while self._queue:
+            atom = self._queue.popleft()
+            if self.depths[atom] >= depth:
+                waiting.append(atom)
+                continue
+            for neighbor in self.adjacency[atom]:
+                if neighbor not in self.depths:
+                    self.parents[neighbor] = atom
+                    self.depths[neighbor] = self.depths[atom] + 1
+                    self._queue.append(neighbor)
+                    reached.append(neighbor)
+        self._queue = waiting
+        return reached
+
+    def ring(self, first, second):
+        """The ring closed by the bond between two atoms reached, or
+        None if their paths to the root meet before it."""
+
+        first_path = _path(self.parents, first)
+        second_path = _path(self.parents, second)
+        if len(set(first_path).intersection(second_path)) != 1:
+            return None
+        return first_path[::-1] + second_path[:-1]
+
+
+def _path(parents, atom):
+    path = []
+    while atom is not None:
+        path.append(atom)
+        atom = parents[atom]
+    return path
+
+
+def _candidates(number, search, reached, smallest, largest):
+    """The candidate rings of a search with more than `smallest` and at
+    most `largest` atoms, as ``(size, number, first, second)``.
+
+    Candidates larger than those of the previous depth have an atom
+    reached since, so only the bonds of those atoms are looked at.
+    """
+
+    parents, depths = search.parents, search.depths
+    new = set(reached)
+    for first in reached:
+        for second in search.adjacency[first]:
+            if second not in depths or parents[first] == second or \
+                    parents[second] == first or \
+                    (second in new and not first < second):
+                continue
+            size = depths[first] + depths[second] + 1
+            if smallest < size <= largest:
+                yield size, number, first, second
+
+
+class _CycleBasis(object):
+    """Independent rings, with their bonds as the bits of an integer,
+    reduced by Gaussian elimination over GF(2) keyed by the highest
+    bit."""
+
+    def __init__(self, edges):
+        self.bits = dict(
+            (frozenset(edge), 1 << number)
+            for number, edge in enumerate(edges)
+        )
+        self.basis = {}
+        self.seen = set()
+        self.rings = []
+
+    def add(self, ring):
+        """Keep a ring if it is independent of those kept already."""
+
+        vector = 0
+        for position, atom in enumerate(ring):
+            vector |= self.bits[frozenset((atom, ring[position - 1]))]
+        if vector in self.seen:
+            return
+        self.seen.add(vector)
+        while vector:
+            highest = vector.bit_length() - 1
+            if highest not in self.basis:
+                self.basis[highest] = vector
+                self.rings.append(_normalize(ring))
+                return
+            vector ^= self.basis[highest]
+
+
+def _smallest_rings(adjacency, edges, count):
+    """The `count` rings of a minimum cycle basis of a biconnected
+    component, smallest first."""
+
+    searches = [_BreadthFirst(adjacency, root) for root in sorted(adjacency)]
+    basis = _CycleBasis(edges)
+    smallest, depth = 0, _FIRST_DEPTH
+    while True:
+        # Every candidate of up to 2 * depth + 1 atoms has both ends of
+        # its bond within `depth` of its root, so none is missed.  The
+        # smaller ones were all tried at the previous depth, in order,
+        # so the rings kept then are kept.
+        largest = 2 * depth + 1
+        candidates = sorted(
+            candidate
+            for number, search in enumerate(searches)
+            for candidate in _candidates(
+                number, search, search.deepen(depth), smallest, largest
+            )
+        )
+        for _, number, first, second in candidates:
+            ring = searches[number].ring(first, second)
+            if ring is not None:
+                basis.add(ring)
+                if len(basis.rings) == count:
+                    return basis.rings
+        if depth >= len(adjacency):
+            return basis.rings
+        smallest, depth = largest, depth * 2
+
+
+def _perceive(molecule):
+    # The number of independent cycles is zero for most molecules of a
+    # library, which then skip the rest.
+    fragments = nx.number_connected_components(molecule)
+    if molecule.number_of_edges() - len(molecule) + fragments == 0:
+        return RingInfo([], ())
+
+    rings = []
+    ring_bonds = []
+    for edges in nx.biconnected_component_edges(molecule):
+        if len(edges) < 2:
+            continue
+        adjacency = {}
+        for first, second in edges:
+            adjacency.setdefault(first, set()).add(second)
+            adjacency.setdefault(second, set()).add(first)
+            ring_bonds.append(frozenset((first, second)))
+        count = len(edges) - len(adjacency) + 1
+        if count == 1:
+            rings.append(_normalize(_cycle_order(adjacency)))
+        else:
+            rings.extend(_smallest_rings(adjacency, edges, count))
+    rings.sort(key=lambda ring: (len(ring), ring))
+    return RingInfo(rings, ring_bonds)
+
+
+def ring_info(molecule):
+    """Perceive the rings of a molecule.
+
+    The result is cached on the molecule, and computed again once the
+    molecule changes.
+
+    Returns
+    -------
+    info : RingInfo
+
+    Examples
+    --------
+    >>> from CAOS.structures.molecule import Molecule
+    >>> cyclopropane = Molecule(
+    ...     {'a1': 'C', 'a2': 'C', 'a3': 'C'},
+    ...     {'b1': {'nodes': ('a1', 'a2')}, 'b2': {'nodes': ('a2', 'a3')},
+    ...      'b3': {'nodes': ('a3', 'a1')}}
+    ... )
+    >>> ring_info(cyclopropane).ring_sizes('a2')
+    [3]
+    """
+
+    return molecule._cached(_RINGS_KEY, _perceive)
+
+
+def ring_info_many(molecules):
+    """Compute `ring_info` for many molecules.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+        The molecules.  Results are cached on each molecule.
+
+    Returns
+    -------
+    infos : list[RingInfo]
+        The rings of each molecule, in the same order.
+    """
+
+    return [ring_info(molecule) for molecule in molecules]
@@ -0,0 +1,394 @@
+"""A columnar store of per-molecule descriptors for libraries.
+
+Filtering a library ("every molecule with an O-H and a formula weight
+under 200"), or reacting it, computes the same properties of the same
+molecules again and again.  A `DescriptorStore` computes them once, in
+batches, and keeps each as a NumPy column with one row per molecule:
+
+* ``atoms``, ``heavy_atoms``, ``bonds``, ``charge`` and ``weight``,
+  counting implicit hydrogens (see `Molecule.to_implicit`);
+* ``count_<element>``, the number of atoms of each element;
+* one boolean column per functional group of
+  `substructure.FUNCTIONAL_GROUPS` (``hydroxyl``, ``carbonyl``, ...);
+* ``acid_pka`` and ``base_pka``, the estimates of `pka.estimate_many`
+  for the most acidic hydrogen and the most basic atom.
+
+Queries are vectorized over the columns, see `DescriptorStore.mask`.  A
+store can be saved to a directory, one ``.npy`` file per column, and
+loaded memory mapped.
+
+The store is also a source of precomputed inputs for the dispatcher:
+given as the ``'descriptor_store'`` condition, the pKa estimates of the
+reactants it holds are rebuilt from it instead of being computed (see
+`pka_estimates`).  Every estimated site is stored by its atom class (see
+`canonical.atom_classes`), so the estimates of a reactant that is only
+isomorphic to the stored molecule refer to the reactant's own atoms.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from collections import defaultdict
+import json
+import os
+
+import numpy as np
+import six
+
+from .canonical import atom_classes_many, canonical_hashes
+from .pka import PkaEstimate, estimate_many
+from .substructure import FUNCTIONAL_GROUPS, functional_groups
+
+_STORE_VERSION = 1
+_META = 'store.json'
+# The pKa site table, stored by row offsets like a sparse matrix.
+_SITE_COLUMNS = ('site_offsets', 'site_classes', 'site_acid', 'site_base')
+_COUNT_PREFIX = 'count_'
+
+
+def _describe(molecule, estimate, classes):
+    """The descriptors of one molecule, and its pKa sites by class."""
+
+    counts = molecule.element_counts()
+    values = {
+        'atoms': sum(six.itervalues(counts)),
+        'heavy_atoms': sum(count for symbol, count in six.iteritems(counts)
+                           if symbol != 'H'),
+        'bonds': molecule.number_of_edges(),
+        'charge': molecule.charge,
+        'weight': molecule.average_mass,
+        'acid_pka': estimate.acid_pka,
+        'base_pka': estimate.base_pka,
+    }
+    for symbol, count in six.iteritems(counts):
+        values[_COUNT_PREFIX + symbol] = count
+    groups = functional_groups(molecule)
+    for name in FUNCTIONAL_GROUPS:
+        values[name] = name in groups
+
+    sites = {}
+    for atom_id, pka in six.iteritems(estimate.acidic):
+        sites[classes[atom_id]] = [pka, np.nan]
+    for atom_id, pka in six.iteritems(estimate.basic):
+        sites.setdefault(classes[atom_id], [np.nan, np.nan])[1] = pka
+    return values, sorted(sites.items())
+
+
+def _default(name):
+    # The value of a column for molecules added before it existed.
+    return 0 if name.startswith(_COUNT_PREFIX) else np.nan
+
+
+class DescriptorStore(object):
+    """Descriptor columns for a library of molecules.
+
+    Parameters
+    ----------
+    path : Optional[str]
+        A directory the store was saved to with `save`.  Its columns
+        are memory mapped, and copied the first time molecules are
+        added.
+
+    Attributes
+    ----------
+    keys : list
+        The key of each row.
+    hashes : list[str]
+        The canonical hash of the molecule of each row.
+    """
+
+    def __init__(self, path=None):
+        self.keys = []
+        self.hashes = []
+        self._columns = {}
+        self._sites = {
+            'site_offsets': np.zeros(1, dtype=np.intp),
+            'site_classes': np.array([], dtype='U'),
+            'site_acid': np.array([]),
+            'site_base': np.array([]),
+        }
+        self._rows = {}
+        if path is not None:
+            self._load(path)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, molecule):
+        return canonical_hashes([molecule])[0] in self._rows
+
+    def __getitem__(self, name):
+        """The column of a descriptor, as an array with one value per
+        row."""
+
+        return self._columns[name]
+
+    @property
+    def columns(self):
+        """The names of the descriptor columns, sorted."""
+
+        return sorted(self._columns)
+
+    def add(self, molecules, keys=None):
+        """Compute the descriptors of molecules and add them as rows.
+
+        Parameters
+        ----------
+        molecules : collection[Molecule]
+            The molecules.  Their pKa estimates, atom classes and
+            canonical hashes are computed in one batch each.
+        keys : Optional[collection]
+            The key of each molecule.  Stored keys must be JSON
+            serializable.  Defaults to the ``id`` of each molecule if
+            it has one, and its row otherwise.
+        """
+
+        molecules = list(molecules)
+        if keys is None:
+            keys = [
+                getattr(molecule, 'id', len(self) + number)
+                for number, molecule in enumerate(molecules)
+            ]
+        keys = list(keys)
+        if len(keys) != len(molecules):
+            raise ValueError("Expected {} keys, got {}.".format(
+                len(molecules), len(keys)
+            ))
+        if not molecules:
+            return
+
+        hashes = canonical_hashes(molecules)
+        rows = [
+            _describe(molecule, estimate, classes)
+            for molecule, estimate, classes in zip(
+                molecules, estimate_many(molecules),
+                atom_classes_many(molecules))
+        ]
+
+        start = len(self)
+        names = set(self._columns)
+        for values, _ in rows:
+            names.update(values)
+        for name in names:
+            new = np.array([values.get(name, _default(name))
+                            for values, _ in rows])
+            old = self._columns.get(name)
+            if old is None:
+                old = np.full(start, _default(name), dtype=new.dtype)
+            self._columns[name] = np.concatenate([old, new])
+
+        sites = [site for _, row_sites in rows for site in row_sites]
+        lengths = np.cumsum([len(row_sites) for _, row_sites in rows])
+        self._sites = {
+            'site_offsets': np.concatenate([
+                self._sites['site_offsets'],
+                self._sites['site_offsets'][-1] + lengths
+            ]),
+            'site_classes': np.concatenate([
+                self._sites['site_classes'],
+                np.array([label for label, _ in sites], dtype='U')
+            ]),
+            'site_acid': np.concatenate([
+                self._sites['site_acid'],
+                np.array([pkas[0] for _, pkas in sites], dtype=float)
+            ]),
+            'site_base': np.concatenate([
+                self._sites['site_base'],
+                np.array([pkas[1] for _, pkas in sites], dtype=float)
+            ]),
+        }
+
+        for row, key in enumerate(hashes, start):
+            self._rows.setdefault(key, row)
+        self.keys.extend(keys)
+        self.hashes.extend(hashes)
+
+    def mask(self, **criteria):
+        """Find the rows meeting every criterion.
+
+        Parameters
+        ----------
+        **criteria
+            Per column, either a ``(low, high)`` pair, inclusive, with
+            ``None`` for no bound, or a value the column must equal.
+            A column no molecule had a value for (``count_Br``, say)
+            is taken to be 0.
+
+        Returns
+        -------
+        mask : numpy.ndarray
+            Booleans, one per row.
+
+        Examples
+        --------
+        >>> from CAOS.structures.molecule import Molecule
+        >>> store = DescriptorStore()
+        >>> store.add([
+        ...     Molecule({'a1': 'O', 'a2': 'H'},
+        ...              {'b1': {'nodes': ('a1', 'a2'), 'order': 1}},
+        ...              id='hydroxide'),
+        ...     Molecule({'a1': 'Cl'}, {}, id='chloride'),
+        ... ])
+        >>> store.select(hydroxyl=True, weight=(None, 20))
+        ['hydroxide']
+        """
+
+        mask = np.ones(len(self), dtype=bool)
+        for name, criterion in six.iteritems(criteria):
+            if name in self._columns:
+                column = self._columns[name]
+            else:
+                column = np.full(len(self), _default(name))
+            if isinstance(criterion, tuple):
+                low, high = criterion
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+            else:
+                mask &= column == criterion
+        return mask
+
+    def select(self, **criteria):
+        """The keys of the rows meeting every criterion, see `mask`."""
+
+        return [self.keys[row] for row in np.flatnonzero(
+            self.mask(**criteria)
+        ).tolist()]
+
+    def rows(self, molecules):
+        """Find the rows of molecules by their canonical hash.
+
+        Returns
+        -------
+        rows : list[Optional[int]]
+            The first row of each molecule, or ``None`` if it isn't in
+            the store.
+        """
+
+        return [self._rows.get(key) for key in canonical_hashes(molecules)]
+
+    def pka_estimates(self, molecules):
+        """The pKa estimates of molecules, rebuilt from the store.
+
+        Molecules that aren't in the store are estimated, in one batch.
+
+        Returns
+        -------
+        estimates : list[PkaEstimate]
+            The estimates, referring to the atoms of each molecule.
+        """
+
+        molecules = list(molecules)
+        rows = self.rows(molecules)
+        missing = [position for position, row in enumerate(rows)
+                   if row is None]
+        estimates = [None] * len(molecules)
+        for position, estimate in zip(missing, estimate_many(
+                molecules[position] for position in missing)):
+            estimates[position] = estimate
+
+        found = [position for position, row in enumerate(rows)
+                 if row is not None]
+        offsets = self._sites['site_offsets']
+        for position, classes in zip(found, atom_classes_many(
+                molecules[position] for position in found)):
+            row = rows[position]
+            start, stop = offsets[row], offsets[row + 1]
+            sites = dict(zip(
+                self._sites['site_classes'][start:stop].tolist(),
+                zip(self._sites['site_acid'][start:stop].tolist(),
+                    self._sites['site_base'][start:stop].tolist())
+            ))
+            acidic = {}
+            basic = {}
+            for atom_id, label in six.iteritems(classes):
+                if label not in sites:
+                    continue
+                acid, base = sites[label]
+                # NaN is the only value not equal to itself.
+                if acid == acid:
+                    acidic[atom_id] = acid
+                if base == base:
+                    basic[atom_id] = base
+            estimates[position] = PkaEstimate(acidic, basic)
+        return estimates
+
+    def save(self, path):
+        """Save the store to a directory, creating it if needed."""
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        arrays = dict(self._columns)
+        arrays.update(self._sites)
+        for name, array in six.iteritems(arrays):
+            np.save(os.path.join(path, name + '.npy'), array)
+        with open(os.path.join(path, _META), 'w') as meta:
+            json.dump({
+                'version': _STORE_VERSION,
+                'columns': sorted(self._columns),
+                'keys': self.keys,
+                'hashes': self.hashes,
+            }, meta)
+
+    def _load(self, path):
+        with open(os.path.join(path, _META)) as meta:
+            meta = json.load(meta)
+        if meta['version'] != _STORE_VERSION:
+            raise ValueError("Unsupported descriptor store version {}.".format(
+                meta['version']
+            ))
+
+        def load(name):
+            return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+        self.keys = meta['keys']
+        self.hashes = meta['hashes']
+        self._columns = dict((name, load(name)) for name in meta['columns'])
+        self._sites = dict((name, load(name)) for name in _SITE_COLUMNS)
+        for row, key in enumerate(self.hashes):
+            self._rows.setdefault(key, row)
+
+    def __repr__(self):
+        return "DescriptorStore({} molecules, {} columns)".format(
+            len(self), len(self._columns)
+        )
+
+
+def pka_estimates(molecules, conditions):
+    """Estimate pKas, using the descriptor store of the conditions.
+
+    Parameters
+    ----------
+    molecules : collection[Molecule]
+    conditions : mapping or sequence[mapping]
+        The conditions, or the conditions of each molecule.  Those with
+        a `DescriptorStore` under ``'descriptor_store'`` take the
+        estimates of the molecules it holds from it.
+
+    Returns
+    -------
+    estimates : list[PkaEstimate]
+        As `pka.estimate_many`.
+    """
+
+    molecules = list(molecules)
+    if conditions is None or hasattr(conditions, 'get'):
+        conditions = [conditions] * len(molecules)
+
+    groups = defaultdict(list)
+    stores = {}
+    for position, row_conditions in enumerate(conditions):
+        store = (row_conditions or {}).get('descriptor_store')
+        stores[id(store)] = store
+        groups[id(store)].append(position)
+
+    estimates = [None] * len(molecules)
+    for identity, positions in six.iteritems(groups):
+        store = stores[identity]
+        chosen = [molecules[position] for position in positions]
+        results = estimate_many(chosen) if store is None \
+            else store.pka_estimates(chosen)
+        for position, estimate in zip(positions, results):
+            estimates[position] = estimate
+    return estimates
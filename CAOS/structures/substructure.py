@@ -0,0 +1,640 @@
+"""Substructure queries over molecules.
+
+A `Pattern` describes a fragment of a molecule in the same format as a
+`Molecule` - a dictionary of atoms and a dictionary of bonds - except
+that atoms and bonds may be queries rather than plain values.  Patterns
+are matched as (non-induced) subgraphs, much like SMARTS.
+
+Matching is driven by a per-molecule `MoleculeIndex`, which records the
+atoms of each element and the elements of each atom's neighbors.  It is
+computed once per molecule and cached until the molecule changes, so the
+candidate atoms for each pattern atom can be found without scanning the
+whole graph, and most non-matching molecules are rejected before any
+search happens.
+
+Examples
+--------
+>>> from CAOS.structures.molecule import Molecule
+>>> water = Molecule(
+...     {'a1': 'H', 'a2': 'H', 'a3': 'O'},
+...     {'b1': {'nodes': ('a1', 'a3'), 'order': 1},
+...      'b2': {'nodes': ('a2', 'a3'), 'order': 1}}
+... )
+>>> hydroxyl = Pattern.from_string('O-H')
+>>> len(find_matches(hydroxyl, water))
+2
+
+Attributes
+----------
+FUNCTIONAL_GROUPS : dict[str, Pattern]
+    Common functional groups, by name.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import re
+from collections import defaultdict
+
+import six
+
+
+class AtomQuery(object):
+    """A predicate on an atom of a molecule.
+
+    Parameters
+    ----------
+    symbols : Optional[collection[str]]
+        The atom must be one of these elements.  Any element matches if
+        this is not given.
+    degree : Optional[int]
+        The atom must have exactly this many neighbors.
+    hydrogens : Optional[int]
+        The atom must have exactly this many hydrogen neighbors.
+    predicate : Optional[callable]
+        Called as ``predicate(molecule, atom_id)``; the atom only
+        matches if it returns a truthy value.
+    """
+
+    def __init__(self, symbols=None, degree=None, hydrogens=None,
+                 predicate=None):
+        if isinstance(symbols, six.string_types):
+            symbols = (symbols,)
+        self.symbols = frozenset(symbols) if symbols is not None else None
+        self.degree = degree
+        self.hydrogens = hydrogens
+        self.predicate = predicate
+
+    @classmethod
+    def coerce(cls, value):
+        """Build a query from a symbol, a list of symbols or a query.
+
+        ``None`` and ``'*'`` match any atom.
+        """
+
+        if isinstance(value, AtomQuery):
+            return value
+        elif value is None or value == '*':
+            return cls()
+        return cls(value)
+
+    def matches(self, molecule, index, atom_id):
+        """Check whether an atom of an indexed molecule matches.
+
+        Parameters
+        ----------
+        molecule : Molecule
+            The molecule the atom belongs to.
+        index : MoleculeIndex
+            The index of `molecule`.
+        atom_id : str
+            The atom being checked.
+
+        Returns
+        -------
+        bool
+            Whether or not the atom satisfies the query.
+        """
+
+        if self.symbols is not None and \
+                molecule.atoms[atom_id] not in self.symbols:
+            return False
+        if self.degree is not None and \
+                index.degrees[atom_id] != self.degree:
+            return False
+        if self.hydrogens is not None and \
+                index.signatures[atom_id].get('H', 0) != self.hydrogens:
+            return False
+        if self.predicate is not None and \
+                not self.predicate(molecule, atom_id):
+            return False
+        return True
+
+    def __repr__(self):
+        return "AtomQuery(symbols={}, degree={}, hydrogens={})".format(
+            sorted(self.symbols) if self.symbols is not None else None,
+            self.degree, self.hydrogens
+        )
+
+
+class BondQuery(object):
+    """A predicate on a bond of a molecule.
+
+    Parameters
+    ----------
+    order : Optional[int]
+        The bond must have this order.  Bonds without an explicit order
+        are single bonds.  Any order matches if this is not given.
+    predicate : Optional[callable]
+        Called with the bond's attribute dictionary; the bond only
+        matches if it returns a truthy value.
+    """
+
+    def __init__(self, order=None, predicate=None):
+        self.order = order
+        self.predicate = predicate
+
+    @classmethod
+    def coerce(cls, bond):
+        """Build a query from a pattern bond dictionary."""
+
+        if 'query' in bond:
+            return bond['query']
+        return cls(bond.get('order'))
+
+    def matches(self, attributes):
+        """Check whether a bond, given its attributes, matches."""
+
+        if self.order is not None and \
+                attributes.get('order', 1) != self.order:
+            return False
+        if self.predicate is not None and not self.predicate(attributes):
+            return False
+        return True
+
+
+class Pattern(object):
+    """A substructure that can be searched for in molecules.
+
+    Parameters
+    ----------
+    atoms : dict
+        Mapping from pattern atom id to an `AtomQuery`, an atomic
+        symbol, a collection of atomic symbols or ``'*'``.
+    bonds : dict
+        Mapping from pattern bond id to a dictionary with the ``'nodes'``
+        the bond connects and optionally an ``'order'`` or a ``'query'``
+        (a `BondQuery`).
+    """
+
+    _TOKEN = re.compile(r"\[([^\]]+)\]|([A-Z][a-z]?|\*)|([-=#~])")
+    _BOND_ORDERS = {'-': 1, '=': 2, '#': 3, '~': None}
+
+    def __init__(self, atoms, bonds):
+        self.atoms = dict(
+            (id_, AtomQuery.coerce(value)) for id_, value in
+            six.iteritems(atoms)
+        )
+        self.bonds = dict(
+            (id_, (tuple(bond['nodes']), BondQuery.coerce(bond)))
+            for id_, bond in six.iteritems(bonds)
+        )
+
+        self.neighbors = defaultdict(list)
+        for first, second in (nodes for nodes, _ in self.bonds.values()):
+            self.neighbors[first].append(second)
+            self.neighbors[second].append(first)
+
+        self._bond_between = {}
+        for nodes, query in self.bonds.values():
+            self._bond_between[nodes] = query
+            self._bond_between[nodes[::-1]] = query
+
+    @classmethod
+    def from_string(cls, text):
+        """Build a linear pattern from a short SMARTS-like string.
+
+        Atoms are atomic symbols, ``*`` for any atom or a bracketed,
+        comma separated list of symbols.  Atoms are joined by ``-``
+        (single), ``=`` (double), ``#`` (triple) or ``~`` (any) bonds;
+        adjacent atoms without a bond symbol are joined by a single
+        bond.
+
+        Parameters
+        ----------
+        text : str
+            The pattern, e.g. ``'O-H'``, ``'C=O'`` or ``'[N,O]-H'``.
+
+        Returns
+        -------
+        pattern : Pattern
+            The linear pattern.
+
+        Raises
+        ------
+        ValueError
+            If the string can't be parsed.
+        """
+
+        atoms = {}
+        bonds = {}
+        order = 1
+        position = 0
+        previous = None
+        text = text.replace(' ', '')
+
+        while position < len(text):
+            match = cls._TOKEN.match(text, position)
+            if match is None:
+                raise ValueError("Can't parse pattern {!r} at {}.".format(
+                    text, position
+                ))
+            position = match.end()
+            bracket, symbol, bond = match.groups()
+
+            if bond is not None:
+                if previous is None or \
+                        text[match.start() - 1] in cls._BOND_ORDERS:
+                    raise ValueError("Misplaced bond in pattern {!r}.".format(
+                        text
+                    ))
+                order = cls._BOND_ORDERS[bond]
+                continue
+
+            atom_id = "p{}".format(len(atoms))
+            atoms[atom_id] = bracket.split(',') if bracket else symbol
+            if previous is not None:
+                bonds["p{}".format(len(bonds))] = {
+                    'nodes': (previous, atom_id), 'order': order
+                }
+            previous = atom_id
+            order = 1
+
+        if not atoms or text[-1] in cls._BOND_ORDERS:
+            raise ValueError("Incomplete pattern {!r}.".format(text))
+        return cls(atoms, bonds)
+
+    def bond_between(self, first, second):
+        """Get the query for the bond between two pattern atoms."""
+
+        return self._bond_between[(first, second)]
+
+    def required_neighbors(self, atom_id):
+        """Count the fixed-element neighbors a pattern atom needs.
+
+        Returns
+        -------
+        counts : dict[str, int]
+            For each element, the number of neighbors of `atom_id` that
+            can only be that element.
+        """
+
+        counts = defaultdict(int)
+        for neighbor in self.neighbors[atom_id]:
+            symbols = self.atoms[neighbor].symbols
+            if symbols is not None and len(symbols) == 1:
+                counts[next(iter(symbols))] += 1
+        return counts
+
+    def required_elements(self):
+        """Count the atoms of each element the pattern needs.
+
+        Returns
+        -------
+        counts : dict[str, int]
+            For each element, the number of pattern atoms that can only
+            be that element.
+        """
+
+        counts = defaultdict(int)
+        for query in self.atoms.values():
+            if query.symbols is not None and len(query.symbols) == 1:
+                counts[next(iter(query.symbols))] += 1
+        return counts
+
+
+class MoleculeIndex(object):
+    """Precomputed lookups used to match patterns against a molecule.
+
+    Use `MoleculeIndex.of` rather than constructing these directly, so
+    that the index is cached on the molecule.
+
+    Attributes
+    ----------
+    by_symbol : dict[str, frozenset[str]]
+        The ids of the atoms of each element.
+    signatures : dict[str, dict[str, int]]
+        For each atom, the number of neighbors of each element.
+    degrees : dict[str, int]
+        The number of neighbors of each atom.
+    """
+
+    _CACHE_KEY = 'substructure_index'
+
+    def __init__(self, molecule):
+        by_symbol = defaultdict(set)
+        for atom_id, symbol in six.iteritems(molecule.atoms):
+            if atom_id in molecule:
+                by_symbol[symbol].add(atom_id)
+        self.by_symbol = dict(
+            (symbol, frozenset(ids)) for symbol, ids in
+            six.iteritems(by_symbol)
+        )
+
+        self.signatures = {}
+        self.degrees = {}
+        for atom_id in molecule:
+            signature = defaultdict(int)
+            for neighbor in molecule[atom_id]:
+                signature[molecule.atoms[neighbor]] += 1
+            self.signatures[atom_id] = dict(signature)
+            self.degrees[atom_id] = len(molecule[atom_id])
+
+    @classmethod
+    def of(cls, molecule):
+        """Get the (cached) index of a molecule."""
+
+        return molecule._cached(cls._CACHE_KEY, cls)
+
+    def element_counts(self):
+        """Count the atoms of each element in the molecule."""
+
+        return dict(
+            (symbol, len(ids)) for symbol, ids in six.iteritems(self.by_symbol)
+        )
+
+    def could_contain(self, pattern):
+        """Cheaply check whether the molecule might contain a pattern.
+
+        Returns
+        -------
+        bool
+            ``False`` if the molecule certainly doesn't contain the
+            pattern because it has too few atoms of some element.
+        """
+
+        for symbol, count in six.iteritems(pattern.required_elements()):
+            if len(self.by_symbol.get(symbol, ())) < count:
+                return False
+        return True
+
+    def candidates(self, molecule, pattern, atom_id):
+        """Find the atoms of the molecule a pattern atom could map to.
+
+        Parameters
+        ----------
+        molecule : Molecule
+            The indexed molecule.
+        pattern : Pattern
+            The pattern being matched.
+        atom_id : str
+            The pattern atom.
+
+        Returns
+        -------
+        candidates : set[str]
+            Ids of the molecule atoms that satisfy the atom query and
+            have enough neighbors of the right elements.
+        """
+
+        query = pattern.atoms[atom_id]
+        if query.symbols is None:
+            pool = self.degrees
+        else:
+            pool = set()
+            for symbol in query.symbols:
+                pool.update(self.by_symbol.get(symbol, ()))
+
+        needed = pattern.required_neighbors(atom_id)
+        degree = len(pattern.neighbors[atom_id])
+        return set(
+            candidate for candidate in pool
+            if self.degrees[candidate] >= degree and
+            all(self.signatures[candidate].get(symbol, 0) >= count
+                for symbol, count in six.iteritems(needed)) and
+            query.matches(molecule, self, candidate)
+        )
+
+
+def _search_order(pattern, candidates):
+    """Order pattern atoms so each one (after the first of its connected
+    component) is bonded to an atom earlier in the order."""
+
+    order = []
+    placed = set()
+    remaining = set(pattern.atoms)
+
+    while remaining:
+        start = min(remaining, key=lambda atom: (len(candidates[atom]), atom))
+        frontier = [start]
+        placed.add(start)
+        while frontier:
+            atom = frontier.pop(0)
+            order.append(atom)
+            remaining.discard(atom)
+            neighbors = sorted(
+                (neighbor for neighbor in pattern.neighbors[atom]
+                 if neighbor not in placed),
+                key=lambda neighbor: (len(candidates[neighbor]), neighbor)
+            )
+            for neighbor in neighbors:
+                placed.add(neighbor)
+                frontier.append(neighbor)
+    return order
+
+
+def _anchors(pattern, order):
+    """For each pattern atom, the atoms earlier in `order` it is bonded
+    to."""
+
+    positions = dict((atom, position) for position, atom in enumerate(order))
+    return dict(
+        (atom, [other for other in pattern.neighbors[atom]
+                if positions[other] < positions[atom]])
+        for atom in order
+    )
+
+
+class _Search(object):
+    """Backtracking search for the matches of a pattern, placing the
+    pattern atoms in `_search_order`."""
+
+    def __init__(self, pattern, molecule, candidates, unique):
+        self.pattern = pattern
+        self.molecule = molecule
+        self.candidates = candidates
+        self.unique = unique
+        self.order = _search_order(pattern, candidates)
+        self.anchors = _anchors(pattern, self.order)
+        self.seen = set()
+        self.mapping = {}
+        self.used = set()
+
+    def feasible(self, atom, option):
+        """Whether a free molecule atom is bonded, with matching bonds,
+        to the images of all the anchors of a pattern atom."""
+
+        bonded = self.molecule[option]
+        return all(
+            self.mapping[other] in bonded and
+            self.pattern.bond_between(atom, other).matches(
+                bonded[self.mapping[other]])
+            for other in self.anchors[atom]
+        )
+
+    def options(self, atom):
+        """The molecule atoms `atom` can be mapped to next."""
+
+        anchors = self.anchors[atom]
+        candidates = self.candidates[atom]
+        if anchors:
+            pool = (neighbor for neighbor in self.molecule[
+                self.mapping[anchors[0]]] if neighbor in candidates)
+        else:
+            pool = candidates
+        return sorted(
+            option for option in pool
+            if option not in self.used and self.feasible(atom, option)
+        )
+
+    def _complete(self):
+        if self.unique:
+            key = frozenset(self.used)
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+        return True
+
+    def extend(self, position=0):
+        """Yield the matches extending the current partial mapping."""
+
+        if position == len(self.order):
+            if self._complete():
+                yield dict(self.mapping)
+            return
+
+        atom = self.order[position]
+        for option in self.options(atom):
+            self.mapping[atom] = option
+            self.used.add(option)
+            for match in self.extend(position + 1):
+                yield match
+            self.used.discard(option)
+            del self.mapping[atom]
+
+
+def iter_matches(pattern, molecule, unique=True):
+    """Find every occurrence of a pattern in a molecule.
+
+    Parameters
+    ----------
+    pattern : Pattern
+        The substructure to search for.
+    molecule : Molecule
+        The molecule to search in.
+    unique : Optional[bool]
+        If true, only one match is given for each set of molecule atoms,
+        so that symmetric patterns aren't reported several times.
+
+    Yields
+    ------
+    match : dict[str, str]
+        Mapping from pattern atom ids to molecule atom ids.  In a
+        molecule with implicit hydrogens, pattern hydrogens are matched
+        in its explicit form, so they map to ids the molecule doesn't
+        have (see `Molecule.to_explicit`); other atoms keep their ids.
+    """
+
+    if getattr(molecule, 'implicit_hydrogens', False):
+        molecule = molecule._cached(
+            'explicit_form', lambda implicit: implicit.to_explicit()
+        )
+    index = MoleculeIndex.of(molecule)
+    if not pattern.atoms or not index.could_contain(pattern):
+        return
+
+    candidates = dict(
+        (atom_id, index.candidates(molecule, pattern, atom_id))
+        for atom_id in pattern.atoms
+    )
+    if not all(candidates.values()):
+        return
+
+    for match in _Search(pattern, molecule, candidates, unique).extend():
+        yield match
+
+
+def find_matches(pattern, molecule, unique=True):
+    """Find every occurrence of a pattern in a molecule.
+
+    See `iter_matches`.
+
+    Returns
+    -------
+    matches : list[dict[str, str]]
+        Mappings from pattern atom ids to molecule atom ids.
+    """
+
+    return list(iter_matches(pattern, molecule, unique))
+
+
+def has_match(pattern, molecule):
+    """Check whether a molecule contains a pattern at least once."""
+
+    for _ in iter_matches(pattern, molecule, unique=False):
+        return True
+    return False
+
+
+def query_library(pattern, molecules, unique=True):
+    """Search for a pattern in every molecule of a library.
+
+    Molecules that can't contain the pattern, based on their element
+    counts, are skipped without searching.
+
+    Parameters
+    ----------
+    pattern : Pattern
+        The substructure to search for.
+    molecules : iterable[Molecule]
+        The molecules to search in.
+    unique : Optional[bool]
+        See `iter_matches`.
+
+    Returns
+    -------
+    hits : list[tuple[int, list[dict[str, str]]]]
+        The position of each molecule containing the pattern, with its
+        matches.
+    """
+
+    hits = []
+    for position, molecule in enumerate(molecules):
+        matches = find_matches(pattern, molecule, unique)
+        if matches:
+            hits.append((position, matches))
+    return hits
+
+
+def _carboxylic_acid():
+    return Pattern(
+        {'c': 'C', 'o1': 'O', 'o2': 'O', 'h': 'H'},
+        {'b1': {'nodes': ('c', 'o1'), 'order': 2},
+         'b2': {'nodes': ('c', 'o2'), 'order': 1},
+         'b3': {'nodes': ('o2', 'h'), 'order': 1}}
+    )
+
+
+FUNCTIONAL_GROUPS = {
+    'hydroxyl': Pattern.from_string('O-H'),
+    'carbonyl': Pattern.from_string('C=O'),
+    'carboxylic_acid': _carboxylic_acid(),
+    'amino': Pattern.from_string('N-H'),
+    'thiol': Pattern.from_string('S-H'),
+    'nitrile': Pattern.from_string('C#N'),
+    'alkene': Pattern.from_string('C=C'),
+    'alkyne': Pattern.from_string('C#C'),
+    'acidic_hydrogen': Pattern.from_string('[O,N,S]-H'),
+}
+
+
+def functional_groups(molecule):
+    """Find the functional groups of `FUNCTIONAL_GROUPS` in a molecule.
+
+    The result is cached on the molecule until it changes.
+
+    Returns
+    -------
+    groups : dict[str, list[dict[str, str]]]
+        The matches of every functional group present in the molecule.
+    """
+
+    def compute(molecule):
+        groups = {}
+        for name, pattern in six.iteritems(FUNCTIONAL_GROUPS):
+            matches = find_matches(pattern, molecule)
+            if matches:
+                groups[name] = matches
+        return groups
+
+    return molecule._cached('functional_groups', compute)
@@ -0,0 +1,356 @@
+"""Run the same reactants through many variations of the conditions.
+
+`sweep` dispatches the reactants once for every point of a grid of
+conditions, but evaluates each requirement and mechanism only as often
+as its inputs actually change.
+
+The condition keys a function depends on are not declared: every call
+is made with conditions that record which keys were read.  The result
+is then cached under the values of those keys, together with the
+public attributes of the reactants (which requirements such as
+`requirements.pka` use to pass information on to mechanisms).  A later
+point whose values agree on those keys reuses the result, because a
+function that reads the same values takes the same path through its
+code.
+
+Every point starts from the reactants as they were given, as if it
+were dispatched on its own: attributes set by requirements at earlier
+points are removed first, and the changes mechanisms make to the
+reactants are rolled back (products that are reactants changed in
+place are copied first).  Products are validated when the point has
+``'validate'`` set, as by `react` (see `CAOS.validation`).  The
+attributes a requirement sets are recorded along with its result and
+set again whenever the result is reused, so mechanisms always see the
+attributes matching the current point.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import itertools
+
+import six
+
+from .descriptors import Descriptors, call
+from .dispatch import ReactionDispatcher
+from . import logger
+
+_REUSED_MESSAGE = "Reused the result of {} for conditions {}."
+
+# Instance attributes of networkx graphs, which describe the structure
+# rather than information added by requirements.
+_GRAPH_ATTRIBUTES = frozenset(
+    ['graph', 'node', 'adj', 'edge', 'succ', 'pred']
+)
+
+_EVERYTHING = None
+_MISSING = object()
+
+
+class _TrackedConditions(dict):
+    """Conditions that remember which keys were looked at.
+
+    Anything that looks at all of the keys at once (iterating over
+    them, for instance) makes the result depend on every key.
+    """
+
+    def __init__(self, conditions):
+        super(_TrackedConditions, self).__init__(conditions)
+        self.accessed = set()
+
+    def _everything(self):
+        self.accessed = _EVERYTHING
+
+    def _access(self, key):
+        if self.accessed is not _EVERYTHING:
+            self.accessed.add(key)
+
+    def __getitem__(self, key):
+        self._access(key)
+        return super(_TrackedConditions, self).__getitem__(key)
+
+    def __contains__(self, key):
+        self._access(key)
+        return super(_TrackedConditions, self).__contains__(key)
+
+    def get(self, key, default=None):
+        self._access(key)
+        return super(_TrackedConditions, self).get(key, default)
+
+    def __iter__(self):
+        self._everything()
+        return super(_TrackedConditions, self).__iter__()
+
+    def __len__(self):
+        self._everything()
+        return super(_TrackedConditions, self).__len__()
+
+    def keys(self):
+        self._everything()
+        return super(_TrackedConditions, self).keys()
+
+    def values(self):
+        self._everything()
+        return super(_TrackedConditions, self).values()
+
+    def items(self):
+        self._everything()
+        return super(_TrackedConditions, self).items()
+
+    if six.PY2:
+        def iterkeys(self):
+            self._everything()
+            return super(_TrackedConditions, self).iterkeys()
+
+        def itervalues(self):
+            self._everything()
+            return super(_TrackedConditions, self).itervalues()
+
+        def iteritems(self):
+            self._everything()
+            return super(_TrackedConditions, self).iteritems()
+
+    def copy(self):
+        self._everything()
+        return dict(super(_TrackedConditions, self).items())
+
+
+def _freeze(value):
+    """Turn a condition value into something hashable."""
+
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted(
+            ((_freeze(key), _freeze(item))
+             for key, item in six.iteritems(value)),
+            key=repr
+        ))
+    elif isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(
+            _freeze(item) for item in value
+        )
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    elif hasattr(value, 'tobytes') and hasattr(value, 'dtype'):
+        return ('array', value.shape, value.dtype.str, value.tobytes())
+    try:
+        hash(value)
+    except TypeError:
+        raise _Uncacheable(value)
+    return value
+
+
+class _Uncacheable(Exception):
+    """Raised by `_freeze` for values that can't be part of a cache key.
+
+    Falling back to something like their ``repr`` would let different
+    values share a result, so calls involving them aren't cached.
+    """
+
+
+def _frozen_state(reactants):
+    """`_state`, or None if an attribute can't be frozen."""
+
+    try:
+        return _state(reactants)
+    except _Uncacheable:
+        return None
+
+
+def _attributes(reactant):
+    return dict(
+        (name, value) for name, value in six.iteritems(vars(reactant))
+        if not name.startswith('_') and name not in _GRAPH_ATTRIBUTES
+    )
+
+
+def _state(reactants):
+    return tuple(
+        tuple(sorted(
+            (name, _freeze(value))
+            for name, value in six.iteritems(_attributes(reactant))
+        )) for reactant in reactants
+    )
+
+
+def _restore(reactants, originals):
+    """Put back the public attributes the reactants started with."""
+
+    for reactant, original in zip(reactants, originals):
+        for name in _attributes(reactant):
+            if name not in original:
+                delattr(reactant, name)
+        for name, value in six.iteritems(original):
+            setattr(reactant, name, value)
+
+
+class _Results(object):
+    """Cached results of calling requirements and mechanisms."""
+
+    def __init__(self):
+        # function -> accessed keys -> (state, values) -> (result, effects)
+        self._entries = {}
+        self.calls = 0
+        self.reused = 0
+
+    @staticmethod
+    def _values(keys, conditions):
+        if keys is _EVERYTHING:
+            return _freeze(dict(conditions))
+        return tuple(_freeze(conditions.get(key, _MISSING)) for key in keys)
+
+    def _key(self, state, keys, conditions):
+        """The cache key of a call, or None if it can't be cached."""
+
+        if state is None:
+            return None
+        try:
+            return state, self._values(keys, conditions)
+        except _Uncacheable:
+            return None
+
+    def _reuse(self, entries, state, reactants, conditions):
+        """Find a cached result, setting the attributes it recorded.
+
+        Returns
+        -------
+        found : tuple
+            The result in a 1-tuple, or an empty tuple if there is none.
+        """
+
+        for keys, results in six.iteritems(entries):
+            key = self._key(state, keys, conditions)
+            if key in results:
+                result, effects = results[key]
+                for reactant, changes in zip(reactants, effects):
+                    for name, value in six.iteritems(changes):
+                        setattr(reactant, name, value)
+                return (result,)
+        return ()
+
+    def call(self, function, reactants, conditions, mechanism=False):
+        """Call a requirement or mechanism, or reuse its result.
+
+        Calls whose conditions or reactant attributes include values
+        `_freeze` can't handle are always made, and never cached.
+        """
+
+        entries = self._entries.setdefault(function, {})
+        state = _frozen_state(reactants)
+        found = self._reuse(entries, state, reactants, conditions)
+        if found:
+            self.reused += 1
+            logger.log(_REUSED_MESSAGE.format(
+                getattr(function, '__name__', function), conditions
+            ))
+            return found[0]
+
+        before = [_attributes(reactant) for reactant in reactants]
+        tracked = _TrackedConditions(conditions)
+        # Descriptors read the same tracked conditions, so the keys they
+        # depend on count as keys of the function using them.
+        # Mechanisms are called as by `react`, so they leave the
+        # structure of the reactants as it was.
+        result = (ReactionDispatcher._attempt if mechanism else call)(
+            function, reactants, tracked, Descriptors(reactants, tracked)
+        )
+        if hasattr(result, '__iter__') and iter(result) is result:
+            # Lazy results can only be consumed once.
+            result = list(result)
+        effects = [
+            dict((name, value) for name, value in six.iteritems(
+                _attributes(reactant))
+                if name not in old or old[name] is not value)
+            for reactant, old in zip(reactants, before)
+        ]
+        self.calls += 1
+
+        keys = tracked.accessed
+        if keys is not _EVERYTHING:
+            keys = tuple(sorted(keys, key=repr))
+        key = self._key(state, keys, conditions)
+        if key is not None:
+            entries.setdefault(keys, {})[key] = (result, effects)
+        return result
+
+
+def _points(variations):
+    """Expand the variations into a list of condition overrides."""
+
+    if isinstance(variations, dict):
+        keys = sorted(variations, key=repr)
+        return [
+            dict(zip(keys, values))
+            for values in itertools.product(
+                *[variations[key] for key in keys]
+            )
+        ]
+    return [dict(variation) for variation in variations]
+
+
+def sweep(reactants, conditions, variations, __test=False):
+    """React the same reactants under many variations of the conditions.
+
+    Parameters
+    ----------
+    reactants : collection[Molecule]
+        The reactants, shared by every point.  Attributes requirements
+        set on them are removed again once the sweep is done.
+    conditions : mapping[str -> object]
+        The conditions common to every point.
+    variations : mapping[str -> collection] or collection[mapping]
+        Either a grid, given as the values to try for each key (every
+        combination is a point), or a sequence of mappings, each of
+        which is one point.  A point's values replace those in
+        `conditions`.
+    __test : bool
+        Whether or not to use the testing namespace.
+
+    Returns
+    -------
+    results : list[tuple[dict, list]]
+        The full conditions of each point and its products, or ``None``
+        for the points where no mechanism could react.  Points with the
+        same relevant inputs share the same product list.
+
+    Notes
+    -----
+    Mechanisms are tried in the same order as by `react`, and a point's
+    products are the first non-empty result.  Lazy results (iterators)
+    are turned into lists, so they can be shared between points.
+    """
+
+    namespace = ReactionDispatcher._dispatch_namespace(__test)
+    reactants = list(reactants)
+    originals = [_attributes(reactant) for reactant in reactants]
+    results = _Results()
+
+    swept = []
+    for variation in _points(variations):
+        point = dict(conditions)
+        point.update(variation)
+        _restore(reactants, originals)
+
+        mechanisms = []
+        for mech_name, mech_info in six.iteritems(namespace):
+            for requirement in mech_info['requirements']:
+                if not results.call(requirement, reactants, point):
+                    break
+            else:
+                mechanisms.append(
+                    ReactionDispatcher._load_mechanism(mech_name, mech_info)
+                )
+
+        products = None
+        for mechanism in mechanisms:
+            products = results.call(
+                mechanism, reactants, point, mechanism=True
+            ) or None
+            if products:
+                break
+        swept.append((point, products))
+
+    _restore(reactants, originals)
+    logger.log("Swept {} points with {} calls ({} reused).".format(
+        len(swept), results.calls, results.reused
+    ))
+    return swept
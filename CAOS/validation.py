@@ -0,0 +1,236 @@
+"""Checks that the products of a mechanism are chemically sane.
+
+Mechanisms edit molecules by hand, and a mistake (a hydrogen added to an
+atom that already has all of its bonds, an atom removed from the graph
+but left in `Molecule.atoms`) otherwise only shows up much later, if at
+all.  With the ``'validate'`` condition set, the products of every
+mechanism are checked before they are accepted; products failing a
+check raise an `InvalidProductError`, and the changes the mechanism
+made to the reactants are rolled back.
+
+The checks are:
+
+``'valence'``
+    No atom has a larger sum of bond orders than its element allows
+    (see `CAOS.structures.elements.MAX_VALENCES`).
+``'consistency'``
+    The ``atoms`` and ``bonds`` dicts of each product agree with its
+    graph.
+``'charge'``
+    The net formal charge of the products is that of the reactants.
+``'mass'``
+    The products have as many atoms of each element as the reactants.
+
+They read the summaries each molecule keeps up to date (see
+`CAOS.structures.molecule`), and a product that is a reactant changed
+in place only has the atoms the mechanism touched checked, so the cost
+is proportional to the size of the change rather than of the molecules.
+The balance checks assume the products account for all of the
+reactants, so leave them out for mechanisms returning only some of them
+(such as the ``'mixture'`` and ``'equilibrium'`` modes of the acid base
+mechanism) by giving the checks to run: ``{'validate': ('valence',
+'consistency')}``.
+
+Attributes
+----------
+CHECKS: tuple[str]
+    The names of the checks, all of which ``'validate': True`` runs.
+validate_products: function
+    Checks the products of a reaction.
+validated_call: function
+    Calls a mechanism, validating its products if the conditions ask.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from collections import Counter
+
+import six
+
+from .descriptors import call
+from .exceptions.reaction_errors import InvalidProductError
+from .structures.elements import MAX_VALENCES
+from . import logger
+
+CHECKS = ('valence', 'consistency', 'charge', 'mass')
+
+_INVALID_MESSAGE = "Invalid products of {}: {}"
+
+
+def _checks(conditions):
+    """The checks the conditions ask for."""
+
+    validate = None if conditions is None else conditions.get('validate')
+    if not validate:
+        return ()
+    if validate is True:
+        return CHECKS
+    if isinstance(validate, six.string_types):
+        validate = (validate,)
+    unknown = set(validate).difference(CHECKS)
+    if unknown:
+        raise ValueError("Unknown product checks {}.".format(sorted(unknown)))
+    return tuple(validate)
+
+
+def _molecules(items):
+    return [item for item in items or () if hasattr(item, 'element_counts')]
+
+
+def _totals(molecules):
+    """The net charge and element counts of some molecules."""
+
+    charge = 0
+    elements = Counter()
+    for molecule in _molecules(molecules):
+        charge += molecule.charge
+        elements.update(molecule.element_counts())
+    return charge, elements
+
+
+def _check_valence(molecule, atoms, problems):
+    for atom in atoms:
+        if atom not in molecule.node:
+            continue
+        symbol = molecule.node[atom]['symbol']
+        limit = MAX_VALENCES.get(symbol)
+        order_sum = molecule.bond_order_sum(atom)
+        if limit is not None and order_sum > limit:
+            problems.append(
+                "atom {} ({}) has a bond order sum of {}, more than {}".format(
+                    atom, symbol, order_sum, limit
+                )
+            )
+
+
+def _check_consistency(molecule, atoms, problems):
+    # Equal sizes, and every atom and bond of the graph being in the
+    # dicts, means the dicts hold nothing else.
+    if len(molecule.atoms) != molecule.number_of_nodes():
+        problems.append("{} atoms in the dict but {} in the graph".format(
+            len(molecule.atoms), molecule.number_of_nodes()
+        ))
+    if len(molecule.bonds) != molecule.number_of_edges():
+        problems.append("{} bonds in the dict but {} in the graph".format(
+            len(molecule.bonds), molecule.number_of_edges()
+        ))
+    for atom in atoms:
+        if atom not in molecule.node:
+            if atom in molecule.atoms:
+                problems.append("removed atom {} is still in the dict".format(
+                    atom
+                ))
+            continue
+        if molecule.atoms.get(atom) != molecule.node[atom]['symbol']:
+            problems.append("atom {} is {} in the dict but {} in the graph"
+                            .format(atom, molecule.atoms.get(atom),
+                                    molecule.node[atom]['symbol']))
+        for neighbor, data in six.iteritems(molecule.adj[atom]):
+            bond = molecule.bonds.get(data.get('id'))
+            if bond is None or set(bond['nodes']) != set((atom, neighbor)):
+                problems.append(
+                    "bond {} between {} and {} doesn't match the dict".format(
+                        data.get('id'), atom, neighbor
+                    )
+                )
+
+
+def validate_products(reactants, products, checks=CHECKS, before=None,
+                      mechanism=None):
+    """Check the products of a reaction.
+
+    Parameters
+    ----------
+    reactants : collection[Molecule]
+        The reactants.
+    products : collection[Molecule]
+        The products; ``None`` entries and objects that aren't molecules
+        are skipped.
+    checks : Optional[collection[str]]
+        The checks to run, see `CHECKS`.
+    before : Optional[tuple[int, Counter]]
+        The net charge and element counts of the reactants before the
+        reaction, if it changed them in place.  Computed from
+        `reactants` if not given.
+    mechanism : Optional[str]
+        The name of the mechanism, for the error message.
+
+    Raises
+    ------
+    InvalidProductError
+        If a check fails, with every problem found in the message.
+    """
+
+    problems = []
+    molecules = _molecules(products)
+    if 'valence' in checks or 'consistency' in checks:
+        for molecule in molecules:
+            # A reactant changed in place only needs the atoms the
+            # mechanism touched checked.
+            atoms = molecule._touched_atoms()
+            if atoms is None:
+                atoms = list(molecule)
+            if 'valence' in checks:
+                _check_valence(molecule, atoms, problems)
+            if 'consistency' in checks:
+                _check_consistency(molecule, atoms, problems)
+
+    if 'charge' in checks or 'mass' in checks:
+        charge, elements = before or _totals(reactants)
+        product_charge, product_elements = _totals(molecules)
+        if 'charge' in checks and charge != product_charge:
+            problems.append("net charge went from {} to {}".format(
+                charge, product_charge
+            ))
+        if 'mass' in checks and elements != product_elements:
+            problems.append("atoms went from {} to {}".format(
+                dict(elements), dict(product_elements)
+            ))
+
+    if problems:
+        message = _INVALID_MESSAGE.format(mechanism, '; '.join(problems))
+        logger.log(message)
+        raise InvalidProductError(message)
+
+
+def validated_call(mechanism, reactants, conditions, descriptors):
+    """Call a mechanism as `CAOS.descriptors.call` does, validating its
+    products if the conditions have ``'validate'`` set.
+
+    Parameters
+    ----------
+    mechanism : callable
+    reactants : collection[Molecule]
+    conditions : mapping[str -> object]
+        ``conditions['validate']`` is True to run every check, or the
+        names of the checks to run.
+    descriptors : Descriptors
+
+    Returns
+    -------
+    products : object
+        Whatever the mechanism returns, as a list if it was validated.
+
+    Raises
+    ------
+    InvalidProductError
+        If the products fail a check.
+    ValueError
+        If an unknown check is asked for.
+    """
+
+    checks = _checks(conditions)
+    if not checks:
+        return call(mechanism, reactants, conditions, descriptors)
+
+    before = None
+    if 'charge' in checks or 'mass' in checks:
+        before = _totals(reactants)
+    products = call(mechanism, reactants, conditions, descriptors)
+    if products:
+        if not isinstance(products, list):
+            products = list(products)
+        validate_products(reactants, products, checks, before,
+                          getattr(mechanism, '__name__', mechanism))
+    return products
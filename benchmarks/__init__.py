@@ -0,0 +1,19 @@
+"""Performance benchmarks for the CAOS system.
+
+Benchmarks are plain functions whose names start with ``bench_`` and
+which take a single ``benchmark`` argument, in the same style as the
+``pytest-benchmark`` fixture.  They are collected from the ``bench_*``
+modules in this package and run by `benchmarks.runner`.
+
+Examples
+--------
+Run the suite and store a baseline, then compare a later run against
+it::
+
+    python -m benchmarks.runner run --save baseline.json
+    python -m benchmarks.runner run --save current.json
+    python -m benchmarks.runner compare baseline.json current.json
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
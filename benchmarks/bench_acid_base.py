@@ -0,0 +1,81 @@
+"""Benchmarks for the acid base mechanism."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.dispatch import react
+from CAOS.mechanisms.acid_base import acid_base_mixture, acid_base_reaction
+from CAOS.mechanisms.requirements import pka
+
+from . import generators
+from .runner import parametrize
+
+
+@parametrize('size')
+def bench_pka_requirement(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    assert benchmark(pka, reactants, conditions)
+
+
+def _undone(function, reactants):
+    """Call `function` in a transaction on the reactants and roll it
+    back, so the reactants can be reacted again in the next round."""
+
+    def attempt(*args):
+        for reactant in reactants:
+            reactant.begin()
+        try:
+            return function(*args)
+        finally:
+            for reactant in reversed(reactants):
+                reactant.rollback()
+    return attempt
+
+
+@parametrize('size')
+def bench_acid_base_reaction(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    pka(reactants, conditions)
+    benchmark(
+        _undone(acid_base_reaction, reactants), reactants, conditions
+    )
+
+
+@parametrize('size')
+def bench_react_acid_base(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    benchmark(_undone(react, reactants), reactants, conditions)
+
+
+@parametrize('size')
+def bench_react_acid_base_validated(benchmark, size):
+    """As `bench_react_acid_base`, checking the products; only the atoms
+    the transfer touched are checked."""
+
+    reactants, conditions = generators.acid_base_pair(size)
+    conditions = dict(conditions, validate=True)
+    benchmark(_undone(react, reactants), reactants, conditions)
+
+
+@parametrize('size')
+def bench_mixture_ranking(benchmark, size):
+    # Ten species per unit of size, so the default sizes reach 10k.
+    reactants = generators.mixture(size * 10)
+
+    def rank(reactants):
+        transfers = acid_base_mixture(reactants, {})
+        return next(transfers, None)
+
+    benchmark.pedantic(rank, args=(reactants,), rounds=3)
+
+
+@parametrize('size')
+def bench_mixture_exclusive(benchmark, size):
+    reactants = generators.mixture(size * 10)
+
+    def pair_up(reactants):
+        return sum(1 for _ in acid_base_mixture(
+            reactants, {}, exclusive=True
+        ))
+
+    benchmark.pedantic(pair_up, args=(reactants,), rounds=3)
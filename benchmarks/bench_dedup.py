@@ -0,0 +1,48 @@
+"""Benchmarks for deduplicating product streams."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from CAOS.dedup import KeyStore, deduplicate
+
+from . import generators
+from .runner import parametrize
+
+
+def _stream(size):
+    # Fresh molecules, a fifth of them distinct, so no hash is cached.
+    library = generators.library(size, seed=2, max_carbons=6)
+    return [library[(i * 5) % size] if i % 5 else library[i]
+            for i in range(size)]
+
+
+@parametrize('size')
+def bench_deduplicate(benchmark, size):
+    def run(stream):
+        return sum(1 for _ in deduplicate(stream))
+
+    benchmark.pedantic(run, setup=lambda: ((_stream(size),), {}), rounds=3)
+
+
+@parametrize('size')
+def bench_key_store_spilling(benchmark, size):
+    """Count 1000 keys per unit of `size`, half of them repeats, keeping
+    at most 10000 in memory."""
+
+    rng = np.random.RandomState(0)
+    distinct = rng.randint(0, 2 ** 62, size=size * 500, dtype=np.int64)
+    keys = np.concatenate([distinct, distinct]).astype(np.uint64)
+    rng.shuffle(keys)
+
+    def run():
+        with KeyStore(memory_limit=10000) as store:
+            for start in range(0, len(keys), 10000):
+                batch, counts = np.unique(
+                    keys[start:start + 10000], return_counts=True
+                )
+                store.add(batch, counts)
+            return len(store)
+
+    benchmark.pedantic(run, rounds=1)
@@ -0,0 +1,40 @@
+"""Benchmarks for recording reaction outcomes as deltas."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+from CAOS.delta import ReactionDelta, react_delta
+from CAOS.dispatch import react
+
+from . import generators
+from .runner import parametrize
+
+
+@parametrize('size')
+def bench_react_delta(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    benchmark(react_delta, reactants, conditions)
+
+
+@parametrize('size')
+def bench_react_copies(benchmark, size):
+    """What keeping the reactants intact costs without deltas."""
+
+    reactants, conditions = generators.acid_base_pair(size)
+    benchmark(lambda: react(deepcopy(reactants), conditions))
+
+
+@parametrize('size')
+def bench_delta_round_trip(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    text = react_delta(reactants, conditions).dumps()
+    benchmark(lambda: ReactionDelta.loads(text, reactants).dumps())
+
+
+@parametrize('size')
+def bench_delta_materialize(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    delta = react_delta(reactants, conditions)
+    benchmark(lambda: ReactionDelta(delta.reactants, delta.edits).products)
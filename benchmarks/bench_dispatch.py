@@ -0,0 +1,88 @@
+"""Benchmarks for mechanism registration and dispatch."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.dispatch import ReactionDispatcher, react, react_many, \
+    register_reaction_mechanism
+from CAOS.exceptions.reaction_errors import FailedReactionError
+
+from . import generators
+from .runner import parametrize
+
+
+def _passes(reactants, conditions):
+    return True
+
+
+def _fails(reactants, conditions):
+    return False
+
+
+def _register(count, requirements, prefix='bench_mechanism'):
+    names = []
+    for i in range(count):
+        def mechanism(reactants, conditions):
+            return ['product']
+        mechanism.__name__ = str('{}_{}'.format(prefix, i))
+        register_reaction_mechanism(requirements, True)(mechanism)
+        names.append(mechanism.__name__)
+    return names
+
+
+def _unregister(names):
+    for name in names:
+        del ReactionDispatcher._test_namespace[name]
+
+
+@parametrize('mechanisms', (1, 10, 100, 1000))
+def bench_generate_likely_reactions(benchmark, mechanisms):
+    names = _register(mechanisms, [_passes, _passes, _fails])
+    try:
+        benchmark(
+            ReactionDispatcher._generate_likely_reactions,
+            [], {}, ReactionDispatcher._get_namespace(True)
+        )
+    finally:
+        _unregister(names)
+
+
+@parametrize('mechanisms', (1, 10, 100, 1000))
+def bench_react_last_candidate(benchmark, mechanisms):
+    names = _register(mechanisms - 1, [_fails], 'bench_failing')
+    names += _register(1, [_passes], 'bench_passing')
+    try:
+        benchmark(ReactionDispatcher._react, [], {}, True)
+    finally:
+        _unregister(names)
+
+
+def _mixture_pairs(count):
+    species = generators.mixture(count * 2)
+    return [species[i:i + 2] for i in range(0, len(species), 2)]
+
+
+@parametrize('size')
+def bench_react_many(benchmark, size):
+    # Ten reactions per unit of size, with estimated pKas.
+    def setup():
+        return (_mixture_pairs(size * 10), {}), {}
+
+    benchmark.pedantic(react_many, setup=setup, rounds=3)
+
+
+@parametrize('size')
+def bench_react_loop(benchmark, size):
+    def setup():
+        return (_mixture_pairs(size * 10),), {}
+
+    def loop(reactant_sets):
+        products = []
+        for reactants in reactant_sets:
+            try:
+                products.append(react(reactants, {}))
+            except FailedReactionError:
+                products.append(None)
+        return products
+
+    benchmark.pedantic(loop, setup=setup, rounds=3)
@@ -0,0 +1,48 @@
+"""Benchmarks for enumerating the reactions of a mixture."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+from itertools import combinations
+
+from CAOS.dispatch import react_many
+from CAOS.enumeration import feasible_reactions, react_mixture
+
+from . import generators
+from .runner import parametrize
+
+
+def _species(size):
+    # The number of pairs grows with the square of the species, so the
+    # default sizes give about 400, 5k and 50k pairs.
+    return generators.mixture(10 * int(round(size ** 0.5)))
+
+
+@parametrize('size')
+def bench_feasible_reactions(benchmark, size):
+    species = _species(size)
+    benchmark.pedantic(
+        lambda: sum(1 for _ in feasible_reactions(species, {})), rounds=3
+    )
+
+
+@parametrize('size')
+def bench_react_mixture(benchmark, size):
+    species = _species(size)
+    benchmark.pedantic(
+        lambda: sum(1 for _ in react_mixture(species, {})), rounds=1
+    )
+
+
+@parametrize('size')
+def bench_react_all_pairs(benchmark, size):
+    """What reacting a mixture costs by dispatching copies of every pair."""
+
+    species = _species(size)
+
+    def setup():
+        pairs = [deepcopy(list(pair)) for pair in combinations(species, 2)]
+        return (pairs, {}), {}
+
+    benchmark.pedantic(react_many, setup=setup, rounds=1)
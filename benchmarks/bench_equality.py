@@ -0,0 +1,54 @@
+"""Benchmarks for `Molecule.__eq__`, which is a graph isomorphism."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from . import generators
+from .runner import parametrize
+
+
+def _relabeled(atoms, bonds):
+    # Reverse the atom ids so the two molecules are isomorphic but not
+    # trivially identical.
+    count = len(atoms)
+    mapping = dict(
+        ("a{}".format(i), "a{}".format(count - 1 - i)) for i in range(count)
+    )
+    new_atoms = dict((mapping[id_], symbol) for id_, symbol in atoms.items())
+    new_bonds = dict(
+        (id_, {'nodes': tuple(mapping[n] for n in bond['nodes']),
+               'order': bond['order']})
+        for id_, bond in bonds.items()
+    )
+    return new_atoms, new_bonds
+
+
+@parametrize('size')
+def bench_equal_chains(benchmark, size):
+    first = generators.chain(size)
+    second = generators.Molecule(*_relabeled(*generators.chain_spec(size)))
+    assert benchmark(first.__eq__, second)
+
+
+@parametrize('size')
+def bench_equal_rings(benchmark, size):
+    first = generators.ring(size)
+    second = generators.Molecule(*_relabeled(*generators.ring_spec(size)))
+    assert benchmark(first.__eq__, second)
+
+
+@parametrize('size')
+def bench_equal_alkanes(benchmark, size):
+    carbons = max(size // 3, 1)
+    first = generators.alkane(carbons)
+    second = generators.Molecule(
+        *_relabeled(*generators.alkane_spec(carbons))
+    )
+    assert benchmark(first.__eq__, second)
+
+
+@parametrize('size')
+def bench_unequal_chain_and_ring(benchmark, size):
+    first = generators.chain(max(size, 3))
+    second = generators.ring(max(size, 3))
+    assert not benchmark(first.__eq__, second)
@@ -0,0 +1,39 @@
+"""Benchmarks for the acid-base equilibrium solver."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from CAOS.structures import equilibrium
+
+from . import generators
+from .runner import parametrize
+
+_SPECIES = 300
+
+
+def _buffer(species, seed=0):
+    rng = np.random.RandomState(seed)
+    table = equilibrium.pka_table(rng.uniform(0, 14, (species, 2)))
+    return table, np.zeros(species), np.full((1, species), 1e-3)
+
+
+@parametrize('size')
+def bench_solve_titration(benchmark, size):
+    # Hundreds of species, and a titration point per unit of size.
+    table, charges, totals = _buffer(_SPECIES)
+    added_base = np.linspace(-0.5, 0.5, size)
+    benchmark(equilibrium.solve_ph, table, charges, totals, added_base)
+
+
+@parametrize('size')
+def bench_fractions_sweep(benchmark, size):
+    table, _, _ = _buffer(_SPECIES)
+    benchmark(equilibrium.fractions, table, np.linspace(0, 14, size))
+
+
+@parametrize('size')
+def bench_speciate_mixture(benchmark, size):
+    reactants = generators.mixture(size)
+    benchmark(equilibrium.speciate, reactants, {})
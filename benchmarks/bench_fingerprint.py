@@ -0,0 +1,54 @@
+"""Benchmarks for fingerprints and similarity search."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from CAOS.structures.fingerprint import FingerprintIndex, fingerprints
+
+from . import generators
+from .runner import parametrize
+
+
+@parametrize('size')
+def bench_fingerprints(benchmark, size):
+    """Fingerprint a library (computed in every round, on fresh
+    molecules)."""
+
+    benchmark.pedantic(
+        fingerprints, setup=lambda: ((generators.library(size),), {}),
+        rounds=3
+    )
+
+
+def _index(rows):
+    # Random fingerprints with about as many bits set as real ones,
+    # standing in for a library of `rows` molecules.
+    rng = np.random.RandomState(0)
+    index = FingerprintIndex()
+    for start in range(0, rows, 10000):
+        count = min(rows - start, 10000)
+        bits = rng.random_sample((count, index.size)) < 0.02
+        index.add_fingerprints(
+            np.packbits(bits, axis=1), range(start, start + count)
+        )
+    return index
+
+
+@parametrize('size')
+def bench_search_top_k(benchmark, size):
+    """Find the 10 nearest of 100 fingerprints per unit of `size`."""
+
+    index = _index(size * 100)
+    query = np.packbits(np.random.RandomState(1).random_sample(
+        index.size) < 0.02)
+    benchmark(index.search, query, 10)
+
+
+@parametrize('size')
+def bench_search_threshold(benchmark, size):
+    index = _index(size * 100)
+    query = np.packbits(np.random.RandomState(1).random_sample(
+        index.size) < 0.02)
+    benchmark(index.search, query, None, 0.7)
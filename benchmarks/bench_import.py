@@ -0,0 +1,26 @@
+"""Benchmarks for the time taken to import the library."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import subprocess
+import sys
+
+
+def _import(statement):
+    subprocess.check_call([sys.executable, '-c', statement])
+
+
+def bench_interpreter_startup(benchmark):
+    benchmark.pedantic(_import, args=('pass',), rounds=10)
+
+
+def bench_import_caos(benchmark):
+    benchmark.pedantic(_import, args=('import CAOS',), rounds=10)
+
+
+def bench_import_dispatch_and_molecule(benchmark):
+    benchmark.pedantic(
+        _import,
+        args=('import CAOS.dispatch, CAOS.structures.molecule',), rounds=10
+    )
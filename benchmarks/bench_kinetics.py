@@ -0,0 +1,62 @@
+"""Benchmarks for integrating mass-action kinetics."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from CAOS.kinetics import KineticModel, simulate
+from CAOS.network import expand_network
+
+from . import generators
+from .runner import parametrize
+
+_TIMES = [0, 0.4, 40, 4e5]
+
+
+def _robertson():
+    return KineticModel('ABC', [
+        ({'A': 1}, {'B': 1}),
+        ({'B': 2}, {'B': 1, 'C': 1}),
+        ({'B': 1, 'C': 1}, {'A': 1, 'C': 1}),
+    ], [0.04, 3e7, 1e4])
+
+
+def _scan(size):
+    # A scan over the rate of the first reaction.
+    rate_constants = np.tile([0.04, 3e7, 1e4], (size, 1))
+    rate_constants[:, 0] *= np.linspace(0.5, 2, size)
+    initial = np.tile([1.0, 0, 0], (size, 1))
+    return initial, rate_constants
+
+
+@parametrize('size')
+def bench_simulate_batch(benchmark, size):
+    model = _robertson()
+    initial, rate_constants = _scan(size)
+    benchmark.pedantic(simulate, args=(model, initial, _TIMES,
+                                       rate_constants), rounds=1)
+
+
+@parametrize('size', (10, 100))
+def bench_simulate_loop(benchmark, size):
+    """What the scan costs one run at a time."""
+
+    model = _robertson()
+    initial, rate_constants = _scan(size)
+
+    def loop():
+        return [simulate(model, row, _TIMES, constants)
+                for row, constants in zip(initial, rate_constants)]
+
+    benchmark.pedantic(loop, rounds=1)
+
+
+@parametrize('size', (10, 100))
+def bench_simulate_network(benchmark, size):
+    network = expand_network(generators.mixture(size), {}, depth=2)
+    model = KineticModel.from_network(network)
+    benchmark.pedantic(
+        simulate, args=(model, np.ones(len(model)), np.linspace(0, 10, 11)),
+        rounds=1
+    )
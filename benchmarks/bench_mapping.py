@@ -0,0 +1,34 @@
+"""Benchmarks for mapping product atoms to reactant atoms."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+from CAOS.delta import react_delta
+from CAOS.dispatch import react
+from CAOS.structures.mapping import map_atoms
+
+from . import generators
+from .runner import parametrize
+
+
+@parametrize('size')
+def bench_recorded_map(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    delta = react_delta(reactants, conditions)
+    benchmark(delta.atom_map)
+
+
+@parametrize('size')
+def bench_map_atoms(benchmark, size):
+    """Map a reaction from its products alone (labels are computed in
+    every round, on fresh copies)."""
+
+    reactants, conditions = generators.acid_base_pair(size)
+    products = react(reactants, conditions)
+
+    def setup():
+        return (deepcopy(reactants), deepcopy(products)), {}
+
+    benchmark.pedantic(map_atoms, setup=setup, rounds=3)
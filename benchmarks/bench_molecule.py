@@ -0,0 +1,160 @@
+"""Benchmarks for building and inspecting `Molecule` objects."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+from CAOS.structures.molecule import Molecule
+
+from . import generators
+from .runner import parametrize
+
+
+@parametrize('size')
+def bench_construct_chain(benchmark, size):
+    benchmark.pedantic(
+        Molecule, setup=lambda: (generators.chain_spec(size), {}), rounds=5
+    )
+
+
+@parametrize('size')
+def bench_construct_ring(benchmark, size):
+    benchmark.pedantic(
+        Molecule, setup=lambda: (generators.ring_spec(size), {}), rounds=5
+    )
+
+
+@parametrize('size')
+def bench_construct_dense(benchmark, size):
+    benchmark.pedantic(
+        Molecule, setup=lambda: (generators.dense_spec(size), {}), rounds=5
+    )
+
+
+@parametrize('size')
+def bench_construct_alkane(benchmark, size):
+    carbons = max(size // 3, 1)
+    benchmark.pedantic(
+        Molecule, setup=lambda: (generators.alkane_spec(carbons), {}),
+        rounds=5
+    )
+
+
+@parametrize('size')
+def bench_next_free_atom_id(benchmark, size):
+    molecule = generators.chain(size)
+    benchmark(lambda: molecule._next_free_atom_id)
+
+
+@parametrize('size')
+def bench_next_free_bond_id(benchmark, size):
+    molecule = generators.chain(size)
+    benchmark(lambda: molecule._next_free_bond_id)
+
+
+@parametrize('size')
+def bench_grow_chain(benchmark, size):
+    """Append atoms one at a time, the way mechanisms build products."""
+
+    def grow(molecule, count):
+        previous = molecule._next_free_atom_id
+        molecule._add_node(previous, 'C')
+        for _ in range(count):
+            atom = molecule._next_free_atom_id
+            molecule._add_node(atom, 'C')
+            molecule._add_edge(
+                molecule._next_free_bond_id,
+                {'nodes': (previous, atom), 'order': 1}
+            )
+            previous = atom
+
+    benchmark.pedantic(
+        grow, setup=lambda: ((generators.chain(size), 10), {}), rounds=5
+    )
+
+
+@parametrize('size')
+def bench_deepcopy(benchmark, size):
+    molecule = generators.alkane(max(size // 3, 1))
+    benchmark(deepcopy, molecule)
+
+
+@parametrize('size')
+def bench_transaction_rollback(benchmark, size):
+    """Make and undo the edits of a proton transfer, instead of making
+    them on a deep copy."""
+
+    molecule = generators.alkane(max(size // 3, 1))
+    hydrogen = next(
+        atom for atom, symbol in molecule.atoms.items() if symbol == 'H'
+    )
+    carbon = next(
+        atom for atom, symbol in molecule.atoms.items() if symbol == 'C'
+    )
+
+    def transfer():
+        molecule.begin()
+        molecule.remove_node(hydrogen)
+        atom = molecule._next_free_atom_id
+        molecule._add_node(atom, 'H')
+        molecule._add_edge(
+            molecule._next_free_bond_id, {'nodes': (carbon, atom), 'order': 1}
+        )
+        molecule.rollback()
+
+    benchmark(transfer)
+
+
+@parametrize('size')
+def bench_deepcopy_implicit(benchmark, size):
+    molecule = generators.alkane(max(size // 3, 1)).to_implicit()
+    benchmark(deepcopy, molecule)
+
+
+@parametrize('size')
+def bench_equality(benchmark, size):
+    first = generators.alkane(max(size // 3, 1))
+    second = generators.alkane(max(size // 3, 1))
+    benchmark(lambda: first == second)
+
+
+@parametrize('size')
+def bench_equality_implicit(benchmark, size):
+    first = generators.alkane(max(size // 3, 1)).to_implicit()
+    second = generators.alkane(max(size // 3, 1)).to_implicit()
+    benchmark(lambda: first == second)
+
+
+@parametrize('size')
+def bench_to_implicit(benchmark, size):
+    molecule = generators.alkane(max(size // 3, 1))
+    benchmark(molecule.to_implicit)
+
+
+@parametrize('size')
+def bench_transfer_and_summarize(benchmark, size):
+    """Ask for the formula and charge after each proton transfer, as a
+    validation step would; the summary is updated, not rebuilt."""
+
+    molecule = generators.alkane(max(size // 3, 1))
+    hydrogen = next(
+        atom for atom, symbol in molecule.atoms.items() if symbol == 'H'
+    )
+    carbon = next(
+        atom for atom, symbol in molecule.atoms.items() if symbol == 'C'
+    )
+    molecule.formula
+
+    def transfer():
+        molecule.begin()
+        molecule.remove_node(hydrogen)
+        atom = molecule._next_free_atom_id
+        molecule._add_node(atom, 'H')
+        molecule._add_edge(
+            molecule._next_free_bond_id, {'nodes': (carbon, atom), 'order': 1}
+        )
+        molecule.formula, molecule.charge, molecule.average_mass
+        molecule.rollback()
+
+    benchmark(transfer)
@@ -0,0 +1,49 @@
+"""Benchmarks for expanding reaction networks."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+from itertools import combinations_with_replacement
+
+from CAOS.delta import react_delta
+from CAOS.exceptions.reaction_errors import FailedReactionError
+from CAOS.network import expand_network
+from CAOS.structures.canonical import canonical_hash
+
+from . import generators
+from .runner import parametrize
+
+_DEPTH = 3
+
+
+@parametrize('size')
+def bench_expand_network(benchmark, size):
+    mixture = generators.mixture(size)
+    benchmark.pedantic(expand_network, args=(mixture, {}, _DEPTH), rounds=1)
+
+
+@parametrize('size', (10, 30))
+def bench_expand_naively(benchmark, size):
+    """What reacting every pair of known species at each step costs."""
+
+    mixture = generators.mixture(size)
+
+    def expand(mixture):
+        species = dict((canonical_hash(molecule), molecule)
+                       for molecule in mixture)
+        for _ in range(_DEPTH):
+            found = {}
+            for pair in combinations_with_replacement(
+                    list(species.values()), 2):
+                try:
+                    delta = react_delta(deepcopy(list(pair)), {})
+                except FailedReactionError:
+                    continue
+                for product in delta.products:
+                    if product is not None:
+                        found.setdefault(canonical_hash(product), product)
+            species.update(found)
+        return species
+
+    benchmark.pedantic(expand, args=(mixture,), rounds=1)
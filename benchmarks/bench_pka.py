@@ -0,0 +1,54 @@
+"""Benchmarks for pKa estimation."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.structures import pka
+
+from . import generators
+from .runner import parametrize
+
+
+def _library(size):
+    # Distinct molecules, sharing most of their atom environments.
+    return [generators.alkane(1 + i % 50) for i in range(size)]
+
+
+@parametrize('size')
+def bench_estimate_library_cold(benchmark, size):
+    def setup():
+        pka._centers.clear()
+        return (_library(size),), {}
+
+    benchmark.pedantic(pka.estimate_many, setup=setup, rounds=3)
+
+
+@parametrize('size')
+def bench_estimate_library_memoized(benchmark, size):
+    pka.estimate_many(_library(size))
+
+    def setup():
+        return (_library(size),), {}
+
+    benchmark.pedantic(pka.estimate_many, setup=setup, rounds=3)
+
+
+@parametrize('size')
+def bench_estimate_large_molecule(benchmark, size):
+    def setup():
+        pka._centers.clear()
+        return (generators.alkane(max(size // 3, 1)),), {}
+
+    benchmark.pedantic(pka.estimate, setup=setup, rounds=3)
+
+
+@parametrize('size')
+def bench_estimate_functional_library(benchmark, size):
+    """A combinatorial library: mostly distinct molecules, built from a
+    few end groups."""
+
+    def setup():
+        pka._centers.clear()
+        return (generators.library(size),), {}
+
+    benchmark.pedantic(pka.estimate_many, setup=setup, rounds=3)
@@ -0,0 +1,28 @@
+"""Benchmarks for retrosynthetic search."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.retrosynthesis import retrosynthesis
+
+from . import generators
+from .runner import parametrize
+
+
+def _stock(size):
+    # Ammonium and hydroxide, which make hydronium in two steps, among
+    # a library of other molecules.
+    species = dict(
+        (molecule.id, molecule) for molecule in generators.mixture(40)
+    )
+    return [species['s10'], species['s15']] + generators.library(size), \
+        species['s2']
+
+
+@parametrize('size', (1, 10, 100))
+def bench_retrosynthesis(benchmark, size):
+    stock, target = _stock(size)
+    benchmark.pedantic(
+        retrosynthesis, args=(target, stock, {}),
+        kwargs={'max_routes': 1}, rounds=1
+    )
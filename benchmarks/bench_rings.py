@@ -0,0 +1,49 @@
+"""Benchmarks for ring perception."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import networkx as nx
+
+from CAOS.structures.rings import _perceive, ring_info_many
+
+from . import generators
+from .runner import parametrize
+
+
+@parametrize('size')
+def bench_perceive_fused_rings(benchmark, size):
+    """Rings of a fused ring system of `size` rings, without the cache."""
+
+    molecule = generators.fused_rings(size)
+    benchmark(_perceive, molecule)
+
+
+@parametrize('size')
+def bench_cycle_basis_fused_rings(benchmark, size):
+    """What a requirement calling networkx on every dispatch pays, for
+    comparison; the rings it gives aren't the smallest."""
+
+    molecule = generators.fused_rings(size)
+    benchmark(nx.cycle_basis, molecule)
+
+
+@parametrize('size')
+def bench_ring_info_cached(benchmark, size):
+    molecule = generators.fused_rings(size)
+    molecule.ring_info()
+    benchmark(molecule.ring_info)
+
+
+@parametrize('size')
+def bench_ring_info_library(benchmark, size):
+    """A library of `size` molecules, mostly acyclic."""
+
+    library = generators.library(size)
+
+    def setup():
+        for molecule in library:
+            molecule._invalidate()
+        return (library,), {}
+
+    benchmark.pedantic(ring_info_many, setup=setup, rounds=3)
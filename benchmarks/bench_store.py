@@ -0,0 +1,46 @@
+"""Benchmarks for the columnar descriptor store."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.structures.elements import MASSES
+from CAOS.structures.store import DescriptorStore
+from CAOS.structures.substructure import functional_groups
+
+from . import generators
+from .runner import parametrize
+
+
+def _store(size):
+    store = DescriptorStore()
+    store.add(generators.library(size))
+    return store
+
+
+@parametrize('size')
+def bench_store_build(benchmark, size):
+    library = generators.library(size)
+    benchmark.pedantic(lambda: DescriptorStore().add(library), rounds=1)
+
+
+@parametrize('size')
+def bench_store_query(benchmark, size):
+    store = _store(size)
+    benchmark(store.select, hydroxyl=True, weight=(None, 200))
+
+
+@parametrize('size')
+def bench_filter_loop(benchmark, size):
+    """What the same query costs computed molecule by molecule."""
+
+    library = generators.library(size)
+
+    def select():
+        return [
+            molecule.id for molecule in library
+            if 'hydroxyl' in functional_groups(molecule) and sum(
+                MASSES[symbol] for symbol in molecule.atoms.values()
+            ) <= 200
+        ]
+
+    benchmark(select)
@@ -0,0 +1,31 @@
+"""Benchmarks for substructure matching."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.structures.substructure import FUNCTIONAL_GROUPS, MoleculeIndex, \
+    Pattern, find_matches, query_library
+
+from . import generators
+from .runner import parametrize
+
+
+@parametrize('size')
+def bench_build_index(benchmark, size):
+    molecule = generators.alkane(max(size // 3, 1))
+    benchmark(MoleculeIndex, molecule)
+
+
+@parametrize('size')
+def bench_find_methyls(benchmark, size):
+    molecule = generators.alkane(max(size // 3, 1))
+    pattern = Pattern.from_string('H-C-H')
+    MoleculeIndex.of(molecule)
+    benchmark(find_matches, pattern, molecule)
+
+
+@parametrize('size')
+def bench_query_library_no_hits(benchmark, size):
+    library = [generators.alkane(10) for _ in range(size)]
+    pattern = FUNCTIONAL_GROUPS['carboxylic_acid']
+    benchmark(query_library, pattern, library)
@@ -0,0 +1,41 @@
+"""Benchmarks for sweeping reactions over grids of conditions."""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.dispatch import react
+from CAOS.sweep import sweep
+
+from . import generators
+from .runner import parametrize
+
+_POINTS = 100
+
+
+def _grid(conditions):
+    # Only a few distinct pKa overrides, and a key nothing depends on.
+    weak = dict(conditions['pkas'], Acid=3.0)
+    return {
+        'pkas': [conditions['pkas'], weak],
+        'temperature': list(range(_POINTS // 2)),
+    }
+
+
+@parametrize('size')
+def bench_sweep(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    benchmark(sweep, reactants, conditions, _grid(conditions))
+
+
+@parametrize('size')
+def bench_react_loop(benchmark, size):
+    reactants, conditions = generators.acid_base_pair(size)
+    grid = _grid(conditions)
+
+    def loop():
+        return [
+            react(reactants, dict(conditions, pkas=pkas, temperature=t))
+            for pkas in grid['pkas'] for t in grid['temperature']
+        ]
+
+    benchmark(loop)
@@ -0,0 +1,413 @@
+"""Synthetic molecule generators used by the benchmarks.
+
+Every generator comes in two flavors: a ``*_spec`` function that returns
+fresh ``(atoms, bonds)`` dictionaries suitable for passing to
+`Molecule`, and a function of the same name without the suffix that
+builds the molecule itself.  The specs are fresh on every call because
+`Molecule` mutates the bond dictionaries it is given.
+
+Attributes
+----------
+SIZES : tuple[int]
+    The default molecule sizes (in atoms) used by the benchmarks.
+FULL_SIZES : tuple[int]
+    Every size the benchmarks support, from 10 to 100k atoms.
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import random
+
+from CAOS.compatibility import range
+from CAOS.structures.molecule import Molecule
+
+SIZES = (10, 100, 1000)
+FULL_SIZES = (10, 100, 1000, 10000, 100000)
+
+
+def _atom_id(index):
+    return "a{}".format(index)
+
+
+def _bond_id(index):
+    return "b{}".format(index)
+
+
+def _bonds_from_pairs(pairs, order=1):
+    return dict(
+        (_bond_id(i), {'nodes': (_atom_id(first), _atom_id(second)),
+                       'order': order})
+        for i, (first, second) in enumerate(pairs)
+    )
+
+
+def chain_spec(size, symbol='C'):
+    """Build the atoms and bonds of a linear chain.
+
+    Parameters
+    ----------
+    size : int
+        The number of atoms in the chain.
+    symbol : Optional[str]
+        The atomic symbol used for every atom.  Defaults to carbon.
+
+    Returns
+    -------
+    atoms, bonds : dict
+        Dictionaries that can be passed to `Molecule`.
+    """
+
+    atoms = dict((_atom_id(i), symbol) for i in range(size))
+    bonds = _bonds_from_pairs((i, i + 1) for i in range(size - 1))
+    return atoms, bonds
+
+
+def ring_spec(size, symbol='C'):
+    """Build the atoms and bonds of a single ring.
+
+    Parameters
+    ----------
+    size : int
+        The number of atoms in the ring.  Must be at least 3.
+    symbol : Optional[str]
+        The atomic symbol used for every atom.  Defaults to carbon.
+
+    Returns
+    -------
+    atoms, bonds : dict
+        Dictionaries that can be passed to `Molecule`.
+    """
+
+    if size < 3:
+        raise ValueError("A ring needs at least 3 atoms, not {}.".format(size))
+
+    atoms = dict((_atom_id(i), symbol) for i in range(size))
+    bonds = _bonds_from_pairs((i, (i + 1) % size) for i in range(size))
+    return atoms, bonds
+
+
+def fused_rings_spec(rings, symbol='C'):
+    """Build the atoms and bonds of linearly fused six membered rings,
+    like the skeleton of an acene.
+
+    Parameters
+    ----------
+    rings : int
+        The number of rings.  Must be at least 1.
+    symbol : Optional[str]
+        The atomic symbol used for every atom.  Defaults to carbon.
+
+    Returns
+    -------
+    atoms, bonds : dict
+        Dictionaries that can be passed to `Molecule`.
+    """
+
+    if rings < 1:
+        raise ValueError("Need at least 1 ring, not {}.".format(rings))
+
+    # Two chains of 2 * rings + 1 atoms, joined every other atom.
+    length = 2 * rings + 1
+    atoms = dict((_atom_id(i), symbol) for i in range(2 * length))
+    pairs = [(i, i + 1) for i in range(length - 1)]
+    pairs.extend((length + i, length + i + 1) for i in range(length - 1))
+    pairs.extend((i, length + i) for i in range(0, length, 2))
+    return atoms, _bonds_from_pairs(pairs)
+
+
+def dense_spec(size, degree=4, seed=0, symbols=('C', 'N', 'O')):
+    """Build the atoms and bonds of a dense random graph.
+
+    The graph is a chain (so that it is connected) with extra random
+    bonds added until each atom has, on average, `degree` neighbors.
+
+    Parameters
+    ----------
+    size : int
+        The number of atoms in the graph.
+    degree : Optional[int]
+        The average number of neighbors of each atom.
+    seed : Optional[int]
+        Seed for the random number generator, so that runs are
+        reproducible.
+    symbols : Optional[collection[str]]
+        The atomic symbols to choose from.
+
+    Returns
+    -------
+    atoms, bonds : dict
+        Dictionaries that can be passed to `Molecule`.
+    """
+
+    rng = random.Random(seed)
+    atoms = dict(
+        (_atom_id(i), symbols[rng.randrange(len(symbols))])
+        for i in range(size)
+    )
+
+    pairs = set((i, i + 1) for i in range(size - 1))
+    target = min(size * degree // 2, size * (size - 1) // 2)
+    while len(pairs) < target:
+        first, second = rng.randrange(size), rng.randrange(size)
+        if first != second:
+            pairs.add((min(first, second), max(first, second)))
+
+    bonds = _bonds_from_pairs(sorted(pairs))
+    return atoms, bonds
+
+
+def alkane_spec(carbons):
+    """Build the atoms and bonds of a saturated linear alkane.
+
+    Parameters
+    ----------
+    carbons : int
+        The number of carbon atoms.  The molecule has ``3 * carbons + 2``
+        atoms in total.
+
+    Returns
+    -------
+    atoms, bonds : dict
+        Dictionaries that can be passed to `Molecule`.
+    """
+
+    atoms = dict((_atom_id(i), 'C') for i in range(carbons))
+    pairs = [(i, i + 1) for i in range(carbons - 1)]
+
+    next_atom = carbons
+    for carbon in range(carbons):
+        hydrogens = 2 + (carbon == 0) + (carbon == carbons - 1)
+        for _ in range(hydrogens):
+            atoms[_atom_id(next_atom)] = 'H'
+            pairs.append((carbon, next_atom))
+            next_atom += 1
+
+    return atoms, _bonds_from_pairs(pairs)
+
+
+# End groups of `functionalized_spec`: the atoms of the group (the first
+# one bonds to the chain) and its bonds, as pairs of positions in the
+# group with an optional order.
+_GROUPS = {
+    'H': (('H',), ()),
+    'OH': (('O', 'H'), ((0, 1),)),
+    'NH2': (('N', 'H', 'H'), ((0, 1), (0, 2))),
+    'SH': (('S', 'H'), ((0, 1),)),
+    'COOH': (('C', 'O', 'O', 'H'), ((0, 1, 2), (0, 2), (2, 3))),
+    'COO-': (('C', 'O', 'O'), ((0, 1, 2), (0, 2))),
+}
+
+GROUPS = tuple(sorted(_GROUPS))
+
+
+def functionalized_spec(carbons, head='COOH', tail='H'):
+    """Build a carbon chain with a group at each end.
+
+    Parameters
+    ----------
+    carbons : int
+        The number of carbons in the chain (at least 1).
+    head, tail : Optional[str]
+        The groups at the two ends, out of `GROUPS`.  Defaults to a
+        carboxylic acid.
+
+    Returns
+    -------
+    atoms, bonds : dict
+        Dictionaries that can be passed to `Molecule`.
+    """
+
+    atoms = dict((_atom_id(i), 'C') for i in range(carbons))
+    pairs = [(i, i + 1, 1) for i in range(carbons - 1)]
+    next_atom = carbons
+
+    def attach(carbon, group):
+        start = next_atom
+        symbols, bonds = _GROUPS[group]
+        for offset, symbol in enumerate(symbols):
+            atoms[_atom_id(start + offset)] = symbol
+        pairs.append((carbon, start, 1))
+        for bond in bonds:
+            pairs.append((start + bond[0], start + bond[1],
+                          bond[2] if len(bond) > 2 else 1))
+        return start + len(symbols)
+
+    for carbon in range(carbons):
+        for _ in range(2):
+            atoms[_atom_id(next_atom)] = 'H'
+            pairs.append((carbon, next_atom, 1))
+            next_atom += 1
+    next_atom = attach(0, head)
+    next_atom = attach(carbons - 1, tail)
+
+    bonds = dict(
+        (_bond_id(i), {'nodes': (_atom_id(first), _atom_id(second)),
+                       'order': order})
+        for i, (first, second, order) in enumerate(pairs)
+    )
+    return atoms, bonds
+
+
+def functionalized(carbons, head='COOH', tail='H', **kwargs):
+    """Build a chain with end groups.  See `functionalized_spec`."""
+
+    return Molecule(*functionalized_spec(carbons, head, tail), **kwargs)
+
+
+def library(size, seed=0, max_carbons=12):
+    """Build a combinatorial library of functionalized chains.
+
+    Molecules are mostly distinct, but share their end groups, so
+    their atom environments repeat.
+
+    Parameters
+    ----------
+    size : int
+        The number of molecules.
+    seed : Optional[int]
+        Seed for the random number generator choosing each molecule.
+    max_carbons : Optional[int]
+        The longest chain built.
+
+    Returns
+    -------
+    molecules : list[Molecule]
+        The molecules, with ids ``"m0"``, ``"m1"``, ...
+    """
+
+    rng = random.Random(seed)
+    return [
+        functionalized(
+            rng.randint(1, max_carbons), rng.choice(GROUPS),
+            rng.choice(GROUPS), id="m{}".format(i)
+        ) for i in range(size)
+    ]
+
+
+def chain(size, symbol='C', **kwargs):
+    """Build a linear chain molecule.  See `chain_spec`."""
+
+    return Molecule(*chain_spec(size, symbol), **kwargs)
+
+
+def ring(size, symbol='C', **kwargs):
+    """Build a single ring molecule.  See `ring_spec`."""
+
+    return Molecule(*ring_spec(size, symbol), **kwargs)
+
+
+def fused_rings(rings, symbol='C', **kwargs):
+    """Build linearly fused rings.  See `fused_rings_spec`."""
+
+    return Molecule(*fused_rings_spec(rings, symbol), **kwargs)
+
+
+def dense(size, degree=4, seed=0, **kwargs):
+    """Build a dense random molecule.  See `dense_spec`."""
+
+    return Molecule(*dense_spec(size, degree, seed), **kwargs)
+
+
+def alkane(carbons, **kwargs):
+    """Build a saturated linear alkane.  See `alkane_spec`."""
+
+    return Molecule(*alkane_spec(carbons), **kwargs)
+
+
+def acid_base_pair(size):
+    """Build an acid and a base padded out to roughly `size` atoms.
+
+    The acid is an oxonium and the base an alkoxide, each attached to a
+    carbon chain so that the pair has about `size` atoms in total.  For
+    very small sizes they degrade to hydronium and hydroxide.
+
+    Parameters
+    ----------
+    size : int
+        The approximate number of atoms in the pair.
+
+    Returns
+    -------
+    reactants : list[Molecule]
+        The acid and the base.
+    conditions : dict
+        Conditions that let `requirements.pka` pass for the reactants.
+    """
+
+    padding = max(size // 2 - 3, 0)
+    oxygen = _atom_id(padding)
+
+    def build(hydrogens):
+        atoms, bonds = chain_spec(padding)
+        atoms[oxygen] = 'O'
+        neighbors = [_atom_id(padding - 1)] if padding else []
+        for i in range(hydrogens - len(neighbors)):
+            hydrogen = _atom_id(padding + 1 + i)
+            atoms[hydrogen] = 'H'
+            neighbors.append(hydrogen)
+        for neighbor in neighbors:
+            bonds[_bond_id(len(bonds))] = {
+                'nodes': (neighbor, oxygen), 'order': 1
+            }
+        return atoms, bonds
+
+    acid = Molecule(*build(3), id='Acid')
+    base = Molecule(*build(1), id='Base')
+    conditions = {
+        'pkas': {'Acid': -1.74, 'Base': 15.7},
+        'pka_points': {'Acid': _atom_id(padding + 1), 'Base': oxygen}
+    }
+    return [acid, base], conditions
+
+
+_MIXTURE_SPECIES = (
+    # Hydronium, hydroxide, water, ammonium, ammonia, acetic acid,
+    # acetate, methanol and chloride.
+    ({'a0': 'O', 'a1': 'H', 'a2': 'H', 'a3': 'H'},
+     ((0, 1), (0, 2), (0, 3))),
+    ({'a0': 'O', 'a1': 'H'}, ((0, 1),)),
+    ({'a0': 'O', 'a1': 'H', 'a2': 'H'}, ((0, 1), (0, 2))),
+    ({'a0': 'N', 'a1': 'H', 'a2': 'H', 'a3': 'H', 'a4': 'H'},
+     ((0, 1), (0, 2), (0, 3), (0, 4))),
+    ({'a0': 'N', 'a1': 'H', 'a2': 'H', 'a3': 'H'},
+     ((0, 1), (0, 2), (0, 3))),
+    ({'a0': 'C', 'a1': 'C', 'a2': 'O', 'a3': 'O', 'a4': 'H', 'a5': 'H',
+      'a6': 'H', 'a7': 'H'},
+     ((0, 1), (1, 2, 2), (1, 3), (3, 7), (0, 4), (0, 5), (0, 6))),
+    ({'a0': 'C', 'a1': 'C', 'a2': 'O', 'a3': 'O', 'a4': 'H', 'a5': 'H',
+      'a6': 'H'},
+     ((0, 1), (1, 2, 2), (1, 3), (0, 4), (0, 5), (0, 6))),
+    ({'a0': 'C', 'a1': 'O', 'a2': 'H', 'a3': 'H', 'a4': 'H', 'a5': 'H'},
+     ((0, 1), (1, 5), (0, 2), (0, 3), (0, 4))),
+    ({'a0': 'Cl'}, ()),
+)
+
+
+def mixture(species, seed=0):
+    """Build a mixture of small acids and bases.
+
+    Parameters
+    ----------
+    species : int
+        The number of molecules in the mixture.
+    seed : Optional[int]
+        Seed for the random number generator choosing each molecule.
+
+    Returns
+    -------
+    reactants : list[Molecule]
+        The molecules, with ids ``"s0"``, ``"s1"``, ...
+    """
+
+    rng = random.Random(seed)
+    reactants = []
+    for i in range(species):
+        atoms, pairs = _MIXTURE_SPECIES[rng.randrange(len(_MIXTURE_SPECIES))]
+        bonds = dict(
+            (_bond_id(j), {'nodes': (_atom_id(pair[0]), _atom_id(pair[1])),
+                           'order': pair[2] if len(pair) > 2 else 1})
+            for j, pair in enumerate(pairs)
+        )
+        reactants.append(Molecule(dict(atoms), bonds, id="s{}".format(i)))
+    return reactants
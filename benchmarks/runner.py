@@ -0,0 +1,390 @@
+"""A small pytest-benchmark style runner for the CAOS benchmarks.
+
+Benchmarks are collected from the ``bench_*`` modules of this package.
+Each benchmark is a function named ``bench_*`` taking a `Benchmark`
+object, which it calls with the code to be timed.  Benchmarks can be
+parametrized over several molecule sizes with the `parametrize`
+decorator.
+
+The ``run`` command prints a table of timings and can save them as a
+JSON baseline.  The ``compare`` command reads two such files and exits
+with a non-zero status if any benchmark slowed down by more than a
+threshold.
+
+Attributes
+----------
+DEFAULT_THRESHOLD : float
+    The default fractional slowdown that ``compare`` flags (10%).
+"""
+
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import argparse
+import gc
+import json
+import math
+import os
+import pkgutil
+import platform
+import sys
+import timeit
+from importlib import import_module
+
+from . import generators
+
+DEFAULT_THRESHOLD = 0.10
+
+_timer = timeit.default_timer
+
+
+def parametrize(argument, values=None):
+    """Run a benchmark once for each value of an argument.
+
+    Parameters
+    ----------
+    argument : str
+        Name of the keyword argument passed to the benchmark.
+    values : Optional[collection]
+        Values to run the benchmark with.  Defaults to the sizes chosen
+        on the command line (`generators.SIZES` unless overridden).
+
+    Returns
+    -------
+    decorator : callable
+        Decorator marking the benchmark as parametrized.
+    """
+
+    def decorator(function):
+        function.parametrize = (argument, values)
+        return function
+    return decorator
+
+
+class Benchmark(object):
+    """Times a callable, mimicking the ``pytest-benchmark`` fixture.
+
+    Parameters
+    ----------
+    name : str
+        The full name of the benchmark being run.
+    min_time : Optional[float]
+        Minimum number of seconds to spend timing the callable.
+    max_rounds : Optional[int]
+        Maximum number of timing rounds.
+    """
+
+    def __init__(self, name, min_time=0.2, max_rounds=1000):
+        self.name = name
+        self.min_time = min_time
+        self.max_rounds = max_rounds
+        self.stats = None
+
+    def __call__(self, function, *args, **kwargs):
+        """Repeatedly time ``function(*args, **kwargs)``.
+
+        Returns
+        -------
+        result : object
+            The return value of the last call.
+        """
+
+        def run_round():
+            start = _timer()
+            result = function(*args, **kwargs)
+            return _timer() - start, result
+
+        return self._collect(run_round, self.max_rounds, self.min_time)
+
+    def pedantic(self, target, args=(), kwargs=None, setup=None,
+                 rounds=1, iterations=1):
+        """Time a callable with explicit control over the rounds.
+
+        Parameters
+        ----------
+        target : callable
+            The code being timed.
+        args, kwargs : Optional[collection, mapping]
+            Arguments passed to `target`.
+        setup : Optional[callable]
+            Called before every round, outside the timed region.  If it
+            returns a value it must be an ``(args, kwargs)`` pair, which
+            replaces the arguments for that round.
+        rounds : Optional[int]
+            How many rounds to time.
+        iterations : Optional[int]
+            How many times to call `target` per round.
+
+        Returns
+        -------
+        result : object
+            The return value of the last call.
+        """
+
+        kwargs = kwargs or {}
+
+        def round_arguments():
+            if setup is None:
+                return args, kwargs
+            prepared = setup()
+            return prepared if prepared is not None else (args, kwargs)
+
+        def run_round():
+            round_args, round_kwargs = round_arguments()
+            result = None
+            start = _timer()
+            for _ in range(iterations):
+                result = target(*round_args, **round_kwargs)
+            return (_timer() - start) / iterations, result
+
+        return self._collect(run_round, rounds, None)
+
+    def _collect(self, run_round, max_rounds, min_time):
+        timings = []
+        result = None
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            started = _timer()
+            while len(timings) < max_rounds:
+                elapsed, result = run_round()
+                timings.append(elapsed)
+                if min_time is not None and _timer() - started >= min_time:
+                    break
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        self.stats = _statistics(timings)
+        return result
+
+
+def _statistics(timings):
+    mean = sum(timings) / len(timings)
+    variance = sum((t - mean) ** 2 for t in timings) / len(timings)
+    ordered = sorted(timings)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        median = ordered[middle]
+    else:
+        median = (ordered[middle - 1] + ordered[middle]) / 2
+    return {
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': mean,
+        'median': median,
+        'stddev': math.sqrt(variance),
+        'rounds': len(timings)
+    }
+
+
+def collect(pattern=None, sizes=None):
+    """Find all benchmarks in the package.
+
+    Parameters
+    ----------
+    pattern : Optional[str]
+        Only benchmarks whose full name contains this substring are
+        returned.
+    sizes : Optional[collection[int]]
+        Sizes used for benchmarks parametrized without explicit values.
+
+    Returns
+    -------
+    benchmarks : list[tuple[str, callable, dict]]
+        The name, function and keyword arguments of each benchmark.
+    """
+
+    sizes = tuple(sizes or generators.SIZES)
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    found = []
+
+    module_names = sorted(
+        name for _, name, _ in pkgutil.iter_modules([package_dir])
+        if name.startswith('bench_')
+    )
+    for module_name in module_names:
+        module = import_module('{}.{}'.format(__package__, module_name))
+        names = sorted(
+            name for name, value in vars(module).items()
+            if name.startswith('bench_') and callable(value)
+        )
+        for name in names:
+            function = getattr(module, name)
+            base_name = '{}.{}'.format(module_name, name)
+            if hasattr(function, 'parametrize'):
+                argument, values = function.parametrize
+                for value in (values if values is not None else sizes):
+                    full_name = '{}[{}]'.format(base_name, value)
+                    found.append((full_name, function, {argument: value}))
+            else:
+                found.append((base_name, function, {}))
+
+    if pattern:
+        found = [entry for entry in found if pattern in entry[0]]
+    return found
+
+
+def run(benchmarks, min_time=0.2, stream=None):
+    """Run benchmarks and return their statistics.
+
+    Parameters
+    ----------
+    benchmarks : list[tuple[str, callable, dict]]
+        Benchmarks as returned by `collect`.
+    min_time : Optional[float]
+        Minimum time spent timing each benchmark.
+    stream : Optional[file-like]
+        Where progress is written.  Defaults to `sys.stdout`.
+
+    Returns
+    -------
+    results : dict
+        JSON-serializable results, keyed by benchmark name under
+        ``'benchmarks'`` along with some machine information.
+    """
+
+    stream = stream or sys.stdout
+    results = {}
+    for name, function, kwargs in benchmarks:
+        benchmark = Benchmark(name, min_time=min_time)
+        function(benchmark, **kwargs)
+        if benchmark.stats is None:
+            raise RuntimeError("Benchmark {} never timed anything.".format(
+                name
+            ))
+        results[name] = benchmark.stats
+        stream.write("{:<60} {:>12.6f}s {:>12.6f}s {:>6}\n".format(
+            name, benchmark.stats['min'], benchmark.stats['mean'],
+            benchmark.stats['rounds']
+        ))
+
+    return {
+        'machine': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform()
+        },
+        'benchmarks': results
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, stat='min'):
+    """Compare two sets of results.
+
+    Parameters
+    ----------
+    baseline, current : dict
+        Results as returned by `run`.
+    threshold : Optional[float]
+        Fractional slowdown above which a benchmark is flagged.
+    stat : Optional[str]
+        Which statistic to compare.  The minimum is the least noisy.
+
+    Returns
+    -------
+    rows : list[tuple[str, float, float, float, bool]]
+        The name, baseline time, current time, relative change and
+        whether the change is a regression, for every benchmark present
+        in both results.
+    """
+
+    rows = []
+    old_results = baseline['benchmarks']
+    new_results = current['benchmarks']
+    for name in sorted(set(old_results) & set(new_results)):
+        old = old_results[name][stat]
+        new = new_results[name][stat]
+        change = (new - old) / old if old else 0.0
+        rows.append((name, old, new, change, change > threshold))
+    return rows
+
+
+def _load(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def _run_command(args):
+    sizes = generators.FULL_SIZES if args.full else args.sizes
+    results = run(collect(args.filter, sizes), min_time=args.min_time)
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+    return 0
+
+
+def _compare_command(args):
+    rows = compare(
+        _load(args.baseline), _load(args.current), args.threshold, args.stat
+    )
+    regressions = 0
+    for name, old, new, change, regressed in rows:
+        regressions += regressed
+        print("{:<60} {:>12.6f}s {:>12.6f}s {:>+8.1%}{}".format(
+            name, old, new, change, "  SLOWER" if regressed else ""
+        ))
+    if regressions:
+        print("{} benchmark(s) slowed down by more than {:.0%}.".format(
+            regressions, args.threshold
+        ))
+        return 1
+    return 0
+
+
+def _sizes(value):
+    return tuple(int(size) for size in value.split(','))
+
+
+def main(argv=None):
+    """Entry point for ``python -m benchmarks.runner``."""
+
+    parser = argparse.ArgumentParser(description="Run CAOS benchmarks.")
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks.")
+    run_parser.add_argument(
+        '-k', dest='filter', default=None,
+        help="Only run benchmarks whose name contains this string."
+    )
+    run_parser.add_argument(
+        '--sizes', type=_sizes, default=generators.SIZES,
+        help="Comma separated molecule sizes to benchmark."
+    )
+    run_parser.add_argument(
+        '--full', action='store_true', default=False,
+        help="Benchmark every size up to 100k atoms."
+    )
+    run_parser.add_argument(
+        '--min-time', type=float, default=0.2,
+        help="Minimum seconds spent timing each benchmark."
+    )
+    run_parser.add_argument(
+        '--save', default=None, help="Save the results as JSON to this path."
+    )
+    run_parser.set_defaults(handler=_run_command)
+
+    compare_parser = subparsers.add_parser(
+        'compare', help="Compare two saved results."
+    )
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help="Fractional slowdown that counts as a regression."
+    )
+    compare_parser.add_argument(
+        '--stat', default='min', choices=('min', 'mean', 'median'),
+        help="Statistic to compare."
+    )
+    compare_parser.set_defaults(handler=_compare_command)
+
+    args = parser.parse_args(argv)
+    if not getattr(args, 'handler', None):
+        parser.print_help()
+        return 2
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
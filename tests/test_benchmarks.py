@@ -0,0 +1,66 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from benchmarks import generators
+from benchmarks.runner import Benchmark, collect, compare, parametrize
+
+
+def test_generator_sizes():
+    assert len(generators.chain(10).atoms) == 10
+    assert len(generators.chain(10).bonds) == 9
+    assert len(generators.ring(10).bonds) == 10
+    assert len(generators.alkane(3).atoms) == 11
+
+
+def test_dense_generator_is_reproducible():
+    assert generators.dense_spec(50) == generators.dense_spec(50)
+    atoms, bonds = generators.dense_spec(50, degree=6)
+    assert len(bonds) == 150
+
+
+def test_acid_base_pair():
+    reactants, conditions = generators.acid_base_pair(100)
+    acid, base = reactants
+    assert acid.atoms[conditions['pka_points']['Acid']] == 'H'
+    assert base.atoms[conditions['pka_points']['Base']] == 'O'
+
+
+def test_benchmark_records_statistics():
+    benchmark = Benchmark('test', min_time=0)
+    assert benchmark(lambda x: x + 1, 1) == 2
+    assert benchmark.stats['rounds'] == 1
+
+
+def test_pedantic_runs_every_round():
+    calls = []
+    benchmark = Benchmark('test')
+    benchmark.pedantic(calls.append, setup=lambda: ((1,), {}), rounds=3)
+    assert calls == [1, 1, 1]
+    assert benchmark.stats['rounds'] == 3
+
+
+def test_parametrize_uses_sizes():
+    @parametrize('size')
+    def bench_something(benchmark, size):
+        pass
+
+    assert bench_something.parametrize == ('size', None)
+    names = [name for name, _, _ in collect('bench_construct_chain', (7,))]
+    assert names == ['bench_molecule.bench_construct_chain[7]']
+
+
+def test_compare_flags_regressions():
+    baseline = {'benchmarks': {'a': {'min': 1.0}, 'b': {'min': 1.0}}}
+    current = {'benchmarks': {'a': {'min': 1.05}, 'b': {'min': 1.5}}}
+    rows = dict(
+        (name, regressed)
+        for name, _, _, _, regressed in compare(baseline, current, 0.1)
+    )
+    assert rows == {'a': False, 'b': True}
+
+
+def test_mixture_generator():
+    reactants = generators.mixture(20)
+    assert len(reactants) == 20
+    assert reactants[3].id == 's3'
+    assert generators.mixture(20)[7] == reactants[7]
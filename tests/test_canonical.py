@@ -0,0 +1,130 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from CAOS.structures.canonical import atom_classes, canonical_hash, \
+    environment_labels, environment_labels_many, label_arrays, mix
+from CAOS.structures.molecule import Molecule
+
+from benchmarks import generators
+
+
+def ethanol(prefix='a'):
+    ids = ['{}{}'.format(prefix, i) for i in range(9)]
+    symbols = ['C', 'C', 'O', 'H', 'H', 'H', 'H', 'H', 'H']
+    pairs = [(0, 1), (1, 2), (2, 3), (0, 4), (0, 5), (0, 6), (1, 7), (1, 8)]
+    return Molecule(
+        dict(zip(ids, symbols)),
+        dict(('b{}'.format(i), {'nodes': (ids[x], ids[y]), 'order': 1})
+             for i, (x, y) in enumerate(pairs))
+    )
+
+
+def dimethyl_ether():
+    return Molecule(
+        {'a0': 'C', 'a1': 'O', 'a2': 'C', 'a3': 'H', 'a4': 'H', 'a5': 'H',
+         'a6': 'H', 'a7': 'H', 'a8': 'H'},
+        dict(('b{}'.format(i), {'nodes': pair, 'order': 1})
+             for i, pair in enumerate([
+                 ('a0', 'a1'), ('a1', 'a2'), ('a0', 'a3'), ('a0', 'a4'),
+                 ('a0', 'a5'), ('a2', 'a6'), ('a2', 'a7'), ('a2', 'a8')]))
+    )
+
+
+def bicyclopentyl():
+    # Two five membered rings joined by a bond: every carbon has the
+    # same labels as in decalin.
+    pairs = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 0), (0, 5), (5, 6),
+             (6, 7), (7, 8), (8, 9), (9, 5)]
+    return Molecule(
+        dict(('a{}'.format(atom), 'C') for atom in range(10)),
+        dict(('b{}'.format(i), {'nodes': ('a{}'.format(x), 'a{}'.format(y)),
+                                'order': 1})
+             for i, (x, y) in enumerate(pairs))
+    )
+
+
+def _reversed_ids(molecule):
+    count = len(molecule)
+    mapping = dict(('a{}'.format(i), 'a{}'.format(count - 1 - i))
+                   for i in range(count))
+    return Molecule(
+        dict((mapping[id_], symbol)
+             for id_, symbol in molecule.atoms.items()),
+        dict((id_, {'nodes': tuple(mapping[atom] for atom in bond['nodes']),
+                    'order': bond.get('order', 1)})
+             for id_, bond in molecule.bonds.items())
+    )
+
+
+def test_hash_ignores_ids():
+    assert canonical_hash(ethanol('a')) == canonical_hash(ethanol('x'))
+
+
+def test_hash_distinguishes_isomers():
+    assert canonical_hash(ethanol()) != canonical_hash(dimethyl_ether())
+
+
+def test_equivalent_atoms_share_classes():
+    classes = atom_classes(dimethyl_ether())
+    assert classes['a0'] == classes['a2']
+    assert classes['a3'] == classes['a8']
+    assert classes['a0'] != classes['a1']
+
+
+def test_environment_labels_radius():
+    labels = environment_labels(ethanol(), 0)
+    assert labels['a0'] == labels['a1']
+    assert labels['a0'] != labels['a2']
+    labels = environment_labels(ethanol(), 1)
+    assert labels['a0'] != labels['a1']
+
+
+def test_label_arrays_match_environment_labels():
+    molecules = [ethanol(), dimethyl_ether()]
+    owners, labels = label_arrays(molecules, 2)
+
+    assert owners.tolist() == [0] * 9 + [1] * 9
+    assert len(labels) == 3
+    for radius, current in enumerate(labels):
+        expected = environment_labels_many(molecules, radius)
+        assert sorted("{:016x}".format(int(label)) for label in current) \
+            == sorted(value for atom_labels in expected
+                      for value in atom_labels.values())
+
+
+def test_mix_is_fixed():
+    # splitmix64, whose results may be stored on disk.
+    mixed = mix(np.array([0, 1, 2], dtype=np.uint64))
+    assert mixed.tolist() == [0, 0x5692161d100b05e5, 0xdbd238973a2b148a]
+
+
+def test_hash_tells_apart_what_refinement_cannot():
+    decalin = generators.fused_rings(2)
+
+    assert atom_classes(decalin).values() and \
+        set(atom_classes(decalin).values()) == \
+        set(atom_classes(bicyclopentyl()).values())
+    assert canonical_hash(decalin) != canonical_hash(bicyclopentyl())
+    for molecule in (decalin, bicyclopentyl(), generators.ring(6),
+                     generators.alkane(4)):
+        assert canonical_hash(_reversed_ids(molecule)) == \
+            canonical_hash(molecule)
+
+
+def test_hash_invalidated_on_change():
+    molecule = ethanol()
+    before = canonical_hash(molecule)
+    molecule._add_node('a9', 'Cl')
+    assert canonical_hash(molecule) != before
+
+
+def test_hash_of_implicit_forms():
+    implicit = ethanol().to_implicit()
+    other = ethanol('x').to_implicit()
+
+    assert canonical_hash(implicit) == canonical_hash(other)
+    assert canonical_hash(implicit) != canonical_hash(ethanol())
+    assert canonical_hash(implicit) != \
+        canonical_hash(dimethyl_ether().to_implicit())
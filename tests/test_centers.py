@@ -0,0 +1,74 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.structures import pka
+from CAOS.structures.centers import CenterCache, center_cache
+from CAOS.util import raises
+
+from benchmarks import generators
+
+
+def _sites(molecule):
+    return dict(
+        (atom, symbol) for atom, symbol in molecule.atoms.items()
+        if symbol != 'C'
+    )
+
+
+def test_shared_environments_are_reused():
+    cache = CenterCache(1)
+    calls = []
+
+    def compute(molecules):
+        calls.append(len(molecules))
+        return [_sites(molecule) for molecule in molecules]
+
+    first = generators.functionalized(6, 'OH', 'NH2')
+    # Same molecule, different ids.
+    second = generators.functionalized(6, 'OH', 'NH2')
+    second = type(second)(
+        dict(('x' + atom[1:], symbol)
+             for atom, symbol in second.atoms.items()),
+        dict((bond, {'nodes': tuple('x' + n[1:] for n in data['nodes']),
+                     'order': data['order']})
+             for bond, data in second.bonds.items())
+    )
+    cache.decisions([first], compute)
+    decisions = cache.decisions([second], compute)
+
+    assert calls == [1]
+    assert decisions == [_sites(second)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_batch_computes_each_environment_once():
+    cache = CenterCache(2)
+    computed = []
+
+    def compute(molecules):
+        computed.extend(molecules)
+        return [_sites(molecule) for molecule in molecules]
+
+    # Longer chains only add environments already seen in the middle of
+    # the shorter ones.
+    molecules = [generators.functionalized(n, 'OH', 'SH') for n in range(6, 12)]
+    decisions = cache.decisions(molecules, compute)
+
+    assert len(computed) < len(molecules)
+    assert decisions == [_sites(molecule) for molecule in molecules]
+
+
+def test_library_estimates_match_fresh_scoring():
+    library = generators.library(200, seed=3)
+    cached = pka.estimate_many(library)
+    fresh = pka._compute(generators.library(200, seed=3))
+
+    for estimate, decisions in zip(cached, fresh):
+        expected = pka._from_decisions(decisions)
+        assert estimate.acidic == expected.acidic
+        assert estimate.basic == expected.basic
+
+
+def test_named_caches_are_shared():
+    assert center_cache('pka', 3) is pka._centers
+    assert raises(ValueError, center_cache, ('pka', 2))
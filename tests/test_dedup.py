@@ -0,0 +1,101 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import os
+
+import numpy as np
+
+from CAOS.dedup import BloomFilter, Deduplicator, KeyStore, deduplicate
+from CAOS.structures.canonical import canonical_hash
+from CAOS.structures.molecule import Molecule
+
+from benchmarks import generators
+
+
+def _stream():
+    # Every molecule four times over, in a scrambled order.
+    library = generators.library(40, seed=5, max_carbons=3)
+    return [library[(7 * i) % 40] for i in range(160)]
+
+
+def _firsts(molecules):
+    seen = set()
+    firsts = []
+    for molecule in molecules:
+        key = canonical_hash(molecule)
+        if key not in seen:
+            seen.add(key)
+            firsts.append(molecule)
+    return firsts
+
+
+def test_refinement_twins_are_kept():
+    # Decalin and bicyclopentyl, which refinement can't tell apart.
+    pairs = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 0), (0, 5), (5, 6),
+             (6, 7), (7, 8), (8, 9), (9, 5)]
+    bicyclopentyl = Molecule(
+        dict(('a{}'.format(atom), 'C') for atom in range(10)),
+        dict(('b{}'.format(i), {'nodes': ('a{}'.format(x), 'a{}'.format(y)),
+                                'order': 1})
+             for i, (x, y) in enumerate(pairs))
+    )
+    products = [generators.fused_rings(2), bicyclopentyl,
+                generators.fused_rings(2)]
+
+    assert list(deduplicate(products)) == products[:2]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    keys = np.random.RandomState(0).randint(
+        0, 2 ** 62, size=1000, dtype=np.int64
+    ).astype(np.uint64)
+    bloom = BloomFilter(1000, 0.01)
+    bloom.add(keys[:500])
+
+    assert bloom.contains(keys[:500]).all()
+    assert bloom.contains(keys[500:]).mean() < 0.05
+    assert int(keys[0]) in bloom
+
+
+def test_key_store_spills_and_merges():
+    keys = np.arange(100, dtype=np.uint64) * np.uint64(7919)
+    with KeyStore(memory_limit=8) as store:
+        for start in range(0, 100, 10):
+            assert store.add(keys[start:start + 10]).all()
+        assert not store.add(keys[::3], maybe=np.ones(34, dtype=bool)).any()
+        directory = store.directory
+
+        assert len(store) == 100
+        assert store.total == 134
+        assert 1 < len(store._runs) < 5
+        assert store.count(keys[3]) == 2 and store.count(keys[4]) == 1
+        assert sorted(store.items()) == [
+            (int(key), 2 if number % 3 == 0 else 1)
+            for number, key in enumerate(keys)
+        ]
+    assert not os.path.exists(directory)
+
+
+def test_deduplicate_keeps_first_occurrences():
+    stream = _stream()
+    firsts = _firsts(stream)
+
+    assert list(deduplicate(stream + [None], batch_size=7)) == firsts
+    assert [id(molecule) for molecule in deduplicate(stream)] == \
+        [id(molecule) for molecule in firsts]
+
+
+def test_deduplicator_counts_with_spilling():
+    stream = _stream()
+    with Deduplicator(capacity=10, memory_limit=4, batch_size=16) as dedup:
+        unique = list(dedup.filter(stream))
+        again = list(dedup.filter(stream[:20]))
+
+        assert len(unique) == dedup.unique == len(_firsts(stream))
+        assert again == []
+        assert dedup.seen == 180
+        assert dedup.count(stream[0]) == sum(
+            1 for molecule in stream + stream[:20]
+            if canonical_hash(molecule) == canonical_hash(stream[0])
+        )
+        assert sum(count for _, count in dedup.counts()) == 180
@@ -0,0 +1,95 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+from CAOS.delta import MoleculeEdit, ReactionDelta, react_delta
+from CAOS.dispatch import react
+from CAOS.structures.molecule import Molecule
+
+from benchmarks import generators
+
+
+def _water():
+    return Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'O'},
+        {'b1': {'nodes': ('a1', 'a3'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 1}}
+    )
+
+
+def test_changes_are_net():
+    water = _water()
+    water.begin()
+    water.remove_node('a1')
+    water._add_node('a4', 'H', origin=('elsewhere', 'a9'))
+    water._add_node('a5', 'H')
+    water.remove_node('a5')
+    water._add_edge('b3', {'nodes': ('a3', 'a4'), 'order': 1})
+    water.remove_edge('a2', 'a3')
+    water._add_edge('b4', {'nodes': ('a2', 'a3'), 'order': 2})
+    changes = water.changes()
+    water.rollback()
+
+    assert changes == {
+        'removed_atoms': ['a1'],
+        'added_atoms': {'a4': 'H'},
+        'removed_bonds': ['b1'],
+        'added_bonds': {'b3': ('a3', 'a4', 1)},
+        'changed_bonds': {'b2': 2},
+        'moved_atoms': {'a4': ('elsewhere', 'a9')},
+        'changed_hydrogens': {},
+    }
+
+
+def test_edit_applies_changes():
+    water = _water()
+    edit = MoleculeEdit(
+        0, removed_atoms=['a1'], added_atoms={'a4': 'H'},
+        added_bonds={'b3': ('a3', 'a4', 1)}, changed_bonds={'b2': 2}
+    )
+    product = edit.apply([water])
+
+    assert product == _water()
+    assert product.adj['a2']['a3']['order'] == 2
+    assert len(water) == 3 and 'a4' not in water
+
+
+def test_react_delta_leaves_reactants_unchanged():
+    reactants, conditions = generators.acid_base_pair(20)
+    before = [sorted(reactant.edges()) for reactant in reactants]
+    delta = react_delta(reactants, conditions)
+
+    assert [sorted(reactant.edges()) for reactant in reactants] == before
+    assert delta._products is None
+    assert all(
+        edit is None or len(edit) <= 3 for edit in delta.edits
+    )
+
+    expected = react(deepcopy(reactants), conditions)
+    assert len(delta) == len(expected)
+    for product, other in zip(delta, expected):
+        assert (product is None) == (other is None)
+        if product is not None:
+            assert product == other
+
+
+def test_delta_serialization():
+    reactants, conditions = generators.acid_base_pair(20)
+    delta = react_delta(reactants, conditions)
+    text = delta.dumps()
+    loaded = ReactionDelta.loads(text, reactants)
+
+    assert loaded.dumps() == text
+    assert list(loaded) == list(delta)
+    assert len(text) < 200
+
+
+def test_whole_products():
+    water = _water()
+    delta = ReactionDelta.from_products([], [water, None])
+
+    assert delta.edits[0].source is None
+    assert delta.edits[1] is None
+    assert delta.product(0) == water
+    assert delta[1] is None
@@ -0,0 +1,86 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS import descriptors
+from CAOS.descriptors import Descriptors, descriptor_order, \
+    register_descriptor, uses_descriptors
+from CAOS.dispatch import ReactionDispatcher, register_reaction_mechanism, \
+    react
+from CAOS.exceptions.dispatch_errors import ExistingDescriptorError, \
+    InvalidDescriptorError
+from CAOS.util import raises
+
+from benchmarks import generators
+
+computed = []
+
+
+def setup_module():
+    @register_descriptor('test_atom_counts')
+    def atom_counts(reactants, conditions, known):
+        computed.append('test_atom_counts')
+        return [len(reactant) for reactant in reactants]
+
+    @register_descriptor('test_total', requires=('test_atom_counts',))
+    def total(reactants, conditions, known):
+        computed.append('test_total')
+        return sum(known['test_atom_counts'])
+
+    register_descriptor('test_loop', requires=('test_loop_back',))(None)
+    register_descriptor('test_loop_back', requires=('test_loop',))(None)
+
+    @uses_descriptors('test_total')
+    def small(reactants, conditions, known):
+        return known['test_total'] < 100
+
+    @uses_descriptors('test_atom_counts')
+    def not_empty(reactants, conditions, known):
+        return all(known['test_atom_counts'])
+
+    @register_reaction_mechanism([small, not_empty], True)
+    @uses_descriptors('test_total')
+    def descriptor_reaction(reactants, conditions, known):
+        return [known['test_total']]
+
+
+def teardown_module():
+    del ReactionDispatcher._test_namespace['descriptor_reaction']
+    for name in ('test_atom_counts', 'test_total', 'test_loop',
+                 'test_loop_back'):
+        del descriptors._registry[name]
+
+
+def test_order_puts_requirements_first():
+    assert descriptor_order(['test_total']) == [
+        'test_atom_counts', 'test_total'
+    ]
+
+
+def test_invalid_descriptors():
+    assert raises(InvalidDescriptorError, descriptor_order, [['test_loop']])
+    assert raises(InvalidDescriptorError, descriptor_order, [['missing']])
+    assert raises(
+        ExistingDescriptorError, register_descriptor('test_total'), [None]
+    )
+
+
+def test_descriptors_are_computed_once_per_dispatch():
+    del computed[:]
+    reactants = generators.mixture(3)
+    products = react(reactants, {}, True)
+
+    assert products == [sum(len(reactant) for reactant in reactants)]
+    assert computed == ['test_atom_counts', 'test_total']
+
+
+def test_builtin_descriptors():
+    reactants = generators.mixture(3)
+    known = Descriptors(reactants, {})
+    estimates = known['pka_estimates']
+    hashes = known['canonical_hashes']
+
+    assert len(estimates) == 3 and len(hashes) == 3
+    assert 'atom_classes' in known
+    assert sorted(known.known()) == [
+        'atom_classes', 'canonical_hashes', 'pka_estimates'
+    ]
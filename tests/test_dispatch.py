@@ -2,10 +2,13 @@ from __future__ import print_function, division, unicode_literals, \
     absolute_import
 
 from CAOS.dispatch import register_reaction_mechanism, reaction_is_registered, \
-    ReactionDispatcher, react
+    ReactionDispatcher, react, react_many, register_batch_requirement
 from CAOS.util import raises
 from CAOS.exceptions.dispatch_errors import InvalidReactionError, \
     ExistingReactionError
+from CAOS.exceptions.reaction_errors import FailedReactionError
+
+from benchmarks import generators
 
 
 def teardown_module():
@@ -87,3 +90,124 @@ def test_not_callable_has_name():
     registrator = register_reaction_mechanism([_()], True)
 
     assert raises(InvalidReactionError, registrator, ((lambda x, y: None),))
+
+
+def test_lazy_mechanism_is_not_loaded_until_needed():
+    def fails(reactants, conditions):
+        return False
+
+    ReactionDispatcher._register_lazy(
+        'lazy_mechanism', [fails], 'CAOS.util', 'raises', True
+    )
+    try:
+        info = ReactionDispatcher._test_namespace['lazy_mechanism']
+        ReactionDispatcher._generate_likely_reactions(
+            None, None, ReactionDispatcher._get_namespace(True)
+        )
+        assert info['function'] is None
+        assert reaction_is_registered('lazy_mechanism', True)
+    finally:
+        del ReactionDispatcher._test_namespace['lazy_mechanism']
+
+
+def test_lazy_mechanism_loaded_when_candidate():
+    from CAOS.util import raises as raises_function
+
+    ReactionDispatcher._register_lazy(
+        'lazy_mechanism', [vacuous], 'CAOS.util', 'raises', True
+    )
+    try:
+        assert reaction_is_registered(raises_function, True)
+        potential = ReactionDispatcher._generate_likely_reactions(
+            None, None, ReactionDispatcher._get_namespace(True)
+        )
+        assert raises_function in potential
+        info = ReactionDispatcher._test_namespace['lazy_mechanism']
+        assert info['function'] is raises_function
+    finally:
+        del ReactionDispatcher._test_namespace['lazy_mechanism']
+
+
+def test_lazy_mechanism_existing_name():
+    function = ReactionDispatcher._register_lazy
+    args = ['reaction1', [vacuous], 'CAOS.util', 'raises', True]
+    assert raises(ExistingReactionError, function, args)
+
+
+def test_react_many_uses_batch_requirements():
+    calls = {'batch': 0, 'row': 0, 'mechanism': 0}
+
+    def even(reactants, conditions):
+        calls['row'] += 1
+        return reactants[0] % 2 == 0
+
+    @register_batch_requirement(even)
+    def even_batch(reactant_sets, conditions):
+        calls['batch'] += 1
+        return [reactants[0] % 2 == 0 for reactants in reactant_sets]
+
+    def positive(reactants, conditions):
+        return reactants[0] > 0
+
+    # Keep the mechanisms registered by the other tests out of the way.
+    namespace = ReactionDispatcher._test_namespace
+    saved = dict(namespace)
+    namespace.clear()
+    try:
+        @register_reaction_mechanism([even, positive], True)
+        def batch_reaction(reactants, conditions):
+            calls['mechanism'] += 1
+            return [reactants[0] // 2]
+
+        products = react_many([[n] for n in range(-2, 5)], {}, True)
+    finally:
+        namespace.clear()
+        namespace.update(saved)
+
+    assert products == [None, None, None, None, [1], None, [2]]
+    assert calls == {'batch': 1, 'row': 0, 'mechanism': 2}
+
+
+def test_react_many_matches_react():
+    sets = [generators.acid_base_pair(size) for size in (4, 10, 20)]
+    reactant_sets = [reactants for reactants, _ in sets]
+    conditions = [row_conditions for _, row_conditions in sets]
+
+    batched = react_many(reactant_sets, conditions)
+    for products, (reactants, row_conditions) in zip(batched, sets):
+        assert products == react(reactants, row_conditions)
+
+
+def test_failed_mechanisms_are_rolled_back():
+    reactants, _ = generators.acid_base_pair(4)
+    atoms = [sorted(reactant.nodes()) for reactant in reactants]
+    seen = []
+
+    def vandal(reactants, conditions):
+        for reactant in reactants:
+            reactant.remove_node(reactant.nodes()[0])
+        return []
+
+    def observer(reactants, conditions):
+        seen.extend(sorted(reactant.nodes()) for reactant in reactants)
+        return reactants
+
+    namespace = ReactionDispatcher._test_namespace
+    saved = dict(namespace)
+    namespace.clear()
+    try:
+        register_reaction_mechanism([vacuous], True)(vandal)
+        assert raises(FailedReactionError, react, (reactants, {}, True))
+        assert [sorted(reactant.nodes()) for reactant in reactants] == atoms
+
+        register_reaction_mechanism([vacuous], True)(observer)
+        products = react(reactants, {}, True)
+    finally:
+        namespace.clear()
+        namespace.update(saved)
+
+    assert seen == atoms
+    assert products == reactants
+    assert not any(product is reactant
+                   for product, reactant in zip(products, reactants))
+    assert not any(reactant.in_transaction for reactant in reactants)
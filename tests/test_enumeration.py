@@ -0,0 +1,127 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+from itertools import combinations, combinations_with_replacement
+
+from CAOS.dispatch import ReactionDispatcher, react, \
+    register_reaction_mechanism, register_species_requirement
+from CAOS.enumeration import feasible_reactions, react_mixture, \
+    _combinations
+from CAOS.exceptions.reaction_errors import FailedReactionError
+from CAOS.util import raises
+
+from benchmarks import generators
+
+
+def _isolated(test):
+    """Run a test with only the mechanisms it registers."""
+
+    def wrapper():
+        namespace = ReactionDispatcher._test_namespace
+        saved = dict(namespace)
+        namespace.clear()
+        try:
+            test()
+        finally:
+            namespace.clear()
+            namespace.update(saved)
+
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+
+def test_combinations_with_required_positions():
+    pool = range(6)
+    for size in (1, 2, 3):
+        expected = [combination for combination in combinations(pool, size)
+                    if {1, 4} & set(combination)]
+        assert list(_combinations(pool, size, {1, 4})) == expected
+        assert list(_combinations(pool, size)) == \
+            list(combinations(pool, size))
+        assert list(_combinations(pool, size, {1, 4}, True)) == [
+            combination for combination in
+            combinations_with_replacement(pool, size)
+            if {1, 4} & set(combination)
+        ]
+    assert list(_combinations(pool, 2, set())) == []
+    assert list(_combinations(pool, 7)) == []
+
+
+@_isolated
+def test_species_requirements_prune_combinations():
+    calls = {'even': 0, 'species': 0, 'small': 0}
+
+    def even(reactants, conditions):
+        calls['even'] += 1
+        return all(reactant % 2 == 0 for reactant in reactants)
+
+    @register_species_requirement(even, mode='all', exact=True)
+    def even_species(species, conditions):
+        calls['species'] += 1
+        return [molecule % 2 == 0 for molecule in species]
+
+    def has_four(reactants, conditions):
+        return 4 in reactants
+
+    @register_species_requirement(has_four, mode='any', exact=True)
+    def four_species(species, conditions):
+        return [molecule == 4 for molecule in species]
+
+    def small(reactants, conditions):
+        calls['small'] += 1
+        return sum(reactants) < conditions['limit']
+
+    @register_reaction_mechanism([even, small], True, arity=2)
+    def pair(reactants, conditions):
+        return [sum(reactants)]
+
+    @register_reaction_mechanism([even, has_four], True, arity=(1, 3))
+    def with_four(reactants, conditions):
+        return [max(reactants)]
+
+    mixture = list(range(10))
+    conditions = {'limit': 8}
+    found = [(positions, [mechanism.__name__ for mechanism in mechanisms])
+             for positions, mechanisms in
+             feasible_reactions(mixture, conditions, __test=True)]
+
+    evens = [0, 2, 4, 6, 8]
+    expected = [((4,), ['with_four'])]
+    expected += [(pair_, ['pair']) for pair_ in combinations(evens, 2)
+                 if sum(pair_) < 8]
+    expected += [(triple, ['with_four'])
+                 for triple in combinations(evens, 3) if 4 in triple]
+    assert found == expected
+    assert calls == {'even': 0, 'species': 1, 'small': 10}
+
+    # Without a declared arity a mechanism is only used when asked for.
+    @register_reaction_mechanism([even], True)
+    def anything(reactants, conditions):
+        return list(reactants)
+
+    assert [positions for positions, _ in feasible_reactions(
+        mixture, conditions, __test=True)] == \
+        [positions for positions, _ in expected]
+    assert len(list(feasible_reactions(
+        mixture, conditions, arity=2, __test=True))) == 10
+
+
+def test_react_mixture_matches_react():
+    mixture = generators.mixture(10, seed=2)
+    conditions = {}
+    before = deepcopy(mixture)
+    reactions = list(react_mixture(mixture, conditions))
+
+    assert mixture == before
+    # The structures are unchanged, but the species are annotated.
+    assert all(hasattr(molecule, 'pka') for molecule in mixture)
+    assert reactions
+    reacted = dict(reactions)
+    for pair in combinations(range(len(mixture)), 2):
+        reactants = [deepcopy(mixture[position]) for position in pair]
+        if pair in reacted:
+            assert reacted[pair].products == react(reactants, conditions)
+        else:
+            assert raises(FailedReactionError, react,
+                          (reactants, conditions))
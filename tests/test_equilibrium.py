@@ -0,0 +1,179 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from CAOS.dispatch import react
+from CAOS.structures import equilibrium
+from CAOS.structures.molecule import Molecule
+
+
+def acetic_acid():
+    return Molecule(
+        {'a1': 'C', 'a2': 'C', 'a3': 'O', 'a4': 'O', 'a5': 'H',
+         'a6': 'H', 'a7': 'H', 'a8': 'H'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 2},
+         'b3': {'nodes': ('a2', 'a4'), 'order': 1},
+         'b4': {'nodes': ('a4', 'a5'), 'order': 1},
+         'b5': {'nodes': ('a1', 'a6'), 'order': 1},
+         'b6': {'nodes': ('a1', 'a7'), 'order': 1},
+         'b7': {'nodes': ('a1', 'a8'), 'order': 1}},
+        id='Acetic acid'
+    )
+
+
+def glycine():
+    return Molecule(
+        {'a1': 'N', 'a2': 'C', 'a3': 'C', 'a4': 'O', 'a5': 'O', 'a6': 'H',
+         'a7': 'H', 'a8': 'H', 'a9': 'H', 'a10': 'H'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 1},
+         'b3': {'nodes': ('a3', 'a4'), 'order': 2},
+         'b4': {'nodes': ('a3', 'a5'), 'order': 1},
+         'b5': {'nodes': ('a5', 'a6'), 'order': 1},
+         'b6': {'nodes': ('a1', 'a7'), 'order': 1},
+         'b7': {'nodes': ('a1', 'a8'), 'order': 1},
+         'b8': {'nodes': ('a2', 'a9'), 'order': 1},
+         'b9': {'nodes': ('a2', 'a10'), 'order': 1}},
+        id='Glycine'
+    )
+
+
+def oxalic_acid():
+    return Molecule(
+        {'a1': 'C', 'a2': 'C', 'a3': 'O', 'a4': 'O', 'a5': 'O', 'a6': 'O',
+         'a7': 'H', 'a8': 'H'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1},
+         'b2': {'nodes': ('a1', 'a3'), 'order': 2},
+         'b3': {'nodes': ('a1', 'a4'), 'order': 1},
+         'b4': {'nodes': ('a2', 'a5'), 'order': 2},
+         'b5': {'nodes': ('a2', 'a6'), 'order': 1},
+         'b6': {'nodes': ('a4', 'a7'), 'order': 1},
+         'b7': {'nodes': ('a6', 'a8'), 'order': 1}},
+        id='Oxalic acid'
+    )
+
+
+def ammonium():
+    return Molecule(
+        {'a1': 'N', 'a2': 'H', 'a3': 'H', 'a4': 'H', 'a5': 'H'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1},
+         'b2': {'nodes': ('a1', 'a3'), 'order': 1},
+         'b3': {'nodes': ('a1', 'a4'), 'order': 1},
+         'b4': {'nodes': ('a1', 'a5'), 'order': 1}},
+        id='Ammonium'
+    )
+
+
+def hydrogen_sulfide():
+    return Molecule(
+        {'a1': 'S', 'a2': 'H', 'a3': 'H'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1},
+         'b2': {'nodes': ('a1', 'a3'), 'order': 1}},
+        id='Hydrogen sulfide'
+    )
+
+
+def _hydrogens(molecule, atom_id):
+    return [neighbor for neighbor in molecule[atom_id]
+            if molecule.atoms[neighbor] == 'H']
+
+
+def test_half_dissociated_at_pka():
+    alpha = equilibrium.fractions([[4.76]], [4.76, 5.76])
+    assert alpha.shape == (2, 1, 2)
+    assert np.allclose(alpha[0, 0], [0.5, 0.5])
+    assert np.allclose(alpha[1, 0], [1 / 11, 10 / 11])
+
+
+def test_padded_steps_are_impossible():
+    table = equilibrium.pka_table([[2.15, 7.2, 12.35], 4.76])
+    alpha = equilibrium.fractions(table, np.linspace(0, 14, 15))
+    assert np.allclose(alpha.sum(axis=2), 1)
+    assert (alpha[:, 1, 2:] == 0).all()
+
+
+def test_weak_acid_ph():
+    ph = equilibrium.solve_ph([[4.76]], [0], [[0.1]])
+    assert abs(ph[0] - 2.88) < 0.01
+
+
+def test_titration_curve_is_solved_in_one_batch():
+    table = equilibrium.pka_table([[2.15, 7.2, 12.35]])
+    added_base = np.linspace(0, 0.3, 301)
+    ph = equilibrium.solve_ph(table, [0], [[0.1]], background=added_base)
+
+    assert (np.diff(ph) > 0).all()
+    # Halfway to the second equivalence point, pH = pKa2.
+    assert abs(ph[150] - 7.2) < 0.01
+    single = equilibrium.solve_ph(table, [0], [[0.1]], background=0.15)
+    assert abs(single[0] - ph[150]) < 1e-8
+
+
+def test_speciate_with_given_pkas():
+    speciation = equilibrium.speciate(
+        [acetic_acid()],
+        {'pkas': {'Acetic acid': 4.76}, 'pka_points': {'Acetic acid': 'a5'},
+         'concentrations': {'Acetic acid': 0.1}}
+    )
+    assert abs(speciation.ph[0] - 2.88) < 0.01
+
+    products = speciation.products()
+    assert [len(form) for form, _ in products] == [8, 7]
+    assert abs(sum(amount for _, amount in products) - 0.1) < 1e-12
+
+
+def test_speciate_over_ph_sweep():
+    speciation = equilibrium.speciate(
+        [acetic_acid()], {}, ph=np.linspace(0, 14, 1000)
+    )
+    # Estimated with two basic oxygens, the acidic proton and one of
+    # the three alpha hydrogens, which sit on the same carbon.
+    assert speciation.fractions.shape == (1000, 1, 5)
+    assert np.allclose(speciation.pkas, [[-7.0, -2.0, 4.76, 20]])
+    assert speciation.fractions[0, 0].argmax() == 2
+    assert speciation.fractions[-1, 0].argmax() == 3
+
+
+def test_equilibrium_mode_through_react():
+    products = react([acetic_acid()], {
+        'equilibrium': True, 'ph': 4.76, 'abundance_cutoff': 1e-6,
+        'pkas': {'Acetic acid': 4.76}, 'pka_points': {'Acetic acid': 'a5'},
+    })
+    assert [product.abundance for product in products] == [0.5, 0.5]
+
+
+def test_every_site_is_titrated():
+    speciation = equilibrium.speciate([oxalic_acid()], {}, ph=[14.0])
+
+    (form, _), = speciation.products(cutoff=1e-2)
+    assert len(form) == 6
+    assert 'a7' not in form and 'a8' not in form
+
+
+def test_zwitterion_holds_the_proton_at_the_stronger_base():
+    speciation = equilibrium.speciate([glycine()], {}, ph=[7.0])
+
+    (form, _), = speciation.products(cutoff=1e-2)
+    assert len(form) == 10
+    assert len(_hydrogens(form, 'a1')) == 3
+    assert 'a6' not in form
+
+
+def test_ammonium_loses_one_proton():
+    speciation = equilibrium.speciate([ammonium()], {}, ph=[10.0])
+
+    assert np.allclose(speciation.pkas, [[9.25]])
+    protonated = 1 / (1 + 10 ** 0.75)
+    assert np.allclose(speciation.fractions[0, 0],
+                       [protonated, 1 - protonated])
+    (form, _), = speciation.products(cutoff=0.5)
+    assert len(_hydrogens(form, 'a1')) == 3
+
+
+def test_hydrogen_sulfide_stops_at_hydrosulfide():
+    speciation = equilibrium.speciate([hydrogen_sulfide()], {}, ph=[7.0])
+
+    assert np.allclose(speciation.pkas, [[-7.0, 7.0]])
+    assert np.allclose(speciation.fractions[0, 0], [0, 0.5, 0.5])
@@ -0,0 +1,79 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import shutil
+import tempfile
+
+import numpy as np
+
+from CAOS.structures.fingerprint import FingerprintIndex, fingerprint, \
+    fingerprints, popcounts, tanimoto
+from CAOS.util import raises
+
+from benchmarks import generators
+
+
+def test_fingerprint_ignores_ids():
+    first = generators.functionalized(5)
+    second = generators.functionalized(5)
+    second.id = 'other'
+
+    assert (fingerprint(first) == fingerprint(second)).all()
+    assert fingerprint(first).shape == (256,)
+    assert not (fingerprint(first) == fingerprint(
+        generators.functionalized(5, head='NH2'))).all()
+
+
+def test_popcounts_and_tanimoto():
+    rows = np.zeros((3, 8), dtype=np.uint8)
+    rows[0, 0] = 0b1111
+    rows[1, 0] = 0b0011
+    query = rows[0]
+
+    assert popcounts(rows).tolist() == [4, 2, 0]
+    assert tanimoto(query, rows).tolist() == [1.0, 0.5, 0.0]
+    assert tanimoto(rows[2], rows[2:]).tolist() == [0.0]
+
+
+def test_search_top_k_and_threshold():
+    library = generators.library(50, seed=3)
+    index = FingerprintIndex()
+    index.add(library[:20])
+    index.add(library[20:])
+    query = library[7]
+
+    similarities = tanimoto(fingerprint(query), fingerprints(library))
+    expected = sorted(
+        ((-score, position) for position, score in enumerate(similarities))
+    )[:5]
+    results = index.search(query, k=5)
+
+    assert len(index) == 50
+    assert results[0] == (query.id, 1.0)
+    assert [key for key, _ in results] == \
+        [library[position].id for _, position in expected]
+    assert index.similarities(query).tolist() == similarities.tolist()
+
+    above = index.search(query, k=None, threshold=0.5)
+    assert [score for _, score in above] == sorted(
+        (score for score in similarities if score >= 0.5), reverse=True
+    )
+    assert index.search(query, k=0) == []
+
+
+def test_stored_index_is_appended_to():
+    library = generators.library(30, seed=1)
+    path = tempfile.mkdtemp()
+    try:
+        index = FingerprintIndex(path, radius=1, size=512)
+        index.add(library[:10])
+        reopened = FingerprintIndex(path)
+        reopened.add(library[10:])
+        reopened = FingerprintIndex(path)
+
+        assert (reopened.radius, reopened.size) == (1, 512)
+        assert reopened.keys == [molecule.id for molecule in library]
+        assert reopened.search(library[15], k=1) == [(library[15].id, 1.0)]
+        assert raises(ValueError, FingerprintIndex, (path, 2))
+    finally:
+        shutil.rmtree(path)
@@ -0,0 +1,57 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import subprocess
+import sys
+
+from nose.plugins.skip import SkipTest
+
+from CAOS import mechanisms
+
+
+def _imported_modules(statement):
+    if sys.version_info < (3, 7):
+        raise SkipTest("-X importtime needs Python 3.7 or newer")
+
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.STDOUT, universal_newlines=True
+    )
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def test_import_does_not_load_mechanisms():
+    modules = _imported_modules('import CAOS')
+    assert 'CAOS' in modules
+    for mechanism in mechanisms.__mechanisms__:
+        assert 'CAOS.mechanisms.{}'.format(mechanism) not in modules
+
+
+def test_import_does_not_discover_plugins():
+    modules = _imported_modules('import CAOS')
+    assert 'importlib.metadata' not in modules
+    assert 'pkg_resources' not in modules
+
+
+def test_import_does_not_load_heavy_dependencies():
+    modules = _imported_modules('import CAOS')
+    assert 'networkx' not in modules
+    assert 'argparse' not in modules
+
+
+def test_manifest_matches_mechanism_modules():
+    from importlib import import_module
+
+    for name, requirement_names in mechanisms.__manifest__.items():
+        module = import_module('CAOS.mechanisms.{}'.format(name))
+        assert tuple(module.__requirements__) == tuple(requirement_names)
+        arity = getattr(module, '__arity__', None)
+        if isinstance(arity, int):
+            arity = (arity,)
+        assert arity == mechanisms.__arities__.get(name)
@@ -0,0 +1,87 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import numpy as np
+
+from CAOS.kinetics import KineticModel, simulate
+from CAOS.network import expand_network
+from CAOS.util import raises
+
+from benchmarks import generators
+
+
+def _robertson():
+    # A stiff classic: A -> B, 2 B -> B + C, B + C -> A + C.
+    return KineticModel('ABC', [
+        ({'A': 1}, {'B': 1}),
+        ({'B': 2}, {'B': 1, 'C': 1}),
+        ({'B': 1, 'C': 1}, {'A': 1, 'C': 1}),
+    ], [0.04, 3e7, 1e4])
+
+
+def test_stoichiometry_and_jacobian():
+    model = _robertson()
+    concentrations = np.array([[0.7, 1e-3, 0.2], [0.1, 0.5, 0.4]])
+
+    assert model.stoichiometry().tolist() == \
+        [[-1, 0, 1], [1, -1, -1], [0, 1, 0]]
+    assert len(model.net_coefficients) == 6
+
+    numeric = np.empty((2, 3, 3))
+    for species in range(3):
+        shift = np.zeros(3)
+        shift[species] = 1e-4
+        numeric[:, :, species] = (
+            model.derivatives(concentrations + shift) -
+            model.derivatives(concentrations - shift)
+        ) / 2e-4
+    assert np.allclose(model.jacobian(concentrations), numeric, rtol=1e-6,
+                       atol=1e-6)
+
+
+def test_first_order_decay():
+    model = KineticModel('AB', [({'A': 1}, {'B': 1})], [2.0])
+    times = np.linspace(0, 2, 5)
+    results = simulate(model, [1.0, 0.0], times)
+
+    assert results.shape == (5, 2)
+    assert np.allclose(results[:, 0], np.exp(-2 * times), rtol=1e-2)
+    assert np.allclose(results.sum(axis=1), 1.0)
+
+
+def test_stiff_batch_matches_single_runs():
+    model = _robertson()
+    times = [0, 0.4, 40, 4e5]
+    initial = np.array([[1.0, 0, 0], [0.5, 0, 0.5]])
+    rate_constants = np.array([[0.04, 3e7, 1e4], [0.08, 3e7, 1e4]])
+    batch = simulate(model, initial, times, rate_constants, rtol=1e-4,
+                     atol=1e-12)
+
+    assert batch.shape == (2, 4, 3)
+    # Reference values of the Robertson problem.
+    assert np.allclose(batch[0, -1], [4.9394e-3, 1.9854e-8, 0.99506],
+                       rtol=1e-3)
+    for row in range(2):
+        single = simulate(model, initial[row], times, rate_constants[row],
+                          rtol=1e-4, atol=1e-12)
+        assert np.allclose(single, batch[row], rtol=1e-3, atol=1e-10)
+    assert np.allclose(batch.sum(axis=2), 1.0)
+
+    assert raises(ValueError, simulate, (model, [1.0, 0.0], times))
+    assert raises(ValueError, simulate, (model, [1.0, 0, 0], [1, 0]))
+    assert raises(RuntimeError, simulate,
+                  (model, [1.0, 0, 0], times, None, 1e-6, 1e-12, 10))
+
+
+def test_model_of_network():
+    network = expand_network(generators.mixture(5, seed=4), {}, depth=1)
+    model = KineticModel.from_network(
+        network, lambda reaction: 1.0 + (reaction['mechanism'] == 'x')
+    )
+    initial = np.ones(len(model))
+
+    assert len(model) == len(network)
+    assert len(model.rate_constants) == len(network.reactions)
+    results = simulate(model, initial, [0, 0.1, 1])
+    assert results.shape == (3, len(network))
+    assert (results >= 0).all()
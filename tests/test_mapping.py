@@ -0,0 +1,111 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+from CAOS.delta import react_delta
+from CAOS.dispatch import react
+from CAOS.structures.mapping import AtomMap, map_atoms
+from CAOS.structures.molecule import Molecule
+
+from benchmarks import generators
+
+
+def _bond_changes(reactants, products, atom_map):
+    """Count the bonds broken and formed under the map."""
+
+    inverse = atom_map.inverse()
+    kept = 0
+    for number, product in enumerate(products):
+        if product is None:
+            continue
+        for first, second in product.edges():
+            source, image = atom_map[number, first]
+            other, partner = atom_map[number, second]
+            if source == other and reactants[source].has_edge(image, partner):
+                kept += 1
+    formed = sum(
+        product.number_of_edges() for product in products
+        if product is not None
+    ) - kept
+    broken = sum(reactant.number_of_edges() for reactant in reactants) - kept
+    assert len(inverse) == len(atom_map)
+    return broken, formed
+
+
+def test_identical_molecules_map_onto_each_other():
+    molecule = generators.alkane(10)
+    copy = deepcopy(molecule)
+    atom_map = map_atoms([molecule], [copy])
+
+    assert len(atom_map) == len(copy)
+    assert all(
+        copy.atoms[atom] == molecule.atoms[image]
+        for (_, atom), (_, image) in atom_map.items()
+    )
+    assert _bond_changes([molecule], [copy], atom_map) == (0, 0)
+
+
+def test_symmetric_atoms_are_mapped_consistently():
+    molecule = generators.alkane(6)
+    # The same molecule with its atom ids reversed, so that matching by
+    # id order alone would break bonds.
+    ids = sorted(molecule.atoms, key=lambda atom: int(atom[1:]))
+    renamed = dict(zip(ids, reversed(ids)))
+    copy = Molecule(
+        dict((renamed[atom], symbol)
+             for atom, symbol in molecule.atoms.items()),
+        dict((bond, {'nodes': tuple(renamed[atom] for atom in data['nodes']),
+                     'order': data.get('order', 1)})
+             for bond, data in molecule.bonds.items())
+    )
+    atom_map = map_atoms([molecule], [copy])
+
+    assert len(atom_map) == len(copy)
+    assert _bond_changes([molecule], [copy], atom_map) == (0, 0)
+
+
+def test_recorded_map_follows_the_moved_hydrogen():
+    reactants, conditions = generators.acid_base_pair(20)
+    donor = conditions['pka_points']['Acid']
+    delta = react_delta(reactants, conditions)
+    atom_map = delta.atom_map()
+
+    moved = [
+        (key, origin) for key, origin in atom_map.items()
+        if key[0] == 0 and origin[0] == 0
+    ]
+    assert moved == [(moved[0][0], (0, donor))]
+    assert len(atom_map) == sum(
+        len(product) for product in delta if product is not None
+    )
+
+
+def test_standalone_map_is_minimal():
+    reactants, conditions = generators.acid_base_pair(20)
+    originals = deepcopy(reactants)
+    products = react(reactants, conditions)
+    atom_map = map_atoms(originals, products)
+
+    assert len(atom_map) == sum(
+        len(product) for product in products if product is not None
+    )
+    assert _bond_changes(originals, products, atom_map) == (1, 1)
+
+
+def test_partial_map_is_kept():
+    molecule = generators.alkane(3)
+    copy = deepcopy(molecule)
+    hydrogens = sorted(
+        atom for atom, symbol in molecule.atoms.items() if symbol == 'H'
+    )
+    partial = AtomMap([{hydrogens[0]: (0, hydrogens[1])}])
+    atom_map = map_atoms([molecule], [copy], partial)
+
+    assert atom_map[0, hydrogens[0]] == (0, hydrogens[1])
+    assert len(atom_map) == len(copy)
+
+
+def test_map_serialization():
+    atom_map = AtomMap([{'a1': (0, 'a2')}, {}])
+    assert AtomMap.from_dict(atom_map.to_dict()) == atom_map
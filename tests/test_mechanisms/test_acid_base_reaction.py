@@ -1,5 +1,8 @@
+import numpy as np
+
 from CAOS.structures.molecule import Molecule
 from CAOS.dispatch import react
+from CAOS.mechanisms.acid_base import MixtureSites, acid_base_mixture
 
 
 def test_simple_acid_base_reaction():
@@ -44,3 +47,133 @@ def test_simple_acid_base_reaction():
 
     # Determining the salt isn't implemented
     assert products[2] is None
+
+
+def test_acid_base_reaction_with_estimated_pkas():
+    acid = Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'H', 'a4': 'O'},
+        {'b1': {'nodes': ('a1', 'a4'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a4'), 'order': 1},
+         'b3': {'nodes': ('a3', 'a4'), 'order': 1}
+        }
+    )
+
+    base = Molecule(
+        {'a1': 'H', 'a2': 'O'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1}}
+    )
+
+    products = react([acid, base], {})
+
+    water = Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'O'},
+        {'b1': {'nodes': ('a1', 'a3'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 1}
+        }
+    )
+
+    assert products[0] == water
+    assert products[1] == water
+
+
+def _water_ions():
+    hydronium = Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'H', 'a4': 'O'},
+        {'b1': {'nodes': ('a1', 'a4'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a4'), 'order': 1},
+         'b3': {'nodes': ('a3', 'a4'), 'order': 1}
+        },
+        **{'id': 'Hydronium'}
+    )
+    hydroxide = Molecule(
+        {'a1': 'H', 'a2': 'O'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1}},
+        **{'id': 'Hydroxide'}
+    )
+    ammonia = Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'H', 'a4': 'N'},
+        {'b1': {'nodes': ('a1', 'a4'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a4'), 'order': 1},
+         'b3': {'nodes': ('a3', 'a4'), 'order': 1}
+        },
+        **{'id': 'Ammonia'}
+    )
+    return hydronium, hydroxide, ammonia
+
+
+def test_mixture_sites_collapse_equivalent_atoms():
+    hydronium, hydroxide, ammonia = _water_ions()
+    sites = MixtureSites([hydronium, hydroxide, ammonia])
+
+    # Equivalent hydrogens are one donor, and hydronium has no acceptor.
+    assert sorted(sites.donor_owners.tolist()) == [0, 1, 2]
+    assert sorted(sites.acceptor_owners.tolist()) == [1, 2]
+    deltas = sites.delta_matrix()
+    assert deltas.shape == (len(sites.donor_atoms), len(sites.acceptor_atoms))
+    assert np.isnan(deltas[sites.donor_owners[:, None] ==
+                           sites.acceptor_owners[None, :]]).all()
+
+
+def test_mixture_transfers_are_ranked():
+    hydronium, hydroxide, ammonia = _water_ions()
+    transfers = list(acid_base_mixture([hydronium, hydroxide, ammonia], {}))
+
+    deltas = [transfer.delta_pka for transfer in transfers]
+    assert deltas == sorted(deltas, reverse=True)
+    assert all(delta > 0 for delta in deltas)
+
+    best = transfers[0]
+    assert best.acid is hydronium and best.base is hydroxide
+    assert best.donor in ('a1', 'a2', 'a3') and best.acceptor == 'a2'
+
+
+def test_mixture_exclusive_uses_each_reactant_once():
+    hydronium, hydroxide, ammonia = _water_ions()
+    transfers = list(acid_base_mixture(
+        [hydronium, hydroxide, ammonia], {}, exclusive=True
+    ))
+
+    assert len(transfers) == 1
+    water = Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'O'},
+        {'b1': {'nodes': ('a1', 'a3'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 1}
+        }
+    )
+    assert transfers[0].products == [water, water]
+
+
+def test_mixture_mode_through_react():
+    reactants = list(_water_ions())
+    products = react(reactants, {'mixture': True})
+    assert [len(product) for product in products] == [3, 3]
+
+    # The products don't follow later changes to the reactants.
+    for reactant in reactants:
+        reactant.remove_node('a1')
+    assert [len(product) for product in products] == [3, 3]
+
+
+def test_implicit_hydrogens_move_counts():
+    hydronium, hydroxide, _ = _water_ions()
+    explicit = react([hydronium, hydroxide], {})
+    hydronium, hydroxide, _ = _water_ions()
+    acid, base = hydronium.to_implicit(), hydroxide.to_implicit()
+    products = react([acid, base], {})
+
+    assert [len(product) for product in products[:2]] == [1, 1]
+    assert products[0] == explicit[0].to_implicit()
+    assert products[1] == explicit[1].to_implicit()
+
+
+def test_reactants_are_unchanged():
+    hydronium, hydroxide, _ = _water_ions()
+    first = react([hydronium, hydroxide], {})
+
+    assert len(hydronium) == 4
+    assert len(hydroxide) == 2
+    assert not any(product is hydronium or product is hydroxide
+                   for product in first)
+
+    second = react([hydronium, hydroxide], {})
+    assert first[:2] == second[:2]
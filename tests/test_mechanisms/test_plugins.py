@@ -0,0 +1,202 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import os
+import shutil
+import sys
+import tempfile
+
+from CAOS.dispatch import ReactionDispatcher, reaction_is_registered
+from CAOS.mechanisms import plugins
+
+_PLUGIN_SOURCE = '''
+__requirements__ = ('pka', 'fake_caos_plugin:always')
+
+
+def always(reactants, conditions):
+    return True
+
+
+def fake_plugin_reaction(reactants, conditions):
+    return ['fake']
+'''
+
+_ENTRY_POINTS = '''[CAOS.mechanisms]
+fake = fake_caos_plugin:fake_plugin_reaction
+'''
+
+
+class TestPluginDiscovery(object):
+
+    def setup(self):
+        # Keep the cache and bytecode out of the scanned directory.
+        self.directory = tempfile.mkdtemp()
+        self.cache = tempfile.mkdtemp()
+        self.old_cache = os.environ.get(plugins.CACHE_DIR_VARIABLE)
+        os.environ[plugins.CACHE_DIR_VARIABLE] = self.cache
+        self.dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = True
+
+        with open(os.path.join(self.directory, 'fake_caos_plugin.py'),
+                  'w') as module_file:
+            module_file.write(_PLUGIN_SOURCE)
+        dist_info = os.path.join(
+            self.directory, 'fake_caos_plugin-1.0.dist-info'
+        )
+        os.mkdir(dist_info)
+        with open(os.path.join(dist_info, 'METADATA'), 'w') as metadata:
+            metadata.write('Metadata-Version: 2.1\n'
+                           'Name: fake-caos-plugin\nVersion: 1.0\n')
+        with open(os.path.join(dist_info, 'entry_points.txt'),
+                  'w') as entry_points:
+            entry_points.write(_ENTRY_POINTS)
+        sys.path.insert(0, self.directory)
+
+    def teardown(self):
+        sys.path.remove(self.directory)
+        sys.modules.pop('fake_caos_plugin', None)
+        ReactionDispatcher._mechanism_namespace.pop(
+            'fake_plugin_reaction', None
+        )
+        if self.old_cache is None:
+            del os.environ[plugins.CACHE_DIR_VARIABLE]
+        else:
+            os.environ[plugins.CACHE_DIR_VARIABLE] = self.old_cache
+        sys.dont_write_bytecode = self.dont_write_bytecode
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.cache)
+
+    def test_discover(self):
+        found = plugins.discover(path=[self.directory])
+        assert len(found) == 1
+        assert found[0]['module'] == 'fake_caos_plugin'
+        assert found[0]['attribute'] == 'fake_plugin_reaction'
+        assert found[0]['requirements'] == [
+            'pka', 'fake_caos_plugin:always'
+        ]
+        assert os.path.exists(plugins.index_path())
+
+    def test_index_is_reused(self):
+        first = plugins.discover(path=[self.directory])
+
+        scan = plugins._scan
+        plugins._scan = None
+        try:
+            assert plugins.discover(path=[self.directory]) == first
+        finally:
+            plugins._scan = scan
+
+    def test_index_skips_metadata_of_unchanged_sites(self):
+        os.utime(self.directory, (0, 0))
+        first = plugins.discover(path=[self.directory])
+
+        distributions = plugins._distributions
+        plugins._distributions = None
+        try:
+            assert plugins.discover(path=[self.directory]) == first
+        finally:
+            plugins._distributions = distributions
+
+    def test_index_invalidated_by_new_distribution(self):
+        os.utime(self.directory, (0, 0))
+        plugins.discover(path=[self.directory])
+        # An upgrade replaces the metadata directory, which changes the
+        # modification time of the site directory.
+        dist_info = os.path.join(self.directory,
+                                 'fake_caos_plugin-1.1.dist-info')
+        os.rename(os.path.join(self.directory,
+                               'fake_caos_plugin-1.0.dist-info'), dist_info)
+        with open(os.path.join(dist_info, 'METADATA'), 'w') as metadata:
+            metadata.write('Metadata-Version: 2.1\n'
+                           'Name: fake-caos-plugin\nVersion: 1.1\n')
+        calls = []
+        scan = plugins._scan
+
+        def counting_scan(distributions):
+            calls.append(distributions)
+            return scan(distributions)
+
+        plugins._scan = counting_scan
+        try:
+            plugins.discover(path=[self.directory])
+        finally:
+            plugins._scan = scan
+        assert len(calls) == 1
+
+    def test_index_ignores_other_changes(self):
+        first = plugins.discover(path=[self.directory])
+        os.utime(self.directory, (0, 0))
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as notes:
+            notes.write('not a distribution\n')
+
+        scan = plugins._scan
+        plugins._scan = None
+        try:
+            assert plugins.discover(path=[self.directory]) == first
+        finally:
+            plugins._scan = scan
+
+    def test_default_path_skips_current_directory(self):
+        assert '' not in plugins._site_directories()
+        assert os.getcwd() not in plugins._site_directories()
+
+    def test_register_plugins_lazily(self):
+        plugins.discover(path=[self.directory])
+        sys.modules.pop('fake_caos_plugin', None)
+
+        names = plugins.register_plugins(path=[self.directory])
+
+        assert names == ['fake_plugin_reaction']
+        assert reaction_is_registered('fake_plugin_reaction')
+        assert 'fake_caos_plugin' not in sys.modules
+
+        info = ReactionDispatcher._mechanism_namespace['fake_plugin_reaction']
+        assert info['requirements'][1](None, None)
+        assert 'fake_caos_plugin' in sys.modules
+
+    def test_discovery_runs_on_first_dispatch(self):
+        hooks = ReactionDispatcher._discovery_hooks
+        saved = list(hooks)
+        calls = []
+        hooks[:] = [lambda: calls.append(True)]
+        try:
+            reaction_is_registered('fake_plugin_reaction')
+            reaction_is_registered('fake_plugin_reaction')
+        finally:
+            hooks[:] = saved
+        assert calls == [True]
+
+    def test_failed_discovery_is_retried(self):
+        hooks = ReactionDispatcher._discovery_hooks
+        saved = list(hooks)
+        calls = []
+
+        def flaky():
+            calls.append(True)
+            if len(calls) == 1:
+                raise IOError("index unreadable")
+
+        hooks[:] = [flaky]
+        try:
+            try:
+                reaction_is_registered('fake_plugin_reaction')
+            except IOError:
+                pass
+            reaction_is_registered('fake_plugin_reaction')
+            reaction_is_registered('fake_plugin_reaction')
+        finally:
+            hooks[:] = saved
+        assert calls == [True, True]
+
+    def test_broken_plugin_is_skipped(self):
+        with open(os.path.join(self.directory, 'fake_caos_plugin.py'),
+                  'w') as module_file:
+            module_file.write('raise ImportError("broken")\n')
+        assert plugins.discover(refresh=True, path=[self.directory]) == []
+
+    def test_disabled(self):
+        os.environ[plugins.DISABLE_VARIABLE] = '1'
+        try:
+            assert plugins.register_plugins(path=[self.directory]) == []
+        finally:
+            del os.environ[plugins.DISABLE_VARIABLE]
@@ -0,0 +1,107 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+from itertools import combinations_with_replacement
+
+from CAOS.delta import react_delta
+from CAOS.exceptions.reaction_errors import FailedReactionError
+from CAOS.network import ReactionNetwork, expand_network
+from CAOS.structures.canonical import canonical_hash
+from CAOS.structures.molecule import Molecule
+
+from benchmarks import generators
+
+
+def _naive(mixture, depth):
+    """Expand by reacting every combination of the known species."""
+
+    species = dict((canonical_hash(molecule), molecule)
+                   for molecule in mixture)
+    for _ in range(depth):
+        found = {}
+        for pair in combinations_with_replacement(list(species.values()), 2):
+            try:
+                products = react_delta(deepcopy(list(pair)), {}).products
+            except FailedReactionError:
+                continue
+            for product in products:
+                if product is not None:
+                    found.setdefault(canonical_hash(product), product)
+        species.update(found)
+    return set(species)
+
+
+def test_expansion_matches_naive_loop():
+    mixture = generators.mixture(5, seed=4)
+    before = deepcopy(mixture)
+    network = expand_network(mixture, {}, depth=2)
+
+    assert mixture == before
+    assert set(network.graph.nodes()) - set(network.reactions) == \
+        _naive(mixture, 2)
+    assert network.generation == 2
+    for source, target in network.graph.edges():
+        assert network.graph.node[source]['bipartite'] != \
+            network.graph.node[target]['bipartite']
+
+
+def test_expanding_again_repeats_nothing():
+    mixture = generators.mixture(5, seed=4)
+    whole = expand_network(mixture, {}, depth=3)
+    network = ReactionNetwork({})
+    network.add_species(mixture)
+    network.expand(1).expand(1)
+    tried = len(network._outcomes)
+    network.expand(1)
+
+    assert len(network) == len(whole)
+    assert len(network.reactions) == len(whole.reactions)
+    # Only combinations with a species of the last generation are new.
+    new = len(network._outcomes) - tried
+    assert 0 < new < len(network) ** 2
+    reaction = network.outcome(mixture[:2])
+    assert reaction is None or reaction in network.reactions
+
+
+def test_species_limit():
+    mixture = generators.mixture(5, seed=4)
+    network = expand_network(mixture, {}, depth=3, max_species=6)
+
+    assert len(network) == 6
+    assert network.truncated
+    for reaction in network.reactions:
+        assert all(product in network.graph
+                   for product in network.graph.successors(reaction))
+
+
+def test_species_limit_keeps_reactions_whole():
+    species = dict((molecule.id, molecule)
+                   for molecule in generators.mixture(40))
+    # Acetic acid and hydroxide give acetate and water, which don't
+    # both fit.
+    mixture = [species['s9'], species['s15']]
+    network = expand_network(mixture, {}, depth=1, max_species=3)
+
+    assert len(network) == 2 and network.truncated
+    assert network.reactions == []
+    assert expand_network(mixture, {}, depth=1, max_species=4).reactions \
+        == ['r0']
+
+
+def test_species_told_apart_exactly():
+    # Decalin and bicyclopentyl, which refinement can't tell apart.
+    pairs = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 0), (0, 5), (5, 6),
+             (6, 7), (7, 8), (8, 9), (9, 5)]
+    bicyclopentyl = Molecule(
+        dict(('a{}'.format(atom), 'C') for atom in range(10)),
+        dict(('b{}'.format(i), {'nodes': ('a{}'.format(x), 'a{}'.format(y)),
+                                'order': 1})
+             for i, (x, y) in enumerate(pairs))
+    )
+    network = ReactionNetwork({})
+
+    assert len(network.add_species([generators.fused_rings(2)])) == 1
+    assert bicyclopentyl not in network
+    assert len(network.add_species([bicyclopentyl])) == 1
+    assert len(network) == 2
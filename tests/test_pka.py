@@ -0,0 +1,97 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.structures import pka
+from CAOS.structures.molecule import Molecule
+
+
+def hydronium():
+    return Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'H', 'a4': 'O'},
+        {'b1': {'nodes': ('a1', 'a4'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a4'), 'order': 1},
+         'b3': {'nodes': ('a3', 'a4'), 'order': 1}}
+    )
+
+
+def hydroxide():
+    return Molecule(
+        {'a1': 'H', 'a2': 'O'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1}}
+    )
+
+
+def acetic_acid():
+    return Molecule(
+        {'a1': 'C', 'a2': 'C', 'a3': 'O', 'a4': 'O', 'a5': 'H',
+         'a6': 'H', 'a7': 'H', 'a8': 'H'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 2},
+         'b3': {'nodes': ('a2', 'a4'), 'order': 1},
+         'b4': {'nodes': ('a4', 'a5'), 'order': 1},
+         'b5': {'nodes': ('a1', 'a6'), 'order': 1},
+         'b6': {'nodes': ('a1', 'a7'), 'order': 1},
+         'b7': {'nodes': ('a1', 'a8'), 'order': 1}}
+    )
+
+
+def test_hydronium():
+    estimate = pka.estimate(hydronium())
+    assert estimate.acid_pka == pka.ACID_TABLE['oxonium']
+    assert estimate.acid_site in ('a1', 'a2', 'a3')
+    assert estimate.base_site is None
+
+
+def test_hydroxide():
+    estimate = pka.estimate(hydroxide())
+    assert estimate.base_site == 'a2'
+    assert estimate.base_pka == pka.BASE_TABLE['hydroxide']
+
+
+def test_carboxylic_acid():
+    estimate = pka.estimate(acetic_acid())
+    assert estimate.acid_site == 'a5'
+    assert estimate.acid_pka == pka.ACID_TABLE['carboxylic_acid']
+    assert estimate.acidic['a6'] == pka.ACID_TABLE['alpha_carbonyl']
+    assert estimate.basic['a3'] == pka.BASE_TABLE['carbonyl']
+
+
+def test_estimate_many_matches_single():
+    molecules = [hydronium(), hydroxide(), acetic_acid(), hydroxide()]
+    batch = pka.estimate_many(molecules)
+    for molecule, estimate in zip(molecules, batch):
+        single = pka.estimate(molecule)
+        assert single.acidic == estimate.acidic
+        assert single.basic == estimate.basic
+
+
+def test_memoized_by_structure():
+    first = acetic_acid()
+    second = Molecule(
+        dict(('x' + id_[1:], symbol)
+             for id_, symbol in first.atoms.items()),
+        dict((id_, {'nodes': tuple('x' + n[1:] for n in bond['nodes']),
+                    'order': bond['order']})
+             for id_, bond in first.bonds.items())
+    )
+    pka.estimate(first)
+    estimate = pka.estimate(second)
+    assert estimate.acid_site == 'x5'
+
+
+def test_estimate_is_invalidated_on_change():
+    molecule = hydroxide()
+    assert pka.estimate(molecule).acid_pka == pka.ACID_TABLE['hydroxide']
+    molecule._add_node('a3', 'H')
+    molecule._add_edge('b2', {'nodes': ('a2', 'a3'), 'order': 1})
+    assert pka.estimate(molecule).acid_pka == pka.ACID_TABLE['water']
+
+
+def test_implicit_hydrogens():
+    explicit = pka.estimate(acetic_acid())
+    estimate = pka.estimate(acetic_acid().to_implicit())
+
+    assert estimate.acid_site == 'a4'
+    assert estimate.acid_pka == explicit.acid_pka
+    assert estimate.acidic['a1'] == pka.ACID_TABLE['alpha_carbonyl']
+    assert estimate.basic == explicit.basic
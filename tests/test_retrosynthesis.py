@@ -0,0 +1,95 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+from CAOS.dispatch import react
+from CAOS.retrosynthesis import retrosynthesis
+from CAOS.structures.canonical import canonical_hash, canonical_hashes
+
+from benchmarks import generators
+
+# Hydronium, hydroxide, water, ammonium and acetic acid.
+_SPECIES = dict(
+    (molecule.id, molecule) for molecule in generators.mixture(40)
+)
+HYDRONIUM, HYDROXIDE, WATER, AMMONIUM, ACETIC_ACID = (
+    _SPECIES[id_] for id_ in ('s2', 's15', 's12', 's10', 's9')
+)
+
+
+def _check(route, target, stock):
+    available = set(canonical_hashes(stock))
+    for step in route.steps:
+        keys = canonical_hashes(step.precursors)
+        assert all(key in available for key in keys)
+        products = react(deepcopy(step.precursors), {})
+        product_keys = canonical_hashes(
+            product for product in products if product is not None
+        )
+        assert canonical_hash(step.product) in product_keys
+        available.add(canonical_hash(step.product))
+    assert canonical_hash(route.steps[-1].product) == canonical_hash(target)
+
+
+def test_one_step_routes():
+    stock = [WATER, ACETIC_ACID]
+    routes = retrosynthesis(HYDRONIUM, stock, {})
+
+    assert len(routes) == 2
+    for route in routes:
+        assert route.cost == 1
+        _check(route, HYDRONIUM, stock)
+
+
+def test_routes_through_intermediates():
+    stock = [AMMONIUM, HYDROXIDE]
+    routes = retrosynthesis(HYDRONIUM, stock, {})
+
+    assert routes
+    assert [route.cost for route in routes] == sorted(
+        route.cost for route in routes
+    )
+    assert routes[0].cost == 2
+    for route in routes:
+        _check(route, HYDRONIUM, stock)
+    assert retrosynthesis(HYDRONIUM, stock, {}, max_depth=1) == []
+
+
+def test_stock_target_and_budget():
+    routes = retrosynthesis(WATER, [HYDROXIDE, WATER], {})
+    assert len(routes) == 1 and routes[0].cost == 0
+
+    assert retrosynthesis(HYDRONIUM, [WATER], {}, max_nodes=0) == []
+    assert retrosynthesis(HYDRONIUM, [WATER], {}, max_time=0) == []
+
+
+def test_forward_checks_are_memoized():
+    from CAOS import retrosynthesis as module
+    from CAOS.dispatch import ReactionDispatcher
+
+    calls = []
+    gives = module._gives
+
+    def counting_gives(*arguments):
+        calls.append(arguments)
+        return gives(*arguments)
+
+    stock = [WATER, ACETIC_ACID]
+    expansion = module._Expansion(module._retro_mechanisms(
+        ReactionDispatcher._dispatch_namespace(False)
+    ), {}, stock)
+    name, info, _ = expansion.mechanisms[0]
+    key = canonical_hash(HYDRONIUM)
+    module._gives = counting_gives
+    try:
+        for _ in range(2):
+            # Equal precursors proposed from different states.
+            precursors = deepcopy(stock)
+            assert expansion.gives(
+                name, info, precursors, canonical_hashes(precursors), key
+            )
+    finally:
+        module._gives = gives
+
+    assert len(calls) == 1
@@ -0,0 +1,104 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+import networkx as nx
+
+from CAOS.structures.molecule import Molecule
+from CAOS.structures.rings import ring_info, ring_info_many
+
+from benchmarks import generators
+
+
+def _carbons(pairs):
+    """A carbon skeleton with single bonds between the numbered atoms."""
+
+    atoms = dict(
+        ('a{}'.format(atom), 'C') for pair in pairs for atom in pair
+    )
+    bonds = dict(
+        ('b{}'.format(number),
+         {'nodes': ('a{}'.format(first), 'a{}'.format(second)), 'order': 1})
+        for number, (first, second) in enumerate(pairs)
+    )
+    return Molecule(atoms, bonds)
+
+
+def _sizes(molecule):
+    return sorted(len(ring) for ring in ring_info(molecule).rings)
+
+
+def _is_ring(molecule, ring):
+    return all(molecule.has_edge(atom, ring[position - 1])
+               for position, atom in enumerate(ring))
+
+
+def test_acyclic():
+    info = ring_info(generators.alkane(5))
+
+    assert len(info) == 0
+    assert not info.in_ring('a0')
+
+
+def test_naphthalene():
+    # Two fused rings, sharing the bond between atoms 0 and 5.
+    molecule = _carbons([(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0),
+                         (5, 6), (6, 7), (7, 8), (8, 9), (9, 0), (9, 10)])
+    info = ring_info(molecule)
+
+    assert _sizes(molecule) == [6, 6]
+    assert all(_is_ring(molecule, ring) for ring in info.rings)
+    assert info.ring_sizes('a0') == [6, 6]
+    assert info.ring_sizes('a3') == [6]
+    assert info.is_ring_bond('a0', 'a5')
+    assert not info.is_ring_bond('a9', 'a10') and not info.in_ring('a10')
+
+
+def test_cages():
+    cube = [(0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6), (6, 7),
+            (7, 4), (0, 4), (1, 5), (2, 6), (3, 7)]
+    norbornane = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0),
+                  (0, 6), (6, 3)]
+    spiro = [(0, 1), (1, 2), (2, 0), (0, 3), (3, 4), (4, 5), (5, 0)]
+
+    assert _sizes(_carbons(cube)) == [4, 4, 4, 4, 4]
+    assert _sizes(_carbons(norbornane)) == [5, 5]
+    assert _sizes(_carbons(spiro)) == [3, 4]
+
+
+def test_small_ring_kept_while_searching_deeper():
+    # A five membered ring, bridged by a chain of 18 atoms into a ring
+    # of 21, larger than those of the first search depth.
+    chain = [0] + list(range(5, 23)) + [2]
+    pairs = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 0)] + list(
+        zip(chain, chain[1:])
+    )
+    molecule = _carbons(pairs)
+    info = ring_info(molecule)
+
+    assert _sizes(molecule) == [5, 21]
+    assert all(_is_ring(molecule, ring) for ring in info.rings)
+
+
+def test_rings_form_a_cycle_basis():
+    for seed in range(5):
+        molecule = generators.dense(40, seed=seed)
+        info = ring_info(molecule)
+        basis = nx.cycle_basis(molecule)
+
+        assert len(info) == len(basis)
+        assert all(_is_ring(molecule, ring) for ring in info.rings)
+        # Minimal: no longer in total than another basis.
+        assert sum(map(len, info.rings)) <= sum(map(len, basis))
+
+
+def test_cached_until_changed():
+    molecule = generators.ring(6)
+    info = molecule.ring_info()
+
+    assert molecule.ring_info() is info
+    assert ring_info_many([molecule, molecule]) == [info, info]
+    molecule.begin()
+    molecule.remove_edge('a0', 'a1')
+    assert len(molecule.ring_info()) == 0
+    molecule.rollback()
+    assert molecule.ring_info() is info
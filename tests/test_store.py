@@ -0,0 +1,106 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+import shutil
+import tempfile
+
+import numpy as np
+
+from CAOS.descriptors import Descriptors
+from CAOS.dispatch import react
+from CAOS.structures.molecule import Molecule
+from CAOS.structures.pka import _CACHE_KEY, estimate_many
+from CAOS.structures.store import DescriptorStore, pka_estimates
+
+from benchmarks import generators
+
+
+def _relabeled(molecule):
+    # The same molecule, with other atom ids.
+    names = dict((atom_id, 'x' + atom_id) for atom_id in molecule)
+    atoms = dict((names[atom_id], symbol)
+                 for atom_id, symbol in molecule.atoms.items())
+    bonds = dict(
+        (bond_id, {'nodes': tuple(names[node] for node in bond['nodes']),
+                   'order': bond['order']})
+        for bond_id, bond in molecule.bonds.items()
+    )
+    return Molecule(atoms, bonds, id=molecule.id)
+
+
+def test_columns_and_queries():
+    library = generators.library(40, seed=5)
+    store = DescriptorStore()
+    store.add(library[:25])
+    store.add(library[25:] + [Molecule({'a1': 'Br'}, {}, id='bromide')])
+
+    assert len(store) == 41
+    assert store['count_Br'].tolist() == [0] * 40 + [1]
+    assert store['hydroxyl'].dtype == bool
+    carbons = [sum(1 for symbol in molecule.atoms.values() if symbol == 'C')
+               for molecule in library]
+    assert store['count_C'][:40].tolist() == carbons
+    assert np.allclose(store['weight'][-1], 79.904)
+
+    light = store.mask(hydroxyl=True, weight=(None, 200))
+    expected = [molecule.id for molecule, weight, hydroxyl in zip(
+        library, store['weight'], store['hydroxyl'])
+        if hydroxyl and weight <= 200]
+    assert expected and store.select(hydroxyl=True, weight=(None, 200)) == \
+        expected
+    assert light.sum() == len(expected)
+    assert store.select(count_I=(1, None)) == []
+
+
+def test_estimates_follow_the_reactant_atoms():
+    library = generators.library(20, seed=2)
+    store = DescriptorStore()
+    store.add(library[:10])
+    queries = [_relabeled(molecule) for molecule in library]
+    expected = estimate_many(deepcopy(queries))
+
+    stored = store.pka_estimates(queries)
+    for estimate, reference in zip(stored, expected):
+        assert estimate.acidic == reference.acidic
+        assert estimate.basic == reference.basic
+    conditions = [{'descriptor_store': store}, {}] * 10
+    assert [estimate.acidic for estimate in pka_estimates(
+        queries, conditions)] == [estimate.acidic for estimate in expected]
+
+
+def test_saved_store_is_memory_mapped():
+    library = generators.library(20, seed=3)
+    store = DescriptorStore()
+    store.add(library[:15])
+    path = tempfile.mkdtemp()
+    try:
+        store.save(path)
+        loaded = DescriptorStore(path)
+        assert isinstance(loaded['weight'], np.memmap)
+        assert loaded.columns == store.columns
+        assert loaded.keys == store.keys
+        assert loaded.rows(library[14:16]) == [14, None]
+
+        loaded.add(library[15:])
+        store.add(library[15:])
+        for name in store.columns:
+            assert store[name].tolist() == loaded[name].tolist()
+    finally:
+        shutil.rmtree(path)
+
+
+def test_dispatch_uses_the_store():
+    reactants, conditions = generators.acid_base_pair(12)
+    del conditions['pkas'], conditions['pka_points']
+    store = DescriptorStore()
+    store.add(deepcopy(reactants))
+
+    expected = react(deepcopy(reactants), conditions)
+    stored = dict(conditions, descriptor_store=store)
+    assert react(deepcopy(reactants), stored) == expected
+
+    # The estimates are rebuilt, not computed (which would cache them).
+    copies = deepcopy(reactants)
+    Descriptors(copies, stored)['pka_estimates']
+    assert all(_CACHE_KEY not in (copy._cache or {}) for copy in copies)
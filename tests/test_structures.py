@@ -150,3 +150,207 @@ def test_masking_kwarg():
         {'b1': {'nodes': ('a1', 'a2')}}),
         {'node': 13}
     )
+
+
+def _water():
+    return Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'O'},
+        {'b1': {'nodes': ('a1', 'a3'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 1}}
+    )
+
+
+def test_rollback():
+    a = _water()
+    b = _water()
+    a.begin()
+    a.remove_node('a1')
+    a._add_node('a4', 'H')
+    a._add_edge('b3', {'nodes': ('a3', 'a4'), 'order': 1})
+    a.remove_edge('a2', 'a3')
+    a.rollback()
+
+    def bonds(molecule):
+        return sorted(
+            (tuple(sorted((u, v))), data['id'])
+            for u, v, data in molecule.edges(data=True)
+        )
+
+    assert a == b
+    assert bonds(a) == bonds(b)
+    assert 'a4' not in a.atoms
+    assert 'b3' not in a.bonds
+    assert not a.in_transaction
+
+
+def test_rollback_of_rebonded_pair():
+    a = _water()
+    a.formula
+    a.begin()
+    a._add_edge('b3', {'nodes': ('a1', 'a3'), 'order': 2})
+    assert a.bond_order_sum('a1') == 2
+    a.rollback()
+
+    assert a.has_edge('a1', 'a3')
+    assert a.adj['a1']['a3'] == {'id': 'b1', 'order': 1}
+    assert sorted(a.bonds) == ['b1', 'b2']
+    assert a.bond_order_sum('a1') == 1
+    assert _summary(a)
+
+
+def test_commit():
+    a = _water()
+    a.begin()
+    a.remove_node('a1')
+    a.commit()
+
+    assert 'a1' not in a
+    assert not a.in_transaction
+    assert raises(RuntimeError, a.commit, ())
+
+
+def test_nested_rollback():
+    a = _water()
+    a.begin()
+    a.remove_node('a1')
+    a.begin()
+    a.remove_node('a2')
+    a.rollback()
+
+    assert 'a2' in a and 'a1' not in a
+    a.rollback()
+    assert 'a1' in a and a.has_edge('a1', 'a3')
+
+
+def test_rollback_restores_cache():
+    a = _water()
+    a._cached('count', lambda molecule: len(molecule))
+    a.begin()
+    a.remove_node('a1')
+    assert a._cached('count', lambda molecule: len(molecule)) == 2
+    a.rollback()
+
+    assert a._cached('count', lambda molecule: len(molecule)) == 3
+
+
+def test_transaction_context():
+    a = _water()
+    try:
+        with a.transaction():
+            a.remove_node('a1')
+            raise ValueError
+    except ValueError:
+        pass
+    assert 'a1' in a
+
+    with a.transaction():
+        a.remove_node('a1')
+    assert 'a1' not in a
+
+
+def test_copy_outside_transaction():
+    from copy import deepcopy
+
+    a = _water()
+    a.begin()
+    b = deepcopy(a)
+    a.rollback()
+
+    assert not b.in_transaction
+    assert raises(RuntimeError, b.rollback, ())
+
+
+def test_implicit_round_trip():
+    a = _water()
+    a.id = 'Water'
+    implicit = a.to_implicit()
+
+    assert len(implicit) == 1
+    assert implicit.implicit_hydrogens
+    assert implicit.hydrogen_count('a3') == 2
+    assert implicit.id == 'Water'
+    assert implicit != a
+    assert implicit.to_explicit() == a
+    assert not implicit.to_explicit().implicit_hydrogens
+    assert len(a) == 3
+
+
+def test_implicit_hydrogens_roll_back():
+    a = _water().to_implicit()
+    a.begin()
+    a._remove_hydrogen('a3')
+    assert a.hydrogen_count('a3') == 1
+    assert a._add_hydrogen('a3') == 'a3'
+    a._remove_hydrogen('a3')
+    assert a.changes()['changed_hydrogens'] == {'a3': 1}
+    a.rollback()
+
+    assert a.hydrogen_count('a3') == 2
+    a._remove_hydrogen('a3')
+    a._remove_hydrogen('a3')
+    assert raises(ValueError, a._remove_hydrogen, ('a3',))
+
+
+def _summary(molecule):
+    from CAOS.structures.molecule import _Summary
+
+    kept = molecule._summarized()
+    fresh = _Summary(molecule)
+    return (kept.elements, kept.valences, kept.charges, kept.charge) == \
+        (fresh.elements, fresh.valences, fresh.charges, fresh.charge)
+
+
+def test_summary():
+    a = _water()
+
+    assert a.formula == 'H2O'
+    assert a.element_counts() == {'H': 2, 'O': 1}
+    assert abs(a.average_mass - 18.015) < 1e-3
+    assert abs(a.monoisotopic_mass - 18.010565) < 1e-6
+    assert a.bond_order_sum('a3') == 2
+    assert a.charge == 0
+
+    a.remove_node('a1')
+    assert a.formula == 'HO'
+    assert a.formal_charge('a3') == -1 and a.charge == -1
+    a._add_node('a4', 'H')
+    assert a.charge == 0
+    a._add_edge('b3', {'nodes': ('a3', 'a4'), 'order': 1})
+    assert a.formula == 'H2O' and a.charge == 0
+    assert _summary(a)
+
+
+def test_summary_rollback():
+    a = _water()
+    a._add_node('a4', 'C')
+    a._add_edge('b3', {'nodes': ('a3', 'a4'), 'order': 1})
+    implicit = a.to_implicit()
+    for molecule in (a, implicit):
+        molecule.formula
+        molecule.begin()
+        molecule.remove_edge('a3', 'a4')
+        molecule._add_hydrogen('a4')
+        molecule._add_node('a9', 'H')
+        molecule._add_edge('b9', {'nodes': ('a3', 'a9'), 'order': 1})
+        molecule.remove_node('a3')
+        assert _summary(molecule)
+        molecule.rollback()
+
+        assert _summary(molecule)
+        assert molecule.formula == 'CH2O'
+        assert molecule.charge == 1
+    assert implicit.bond_order_sum('a3') == 3
+    assert implicit.formal_charge('a3') == 1
+    assert implicit.to_explicit().formula == 'CH2O'
+
+
+def test_removals_update_dicts():
+    a = _water()
+    a.begin()
+    a.remove_node('a1')
+    a.remove_edge('a2', 'a3')
+
+    assert sorted(a.atoms) == ['a2', 'a3'] and not a.bonds
+    a.rollback()
+    assert sorted(a.atoms) == ['a1', 'a2', 'a3']
+    assert a.bonds == _water().bonds
@@ -0,0 +1,92 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.mechanisms.requirements import has_substructure
+from CAOS.structures.molecule import Molecule
+from CAOS.structures.substructure import AtomQuery, MoleculeIndex, \
+    Pattern, find_matches, functional_groups, has_match, query_library
+from CAOS.util import raises
+
+
+def acetic_acid():
+    return Molecule(
+        {'a1': 'C', 'a2': 'C', 'a3': 'O', 'a4': 'O', 'a5': 'H',
+         'a6': 'H', 'a7': 'H', 'a8': 'H'},
+        {'b1': {'nodes': ('a1', 'a2'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 2},
+         'b3': {'nodes': ('a2', 'a4'), 'order': 1},
+         'b4': {'nodes': ('a4', 'a5'), 'order': 1},
+         'b5': {'nodes': ('a1', 'a6'), 'order': 1},
+         'b6': {'nodes': ('a1', 'a7'), 'order': 1},
+         'b7': {'nodes': ('a1', 'a8'), 'order': 1}}
+    )
+
+
+def water():
+    return Molecule(
+        {'a1': 'H', 'a2': 'H', 'a3': 'O'},
+        {'b1': {'nodes': ('a1', 'a3'), 'order': 1},
+         'b2': {'nodes': ('a2', 'a3'), 'order': 1}}
+    )
+
+
+def test_from_string():
+    pattern = Pattern.from_string('[N,O]-H')
+    assert pattern.atoms['p0'].symbols == frozenset(['N', 'O'])
+    assert pattern.atoms['p1'].symbols == frozenset(['H'])
+    assert pattern.bond_between('p0', 'p1').order == 1
+
+
+def test_from_string_invalid():
+    for text in ['-C', 'C-', 'C=-O', 'C[O', '']:
+        assert raises(ValueError, Pattern.from_string, [text])
+
+
+def test_bond_orders_are_respected():
+    molecule = acetic_acid()
+    carbonyls = find_matches(Pattern.from_string('C=O'), molecule)
+    assert carbonyls == [{'p0': 'a2', 'p1': 'a3'}]
+    any_bond = find_matches(Pattern.from_string('C~O'), molecule)
+    assert len(any_bond) == 2
+
+
+def test_unique_matches():
+    hydroxyl = Pattern.from_string('H-O-H')
+    assert len(find_matches(hydroxyl, water())) == 1
+    assert len(find_matches(hydroxyl, water(), unique=False)) == 2
+
+
+def test_atom_query_hydrogens():
+    methyl = Pattern({'c': AtomQuery('C', hydrogens=3)}, {})
+    assert find_matches(methyl, acetic_acid()) == [{'c': 'a1'}]
+
+
+def test_functional_groups():
+    groups = functional_groups(acetic_acid())
+    assert 'carboxylic_acid' in groups
+    assert 'hydroxyl' in groups
+    assert 'thiol' not in groups
+
+
+def test_index_is_cached_and_invalidated():
+    molecule = water()
+    index = MoleculeIndex.of(molecule)
+    assert MoleculeIndex.of(molecule) is index
+    assert not has_match(Pattern.from_string('O-N'), molecule)
+
+    molecule._add_node('a4', 'N')
+    molecule._add_edge('b3', {'nodes': ('a3', 'a4'), 'order': 1})
+    assert MoleculeIndex.of(molecule) is not index
+    assert has_match(Pattern.from_string('O-N'), molecule)
+
+
+def test_query_library():
+    library = [water(), acetic_acid(), water()]
+    hits = query_library(Pattern.from_string('C=O'), library)
+    assert [position for position, _ in hits] == [1]
+
+
+def test_has_substructure_requirement():
+    requirement = has_substructure('C=O')
+    assert requirement([water(), acetic_acid()], {})
+    assert not requirement([water()], {})
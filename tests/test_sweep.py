@@ -0,0 +1,152 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from CAOS.dispatch import register_reaction_mechanism, ReactionDispatcher
+from CAOS.exceptions.reaction_errors import InvalidProductError
+from CAOS.sweep import sweep, _Results
+from CAOS.util import raises
+from CAOS.mechanisms.requirements import pka
+from CAOS.mechanisms.acid_base import acid_base_reaction
+
+from benchmarks import generators
+
+calls = {'solvent': 0, 'temperature': 0, 'mechanism': 0}
+
+
+def setup_module():
+    def needs_water(reactants, conditions):
+        calls['solvent'] += 1
+        return conditions.get('solvent', 'water') == 'water'
+
+    def warm_enough(reactants, conditions):
+        calls['temperature'] += 1
+        for reactant in reactants:
+            reactant.warm = conditions['temperature'] > 250
+        return True
+
+    @register_reaction_mechanism([needs_water, warm_enough], True)
+    def sweep_reaction(reactants, conditions):
+        calls['mechanism'] += 1
+        return [reactant.warm for reactant in reactants]
+
+
+def teardown_module():
+    del ReactionDispatcher._test_namespace['sweep_reaction']
+
+
+def setup():
+    for key in calls:
+        calls[key] = 0
+
+
+def test_requirements_rerun_only_for_their_keys():
+    setup()
+    reactants = generators.mixture(2)
+    results = sweep(reactants, {'pressure': 1}, {
+        'solvent': ['water', 'hexane'],
+        'temperature': [200, 300, 400],
+        'catalyst': [None, 'Pd'],
+    }, True)
+
+    assert len(results) == 12
+    assert calls['solvent'] == 2
+    # Only points in water reach the temperature requirement.
+    assert calls['temperature'] == 3
+    # The mechanism only depends on the attributes set by the
+    # requirement, which are the same at 300 and 400 degrees.
+    assert calls['mechanism'] == 2
+
+    for point, products in results:
+        if point['solvent'] == 'hexane':
+            assert products is None
+        else:
+            assert products == [point['temperature'] > 250] * 2
+
+
+def test_reused_requirements_restore_attributes():
+    setup()
+    reactants = generators.mixture(1)
+    results = sweep(reactants, {}, [
+        {'temperature': 300}, {'temperature': 200}, {'temperature': 300}
+    ], True)
+
+    assert [products for _, products in results] == [[True], [False], [True]]
+    assert calls['temperature'] == 2
+    assert results[0][1] is results[2][1]
+
+
+def test_sweep_pka_overrides():
+    reactants, conditions = generators.acid_base_pair(10)
+    strong = conditions['pkas']
+    weak = dict(strong, Acid=20.0)
+    results = sweep(reactants, conditions, {'pkas': [strong, weak, strong]})
+
+    assert results[0][1] is results[2][1]
+    assert results[0][1] is not results[1][1]
+    expected = acid_base_reaction(reactants, dict(conditions, pkas=strong)) \
+        if pka(reactants, dict(conditions, pkas=strong)) else None
+    assert results[0][1][:2] == expected[:2]
+
+
+def test_sweep_leaves_reactants_unchanged():
+    reactants, conditions = generators.acid_base_pair(10)
+    before = [sorted(reactant.edges()) for reactant in reactants]
+    results = sweep(reactants, conditions, {'temperature': [200, 300]})
+
+    assert [sorted(reactant.edges()) for reactant in reactants] == before
+    for _, products in results:
+        assert not any(
+            product is reactant
+            for product in products for reactant in reactants
+        )
+
+
+def test_sweep_validates_when_asked():
+    def overbond_wanted(reactants, conditions):
+        return conditions.get('mechanism') == 'overbond'
+
+    @register_reaction_mechanism([overbond_wanted], True)
+    def sweep_overbond_reaction(reactants, conditions):
+        # Gives a carbon of the alkane a fifth bond.
+        alkane = reactants[0]
+        alkane._add_node('a99', 'H')
+        alkane._add_edge('b99', {'nodes': ('a0', 'a99'), 'order': 1})
+        return [alkane]
+
+    reactants = [generators.alkane(2)]
+    conditions = {'mechanism': 'overbond', 'solvent': 'hexane'}
+    try:
+        results = sweep(reactants, conditions, {'validate': [False]}, True)
+        assert len(results[0][1][0]) == len(reactants[0]) + 1
+        assert raises(InvalidProductError, sweep, (
+            reactants, conditions, {'validate': [False, True]}, True
+        ))
+    finally:
+        del ReactionDispatcher._test_namespace['sweep_overbond_reaction']
+    assert 'a99' not in reactants[0]
+
+
+class _Unhashable(object):
+    """Equal values with the same repr, but no hash."""
+
+    __hash__ = None
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __repr__(self):
+        return '_Unhashable()'
+
+
+def test_unhashable_conditions_are_not_cached():
+    def probe(reactants, conditions):
+        return conditions['probe'].value
+
+    results = _Results()
+    reactants = generators.mixture(1)
+    assert results.call(probe, reactants, {'probe': _Unhashable(1)}) == 1
+    assert results.call(probe, reactants, {'probe': _Unhashable(2)}) == 2
+    assert results.calls == 2 and results.reused == 0
@@ -0,0 +1,92 @@
+from __future__ import print_function, division, unicode_literals, \
+    absolute_import
+
+from copy import deepcopy
+
+from CAOS.delta import react_delta
+from CAOS.dispatch import ReactionDispatcher, react, \
+    register_reaction_mechanism
+from CAOS.exceptions.reaction_errors import InvalidProductError
+from CAOS.structures.molecule import Molecule
+from CAOS.util import raises
+from CAOS.validation import validate_products
+
+from benchmarks import generators
+
+
+def _wants(name):
+    def requirement(reactants, conditions):
+        return conditions.get('mechanism') == name
+    return requirement
+
+
+def setup_module():
+    @register_reaction_mechanism([_wants('overbond')], True)
+    def overbond_reaction(reactants, conditions):
+        # Gives a carbon a fifth bond.
+        methane = reactants[0]
+        methane._add_node('a9', 'H')
+        methane._add_edge('b9', {'nodes': ('a0', 'a9'), 'order': 1})
+        return [methane]
+
+    @register_reaction_mechanism([_wants('stale')], True)
+    def stale_reaction(reactants, conditions):
+        # Leaves an atom in the dict that is gone from the graph.
+        methane = reactants[0]
+        methane.remove_node('a1')
+        methane.atoms['a1'] = 'H'
+        methane._add_hydrogen('a0')
+        return [methane]
+
+
+def teardown_module():
+    for name in ('overbond_reaction', 'stale_reaction'):
+        del ReactionDispatcher._test_namespace[name]
+
+
+def _methane():
+    return Molecule(
+        {'a0': 'C', 'a1': 'H', 'a2': 'H', 'a3': 'H', 'a4': 'H'},
+        dict(('b{}'.format(number), {'nodes': ('a0', 'a{}'.format(number)),
+                                     'order': 1})
+             for number in range(1, 5))
+    )
+
+
+def test_acid_base_products_pass():
+    reactants, conditions = generators.acid_base_pair(20)
+    conditions = dict(conditions, validate=True)
+
+    assert react_delta(reactants, conditions)
+    expected = react(deepcopy(reactants), dict(conditions, validate=False))
+    products = react(reactants, conditions)
+    assert len(products) == len(expected)
+
+
+def test_invalid_products_roll_back():
+    for name in ('overbond', 'stale'):
+        methane = _methane()
+        conditions = {'mechanism': name, 'validate': True}
+        assert raises(InvalidProductError, react,
+                      ([methane], conditions, True))
+        assert methane == _methane()
+        assert sorted(methane.atoms) == sorted(_methane().atoms)
+        assert not methane.in_transaction
+
+    # Without validation the products are accepted.
+    assert react([_methane()], {'mechanism': 'overbond'}, True)
+
+
+def test_checks_can_be_chosen():
+    methane = _methane()
+    ion = _methane()
+    ion.remove_node('a1')
+
+    assert raises(InvalidProductError, validate_products,
+                  ([methane], [ion]))
+    validate_products([methane], [ion], ('valence', 'consistency'))
+    assert raises(InvalidProductError, validate_products,
+                  ([methane], [ion], ('mass',)))
+    assert raises(ValueError, react,
+                  ([methane], {'mechanism': 'stale', 'validate': ['typo']},
+                   True))